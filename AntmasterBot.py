@@ -3,6 +3,7 @@ import os
 import sys
 import re
 import json
+import hashlib
 import random
 import requests
 import time
@@ -25,6 +26,7 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from deep_translator import GoogleTranslator
 import mysql.connector
 import ssl
+from html import escape
 from aiogram import Bot, Dispatcher, types
 from aiohttp import ClientSession as AiohttpSession
 from aiogram.types import (
@@ -35,8 +37,7 @@ from aiogram.types import (
 from aiogram.filters import Command
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.enums import ParseMode
-from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
-from openai import AsyncOpenAI
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramRetryAfter
 
 # Importar el módulo de reglas
 from usuario_rules import verify_user_role, verify_user_level, ADMIN_ROLES, verificar_restricciones
@@ -45,6 +46,26 @@ from usuario_rules import verify_user_role, verify_user_level, ADMIN_ROLES, veri
 from database import AntDatabase
 from translation_manager import TranslationManager
 from rewards_manager import RewardsManager
+from rate_limiter import limitador_fuentes, CircuitOpenError
+from html_extractor import extraer_antwiki, extraer_antontop, agrupar_secciones, extraer_en_executor
+from species_loader import SpeciesLoader
+from inaturalist_client import INaturalistClient
+from antflights_stats import AntFlightsStatsFetcher
+from genus_crawler import GenusCrawler
+from job_manager import JobManager, ICONOS_ESTADO
+from region_updater import RegionUpdater
+from photo_cache import PhotoCache
+from broadcaster import Broadcaster, formatear_informe
+from chat_registry import ChatRegistry, ChatRegistryMiddleware
+from admin_cache import AdminCache
+from request_context import RequestContext, RequestContextMiddleware
+from update_scheduler import UpdateScheduler
+from webhook_server import BOT_MODE, ejecutar_webhook
+from shard_workers import BOT_WORKERS, WORKER_TRABAJOS, ejecutar_supervisor
+from game_rounds import RoundGenerator
+from game_attempts import AttemptTracker
+from description_service import DescriptionService, DESCRIPCION_RENOVAR_DIAS
+import flight_profiles
 
 # Cargar variables de entorno
 from dotenv import load_dotenv
@@ -73,6 +94,31 @@ TIMEOUT = 30
 MAX_RETRIES = 3
 RETRY_BACKOFF = 2
 
+# Carga masiva de especies
+LOADER_WORKERS = int(os.getenv('LOADER_WORKERS', 4))
+LOADER_BATCH_SIZE = int(os.getenv('LOADER_BATCH_SIZE', 25))
+CHECKPOINTS_DIR = os.getenv('CHECKPOINTS_DIR', 'checkpoints')
+
+# Actualización de estadísticas de vuelos de todos los géneros
+CRAWL_WORKERS = int(os.getenv('CRAWL_WORKERS', 4))
+
+# Actualización de regiones de todas las especies
+REGION_WORKERS = int(os.getenv('REGION_WORKERS', 8))
+REGION_BATCH_SIZE = int(os.getenv('REGION_BATCH_SIZE', 200))
+
+# El hormidato automático solo se envía a los grupos con actividad en esta ventana (segundos)
+VENTANA_ACTIVIDAD_HORMIDATO = 3600
+
+# Segundos mínimos entre ediciones del mensaje mientras se genera una descripción en streaming
+INTERVALO_EDICION_STREAMING = float(os.getenv('INTERVALO_EDICION_STREAMING', 1.0))
+
+# Límites de Telegram (en unidades UTF-16) para el pie de una foto y para un mensaje de texto
+LIMITE_CAPTION = 1024
+LIMITE_MENSAJE = 4096
+
+# Chat donde /precalentar_fotos sube las fotos (por defecto, el privado del administrador)
+PHOTO_CACHE_CHAT_ID = os.getenv('PHOTO_CACHE_CHAT_ID')
+
 
 # Configuración de la sesión de requests con reintentos
 http_session = requests.Session()
@@ -111,6 +157,38 @@ rewards_manager = RewardsManager(db)
 # Inicializar el gestor de traducción
 translation_manager = TranslationManager(db)
 
+# Cliente de iNaturalist con resolución por lotes y caché
+inat_client = INaturalistClient()
+
+# Estadísticas de AntFlights cacheadas por género
+antflights_fetcher = AntFlightsStatsFetcher()
+
+# Trabajos largos de administración en segundo plano
+job_manager = JobManager(db)
+
+# file_id de Telegram de las fotos de especies ya enviadas
+photo_cache = PhotoCache(db)
+
+# Registro de chats donde está el bot; de aquí salen los destinos de los envíos masivos
+chat_registry = ChatRegistry(db)
+
+# Administradores de cada chat en memoria (is_admin, reacciones, badges)
+admin_cache = AdminCache()
+rewards_manager.set_admin_cache(admin_cache)
+
+# Envíos masivos (hormidatos, mensaje diario, rankings) con los límites de Telegram
+broadcaster = Broadcaster(on_descartado=chat_registry.descartar)
+rewards_manager.set_broadcaster(broadcaster)
+
+# Rondas de /adivina_especie preparadas por chat
+game_rounds = RoundGenerator(db, photo_cache)
+
+# Intentos del juego (3 cada 24h) en memoria, guardados en lotes
+game_attempts = AttemptTracker(db)
+
+# Descripciones con OpenAI: un solo cliente, concurrencia limitada y presupuesto diario
+description_service = DescriptionService(db)
+
 # Configuración de APIs
 INATURALIST_API = 'https://api.inaturalist.org/v1/taxa?q='
 ANTWIKI_API = 'https://www.antwiki.org/wiki/'
@@ -229,6 +307,11 @@ regiones = {
 # Crear el bot sin sesión personalizada primero
 bot = Bot(token=TOKEN)
 dp = Dispatcher()
+# Primero el planificador: orden por chat, concurrencia máxima y prioridad de los botones
+update_scheduler = UpdateScheduler()
+dp.update.outer_middleware(update_scheduler)
+dp.update.outer_middleware(ChatRegistryMiddleware(chat_registry))
+dp.update.outer_middleware(RequestContextMiddleware(db, admin_cache))
 
 # Variable global para la sesión que se inicializará en main()
 global_session = None
@@ -261,12 +344,18 @@ def translate_text(text):
         logger.error(f"Error en la traducción: {str(e)}")
         return text
 
-def make_request(url, params=None, timeout=TIMEOUT):
-    """Función auxiliar para hacer peticiones HTTP con reintentos"""
+async def make_request(url, params=None, timeout=TIMEOUT):
+    """Función auxiliar para hacer peticiones HTTP con reintentos (en un executor: la espera del limitador bloquea)"""
     try:
-        response = http_session.get(url, params=params, timeout=timeout)
+        response = await asyncio.get_event_loop().run_in_executor(
+            None,
+            lambda: limitador_fuentes.get_sync(url, session=http_session, params=params, timeout=timeout)
+        )
         response.raise_for_status()
         return response
+    except CircuitOpenError as e:
+        logger.warning(f"Petición descartada: {str(e)}")
+        return None
     except requests.exceptions.Timeout:
         logger.error(f"Timeout al acceder a {url}")
         return None
@@ -290,22 +379,15 @@ async def buscar_especie_google(query):
         
         # 1. Intentar búsqueda directa en AntWiki
         antwiki_url = f"{ANTWIKI_API}{genus}_{species}"
-        response = make_request(antwiki_url)
+        response = await make_request(antwiki_url)
         photo_url = None
         
         if response and response.status_code == 200:
             # 2. Si se encuentra en AntWiki, buscar en iNaturalist
-            url = f"https://api.inaturalist.org/v1/taxa?q={quote(scientific_name)}&rank=species&per_page=1"
-            inat_response = make_request(url)
-            inat_id = None
-            
-            if inat_response:
-                data = inat_response.json()
-                if data.get('total_results', 0) > 0 and data.get('results'):
-                    result = data['results'][0]
-                    inat_id = str(result.get('id'))
-                    if result.get('default_photo'):
-                        photo_url = result['default_photo'].get('medium_url')
+            inat_result = await buscar_en_inaturalist(scientific_name)
+            inat_id = str(inat_result['id']) if inat_result else None
+            if inat_result:
+                photo_url = inat_result.get('photo_url')
             
             # Si no hay foto en iNaturalist, intentar en AntWiki
             if not photo_url:
@@ -328,7 +410,7 @@ async def buscar_especie_google(query):
             'num': 10
         }
         
-        response = make_request(GOOGLE_SEARCH_API, params=params)
+        response = await make_request(GOOGLE_SEARCH_API, params=params)
         if response:
             data = response.json()
             if 'items' in data:
@@ -338,18 +420,9 @@ async def buscar_especie_google(query):
                         species_name = species_name.replace('_', ' ').strip()
                         if ' ' in species_name:
                             # Buscar en iNaturalist
-                            url = f"https://api.inaturalist.org/v1/taxa?q={quote(species_name)}&rank=species&per_page=1"
-                            inat_response = make_request(url)
-                            inat_id = None
-                            photo_url = None
-                            
-                            if inat_response:
-                                data = inat_response.json()
-                                if data.get('total_results', 0) > 0 and data.get('results'):
-                                    result = data['results'][0]
-                                    inat_id = str(result.get('id'))
-                                    if result.get('default_photo'):
-                                        photo_url = result['default_photo'].get('medium_url')
+                            inat_result = await buscar_en_inaturalist(species_name)
+                            inat_id = str(inat_result['id']) if inat_result else None
+                            photo_url = inat_result.get('photo_url') if inat_result else None
                             
                             # Si no hay foto en iNaturalist, intentar en AntWiki
                             if not photo_url:
@@ -411,19 +484,20 @@ def encontrar_especies_similares(nombre_especie: str, umbral: int = 60) -> List[
     return sorted(especies_similares, key=lambda x: x['similitud'], reverse=True)
 
 @dp.message(Command("start"))
-async def send_welcome(message: types.Message):
+async def send_welcome(message: types.Message, contexto: Optional[RequestContext] = None):
     # Registrar interacción
     await db.log_user_interaction(
         user_id=message.from_user.id,
         username=message.from_user.username or message.from_user.first_name,
         interaction_type='command',
         command_name='start',
-        chat_id=message.chat.id
+        chat_id=message.chat.id,
+        contexto=contexto
     )
     await message.answer("🐜 ¡Bienvenido a AntMasterBot! El bot para amantes de la mirmecología. Usa /hormidato para un dato curioso o /especie [nombre] para buscar información sobre una especie.")
 
 @dp.message(Command("ayuda"))
-async def ayuda(message: types.Message):
+async def ayuda(message: types.Message, contexto: Optional[RequestContext] = None):
     """Muestra información de ayuda sobre los comandos disponibles"""
     try:
         # Registrar interacción
@@ -432,7 +506,8 @@ async def ayuda(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='ayuda',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Verificar si el usuario es administrador
@@ -471,6 +546,11 @@ async def ayuda(message: types.Message):
 /actualizar_regiones - Actualizar regiones de especies
 /actualizar_estadisticas - Actualizar estadísticas de vuelos
 /actualizar_todo - Actualización completa
+/jobs - Ver los trabajos en segundo plano
+/cancelar_job [id] - Cancelar un trabajo en curso
+/colas - Ver las colas de updates por chat
+/precalentar_fotos [n] - Subir las fotos de las n especies más buscadas
+/pregenerar_descripciones [n] - Generar o renovar descripciones de las especies más buscadas
 /enviar_mensaje [mensaje] - Enviar mensaje a todos los chats
 /iniciar_ranking - Iniciar sistema de ranking
 /detener_ranking - Detener sistema de ranking
@@ -483,7 +563,7 @@ async def ayuda(message: types.Message):
         await message.answer("❌ Lo siento, hubo un error al mostrar la ayuda.")
 
 @dp.message(Command("normas"))
-async def mostrar_normas(message: types.Message):
+async def mostrar_normas(message: types.Message, contexto: Optional[RequestContext] = None):
     """Muestra las normas del grupo"""
     try:
         # Registrar interacción
@@ -492,7 +572,8 @@ async def mostrar_normas(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='normas',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Texto de las normas
@@ -525,7 +606,7 @@ Los administradores tienen la última palabra.
         await message.answer("Error al mostrar las normas. Por favor, inténtalo de nuevo más tarde.")
 
 @dp.message(Command("iniciar_ranking"))
-async def iniciar_ranking(message: types.Message):
+async def iniciar_ranking(message: types.Message, contexto: Optional[RequestContext] = None):
     """Inicia el sistema de ranking"""
     try:
         # Registrar interacción
@@ -534,7 +615,8 @@ async def iniciar_ranking(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='iniciar_ranking',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Iniciar el gestor de ranking en segundo plano
@@ -546,7 +628,7 @@ async def iniciar_ranking(message: types.Message):
         await message.answer("❌ Error al iniciar el sistema de ranking")
 
 @dp.message(Command("detener_ranking"))
-async def detener_ranking(message: types.Message):
+async def detener_ranking(message: types.Message, contexto: Optional[RequestContext] = None):
     """Detiene el sistema de ranking"""
     try:
         # Registrar interacción
@@ -555,7 +637,8 @@ async def detener_ranking(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='detener_ranking',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Detener el gestor de ranking
@@ -567,14 +650,15 @@ async def detener_ranking(message: types.Message):
         await message.answer("❌ Error al detener el sistema de ranking")
 
 @dp.message(Command("hormidato"))
-async def hormidato(message: types.Message):
+async def hormidato(message: types.Message, contexto: Optional[RequestContext] = None):
     # Registrar interacción
     await db.log_user_interaction(
         user_id=message.from_user.id,
         username=message.from_user.username or message.from_user.first_name,
         interaction_type='command',
         command_name='hormidato',
-        chat_id=message.chat.id
+        chat_id=message.chat.id,
+        contexto=contexto
     )
     
     # Sistema para evitar repetición de hormidatos
@@ -706,50 +790,43 @@ async def hormidato(message: types.Message):
     await message.answer(f"🐜 {categoria}:\n{dato}")
 
 async def buscar_en_inaturalist(query):
-    """Busca información y fotos en iNaturalist"""
+    """Busca información y fotos en iNaturalist (con caché compartida por el bot y las cargas masivas)"""
     try:
-        # Construir la URL de la API
-        url = "https://api.inaturalist.org/v1/taxa"
-        params = {
-            "q": query,
-            "rank": "species",
-            "per_page": 1
-        }
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status != 200:
-                    return None
-                
-                data = await response.json()
-                if not data.get("results") or len(data["results"]) == 0:
-                    return None
-                    
-                result = data["results"][0]
-                    
-                # Extraer información relevante
-                info = {
-                    "id": result.get("id"),
-                    "name": result.get("name"),
-                    "preferred_common_name": result.get("preferred_common_name"),
-                    "wikipedia_url": result.get("wikipedia_url"),
-                    "photo_url": None
-                }
-                
-                # Buscar la mejor foto disponible
-                if result.get("taxon_photos") and len(result["taxon_photos"]) > 0:
-                    photo = result["taxon_photos"][0]["photo"]
-                    if photo.get("medium_url"):
-                        info["photo_url"] = photo["medium_url"]
-                    elif photo.get("url"):
-                        info["photo_url"] = photo["url"]
-                
-                return info
-                
+        return await inat_client.resolver_nombre(query)
     except Exception as e:
         logger.error(f"Error al buscar en iNaturalist: {str(e)}")
         return None
 
+async def completar_ids_inaturalist():
+    """Resuelve y guarda el inaturalist_id de las especies que aún no lo tienen"""
+    sin_id = [nombre for nombre, inat_id in db.get_inaturalist_ids().items() if not inat_id]
+    if not sin_id:
+        return 0
+    resueltos = await inat_client.resolver_nombres(sin_id)
+    ids = {nombre: taxon['id'] for nombre, taxon in resueltos.items() if taxon}
+    guardados = db.set_inaturalist_ids(ids)
+    logger.info(f"inaturalist_id resueltos: {guardados}/{len(sin_id)}")
+    return guardados
+
+async def actualizar_regiones_especies(job):
+    """Resuelve los ids de iNaturalist que falten y recalcula la región de todas las especies"""
+    # Resolver antes los ids que falten para que iNaturalist se consulte por lotes de ids
+    await completar_ids_inaturalist()
+    
+    async def informar(estado):
+        eta = f"{estado['eta'] / 60:.1f} min" if estado['eta'] is not None else "calculando..."
+        await job.progreso(
+            f"🌍 Actualizando regiones... ({estado['procesados']}/{estado['total']})\n"
+            f"✅ Actualizadas: {estado['updated']}\n"
+            f"❌ Errores: {estado['errors']}\n"
+            f"⚡ Ritmo: {estado['por_minuto']:.0f} especies/min\n"
+            f"⏱ Tiempo restante: {eta}"
+        )
+    
+    updater = RegionUpdater(db, inat_client, concurrencia=REGION_WORKERS,
+                            batch_size=REGION_BATCH_SIZE, on_progress=informar)
+    return await updater.actualizar()
+
 async def determinar_region_especie(species_info):
     """Determina la región de una especie basada en datos de iNaturalist"""
     try:
@@ -807,131 +884,110 @@ def generar_resumen_basico(result, inat_info, antwiki_info, distribucion):
         logger.error(f"Error generando resumen básico: {str(e)}")
         return "Error al generar resumen de la especie."
 
-# Inicializar el cliente de OpenAI
-client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-
-async def generar_descripcion_especie(nombre_cientifico: str) -> str:
-    """Genera una descripción detallada de la especie usando ChatGPT y datos de AntWiki"""
+async def generar_descripcion_especie(nombre_cientifico: str, on_parcial=None) -> str:
+    """
+    Genera una descripción detallada de la especie usando ChatGPT y datos de AntWiki.
+    Con on_parcial(texto) la descripción se genera en streaming y se notifica el texto parcial.
+    """
     try:
-        # Primero intentar obtener la descripción cacheada
-        descripcion_cache = db.get_cached_description(nombre_cientifico)
-        if descripcion_cache:
-            logger.info(f"Descripción recuperada del caché para: {nombre_cientifico}")
-            return descripcion_cache
-            
-        logger.info(f"Generando nueva descripción para: {nombre_cientifico}")
-        genus, species = nombre_cientifico.split()[:2]
-        
-        # Obtener información de AntWiki
-        antwiki_info = None
-        url = f"https://www.antwiki.org/wiki/{genus}_{species}"
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
-                    
-                    # Extraer información relevante
-                    content = soup.find('div', id='mw-content-text')
-                    if content:
-                        info = {
-                            'description': [],
-                            'distribution': [],
-                            'habitat': [],
-                            'behavior': [],
-                            'measurements': []
-                        }
-                        
-                        # Buscar información en la tabla (infobox)
-                        infobox = soup.find('table', class_='infobox')
-                        if infobox:
-                            for row in infobox.find_all('tr'):
-                                header = row.find('th')
-                                value = row.find('td')
-                                if header and value:
-                                    key = header.get_text().strip().lower()
-                                    val = value.get_text().strip()
-                                    if any(word in key for word in ['size', 'length', 'measurements']):
-                                        info['measurements'].append(f"{key}: {val}")
-                                    elif 'distribution' in key:
-                                        info['distribution'].append(val)
-                                    elif 'habitat' in key:
-                                        info['habitat'].append(val)
-                        
-                        # Buscar secciones relevantes en el contenido
-                        for section in content.find_all(['h2', 'h3']):
-                            section_title = section.get_text().strip().lower()
-                            next_elem = section.find_next_sibling()
-                            
-                            while next_elem and next_elem.name not in ['h2', 'h3']:
-                                if next_elem.name == 'p':
-                                    text = next_elem.get_text().strip()
-                                    if text:
-                                        if any(word in section_title for word in ['description', 'descripción']):
-                                            info['description'].append(text)
-                                        elif any(word in section_title for word in ['distribution', 'distribución']):
-                                            info['distribution'].append(text)
-                                        elif any(word in section_title for word in ['habitat', 'hábitat']):
-                                            info['habitat'].append(text)
-                                        elif any(word in section_title for word in ['behavior', 'behaviour', 'comportamiento']):
-                                            info['behavior'].append(text)
-                                next_elem = next_elem.find_next_sibling()
-                        
-                        # Preparar el prompt para ChatGPT
-                        prompt = f"""Genera un resumen BREVE Y CONCISO (máximo 800 caracteres en total) sobre la hormiga {nombre_cientifico} basado en la siguiente información de AntWiki. 
-                        El resumen debe ser en español y destacar solo los aspectos más interesantes y únicos de la especie.
-                        
-                        Información disponible:
-                        
-                        Descripción: {' '.join(info['description'][:1])}
-                        
-                        Distribución: {' '.join(info['distribution'])}
-                        
-                        Hábitat: {' '.join(info['habitat'])}
-                        
-                        Comportamiento: {' '.join(info['behavior'])}
-                        
-                        Medidas: {' '.join(info['measurements'])}
-                        
-                        IMPORTANTE:
-                        1. El resumen DEBE ser menor a 800 caracteres en total
-                        2. Usa máximo 2-3 emojis en todo el texto
-                        3. Estructura el texto en 2-3 líneas máximo
-                        4. Prioriza la información más interesante y única
-                        5. Si no hay información en alguna sección, omítela
-                        """
-                        
-                        client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-                        completion = await client.chat.completions.create(
-                            model="gpt-3.5-turbo",
-                            messages=[
-                                {"role": "system", "content": "Eres un experto en mirmecología especializado en generar resúmenes BREVES y precisos sobre especies de hormigas. Debes ser conciso y mantener el texto dentro del límite de caracteres."},
-                                {"role": "user", "content": prompt}
-                            ],
-                            temperature=0.7,
-                            max_tokens=200
-                        )
-                        
-                        descripcion = completion.choices[0].message.content
-                        
-                        # Guardar la descripción en la base de datos
-                        if descripcion:
-                            if db.save_species_description(nombre_cientifico, descripcion):
-                                logger.info(f"Descripción guardada en caché para: {nombre_cientifico}")
-                            else:
-                                logger.warning(f"No se pudo guardar la descripción en caché para: {nombre_cientifico}")
-                        
-                        return descripcion
-        
-        return None
+        # Descripción cacheada (si ha caducado se revalida contra AntWiki)
+        resultado = await description_service.describir(nombre_cientifico, on_parcial)
+        descripcion, info = resultado['descripcion'], resultado['info']
+        if resultado['resultado'] in ('cache', 'caducada', 'sin_cambios'):
+            logger.info(f"Descripción recuperada del caché para: {nombre_cientifico} ({resultado['resultado']})")
+        if descripcion or not info:
+            return descripcion
+        
+        # Sin presupuesto, fuera de plazo o con error: resumen básico sin guardar en caché
+        description_service.registrar_respaldo()
+        return generar_resumen_basico(
+            {'scientific_name': nombre_cientifico}, None,
+            {'habitat': ' '.join(info['habitat'])}, info['distribution']
+        )
         
     except Exception as e:
         logger.error(f"Error al generar descripción de especie: {str(e)}")
         return None
 
+def longitud_telegram(texto: str) -> int:
+    """Longitud tal como la cuenta Telegram (unidades UTF-16)"""
+    return len(texto.encode('utf-16-le')) // 2
+
+def recortar_descripcion(descripcion: str, componer, limite: int):
+    """
+    Recorta la descripción para que componer(descripcion) no pase de `limite`.
+    Devuelve (texto, recortada).
+    """
+    disponible = limite - longitud_telegram(componer(""))
+    if longitud_telegram(descripcion) <= disponible:
+        return descripcion, False
+    recorte = descripcion[:max(0, disponible - 1)]
+    while recorte and longitud_telegram(recorte) > disponible - 1:
+        recorte = recorte[:-1]
+    if ' ' in recorte:
+        recorte = recorte.rsplit(' ', 1)[0]
+    return recorte.rstrip() + "…", True
+
+async def enviar_descripcion_completa(mensaje, nombre_cientifico: str, descripcion: str):
+    """Envía como respuesta a la ficha la descripción que no cabía en ella"""
+    texto = f"📖 *{nombre_cientifico}*\n\n{descripcion}"[:LIMITE_MENSAJE]
+    try:
+        await mensaje.reply(text=texto, parse_mode=ParseMode.MARKDOWN)
+    except TelegramBadRequest:
+        await mensaje.reply(text=texto)
+
+async def completar_descripcion_en_streaming(mensaje, nombre_cientifico: str, componer, reply_markup=None) -> str:
+    """
+    Genera la descripción en streaming y la va escribiendo en el mensaje ya enviado (caption si
+    es una foto), como mucho una edición cada INTERVALO_EDICION_STREAMING segundos.
+
+    Si la descripción no cabe en el mensaje, la ficha se queda con el principio y la
+    descripción completa se envía como respuesta.
+    """
+    es_foto = bool(getattr(mensaje, 'photo', None))
+    limite = LIMITE_CAPTION if es_foto else LIMITE_MENSAJE
+    estado = {'ultima_edicion': 0.0, 'texto': None}
+    
+    async def editar(texto, parse_mode=ParseMode.MARKDOWN):
+        if texto == estado['texto']:
+            return
+        if es_foto:
+            await mensaje.edit_caption(caption=texto, parse_mode=parse_mode, reply_markup=reply_markup)
+        else:
+            await mensaje.edit_text(text=texto, parse_mode=parse_mode, reply_markup=reply_markup)
+        estado['texto'] = texto
+    
+    async def parcial(texto):
+        ahora = time.monotonic()
+        if ahora - estado['ultima_edicion'] < INTERVALO_EDICION_STREAMING:
+            return
+        estado['ultima_edicion'] = ahora
+        try:
+            await editar(componer(recortar_descripcion(texto + " ▌", componer, limite)[0]))
+        except TelegramRetryAfter as e:
+            estado['ultima_edicion'] = ahora + e.retry_after
+        except TelegramBadRequest:
+            # Markdown a medias en el texto parcial: se espera al siguiente fragmento
+            pass
+    
+    descripcion = await generar_descripcion_especie(nombre_cientifico, on_parcial=parcial)
+    if not descripcion:
+        descripcion = "❌ Lo siento, no pude generar una descripción detallada para esta especie."
+    texto, recortada = recortar_descripcion(descripcion, componer, limite)
+    try:
+        await editar(componer(texto))
+    except TelegramBadRequest:
+        try:
+            await editar(componer(texto), parse_mode=None)
+        except TelegramBadRequest as e:
+            logger.error(f"Error al completar la descripción en la ficha: {str(e)}")
+            recortada = True
+    if recortada:
+        await enviar_descripcion_completa(mensaje, nombre_cientifico, descripcion)
+    return descripcion
+
 @dp.message(Command("especie"))
-async def especie(message: types.Message):
+async def especie(message: types.Message, contexto: Optional[RequestContext] = None):
     """Muestra información sobre una especie de hormiga"""
     try:
         # Registrar interacción
@@ -940,7 +996,8 @@ async def especie(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='especie',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Obtener el texto después del comando
@@ -963,21 +1020,24 @@ async def especie(message: types.Message):
             result = db.find_species_by_name(mejor_coincidencia['nombre'])
             if result:
                 logger.info(f"Mostrando información para: {result['scientific_name']}")
+                inicio = time.monotonic()
                 
-                # Generar descripción con ChatGPT
-                descripcion = await generar_descripcion_especie(result['scientific_name'])
-                if not descripcion:
-                    descripcion = "❌ Lo siento, no pude generar una descripción detallada para esta especie."
-                
-                # Construir el mensaje
-                caption = f"🐜 *{result['scientific_name']}*\n\n{descripcion}\n\n"
+                # Descripción de la caché; si no la hay, la ficha se envía ya y la descripción
+                # se genera en streaming sobre el mensaje enviado
+                en_cache = description_service.desde_cache(result['scientific_name'])
+                descripcion = en_cache['descripcion'] if en_cache else "⏳ _Generando descripción..._"
                 
                 # Obtener vuelos recientes
                 vuelos = await obtener_vuelos_recientes(result['scientific_name'])
+                texto_vuelos = ""
                 if vuelos:
-                    caption += "\n📅 *Últimos vuelos registrados:*\n"
+                    texto_vuelos += "\n📅 *Últimos vuelos registrados:*\n"
                     for vuelo in vuelos.get('vuelos', [])[:3]:
-                        caption += f"• {vuelo['fecha']} - {vuelo['ubicacion']}\n"
+                        texto_vuelos += f"• {vuelo['fecha']} - {vuelo['ubicacion']}\n"
+                
+                # Construir el mensaje
+                def componer_caption(texto):
+                    return f"🐜 *{result['scientific_name']}*\n\n{texto}\n\n{texto_vuelos}"
                 
                 # Crear botones para enlaces externos
                 genus, species = result['scientific_name'].split()[:2]
@@ -998,45 +1058,51 @@ async def especie(message: types.Message):
                     ]
                 ])
                 
-                # Buscar fotos en múltiples fuentes
-                photos = []
+                # Buscar fotos en múltiples fuentes (se envían por file_id si ya se subieron)
+                fuentes_fotos = []
+                nombre_foto = result['scientific_name']
                 
                 # 1. Foto de la base de datos
                 if result.get('photo_url'):
-                    photos.append(InputMediaPhoto(
-                        media=result['photo_url'],
-                        caption=caption if len(photos) == 0 else None,
-                        parse_mode=ParseMode.MARKDOWN
-                    ))
+                    fuentes_fotos.append((nombre_foto, result['photo_url'], 'species'))
                 
                 # 2. Foto de iNaturalist
                 inat_info = await buscar_en_inaturalist(result['scientific_name'])
                 if inat_info and inat_info.get('photo_url'):
-                    photos.append(InputMediaPhoto(
-                        media=inat_info['photo_url'],
-                        caption=caption if len(photos) == 0 else None,
-                        parse_mode=ParseMode.MARKDOWN
-                    ))
+                    fuentes_fotos.append((nombre_foto, inat_info['photo_url'], 'inaturalist'))
+                
+                # El pie de una foto admite menos texto que un mensaje; lo que no quepa se envía aparte
+                descripcion_ficha, recortada = recortar_descripcion(
+                    descripcion, componer_caption, LIMITE_CAPTION if fuentes_fotos else LIMITE_MENSAJE
+                )
+                caption = componer_caption(descripcion_ficha)
+                
+                # Mensaje que lleva la descripción y, si lo tiene, su teclado
+                mensaje_ficha = None
+                teclado_ficha = keyboard
                 
                 # Si no hay fotos, enviar solo el texto
-                if not photos:
-                    await message.answer(
+                if not fuentes_fotos:
+                    mensaje_ficha = await message.answer(
                         text=caption,
                         parse_mode=ParseMode.MARKDOWN,
                         reply_markup=keyboard
                     )
                 # Si hay una sola foto, usar answer_photo
-                elif len(photos) == 1:
+                elif len(fuentes_fotos) == 1:
                     try:
-                        await message.answer_photo(
-                            photo=photos[0].media,
-                            caption=caption,
-                            parse_mode=ParseMode.MARKDOWN,
-                            reply_markup=keyboard
+                        mensaje_ficha = await photo_cache.enviar(
+                            lambda foto: message.answer_photo(
+                                photo=foto,
+                                caption=caption,
+                                parse_mode=ParseMode.MARKDOWN,
+                                reply_markup=keyboard
+                            ),
+                            *fuentes_fotos[0]
                         )
                     except Exception as e:
                         logger.error(f"Error al enviar foto: {str(e)}")
-                        await message.answer(
+                        mensaje_ficha = await message.answer(
                             text=caption,
                             parse_mode=ParseMode.MARKDOWN,
                             reply_markup=keyboard
@@ -1044,8 +1110,19 @@ async def especie(message: types.Message):
                 # Si hay múltiples fotos, usar media group
                 else:
                     try:
-                        # Enviar el grupo de fotos
-                        await message.answer_media_group(media=photos)
+                        # Enviar el grupo de fotos (con URL si algún file_id está caducado) y guardar los file_id
+                        mensajes = await photo_cache.enviar_grupo(
+                            lambda medias: message.answer_media_group(media=[
+                                InputMediaPhoto(
+                                    media=media,
+                                    caption=caption if i == 0 else None,
+                                    parse_mode=ParseMode.MARKDOWN
+                                )
+                                for i, media in enumerate(medias)
+                            ]),
+                            fuentes_fotos
+                        )
+                        mensaje_ficha, teclado_ficha = mensajes[0], None
                         # Enviar el mensaje con los botones por separado
                         await message.answer(
                             text="🔍 Enlaces adicionales:",
@@ -1053,21 +1130,33 @@ async def especie(message: types.Message):
                         )
                     except Exception as e:
                         logger.error(f"Error al enviar grupo de fotos: {str(e)}")
-                        # Si falla, intentar enviar solo la primera foto
+                        # Si falla también con las URL, intentar enviar solo la primera foto
                         try:
-                            await message.answer_photo(
-                                photo=photos[0].media,
-                                caption=caption,
-                                parse_mode=ParseMode.MARKDOWN,
-                                reply_markup=keyboard
+                            mensaje_ficha = await photo_cache.enviar(
+                                lambda foto: message.answer_photo(
+                                    photo=foto,
+                                    caption=caption,
+                                    parse_mode=ParseMode.MARKDOWN,
+                                    reply_markup=keyboard
+                                ),
+                                *fuentes_fotos[0]
                             )
                         except Exception as e:
                             logger.error(f"Error al enviar foto individual: {str(e)}")
-                            await message.answer(
+                            mensaje_ficha = await message.answer(
                                 text=caption,
                                 parse_mode=ParseMode.MARKDOWN,
                                 reply_markup=keyboard
                             )
+                
+                logger.info(f"/especie {result['scientific_name']}: ficha enviada en {time.monotonic() - inicio:.2f}s")
+                if en_cache and recortada and mensaje_ficha:
+                    await enviar_descripcion_completa(mensaje_ficha, result['scientific_name'], descripcion)
+                if not en_cache and mensaje_ficha:
+                    await completar_descripcion_en_streaming(
+                        mensaje_ficha, result['scientific_name'], componer_caption, teclado_ficha
+                    )
+                    logger.info(f"/especie {result['scientific_name']}: descripción completa en {time.monotonic() - inicio:.2f}s")
                 return
         
         # Si no hay especies locales con alta similitud (>80%), buscar en internet
@@ -1129,11 +1218,14 @@ async def especie(message: types.Message):
                     # Enviar información con foto si está disponible
                     if inat_info.get('photo_url'):
                         try:
-                            await message.answer_photo(
-                                photo=inat_info['photo_url'],
-                                caption=caption,
-                                parse_mode=ParseMode.MARKDOWN,
-                                reply_markup=keyboard
+                            await photo_cache.enviar(
+                                lambda foto: message.answer_photo(
+                                    photo=foto,
+                                    caption=caption,
+                                    parse_mode=ParseMode.MARKDOWN,
+                                    reply_markup=keyboard
+                                ),
+                                nombre_cientifico, inat_info['photo_url'], 'inaturalist'
                             )
                         except Exception as e:
                             logger.error(f"Error al enviar foto de iNaturalist: {str(e)}")
@@ -1231,7 +1323,7 @@ async def handle_ver_especie(callback_query: types.CallbackQuery):
         await callback_query.answer("❌ Error al mostrar la información de la especie", show_alert=True)
 
 @dp.message(Command("ranking"))
-async def ranking(message: types.Message):
+async def ranking(message: types.Message, contexto: Optional[RequestContext] = None):
     """Muestra el ranking histórico de usuarios"""
     cursor = None
     try:
@@ -1241,7 +1333,8 @@ async def ranking(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='ranking',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Obtener el ranking histórico de usuarios SOLO para este chat, usando solo la tabla user_experience
@@ -1282,13 +1375,14 @@ async def ranking(message: types.Message):
             cursor.close()
 
 @dp.message(Command("cargar_especies"))
-async def cargar_especies(message: types.Message):
+async def cargar_especies(message: types.Message, contexto: Optional[RequestContext] = None):
     # Registrar interacción
     await db.log_user_interaction(
         message.from_user.id,
         message.from_user.username or message.from_user.first_name,
         'command',
-        'cargar_especies'
+        'cargar_especies',
+        contexto=contexto
     )
     """Carga múltiples especies a la vez desde un archivo o texto"""
     try:
@@ -1360,59 +1454,34 @@ async def cargar_especies(message: types.Message):
             await wait_message.edit_text("❌ No se encontraron especies válidas en el archivo.")
             return
 
-        # Procesar especies
-        total = len(especies)
-        procesadas = 0
-        resultados = []
-        
-        for especie in especies:
-            try:
-                # Buscar la especie usando la misma lógica que /especie
-                species_info = await buscar_especie_google(especie)
-                
-                if species_info:
-                    result = db.find_species(species_info)
-                    if result:
-                        # Actualizar región si se proporcionó
-                        if region:
-                            db.update_species_region(result['scientific_name'], region)
-                        resultados.append(f"✅ {result['scientific_name']}")
-                        procesadas += 1
-                    else:
-                        resultados.append(f"❌ Error al guardar: {especie}")
-                else:
-                    resultados.append(f"❌ No encontrada: {especie}")
-                
-                # Actualizar mensaje de progreso cada 5 especies
-                if len(resultados) % 5 == 0:
-                    progress = f"🔄 Procesando... ({procesadas}/{total})\n"
-                    if region:
-                        progress += f"🌍 Región: {region}\n"
-                    progress += "\n"
-                    progress += "\n".join(resultados[-10:])  # Mostrar solo los últimos 10 resultados
-                    
-                    try:
-                        await wait_message.edit_text(progress)
-                    except Exception:
-                        # Si el mensaje es muy largo, enviar uno nuevo
-                        await message.answer(progress)
-                
-                # Pequeña pausa para no sobrecargar las APIs
-                await asyncio.sleep(1)
-                
-            except Exception as e:
-                logger.error(f"Error procesando {especie}: {str(e)}")
-                resultados.append(f"❌ Error: {especie}")
+        # Procesar especies en segundo plano; cada lista tiene su checkpoint, así que volver a
+        # enviarla tras un reinicio o una cancelación continúa donde se quedó
+        checkpoint = ruta_checkpoint_carga(especies, region)
         
-        # Mensaje final
-        resumen = f"✅ Proceso completado ({procesadas}/{total})\n"
-        if region:
-            resumen += f"🌍 Región: {region}\n"
-        resumen += "\nÚltimas especies procesadas:\n"
-        resumen += "\n".join(resultados[-10:])  # Mostrar solo las últimas 10 especies
-        
-        await message.answer(resumen)
-        await wait_message.delete()
+        async def job_cargar_especies(job):
+            async def informar(estado):
+                await job.progreso(formatear_progreso_carga(estado, region))
+            
+            resumen = await cargar_lista_especies(especies, region, checkpoint, on_progress=informar)
+            
+            # Mensaje final
+            mensaje = f"✅ Proceso completado ({resumen['guardadas']}/{resumen['total']})\n"
+            if region:
+                mensaje += f"🌍 Región: {region}\n"
+            if resumen['omitidos']:
+                mensaje += f"♻️ Ya completadas en un intento anterior: {resumen['omitidos']}\n"
+            mensaje += f"❓ No encontradas: {resumen['no_encontradas']}\n"
+            mensaje += f"❌ Errores: {resumen['errores']}\n"
+            mensaje += f"⏱ Duración: {resumen['transcurrido'] / 60:.1f} min\n"
+            if resumen['ultimas']:
+                mensaje += "\nÚltimas especies procesadas:\n"
+                mensaje += "\n".join(resumen['ultimas'])
+            
+            await job.progreso(mensaje, forzar=True)
+            return mensaje
+        
+        await job_manager.lanzar('cargar_especies', job_cargar_especies, wait_message, message.from_user.id,
+                                 f"{len(especies)} especies", {'total': len(especies), 'region': region})
         
     except Exception as e:
         logger.error(f"Error en carga masiva: {str(e)}")
@@ -1434,7 +1503,7 @@ async def obtener_vuelos_recientes(especie):
         url = f"{ANTFLIGHTS_API}/data.php?scientific_name={quote(especie)}"
         logger.info(f"Buscando vuelos para {especie} en {url}")
         
-        async with session.get(url) as response:
+        async with limitador_fuentes.get(session, url) as response:
             if response.status == 200:
                 text = await response.text()
                 
@@ -1451,7 +1520,7 @@ async def obtener_vuelos_recientes(especie):
             for location in locations[:3]:  # Intentar con las primeras 3 ubicaciones
                 url = f"{ANTFLIGHTS_API}/index.php?ql={quote(location.strip().lower())}"
                 
-                async with session.get(url) as response:
+                async with limitador_fuentes.get(session, url) as response:
                     if response.status == 200:
                         html = await response.text()
                         soup = BeautifulSoup(html, 'html.parser')
@@ -1508,7 +1577,7 @@ async def obtener_especies_por_region(lat, lon, cursor):
     return cursor.fetchall()
 
 @dp.message(Command("prediccion"))
-async def prediccion(message: types.Message):
+async def prediccion(message: types.Message, contexto: Optional[RequestContext] = None):
     """Muestra los vuelos nupciales registrados y predicciones basadas en temporadas"""
     try:
         # Registrar interacción
@@ -1517,7 +1586,8 @@ async def prediccion(message: types.Message):
             message.from_user.username or message.from_user.first_name,
             'command',
             'prediccion',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
 
         # Obtener la localidad del mensaje
@@ -1568,6 +1638,13 @@ async def prediccion(message: types.Message):
                         'datos': datos
                     })
             
+            # Frecuencia de vuelos del género en el mes actual según los perfiles de AntFlights
+            generos = {especie['nombre'].split()[0].lower() for especie in especies_activas}
+            puntuaciones = flight_profiles.puntuar(db.get_flight_profiles(list(generos)), mes=datetime.now().month)
+            for especie in especies_activas:
+                especie['puntuacion'] = puntuaciones.get(especie['nombre'].split()[0].lower())
+            especies_activas.sort(key=lambda e: e['puntuacion'] or 0, reverse=True)
+            
             # Construir el mensaje con diseño mejorado
             mensaje = f"🌡️ Predicción de Vuelos Nupciales en {location}\n"
             mensaje += f"📅 {temporada_actual} - {mes_actual_es.capitalize()}\n\n"
@@ -1581,17 +1658,28 @@ async def prediccion(message: types.Message):
                     
                     mensaje += f"🐜 {especie['nombre']}\n"
                     mensaje += f"├ 📊 Probabilidad: {prob_vuelo}\n"
+                    if especie['puntuacion'] is not None:
+                        mensaje += f"├ 📈 Vuelos del género este mes (AntFlights): {especie['puntuacion']:.0%}\n"
                     mensaje += f"├ 🕒 Horario óptimo: {datos['horas_activas']}\n"
                     mensaje += f"├ 🌡️ Temperatura ideal: {datos['temperatura']['min']}-{datos['temperatura']['max']}°C\n"
                     mensaje += f"├ 💧 Humedad requerida: {datos['humedad']['min']}-{datos['humedad']['max']}%\n"
                     mensaje += f"├ 💨 Viento máximo: {datos['viento_max']} km/h\n"
                     mensaje += f"└ 📍 Distribución: {', '.join(datos['distribucion'])}\n\n"
             
-            # Buscar registros recientes en AntFlights
+            # Buscar registros recientes en AntFlights; si no está disponible la predicción se
+            # envía igualmente con los datos locales
             url = f"{ANTFLIGHTS_API}/index.php?ql={quote(location.strip().lower())}"
-            response = requests.get(url, timeout=TIMEOUT)
+            try:
+                response = await asyncio.get_event_loop().run_in_executor(
+                    None,
+                    lambda: limitador_fuentes.get_sync(url, timeout=TIMEOUT)
+                )
+            except (CircuitOpenError, requests.exceptions.RequestException) as e:
+                logger.warning(f"AntFlights no disponible para /prediccion: {str(e)}")
+                response = None
+                mensaje += "ℹ️ AntFlights no responde ahora mismo; se omiten los vuelos registrados recientemente.\n\n"
             
-            if response.status_code == 200:
+            if response is not None and response.status_code == 200:
                 soup = BeautifulSoup(response.text, 'html.parser')
                 vuelos_recientes = []
                 
@@ -1816,14 +1904,9 @@ async def adivina_especie(message: types.Message):
         logger.info(f"Comando /adivina_especie recibido de {user_id} en chat {chat_id} (thread: {message_thread_id})")
 
         # Limitar a 3 intentos cada 24h
-        if hasattr(db, 'can_play_guessing_game') and not db.can_play_guessing_game(user_id, chat_id):
-            # Obtener la hora exacta en la que podrá jugar de nuevo
-            next_time = db.get_next_game_time(user_id, chat_id) if hasattr(db, 'get_next_game_time') else None
-            
-            if next_time:
-                message_text = f"Ya has jugado 3 veces en las últimas 24 horas. Podrás jugar de nuevo a las {next_time}."
-            else:
-                message_text = "Ya has jugado 3 veces en las últimas 24 horas. ¡Vuelve mañana!"
+        if not game_attempts.puede_jugar(user_id, chat_id):
+            # Incluye la hora exacta en la que podrá jugar de nuevo
+            message_text = game_attempts.mensaje_limite(user_id, chat_id)
             
             await message.delete()
             # Enviar respuesta en el mismo hilo
@@ -1857,52 +1940,54 @@ async def adivina_especie_directo(message):
     message_thread_id = getattr(message, 'message_thread_id', None)
     
     logger.info(f"Iniciando juego directo en chat {chat_id} (thread: {message_thread_id})")
-    
-    wait_message = await bot.send_message(
-        chat_id=chat_id,
-        text="🔍 Buscando especies para el juego...",
-        message_thread_id=message_thread_id
-    )
+    jugador_id = message.from_user.id
 
-    # Obtener especies con foto
-    def is_valid_photo_url(url):
-        return url and url.startswith("http")
+    # La ronda ya está preparada; si Telegram rechaza la foto se descarta y se usa la siguiente
+    for _ in range(3):
+        ronda = await game_rounds.siguiente(chat_id)
+        if not ronda:
+            await bot.send_message(
+                chat_id=chat_id,
+                text="❌ No hay suficientes especies con fotos para jugar.",
+                message_thread_id=message_thread_id
+            )
+            return
 
-    especies = [e for e in db.get_all_species() if is_valid_photo_url(e.get('photo_url'))]
-    if len(especies) < 3:
-        await wait_message.edit_text("❌ No hay suficientes especies con fotos para jugar.")
-        return
+        especie_correcta = ronda['especie']
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(
+                text=op['scientific_name'],
+                callback_data=f"adivina:{op['id']}:{especie_correcta['id']}:{jugador_id}:{message_thread_id or 'none'}"
+            )] for op in ronda['opciones']
+        ])
 
-    especie_correcta = random.choice(especies)
-    opciones = [especie_correcta]
-    while len(opciones) < 4:
-        candidata = random.choice(especies)
-        if candidata not in opciones:
-            opciones.append(candidata)
-    random.shuffle(opciones)
+        try:
+            await photo_cache.enviar(
+                lambda foto: bot.send_photo(
+                    chat_id=chat_id,
+                    photo=foto,
+                    caption="🎮 <b>¡ADIVINA LA ESPECIE!</b> 🔍\n\n"
+                            "¿Qué especie de hormiga muestra la imagen?\n"
+                            "Selecciona la respuesta correcta:",
+                    parse_mode=ParseMode.HTML,
+                    reply_markup=keyboard,
+                    message_thread_id=message_thread_id
+                ),
+                especie_correcta['scientific_name'], especie_correcta['photo_url']
+            )
+            return
+        except TelegramBadRequest as e:
+            logger.warning(f"Foto no válida para {especie_correcta['scientific_name']}: {str(e)}")
+            game_rounds.descartar(especie_correcta['id'])
 
-    jugador_id = message.from_user.id
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(
-            text=op['scientific_name'],
-            callback_data=f"adivina:{op['id']}:{especie_correcta['id']}:{jugador_id}:{message_thread_id or 'none'}"
-        )] for op in opciones
-    ])
-
-    await wait_message.delete()
-    await bot.send_photo(
+    await bot.send_message(
         chat_id=chat_id,
-        photo=especie_correcta['photo_url'],
-        caption="🎮 <b>¡ADIVINA LA ESPECIE!</b> 🔍\n\n"
-                "¿Qué especie de hormiga muestra la imagen?\n"
-                "Selecciona la respuesta correcta:",
-        parse_mode=ParseMode.HTML,
-        reply_markup=keyboard,
+        text="❌ No se pudo cargar la foto de la especie. Inténtalo de nuevo.",
         message_thread_id=message_thread_id
     )
 
 @dp.callback_query(lambda c: c.data and c.data.startswith('adivina:'))
-async def handle_respuesta(callback_query: types.CallbackQuery):
+async def handle_respuesta(callback_query: types.CallbackQuery, contexto: Optional[RequestContext] = None):
     try:
         partes = callback_query.data.split(':')
         id_seleccionado = int(partes[1])
@@ -1921,44 +2006,20 @@ async def handle_respuesta(callback_query: types.CallbackQuery):
             await callback_query.answer("Solo el usuario que inició el juego puede responder a este juego.", show_alert=True)
             return
 
-        # Verificar si el usuario puede seguir jugando antes de procesar la respuesta
-        if hasattr(db, 'can_play_guessing_game') and not db.can_play_guessing_game(user_id, chat_id):
-            next_time = db.get_next_game_time(user_id, chat_id) if hasattr(db, 'get_next_game_time') else None
-            
-            if next_time:
-                message_text = f"Ya has jugado 3 veces en las últimas 24 horas. Podrás jugar de nuevo a las {next_time}."
-            else:
-                message_text = "Ya has jugado 3 veces en las últimas 24 horas. ¡Vuelve mañana!"
-                
-            await callback_query.answer(message_text, show_alert=True)
+        es_correcta = (id_seleccionado == id_correcto)
+
+        # Registrar el intento independientemente del resultado; falla si ya no le quedan intentos
+        if not game_attempts.registrar(user_id, chat_id, id_correcto, is_correct=es_correcta):
+            await callback_query.answer(game_attempts.mensaje_limite(user_id, chat_id), show_alert=True)
             await callback_query.message.delete()
             return
 
-        es_correcta = (id_seleccionado == id_correcto)
-        especie = db.get_species_by_id(id_correcto)
+        especie = game_rounds.especie(id_correcto) or db.get_species_by_id(id_correcto)
         nombre_correcto = especie['scientific_name'] if especie else "Especie desconocida"
 
-        # Registrar el intento independientemente del resultado
-        if hasattr(db, 'register_game_attempt'):
-            await db.register_game_attempt(user_id, chat_id, id_correcto, is_correct=es_correcta)
-
         if es_correcta:
             logger.info(f"Respuesta CORRECTA - Otorgando 10 XP a usuario {user_id} ({username})")
             
-            # Otorgar 10 XP reales por acierto
-            if hasattr(db, 'log_user_interaction'):
-                xp_result = await db.log_user_interaction(
-                    user_id=user_id,
-                    username=username,
-                    interaction_type='game_guess',
-                    command_name='adivina_especie',
-                    points=10,
-                    chat_id=chat_id
-                )
-                logger.info(f"Resultado de otorgar XP: {xp_result}")
-            else:
-                logger.error("Método log_user_interaction no disponible en db")
-                
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="🎮 Jugar de nuevo", callback_data=f"adivina_nuevo:{thread_id or 'none'}")]
             ])
@@ -1971,6 +2032,18 @@ async def handle_respuesta(callback_query: types.CallbackQuery):
                 reply_markup=keyboard
             )
             await callback_query.answer("¡Respuesta correcta! +10 XP", show_alert=True)
+            
+            # Otorgar 10 XP reales por acierto, después de responder al callback
+            xp_result = await db.log_user_interaction(
+                user_id=user_id,
+                username=username,
+                interaction_type='game_guess',
+                command_name='adivina_especie',
+                points=10,
+                chat_id=chat_id,
+                contexto=contexto
+            )
+            logger.info(f"Resultado de otorgar XP: {xp_result}")
         else:
             logger.info(f"Respuesta INCORRECTA - Usuario {user_id} ({username})")
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -2001,16 +2074,8 @@ async def reiniciar_juego(callback_query: types.CallbackQuery):
         logger.info(f"Reiniciando juego - Usuario: {user_id}, Chat: {chat_id}, Thread: {thread_id}")
         
         # Verificar límite de juegos diarios
-        if hasattr(db, 'can_play_guessing_game') and not db.can_play_guessing_game(user_id, chat_id):
-            # Obtener la hora exacta en la que podrá jugar de nuevo
-            next_time = db.get_next_game_time(user_id, chat_id) if hasattr(db, 'get_next_game_time') else None
-            
-            if next_time:
-                message_text = f"Ya has jugado 3 veces en las últimas 24 horas. Podrás jugar de nuevo a las {next_time}."
-            else:
-                message_text = "Ya has jugado 3 veces en las últimas 24 horas. ¡Vuelve mañana!"
-                
-            await callback_query.answer(message_text, show_alert=True)
+        if not game_attempts.puede_jugar(user_id, chat_id):
+            await callback_query.answer(game_attempts.mensaje_limite(user_id, chat_id), show_alert=True)
             await callback_query.message.delete()
             return
             
@@ -2084,22 +2149,118 @@ async def proximos_vuelos(message: types.Message):
 async def actualizar_regiones(message: types.Message):
     """Actualiza las regiones de todas las especies en la base de datos"""
     try:
+        en_curso = job_manager.en_curso('actualizar_regiones', 'actualizar_todo')
+        if en_curso:
+            await message.answer(f"⏳ Ya hay una actualización de regiones en curso (trabajo #{en_curso.id}).")
+            return
         wait_message = await message.answer('🔄 Actualizando regiones de especies, esto puede tomar varios minutos...')
         
-        # Usar la nueva función de actualización masiva
-        resultados = db.update_all_regions()
-        
-        mensaje = f"✅ Actualización completada:\n\n"
-        mensaje += f"📊 Especies procesadas: {resultados['total']}\n"
-        mensaje += f"✨ Actualizadas correctamente: {resultados['updated']}\n"
-        mensaje += f"❌ Errores: {resultados['errors']}"
+        async def job_actualizar_regiones(job):
+            resultados = await actualizar_regiones_especies(job)
+            
+            mensaje = f"✅ Actualización completada:\n\n"
+            mensaje += f"📊 Especies procesadas: {resultados['total']}\n"
+            mensaje += f"✨ Actualizadas correctamente: {resultados['updated']}\n"
+            mensaje += f"❌ Errores: {resultados['errors']}"
+            
+            await job.progreso(mensaje, forzar=True)
+            return mensaje
         
-        await wait_message.edit_text(mensaje)
+        await job_manager.lanzar('actualizar_regiones', job_actualizar_regiones, wait_message,
+                                 message.from_user.id, "Regiones de todas las especies")
         
     except Exception as e:
         logger.error(f"Error en actualización de regiones: {str(e)}")
         await message.answer("❌ Ocurrió un error al actualizar las regiones. Por favor, intenta más tarde.")
 
+def ruta_checkpoint_carga(especies, region=None):
+    """Checkpoint de /cargar_especies: uno por lista de especies (y región)"""
+    os.makedirs(CHECKPOINTS_DIR, exist_ok=True)
+    clave = "\n".join([region or ""] + sorted(e.lower() for e in especies))
+    return os.path.join(CHECKPOINTS_DIR, f"cargar_especies_{hashlib.sha1(clave.encode('utf-8')).hexdigest()[:16]}.checkpoint")
+
+def formatear_progreso_carga(estado, region=None):
+    """Mensaje de progreso de una carga masiva de especies"""
+    eta = f"{estado['eta'] / 60:.1f} min" if estado['eta'] is not None else "calculando..."
+    mensaje = f"🔄 Procesando... ({estado['procesados'] + estado['omitidos']}/{estado['total']})\n"
+    if region:
+        mensaje += f"🌍 Región: {region}\n"
+    if estado['omitidos']:
+        mensaje += f"♻️ Ya completadas en un intento anterior: {estado['omitidos']}\n"
+    mensaje += f"⚡ Ritmo: {estado['por_minuto']:.0f} especies/min\n"
+    mensaje += f"⏱ Tiempo restante: {eta}\n\n"
+    mensaje += "\n".join(estado['ultimas'])
+    return mensaje
+
+def _procesador_carga(region, session):
+    """Función `procesar` de SpeciesLoader: consulta iNaturalist y AntWiki a la vez para cada especie"""
+    async def procesar(especie, loader):
+        partes = especie.split()
+        genus = partes[0]
+        species = partes[1]
+        subspecies = " ".join(partes[2:]) if len(partes) > 2 else None
+        
+        # Construir el nombre científico completo
+        scientific_name = f"{genus} {species}"
+        if subspecies:
+            scientific_name += f" {subspecies}"
+        
+        async def consultar_inaturalist():
+            async with loader.fuente('inaturalist'):
+                return await buscar_en_inaturalist(scientific_name)
+        
+        async def verificar_antwiki():
+            url = construir_url_antwiki(genus, species)
+            try:
+                async with loader.fuente('antwiki'):
+                    async with limitador_fuentes.head(session, url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                        if response.status == 200:
+                            return url
+            except Exception as e:
+                logger.warning(f"No se pudo verificar AntWiki para {scientific_name}: {str(e)}")
+            return None
+        
+        # Ambas fuentes se consultan a la vez
+        inat_result, antwiki_url = await asyncio.gather(consultar_inaturalist(), verificar_antwiki())
+        
+        return {
+            'scientific_name': scientific_name,
+            'region': region,
+            'antwiki_url': antwiki_url,
+            'photo_url': inat_result.get('photo_url') if inat_result else None,
+            'inaturalist_id': inat_result.get('id') if inat_result else None
+        }
+    
+    return procesar
+
+async def cargar_lista_especies(especies, region=None, checkpoint_path=None, on_progress=None):
+    """
+    Carga una lista de especies con SpeciesLoader: trabajadores en paralelo con límite por
+    fuente, checkpoint de nombres completados y escritura por lotes con upsert_species_batch.
+
+    Si la carga termina sin errores se borra el checkpoint, así que volver a enviar la misma
+    lista la procesa de nuevo; si se interrumpe o alguna especie falla, se reanuda.
+    """
+    async with aiohttp.ClientSession() as session:
+        loader = SpeciesLoader(
+            db,
+            _procesador_carga(region, session),
+            workers=LOADER_WORKERS,
+            checkpoint_path=checkpoint_path,
+            batch_size=LOADER_BATCH_SIZE,
+            on_progress=on_progress
+        )
+        
+        # Resolver en iNaturalist por lotes los nombres pendientes antes de repartirlos entre los trabajadores
+        completadas = loader.cargar_checkpoint()
+        pendientes = [e for e in especies if e.lower() not in completadas]
+        await inat_client.resolver_nombres(pendientes, db.get_inaturalist_ids(pendientes))
+        resumen = await loader.cargar(especies)
+    
+    if checkpoint_path and not resumen['errores'] and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return resumen
+
 async def cargar_especies_desde_archivo(filename, region=None):
     """Carga especies desde un archivo local y busca información adicional"""
     try:
@@ -2141,77 +2302,11 @@ async def cargar_especies_desde_archivo(filename, region=None):
             logger.error("No se encontraron especies válidas en el archivo.")
             return False
 
-        # Procesar especies
-        total = len(especies)
-        procesadas = 0
-        errores = 0
-        
-        logger.info(f"Procesando {total} especies...")
-        
-        for especie in especies:
-            try:
-                # Separar especie y subespecie si existe
-                partes = especie.split()
-                if len(partes) < 2:
-                    logger.error(f"Nombre inválido: {especie}")
-                    errores += 1
-                    continue
-                    
-                genus = partes[0]
-                species = partes[1]
-                subspecies = " ".join(partes[2:]) if len(partes) > 2 else None
-                
-                # Construir el nombre científico completo
-                scientific_name = f"{genus} {species}"
-                if subspecies:
-                    scientific_name += f" {subspecies}"
-
-                # Buscar información adicional
-                logger.info(f"Buscando información adicional para: {scientific_name}")
-                
-                # Buscar en iNaturalist
-                inat_result = await buscar_en_inaturalist(scientific_name)
-                photo_url = None
-                if inat_result and isinstance(inat_result, dict):
-                    photo_url = inat_result.get('photo_url')
-                    logger.info(f"Foto encontrada en iNaturalist para {scientific_name}")
-                
-                # Construir URL de AntWiki y verificar si existe
-                antwiki_url = None
-                try:
-                    url = construir_url_antwiki(genus, species)
-                    response = requests.head(url, timeout=10)
-                    if response.status_code == 200:
-                        antwiki_url = url
-                        logger.info(f"Página de AntWiki encontrada para {scientific_name}")
-                except Exception as e:
-                    logger.warning(f"No se pudo verificar AntWiki para {scientific_name}: {str(e)}")
-                
-                # Guardar en la base de datos con toda la información
-                try:
-                    db.add_species(
-                        scientific_name=scientific_name,
-                        region=region,
-                        antwiki_url=antwiki_url,
-                        photo_url=photo_url,
-                        inaturalist_id=inat_result.get('id') if inat_result else None
-                    )
-                    procesadas += 1
-                except Exception as e:
-                    logger.error(f"Error al guardar {scientific_name} en la base de datos: {str(e)}")
-                    errores += 1
-                    continue
-                
-                if procesadas % 10 == 0:
-                    print(f"Progreso: {procesadas}/{total} especies procesadas")
-                    logger.info(f"Progreso: {procesadas}/{total} especies procesadas")
-                
-                # Pequeña pausa para no sobrecargar las APIs
-                await asyncio.sleep(1)
-                
-            except Exception as e:
-                logger.error(f"Error procesando {especie}: {str(e)}")
-                errores += 1
+        # Procesar especies en paralelo; el checkpoint permite reanudar la carga si se interrumpe
+        logger.info(f"Procesando {len(especies)} especies...")
+        resumen = await cargar_lista_especies(especies, region, f"{filename}.checkpoint")
+        procesadas = resumen['guardadas']
+        errores = resumen['errores']
         
         logger.info(f"Proceso completado: {procesadas} especies procesadas, {errores} errores")
         return True
@@ -2261,37 +2356,18 @@ async def buscar_foto_antwiki(genus, species):
         logger.info(f"Buscando información en AntWiki: {url}")
         
         async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=TIMEOUT) as response:
+            async with limitador_fuentes.get(session, url, timeout=TIMEOUT) as response:
                 if response.status != 200:
                     logger.warning(f"Error al buscar en AntWiki: {response.status}")
                     return None
                 
                 html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
+                pagina = await extraer_en_executor(extraer_antwiki, html)
                 
                 info = {
-                    'photo_url': None,
-                    'description': None
+                    'photo_url': pagina['galeria_foto'] if pagina else None,
+                    'description': pagina['primer_parrafo'] if pagina else None
                 }
-            
-                # Buscar imágenes
-                gallery = soup.find('div', class_='gallery')
-                if gallery:
-                    images = gallery.find_all('img')
-                    if images:
-                        info['photo_url'] = images[0].get('src')
-                        if not info['photo_url'].startswith('http'):
-                            info['photo_url'] = 'https://www.antwiki.org' + info['photo_url']
-                
-                # Buscar información básica
-                content = soup.find('div', id='mw-content-text')
-                if content:
-                    paragraphs = content.find_all('p')
-                    for p in paragraphs:
-                        text = p.get_text().strip()
-                        if text and len(text) > 50:  # Solo párrafos con contenido sustancial
-                            info['description'] = text
-                            break
                 
                 # Si no se encuentra información suficiente, retornar None
                 if not info['photo_url'] and not info['description']:
@@ -2318,14 +2394,14 @@ async def buscar_info_antontop(species_name):
         session = await init_session()
         
         # Realizar la solicitud con un timeout adecuado
-        async with session.get(url, timeout=TIMEOUT) as response:
+        async with limitador_fuentes.get(session, url, timeout=TIMEOUT) as response:
             if response.status != 200:
                 logger.warning(f"Error al buscar en AntOnTop: {response.status}")
                 # Intentar con URL sin el prefijo "es" como respaldo
                 url_alt = f"https://antontop.com/{species_url_name}/"
                 logger.info(f"Intentando URL alternativa: {url_alt}")
                 
-                async with session.get(url_alt, timeout=TIMEOUT) as alt_response:
+                async with limitador_fuentes.get(session, url_alt, timeout=TIMEOUT) as alt_response:
                     if alt_response.status != 200:
                         logger.warning(f"Error al buscar en URL alternativa: {alt_response.status}")
                         return None
@@ -2334,13 +2410,12 @@ async def buscar_info_antontop(species_name):
             else:
                 html = await response.text()
             
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Extraer datos relevantes
+            # Extraer datos relevantes fuera del event loop
+            pagina = await extraer_en_executor(extraer_antontop, html)
             info = {
-                'photo_url': None,
-                'short_description': None, 
-                'description': None,
+                'photo_url': pagina['photo_url'],
+                'short_description': pagina['short_description_parrafo'],
+                'description': pagina['description'],
                 'region': None,
                 'behavior': None,
                 'difficulty': None,
@@ -2351,43 +2426,14 @@ async def buscar_info_antontop(species_name):
                 'colony_size': None
             }
             
-            # Extraer la imagen principal
-            main_image = soup.find('img', {'class': 'wp-post-image'})
-            if main_image and main_image.get('src'):
-                info['photo_url'] = main_image.get('src')
-            
-            # Buscar la descripción corta
-            short_desc_div = soup.find('div', {'class': 'woocommerce-product-details__short-description'})
-            if short_desc_div:
-                p_tag = short_desc_div.find('p')
-                if p_tag:
-                    info['short_description'] = p_tag.get_text().strip()
-            
-            # Buscar la descripción completa
-            description_section = soup.find('div', {'class': 'woocommerce-Tabs-panel--description'})
-            if description_section:
-                info['description'] = description_section.get_text().strip()
-            
-            # Extraer detalles de la tabla de características
-            product_details = soup.find('h4', string='Detalles de producto')
-            if not product_details:
-                product_details = soup.find('h4', string='Product details')
-            
-            if product_details:
-                details_table = product_details.find_next('table')
-                if details_table:
-                    for row in details_table.find_all('tr'):
-                        cells = row.find_all('td')
-                        if len(cells) == 2:
-                            key = cells[0].get_text().strip().lower()
-                            value = cells[1].get_text().strip()
-                            
-                            if 'dificultad' in key or 'difficulty' in key:
-                                info['difficulty'] = value
-                            elif 'comportamiento' in key or 'behavior' in key:
-                                info['behavior'] = value
-                            elif 'origen' in key or 'origin' in key:
-                                info['region'] = value
+            # Detalles de la tabla de características
+            for key, value in pagina['detalles']:
+                if 'dificultad' in key or 'difficulty' in key:
+                    info['difficulty'] = value
+                elif 'comportamiento' in key or 'behavior' in key:
+                    info['behavior'] = value
+                elif 'origen' in key or 'origin' in key:
+                    info['region'] = value
             
             # Si no se encuentra información suficiente, retornar None
             if not info['short_description'] and not info['description']:
@@ -2426,7 +2472,7 @@ async def obtener_distribucion_antmaps(scientific_name):
         
         response = await asyncio.get_event_loop().run_in_executor(
             None, 
-            lambda: requests.get(url, timeout=TIMEOUT)
+            lambda: limitador_fuentes.get_sync(url, timeout=TIMEOUT)
         )
         
         if response.status_code == 200:
@@ -2453,68 +2499,30 @@ async def obtener_mapa_distribucion(scientific_name):
         return None
 
 async def obtener_estadisticas_antflights(genus):
-    """Obtiene las estadísticas de vuelos nupciales desde AntFlights para un género"""
+    """Obtiene las estadísticas de vuelos nupciales desde AntFlights para un género.
+    
+    Los cuatro gráficos (mes, hora, temperatura y fase lunar) están en la misma página,
+    así que se descarga una vez y el resultado se cachea por género.
+    """
     try:
-        # URLs base para las diferentes estadísticas
-        urls = {
-            'month': f"{ANTFLIGHTS_API}/stats/flights/{genus}#byMonth",
-            'hour': f"{ANTFLIGHTS_API}/stats/flights/{genus}#byHours",
-            'temperature': f"{ANTFLIGHTS_API}/stats/flights/{genus}#byTemperatureC",
-            'moon': f"{ANTFLIGHTS_API}/stats/flights/{genus}#byMoon"
-        }
-        
-        stats = {}
-        session = requests.Session()
-        
-        for stat_type, url in urls.items():
-            try:
-                response = await asyncio.get_event_loop().run_in_executor(
-                    None,
-                    lambda: session.get(url, timeout=TIMEOUT)
-                )
-                
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    # Buscar el elemento que contiene los datos del gráfico
-                    script_tags = soup.find_all('script')
-                    for script in script_tags:
-                        if script.string and 'data:' in script.string:
-                            # Extraer los datos del gráfico
-                            data_start = script.string.find('data:')
-                            if data_start != -1:
-                                data_text = script.string[data_start:]
-                                # Encontrar los corchetes que contienen los datos
-                                bracket_start = data_text.find('[')
-                                bracket_end = data_text.find(']', bracket_start)
-                                if bracket_start != -1 and bracket_end != -1:
-                                    data_json = data_text[bracket_start:bracket_end + 1]
-                                    try:
-                                        data = json.loads(data_json)
-                                        stats[stat_type] = data
-                                    except json.JSONDecodeError:
-                                        logger.error(f"Error al decodificar JSON para {stat_type}")
-                                        continue
-            
-            except Exception as e:
-                logger.error(f"Error al obtener estadísticas de {stat_type}: {str(e)}")
-                continue
-        
-        return stats
-        
+        return await antflights_fetcher.obtener(genus)
     except Exception as e:
         logger.error(f"Error al obtener estadísticas de AntFlights: {str(e)}")
         return None
 
 async def actualizar_estadisticas_vuelos(genus):
-    """Actualiza las estadísticas de vuelos nupciales en la base de datos"""
+    """Actualiza las estadísticas de vuelos nupciales de un género en la base de datos.
+    
+    Se guardan una sola vez por género; las especies las heredan al consultarlas.
+    """
+    cursor = None
     try:
-        # Obtener el ID de la especie
+        # Comprobar que el género tiene especies registradas
         cursor = db.get_connection().cursor(dictionary=True)
-        cursor.execute("SELECT id FROM species WHERE scientific_name LIKE %s", (f"{genus}%",))
-        species = cursor.fetchall()
+        cursor.execute("SELECT COUNT(*) AS total FROM species WHERE scientific_name LIKE %s", (f"{genus} %",))
+        total = cursor.fetchone()['total']
         
-        if not species:
+        if not total:
             logger.error(f"No se encontraron especies para el género {genus}")
             return False
         
@@ -2524,183 +2532,144 @@ async def actualizar_estadisticas_vuelos(genus):
             logger.error(f"No se pudieron obtener estadísticas para {genus}")
             return False
         
-        # Procesar y guardar estadísticas para cada especie
-        for specie in species:
-            species_id = specie['id']
-            
-            # Procesar estadísticas por mes
-            if 'month' in stats:
-                for month_data in stats['month']:
-                    month = month_data.get('month')
-                    count = month_data.get('count', 0)
-                    hemisphere = month_data.get('hemisphere', 'World')
-                    if month is not None:
-                        db.add_flight_stats(species_id, 'month', month, count, hemisphere)
-            
-            # Procesar estadísticas por hora
-            if 'hour' in stats:
-                for hour_data in stats['hour']:
-                    hour = hour_data.get('hour')
-                    count = hour_data.get('count', 0)
-                    if hour is not None:
-                        db.add_flight_stats(species_id, 'hour', hour, count)
-            
-            # Procesar estadísticas por temperatura
-            if 'temperature' in stats:
-                for temp_data in stats['temperature']:
-                    temp = temp_data.get('temperature')
-                    count = temp_data.get('count', 0)
-                    if temp is not None:
-                        db.add_flight_stats(species_id, 'temperature', temp, count)
-            
-            # Procesar estadísticas por fase lunar
-            if 'moon' in stats:
-                for moon_data in stats['moon']:
-                    phase = moon_data.get('phase')
-                    count = moon_data.get('count', 0)
-                    if phase is not None:
-                        db.add_flight_stats(species_id, 'moon', phase, count)
-        
-        return True
+        return db.save_genus_flight_stats(genus, stats)
         
     except Exception as e:
         logger.error(f"Error al actualizar estadísticas de vuelos: {str(e)}")
         return False
+    finally:
+        if cursor:
+            cursor.close()
+
+def obtener_generos():
+    """Devuelve la lista de géneros de las especies registradas"""
+    cursor = None
+    try:
+        cursor = db.get_connection().cursor(dictionary=True)
+        cursor.execute("SELECT DISTINCT SUBSTRING_INDEX(scientific_name, ' ', 1) as genus FROM species")
+        return [row['genus'] for row in cursor.fetchall() if row['genus']]
+    finally:
+        if cursor:
+            cursor.close()
+
+def formatear_progreso_estadisticas(estado, titulo="📊 Actualizando estadísticas..."):
+    """Mensaje de progreso de la actualización de estadísticas con ritmo y tiempo restante"""
+    hechos = estado['procesados'] + estado['omitidos']
+    eta = f"{estado['eta'] / 60:.1f} min" if estado['eta'] is not None else "calculando..."
+    mensaje = (
+        f"{titulo} ({hechos}/{estado['total']})\n"
+        f"✅ Actualizados: {estado['actualizados']}\n"
+        f"❌ Errores: {len(estado['errores'])}\n"
+        f"⚡ Ritmo: {estado['por_minuto']:.1f} géneros/min\n"
+        f"⏱ Tiempo restante: {eta}"
+    )
+    if estado['omitidos']:
+        mensaje += f"\n♻️ Ya actualizados en una ejecución anterior: {estado['omitidos']}"
+    return mensaje
+
+def formatear_resumen_estadisticas(estado, sangria=""):
+    """Resumen final de la actualización de estadísticas"""
+    mensaje = f"{sangria}📊 Géneros procesados: {estado['total']}\n"
+    mensaje += f"{sangria}✨ Actualizados correctamente: {estado['actualizados'] + estado['omitidos']}\n"
+    mensaje += f"{sangria}⏱ Duración: {estado['transcurrido'] / 60:.1f} min\n"
+    errores = estado['errores']
+    if errores:
+        mensaje += f"{sangria}❌ Errores ({len(errores)}):\n"
+        mensaje += "\n".join(f"{sangria}• {genus}" for genus in errores[:5])
+        if len(errores) > 5:
+            mensaje += f"\n{sangria}... y {len(errores) - 5} más"
+    return mensaje
+
+async def actualizar_estadisticas_generos(job, titulo="📊 Actualizando estadísticas..."):
+    """Actualiza las estadísticas de todos los géneros en paralelo informando del progreso del trabajo"""
+    async def informar(estado):
+        await job.progreso(formatear_progreso_estadisticas(estado, titulo))
+
+    crawler = GenusCrawler(db, actualizar_estadisticas_vuelos, workers=CRAWL_WORKERS, on_progress=informar)
+    return await crawler.ejecutar(obtener_generos())
+
+async def job_actualizar_estadisticas(job):
+    resumen = await actualizar_estadisticas_generos(job)
+    mensaje = "✅ Actualización completada:\n\n" + formatear_resumen_estadisticas(resumen)
+    await job.progreso(mensaje, forzar=True)
+    return mensaje
 
 @dp.message(Command("actualizar_estadisticas"))
-async def actualizar_estadisticas(message: types.Message):
+async def actualizar_estadisticas(message: types.Message, contexto: Optional[RequestContext] = None):
     # Registrar interacción
     await db.log_user_interaction(
         message.from_user.id,
         message.from_user.username or message.from_user.first_name,
         'command',
-        'actualizar_estadisticas'
+        'actualizar_estadisticas',
+        contexto=contexto
     )
     """Actualiza las estadísticas de vuelos nupciales para un género o todos los géneros"""
     try:
         genus = message.text.split(maxsplit=1)[1] if len(message.text.split()) > 1 else ""
         genus = genus.strip()
-        wait_message = await message.answer('🔄 Actualizando estadísticas de vuelos nupciales...')
         
         if genus:
             # Actualizar un género específico
+            wait_message = await message.answer('🔄 Actualizando estadísticas de vuelos nupciales...')
             success = await actualizar_estadisticas_vuelos(genus)
             if success:
                 await wait_message.edit_text(f"✅ Estadísticas actualizadas para el género {genus}")
             else:
                 await wait_message.edit_text(f"❌ Error al actualizar estadísticas para {genus}")
         else:
-            # Actualizar todos los géneros
-            cursor = db.get_connection().cursor(dictionary=True)
-            cursor.execute("SELECT DISTINCT SUBSTRING_INDEX(scientific_name, ' ', 1) as genus FROM species")
-            genera = cursor.fetchall()
-            
-            total = len(genera)
-            actualizados = 0
-            errores = []
-            
-            for i, row in enumerate(genera, 1):
-                genus = row['genus']
-                try:
-                    success = await actualizar_estadisticas_vuelos(genus)
-                    if success:
-                        actualizados += 1
-                    else:
-                        errores.append(genus)
-                    
-                    # Actualizar mensaje de progreso cada 5 géneros
-                    if i % 5 == 0:
-                        await wait_message.edit_text(
-                            f"🔄 Actualizando estadísticas... ({i}/{total})\n"
-                            f"✅ Actualizados: {actualizados}\n"
-                            f"❌ Errores: {len(errores)}"
-                        )
-                except Exception as e:
-                    logger.error(f"Error al actualizar {genus}: {str(e)}")
-                    errores.append(genus)
-            
-            # Mensaje final
-            mensaje = f"✅ Actualización completada:\n\n"
-            mensaje += f"📊 Géneros procesados: {total}\n"
-            mensaje += f"✨ Actualizados correctamente: {actualizados}\n"
-            if errores:
-                mensaje += f"❌ Errores ({len(errores)}):\n"
-                mensaje += "\n".join(f"• {genus}" for genus in errores[:5])
-                if len(errores) > 5:
-                    mensaje += f"\n... y {len(errores) - 5} más"
-            
-            await wait_message.edit_text(mensaje)
+            # Actualizar todos los géneros en segundo plano
+            en_curso = job_manager.en_curso('actualizar_estadisticas', 'actualizar_todo')
+            if en_curso:
+                await message.answer(f"⏳ Ya hay una actualización de estadísticas en curso (trabajo #{en_curso.id}).")
+                return
+            wait_message = await message.answer('🔄 Actualizando estadísticas de vuelos nupciales...')
+            await job_manager.lanzar('actualizar_estadisticas', job_actualizar_estadisticas, wait_message,
+                                     message.from_user.id, "Estadísticas de todos los géneros")
             
     except Exception as e:
         logger.error(f"Error al actualizar estadísticas: {str(e)}")
         await message.answer("❌ Ocurrió un error al actualizar las estadísticas. Por favor, intenta más tarde.")
 
+async def job_actualizar_todo(job):
+    # 1. Actualizar regiones
+    await job.progreso('🌍 Actualizando regiones de especies...', forzar=True)
+    resultados_regiones = await actualizar_regiones_especies(job)
+    
+    # 2. Actualizar estadísticas de vuelos
+    await job.progreso('📊 Actualizando estadísticas de vuelos nupciales...', forzar=True)
+    resumen = await actualizar_estadisticas_generos(job)
+        
+    # Mensaje final con resumen
+    mensaje = "✅ Actualización completa finalizada\n\n"
+    mensaje += "🌍 Actualización de regiones:\n"
+    mensaje += f"• Total procesadas: {resultados_regiones['total']}\n"
+    mensaje += f"• Actualizadas: {resultados_regiones['updated']}\n"
+    mensaje += f"• Errores: {resultados_regiones['errors']}\n\n"
+    mensaje += "📊 Actualización de estadísticas:\n"
+    mensaje += formatear_resumen_estadisticas(resumen, sangria="  ")
+    
+    await job.progreso(mensaje, forzar=True)
+    return mensaje
+
 @dp.message(Command("actualizar_todo"))
 async def actualizar_todo(message: types.Message):
     """Actualiza todos los datos: estadísticas de vuelos y regiones"""
     try:
+        en_curso = job_manager.en_curso('actualizar_todo', 'actualizar_estadisticas', 'actualizar_regiones')
+        if en_curso:
+            await message.answer(f"⏳ Ya hay una actualización en curso (trabajo #{en_curso.id}).")
+            return
         wait_message = await message.answer('🔄 Iniciando actualización completa de datos...')
-        
-        # 1. Actualizar regiones
-        await wait_message.edit_text('🌍 Actualizando regiones de especies...')
-        resultados_regiones = db.update_all_regions()
-        
-        # 2. Actualizar estadísticas de vuelos
-        await wait_message.edit_text('📊 Actualizando estadísticas de vuelos nupciales...')
-        
-        # Obtener todos los géneros
-        cursor = db.get_connection().cursor(dictionary=True)
-        cursor.execute("SELECT DISTINCT SUBSTRING_INDEX(scientific_name, ' ', 1) as genus FROM species")
-        genera = cursor.fetchall()
-        
-        total_genera = len(genera)
-        actualizados = 0
-        errores = []
-        
-        for i, row in enumerate(genera, 1):
-            genus = row['genus']
-            try:
-                success = await actualizar_estadisticas_vuelos(genus)
-                if success:
-                    actualizados += 1
-                else:
-                    errores.append(genus)
-                
-                # Actualizar mensaje de progreso cada 3 géneros
-                if i % 3 == 0:
-                    await wait_message.edit_text(
-                        f"📊 Actualizando estadísticas... ({i}/{total_genera})\n"
-                        f"✅ Actualizados: {actualizados}\n"
-                        f"❌ Errores: {len(errores)}"
-                    )
-            except Exception as e:
-                logger.error(f"Error al actualizar {genus}: {str(e)}")
-                errores.append(genus)
-        
-        # Mensaje final con resumen
-        mensaje = "✅ Actualización completa finalizada\n\n"
-        mensaje += "🌍 Actualización de regiones:\n"
-        mensaje += f"• Total procesadas: {resultados_regiones['total']}\n"
-        mensaje += f"• Actualizadas: {resultados_regiones['updated']}\n"
-        mensaje += f"• Errores: {resultados_regiones['errors']}\n\n"
-        
-        mensaje += "📊 Actualización de estadísticas:\n"
-        mensaje += f"• Géneros procesados: {total_genera}\n"
-        mensaje += f"• Actualizados: {actualizados}\n"
-        if errores:
-            mensaje += f"• Errores ({len(errores)}):\n"
-            mensaje += "\n".join(f"  - {genus}" for genus in errores[:5])
-            if len(errores) > 5:
-                mensaje += f"\n  ... y {len(errores) - 5} más"
-        
-        await wait_message.edit_text(mensaje)
+        await job_manager.lanzar('actualizar_todo', job_actualizar_todo, wait_message,
+                                 message.from_user.id, "Regiones y estadísticas de vuelos")
         
     except Exception as e:
         logger.error(f"Error en actualización completa: {str(e)}")
         await message.answer("❌ Ocurrió un error durante la actualización. Por favor, intenta más tarde.")
 
 @dp.message(Command("ranking_semanal"))
-async def ranking_semanal(message: types.Message):
+async def ranking_semanal(message: types.Message, contexto: Optional[RequestContext] = None):
     """Muestra el ranking de usuarios más activos de la semana"""
     try:
         # Registrar interacción
@@ -2709,7 +2678,8 @@ async def ranking_semanal(message: types.Message):
             message.from_user.username or message.from_user.first_name,
             'command',
             'ranking_semanal',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Obtener el ranking semanal usando solo la tabla user_experience
@@ -2751,7 +2721,7 @@ async def ranking_semanal(message: types.Message):
             cursor.close()
 
 @dp.message(Command("ranking_mensual"))
-async def ranking_mensual(message: types.Message):
+async def ranking_mensual(message: types.Message, contexto: Optional[RequestContext] = None):
     """Muestra el ranking de usuarios más activos del mes"""
     try:
         # Registrar interacción
@@ -2760,7 +2730,8 @@ async def ranking_mensual(message: types.Message):
             message.from_user.username or message.from_user.first_name,
             'command',
             'ranking_mensual',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Obtener el ranking mensual usando solo la tabla user_experience
@@ -2802,14 +2773,14 @@ async def ranking_mensual(message: types.Message):
             cursor.close()
 
 @dp.message(lambda message: message.photo is not None)
-async def handle_photo(message: types.Message):
+async def handle_photo(message: types.Message, contexto: Optional[RequestContext] = None):
     """Maneja mensajes con fotos"""
     try:
         # Log para depuración
         logger.info(f"Foto recibida del usuario {message.from_user.username or message.from_user.first_name}")
         
         # Verificar si es spam antes de procesar
-        if db.is_spam(message.from_user.id, 'photo', message.chat.id):
+        if db.is_spam(message.from_user.id, 'photo', message.chat.id, contexto=contexto):
             logger.warning(f"Spam de fotos detectado del usuario {message.from_user.username or message.from_user.first_name} en el chat {message.chat.id}")
             # Notificar y aplicar medidas anti-spam
             await notify_spam_detected(message)
@@ -2821,7 +2792,8 @@ async def handle_photo(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='photo',
             command_name=None,
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Registrar como foto pendiente de aprobación
@@ -2851,14 +2823,14 @@ async def handle_photo(message: types.Message):
         logger.error(f"Error al registrar interacción de foto: {str(e)}")
 
 @dp.message(lambda message: message.video is not None)
-async def handle_video(message: types.Message):
+async def handle_video(message: types.Message, contexto: Optional[RequestContext] = None):
     """Maneja mensajes con videos"""
     try:
         # Log para depuración
         logger.info(f"Video recibido del usuario {message.from_user.username or message.from_user.first_name}")
         
         # Verificar si es spam antes de procesar
-        if db.is_spam(message.from_user.id, 'video', message.chat.id):
+        if db.is_spam(message.from_user.id, 'video', message.chat.id, contexto=contexto):
             logger.warning(f"Spam de videos detectado del usuario {message.from_user.username or message.from_user.first_name} en el chat {message.chat.id}")
             # Notificar y aplicar medidas anti-spam
             await notify_spam_detected(message)
@@ -2870,7 +2842,8 @@ async def handle_video(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='video',
             command_name=None,
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Registrar como video pendiente de aprobación
@@ -2900,7 +2873,7 @@ async def handle_video(message: types.Message):
         logger.error(f"Error al registrar interacción de video: {str(e)}")
 
 @dp.message(lambda message: message.document is not None)
-async def handle_document(message: types.Message):
+async def handle_document(message: types.Message, contexto: Optional[RequestContext] = None):
     """Maneja mensajes con documentos"""
     try:
         # Determinar si es un video o un documento normal
@@ -2914,7 +2887,7 @@ async def handle_document(message: types.Message):
             logger.info(f"Documento recibido del usuario {message.from_user.username or message.from_user.first_name}")
         
         # Verificar si es spam antes de procesar
-        if db.is_spam(message.from_user.id, interaction_type, message.chat.id):
+        if db.is_spam(message.from_user.id, interaction_type, message.chat.id, contexto=contexto):
             logger.warning(f"Spam de documentos detectado del usuario {message.from_user.username or message.from_user.first_name} en el chat {message.chat.id}")
             # Notificar y aplicar medidas anti-spam
             await notify_spam_detected(message)
@@ -2926,7 +2899,8 @@ async def handle_document(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type=interaction_type,
             command_name=None,
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Si es un video, registrarlo como pendiente de aprobación
@@ -2957,7 +2931,7 @@ async def handle_document(message: types.Message):
         logger.error(f"Error al registrar interacción de documento: {str(e)}")
 
 @dp.message(lambda message: message.new_chat_members is not None)
-async def handle_new_members(message: types.Message):
+async def handle_new_members(message: types.Message, contexto: Optional[RequestContext] = None):
     """Gestiona la entrada de nuevos miembros al grupo."""
     try:
         chat_id = message.chat.id
@@ -2981,7 +2955,8 @@ async def handle_new_members(message: types.Message):
                 user_id=user_id,
                 username=username,
                 interaction_type='join',
-                chat_id=chat_id
+                chat_id=chat_id,
+                contexto=contexto
             )
             
             # Enviar mensaje de bienvenida con captcha
@@ -3153,18 +3128,7 @@ async def handle_captcha(callback_query: types.CallbackQuery):
 
 async def verificar_actividad_reciente(chat_id):
     """Verifica si ha habido actividad en el grupo en la última hora"""
-    try:
-        cursor = db.get_connection().cursor(dictionary=True)
-        cursor.execute("""
-            SELECT COUNT(*) as count
-            FROM user_interactions
-            WHERE created_at >= NOW() - INTERVAL 1 HOUR
-        """)
-        result = cursor.fetchone()
-        return result['count'] > 0
-    except Exception as e:
-        logger.error(f"Error al verificar actividad reciente: {str(e)}")
-        return False
+    return chat_registry.activo(chat_id, VENTANA_ACTIVIDAD_HORMIDATO)
 
 async def enviar_hormidato_automatico():
     """Envía un hormidato automáticamente si hay actividad en el grupo"""
@@ -3173,130 +3137,121 @@ async def enviar_hormidato_automatico():
         enviar_hormidato_automatico.ultimos_hormidatos = {}
     
     try:
-        # Obtener todos los chats donde el bot está presente
-        cursor = db.get_connection().cursor(dictionary=True)
-        cursor.execute("SELECT DISTINCT chat_id FROM user_interactions WHERE chat_id IS NOT NULL")
-        chats = cursor.fetchall()
+        # Grupos donde el bot sigue presente y ha habido actividad en la última hora
+        chats = chat_registry.activos(VENTANA_ACTIVIDAD_HORMIDATO, solo_grupos=True)
+        logger.info(f"Hormidato automático: {len(chats)} grupos con actividad reciente")
+        
+        # Hormidato elegido para cada chat con actividad
+        mensajes = {}
+        for chat_id in chats:
+            # Crear registro para este chat si no existe
+            if chat_id not in enviar_hormidato_automatico.ultimos_hormidatos:
+                enviar_hormidato_automatico.ultimos_hormidatos[chat_id] = []
+            
+            # Base de datos ampliada de hormidatos (compartida con la función hormidato)
+            datos = {
+                "Curiosidades Generales": [
+                    "Las hormigas pueden levantar hasta 50 veces su propio peso.",
+                    "La reina de una colonia de hormigas puede vivir hasta 30 años.",
+                    "Algunas especies de hormigas practican la agricultura cultivando hongos.",
+                    "Las hormigas del género Myrmecocystus almacenan alimento en el abdomen de hormigas obreras especiales llamadas 'hormigas miel'.",
+                    "Las hormigas pueden construir puentes vivientes usando sus propios cuerpos.",
+                    "Las hormigas usan feromonas para comunicarse, creando complejos 'mapas químicos'.",
+                    "El cerebro de una hormiga tiene alrededor de 250,000 neuronas, uno de los más grandes en relación a su tamaño corporal.",
+                    "Las hormigas son capaces de reconocer a sus compañeras de colonia mediante el olor.",
+                    "Las hormigas se limpian regularmente para evitar infecciones por hongos y bacterias.",
+                    "Una colonia de hormigas puede mover hasta 50 toneladas de tierra durante su vida."
+                ],
+                "Especies Fascinantes": [
+                    "Las hormigas Camponotus saundersi explotan su propio cuerpo como mecanismo de defensa.",
+                    "Las hormigas tejedoras construyen nidos con hojas unidas por la seda producida por sus larvas.",
+                    "Las hormigas cortadoras pueden transportar hasta 50 veces su peso en hojas.",
+                    "La hormiga bala tiene una de las picaduras más dolorosas del mundo, comparada con un disparo.",
+                    "Las hormigas legionarias Eciton burchellii forman colonias nómadas de más de 500,000 individuos.",
+                    "Las hormigas de fuego pueden formar balsas con sus cuerpos para sobrevivir a inundaciones.",
+                    "Las hormigas plateadas del Sahara pueden correr a velocidades de hasta 1 metro por segundo.",
+                    "La hormiga saltadora puede saltar hasta 4 centímetros, equivalente a un humano saltando 40 metros.",
+                    "Las hormigas esclavistas capturan pupas de otras colonias para forzarlas a trabajar para ellas.",
+                    "Las hormigas del género Adetomyrma son conocidas como 'vampiras' por alimentarse de la hemolinfa de sus larvas."
+                ],
+                "Comportamiento Social": [
+                    "Las hormigas practican el 'trofallaxis', el intercambio de alimento líquido boca a boca.",
+                    "Algunas especies de hormigas esclavizan a otras colonias para que trabajen para ellas.",
+                    "Ciertas hormigas tienen 'cementerios' designados donde llevan a sus muertas para evitar enfermedades.",
+                    "Las hormigas obreras crean 'guarderías' específicas para cuidar de las larvas según su etapa de desarrollo.",
+                    "Las hormigas colobopsis exploden tienen 'soldados kamikaze' que explotan, liberando sustancias pegajosas para defender el nido.",
+                    "Las hormigas pueden adoptar diferentes roles según las necesidades de la colonia.",
+                    "Hay hormigas que realizan 'rituales funerarios', llevando a sus muertas a lugares específicos lejos del nido.",
+                    "Algunas especies tienen 'enfermeras' dedicadas que cuidan exclusivamente a las larvas enfermas.",
+                    "Las hormigas pueden reconocer y rechazar a miembros de otras colonias incluso de la misma especie.",
+                    "Existen hormigas que 'secuestran' pupas de otras colonias para aumentar su fuerza laboral."
+                ],
+                "Adaptaciones Sorprendentes": [
+                    "Las hormigas Cephalotes tienen cabezas planas que usan como 'puertas vivientes' para bloquear la entrada al nido.",
+                    "Algunas especies de hormigas pueden nadar y sobrevivir bajo el agua durante horas.",
+                    "Las hormigas 'gliders' pueden planear controladamente si caen de los árboles, dirigiéndose de vuelta al tronco.",
+                    "Ciertas hormigas del desierto han desarrollado patas extremadamente largas para mantener su cuerpo alejado de la arena caliente.",
+                    "Las hormigas Cataglyphis tienen un 'GPS' biológico que les permite volver al nido en línea recta desde cualquier punto.",
+                    "Las hormigas 'cosechadoras' recolectan semillas y crean sus propios 'graneros' dentro del hormiguero.",
+                    "Algunas hormigas pueden cerrar sus espiráculos para evitar ahogarse durante inundaciones.",
+                    "Las hormigas Formica polyctena pueden generar ácido fórmico y rociarlo como defensa química.",
+                    "Las hormigas Messor barbarus pueden organizar las semillas almacenadas por tamaño y tipo en cámaras separadas.",
+                    "La hormiga bala ha desarrollado un veneno que causa dolor extremo como defensa contra vertebrados."
+                ],
+                "Datos sobre Hormigas Reina": [
+                    "Una reina de hormiga puede vivir más de 30 años, mientras que las obreras viven solo meses.",
+                    "Algunas reinas almacenan esperma de múltiples machos para aumentar la diversidad genética de su colonia.",
+                    "Las reinas de ciertas especies usan los músculos de sus alas como energía después de eliminarlas tras el vuelo nupcial.",
+                    "En algunas especies, varias reinas pueden cooperar para fundar una colonia (pleometrosis).",
+                    "Las reinas de hormigas pueden poner diferentes tipos de huevos según las necesidades de la colonia.",
+                    "Una reina de Atta puede poner hasta 30,000 huevos por día.",
+                    "Las reinas de algunas especies pueden vivir sin comer durante meses mientras fundan una nueva colonia.",
+                    "En las colonias de 'killerponera', las obreras pueden convertirse en reinas a través de un duelo ritual.",
+                    "Algunas reinas de hormigas pueden generar diferentes castas de obreras dependiendo de la alimentación de las larvas.",
+                    "Las reinas de Lasius niger pueden fundar colonias completamente solas (fundación claustral)."
+                ],
+                "Consejos de Crianza": [
+                    "Mantén la temperatura del hormiguero entre 24-28°C para la mayoría de especies tropicales.",
+                    "Proporciona una fuente constante de agua para evitar la deshidratación de la colonia.",
+                    "Alimenta con insectos pequeños como moscas o grillos para una dieta rica en proteínas.",
+                    "Evita exponer la colonia a vibraciones o ruidos fuertes para no estresarlas.",
+                    "Limpia el área de forrajeo regularmente para evitar la acumulación de residuos.",
+                    "Si mantienes especies granívoras, ofrece diferentes tipos de semillas para una dieta variada.",
+                    "El glucógeno líquido es excelente para proporcionar energía a las obreras forrajeadoras.",
+                    "Durante la hibernación, reduce gradualmente la temperatura para evitar shock térmico.",
+                    "Para la mayoría de las colonias, una humedad relativa entre 40-60% es ideal.",
+                    "Las dietas de proteínas deben ser más abundantes durante las fases de crecimiento rápido de la colonia."
+                ]
+            }
+            
+            # Obtener todas las categorías y los hormidatos en una lista plana
+            todas_categorias = list(datos.keys())
+            todos_hormidatos = []
+            for categoria in todas_categorias:
+                for dato in datos[categoria]:
+                    todos_hormidatos.append((categoria, dato))
+            
+            # Filtrar hormidatos que no se han mostrado recientemente
+            hormidatos_disponibles = [h for h in todos_hormidatos if h not in enviar_hormidato_automatico.ultimos_hormidatos[chat_id]]
+            
+            # Si todos los hormidatos ya se mostraron, resetear la lista
+            if not hormidatos_disponibles:
+                enviar_hormidato_automatico.ultimos_hormidatos[chat_id] = []
+                hormidatos_disponibles = todos_hormidatos
+            
+            # Seleccionar un hormidato aleatorio de los disponibles
+            hormidato_seleccionado = random.choice(hormidatos_disponibles)
+            categoria, dato = hormidato_seleccionado
+            
+            # Actualizar el historial (mantener solo los últimos 15 hormidatos para evitar repeticiones)
+            enviar_hormidato_automatico.ultimos_hormidatos[chat_id].append(hormidato_seleccionado)
+            if len(enviar_hormidato_automatico.ultimos_hormidatos[chat_id]) > 15:
+                enviar_hormidato_automatico.ultimos_hormidatos[chat_id].pop(0)
+            
+            mensajes[chat_id] = f"🤖 ¡Hora del hormidato !\n\n🐜 {categoria}:\n{dato}"
         
-        for chat in chats:
-            chat_id = chat['chat_id']
-            if chat_id is None:
-                logger.warning(f"Se encontró un chat_id nulo, saltando...")
-                continue
-                
-            # Verificar si ha habido actividad reciente
-            if await verificar_actividad_reciente(chat_id):
-                # Crear registro para este chat si no existe
-                if chat_id not in enviar_hormidato_automatico.ultimos_hormidatos:
-                    enviar_hormidato_automatico.ultimos_hormidatos[chat_id] = []
-                
-                # Base de datos ampliada de hormidatos (compartida con la función hormidato)
-                datos = {
-                    "Curiosidades Generales": [
-                        "Las hormigas pueden levantar hasta 50 veces su propio peso.",
-                        "La reina de una colonia de hormigas puede vivir hasta 30 años.",
-                        "Algunas especies de hormigas practican la agricultura cultivando hongos.",
-                        "Las hormigas del género Myrmecocystus almacenan alimento en el abdomen de hormigas obreras especiales llamadas 'hormigas miel'.",
-                        "Las hormigas pueden construir puentes vivientes usando sus propios cuerpos.",
-                        "Las hormigas usan feromonas para comunicarse, creando complejos 'mapas químicos'.",
-                        "El cerebro de una hormiga tiene alrededor de 250,000 neuronas, uno de los más grandes en relación a su tamaño corporal.",
-                        "Las hormigas son capaces de reconocer a sus compañeras de colonia mediante el olor.",
-                        "Las hormigas se limpian regularmente para evitar infecciones por hongos y bacterias.",
-                        "Una colonia de hormigas puede mover hasta 50 toneladas de tierra durante su vida."
-                    ],
-                    "Especies Fascinantes": [
-                        "Las hormigas Camponotus saundersi explotan su propio cuerpo como mecanismo de defensa.",
-                        "Las hormigas tejedoras construyen nidos con hojas unidas por la seda producida por sus larvas.",
-                        "Las hormigas cortadoras pueden transportar hasta 50 veces su peso en hojas.",
-                        "La hormiga bala tiene una de las picaduras más dolorosas del mundo, comparada con un disparo.",
-                        "Las hormigas legionarias Eciton burchellii forman colonias nómadas de más de 500,000 individuos.",
-                        "Las hormigas de fuego pueden formar balsas con sus cuerpos para sobrevivir a inundaciones.",
-                        "Las hormigas plateadas del Sahara pueden correr a velocidades de hasta 1 metro por segundo.",
-                        "La hormiga saltadora puede saltar hasta 4 centímetros, equivalente a un humano saltando 40 metros.",
-                        "Las hormigas esclavistas capturan pupas de otras colonias para forzarlas a trabajar para ellas.",
-                        "Las hormigas del género Adetomyrma son conocidas como 'vampiras' por alimentarse de la hemolinfa de sus larvas."
-                    ],
-                    "Comportamiento Social": [
-                        "Las hormigas practican el 'trofallaxis', el intercambio de alimento líquido boca a boca.",
-                        "Algunas especies de hormigas esclavizan a otras colonias para que trabajen para ellas.",
-                        "Ciertas hormigas tienen 'cementerios' designados donde llevan a sus muertas para evitar enfermedades.",
-                        "Las hormigas obreras crean 'guarderías' específicas para cuidar de las larvas según su etapa de desarrollo.",
-                        "Las hormigas colobopsis exploden tienen 'soldados kamikaze' que explotan, liberando sustancias pegajosas para defender el nido.",
-                        "Las hormigas pueden adoptar diferentes roles según las necesidades de la colonia.",
-                        "Hay hormigas que realizan 'rituales funerarios', llevando a sus muertas a lugares específicos lejos del nido.",
-                        "Algunas especies tienen 'enfermeras' dedicadas que cuidan exclusivamente a las larvas enfermas.",
-                        "Las hormigas pueden reconocer y rechazar a miembros de otras colonias incluso de la misma especie.",
-                        "Existen hormigas que 'secuestran' pupas de otras colonias para aumentar su fuerza laboral."
-                    ],
-                    "Adaptaciones Sorprendentes": [
-                        "Las hormigas Cephalotes tienen cabezas planas que usan como 'puertas vivientes' para bloquear la entrada al nido.",
-                        "Algunas especies de hormigas pueden nadar y sobrevivir bajo el agua durante horas.",
-                        "Las hormigas 'gliders' pueden planear controladamente si caen de los árboles, dirigiéndose de vuelta al tronco.",
-                        "Ciertas hormigas del desierto han desarrollado patas extremadamente largas para mantener su cuerpo alejado de la arena caliente.",
-                        "Las hormigas Cataglyphis tienen un 'GPS' biológico que les permite volver al nido en línea recta desde cualquier punto.",
-                        "Las hormigas 'cosechadoras' recolectan semillas y crean sus propios 'graneros' dentro del hormiguero.",
-                        "Algunas hormigas pueden cerrar sus espiráculos para evitar ahogarse durante inundaciones.",
-                        "Las hormigas Formica polyctena pueden generar ácido fórmico y rociarlo como defensa química.",
-                        "Las hormigas Messor barbarus pueden organizar las semillas almacenadas por tamaño y tipo en cámaras separadas.",
-                        "La hormiga bala ha desarrollado un veneno que causa dolor extremo como defensa contra vertebrados."
-                    ],
-                    "Datos sobre Hormigas Reina": [
-                        "Una reina de hormiga puede vivir más de 30 años, mientras que las obreras viven solo meses.",
-                        "Algunas reinas almacenan esperma de múltiples machos para aumentar la diversidad genética de su colonia.",
-                        "Las reinas de ciertas especies usan los músculos de sus alas como energía después de eliminarlas tras el vuelo nupcial.",
-                        "En algunas especies, varias reinas pueden cooperar para fundar una colonia (pleometrosis).",
-                        "Las reinas de hormigas pueden poner diferentes tipos de huevos según las necesidades de la colonia.",
-                        "Una reina de Atta puede poner hasta 30,000 huevos por día.",
-                        "Las reinas de algunas especies pueden vivir sin comer durante meses mientras fundan una nueva colonia.",
-                        "En las colonias de 'killerponera', las obreras pueden convertirse en reinas a través de un duelo ritual.",
-                        "Algunas reinas de hormigas pueden generar diferentes castas de obreras dependiendo de la alimentación de las larvas.",
-                        "Las reinas de Lasius niger pueden fundar colonias completamente solas (fundación claustral)."
-                    ],
-                    "Consejos de Crianza": [
-                        "Mantén la temperatura del hormiguero entre 24-28°C para la mayoría de especies tropicales.",
-                        "Proporciona una fuente constante de agua para evitar la deshidratación de la colonia.",
-                        "Alimenta con insectos pequeños como moscas o grillos para una dieta rica en proteínas.",
-                        "Evita exponer la colonia a vibraciones o ruidos fuertes para no estresarlas.",
-                        "Limpia el área de forrajeo regularmente para evitar la acumulación de residuos.",
-                        "Si mantienes especies granívoras, ofrece diferentes tipos de semillas para una dieta variada.",
-                        "El glucógeno líquido es excelente para proporcionar energía a las obreras forrajeadoras.",
-                        "Durante la hibernación, reduce gradualmente la temperatura para evitar shock térmico.",
-                        "Para la mayoría de las colonias, una humedad relativa entre 40-60% es ideal.",
-                        "Las dietas de proteínas deben ser más abundantes durante las fases de crecimiento rápido de la colonia."
-                    ]
-                }
-                
-                # Obtener todas las categorías y los hormidatos en una lista plana
-                todas_categorias = list(datos.keys())
-                todos_hormidatos = []
-                for categoria in todas_categorias:
-                    for dato in datos[categoria]:
-                        todos_hormidatos.append((categoria, dato))
-                
-                # Filtrar hormidatos que no se han mostrado recientemente
-                hormidatos_disponibles = [h for h in todos_hormidatos if h not in enviar_hormidato_automatico.ultimos_hormidatos[chat_id]]
-                
-                # Si todos los hormidatos ya se mostraron, resetear la lista
-                if not hormidatos_disponibles:
-                    enviar_hormidato_automatico.ultimos_hormidatos[chat_id] = []
-                    hormidatos_disponibles = todos_hormidatos
-                
-                # Seleccionar un hormidato aleatorio de los disponibles
-                hormidato_seleccionado = random.choice(hormidatos_disponibles)
-                categoria, dato = hormidato_seleccionado
-                
-                # Actualizar el historial (mantener solo los últimos 15 hormidatos para evitar repeticiones)
-                enviar_hormidato_automatico.ultimos_hormidatos[chat_id].append(hormidato_seleccionado)
-                if len(enviar_hormidato_automatico.ultimos_hormidatos[chat_id]) > 15:
-                    enviar_hormidato_automatico.ultimos_hormidatos[chat_id].pop(0)
-                
-                try:
-                    # Enviar el hormidato con un mensaje especial
-                    mensaje = f"🤖 ¡Hora del hormidato !\n\n🐜 {categoria}:\n{dato}"
-                    await bot.send_message(chat_id=chat_id, text=mensaje)
-                    logger.info(f"Hormidato  enviado al chat {chat_id}")
-                except Exception as e:
-                    logger.error(f"Error al enviar hormidato al chat {chat_id}: {str(e)}")
+        # Enviar todos los hormidatos en paralelo respetando los límites de Telegram
+        await broadcaster.enviar(mensajes)
         
     except Exception as e:
         logger.error(f"Error en envío de hormidato: {str(e)}")
@@ -3321,9 +3276,7 @@ async def enviar_mensaje_diario():
             await asyncio.sleep(segundos_espera)
             
             # Obtener todos los chats donde el bot está presente
-            cursor = db.get_connection().cursor(dictionary=True)
-            cursor.execute("SELECT DISTINCT chat_id FROM user_interactions WHERE chat_id IS NOT NULL")
-            chats = cursor.fetchall()
+            chats = chat_registry.destinos()
             
             if not chats:
                 logger.warning("No se encontraron chats con IDs válidos para enviar mensajes diarios")
@@ -3361,77 +3314,27 @@ async def enviar_mensaje_diario():
                 ]
             }
             
-            for chat in chats:
-                try:
-                    chat_id = chat['chat_id']
-                    if chat_id is None:
-                        logger.warning(f"Se encontró un chat_id nulo, saltando...")
-                        continue
-                        
-                    # Seleccionar una categoría y mensaje aleatorio
-                    categoria = random.choice(list(mensajes_diarios.keys()))
-                    mensaje = random.choice(mensajes_diarios[categoria])
-                    
-                    # Crear el mensaje formateado
-                    mensaje_diario = (
-                        "📅 Mensaje Diario de AntMaster\n\n"
-                        f"🔍 {categoria}:\n"
-                        f"{mensaje}\n\n"
-                        "💡 ¿Sabías este dato? ¡Comparte el tuyo usando /hormidato!"
-                    )
-                    
-                    # Enviar el mensaje
-                    await bot.send_message(chat_id=chat_id, text=mensaje_diario)
-                    logger.info(f"Mensaje diario enviado al chat {chat_id}")
-                    
-                except Exception as e:
-                    logger.error(f"Error al enviar mensaje diario al chat {chat_id}: {str(e)}")
-                    continue
+            mensajes = {}
+            for chat_id in chats:
+                # Seleccionar una categoría y mensaje aleatorio
+                categoria = random.choice(list(mensajes_diarios.keys()))
+                mensaje = random.choice(mensajes_diarios[categoria])
+                
+                # Crear el mensaje formateado
+                mensajes[chat_id] = (
+                    "📅 Mensaje Diario de AntMaster\n\n"
+                    f"🔍 {categoria}:\n"
+                    f"{mensaje}\n\n"
+                    "💡 ¿Sabías este dato? ¡Comparte el tuyo usando /hormidato!"
+                )
+            
+            # Enviar a todos los chats en paralelo respetando los límites de Telegram
+            await broadcaster.enviar(mensajes)
             
         except Exception as e:
             logger.error(f"Error en envío de mensaje diario: {str(e)}")
             await asyncio.sleep(300)  # Esperar 5 minutos en caso de error
 
-async def main():
-    """Función principal del bot"""
-    try:
-        # Inicializar la sesión HTTP global
-        await init_session()
-        
-        # Configurar el bot en el rewards_manager
-        rewards_manager.set_bot(bot)
-        
-        # Inicializar el diccionario de spammers notificados
-        global notified_spammers
-        notified_spammers = {}
-        
-        # Resetear el tiempo de inicio del bot
-        db.reset_bot_start_time()
-        
-        # Configurar el scheduler
-        scheduler = AsyncIOScheduler()
-        
-        # Programar envío de hormidato cada 3 horas
-        scheduler.add_job(enviar_hormidato_automatico, 'interval', hours=3)
-        
-        # Programar mensaje diario a las 12:00
-        scheduler.add_job(enviar_mensaje_diario, 'cron', hour=12)
-        
-        # Iniciar el scheduler
-        scheduler.start()
-        
-        logger.info("Bot iniciado correctamente")
-        
-        # Iniciar el bot con polling
-        await dp.start_polling(bot)
-        
-    except Exception as e:
-        logger.error(f"Error en main: {str(e)}")
-    finally:
-        # Cerrar la sesión HTTP al salir
-        await close_session()
-        logger.info("Sesión HTTP cerrada correctamente")
-
 @dp.message(Command("chat_id"))
 async def get_chat_id(message: types.Message):
     """Muestra el ID del chat actual"""
@@ -3442,7 +3345,7 @@ async def get_chat_id(message: types.Message):
         await message.answer("❌ Error al obtener el ID del chat")
 
 @dp.message(Command("enviar_mensaje_prueba"))
-async def enviar_mensaje_prueba(message: types.Message):
+async def enviar_mensaje_prueba(message: types.Message, contexto: Optional[RequestContext] = None):
     """Envía manualmente un mensaje diario de prueba a todos los grupos"""
     try:
         # Registrar interacción
@@ -3451,16 +3354,15 @@ async def enviar_mensaje_prueba(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='enviar_mensaje_prueba',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Mensaje de espera
         wait_message = await message.answer("🔄 Enviando mensaje de prueba a todos los grupos...")
         
-        # Obtener todos los chats donde el bot está presente
-        cursor = db.get_connection().cursor(dictionary=True)
-        cursor.execute("SELECT DISTINCT chat_id FROM user_interactions")
-        chats = cursor.fetchall()
+        # Obtener todos los chats donde el bot está presente (también los de otros workers)
+        chats = chat_registry.destinos(todos=True)
         
         if not chats:
             await wait_message.edit_text("❌ No se encontraron grupos para enviar el mensaje.")
@@ -3498,51 +3400,32 @@ async def enviar_mensaje_prueba(message: types.Message):
             ]
         }
         
-        # Contador de mensajes enviados
-        enviados = 0
-        errores = 0
+        mensajes = {}
+        for chat_id in chats:
+            # Seleccionar una categoría y mensaje aleatorio
+            categoria = random.choice(list(mensajes_diarios.keys()))
+            mensaje = random.choice(mensajes_diarios[categoria])
+            
+            # Crear el mensaje formateado
+            mensajes[chat_id] = (
+                "🧪 PRUEBA - Mensaje Diario de AntMaster\n\n"
+                f"🔍 {categoria}:\n"
+                f"{mensaje}\n\n"
+                "💡 ¿Sabías este dato? ¡Comparte el tuyo usando /hormidato!\n\n"
+                "ℹ️ Este es un mensaje de prueba del sistema de mensajes diarios."
+            )
         
-        for chat in chats:
-            try:
-                chat_id = chat['chat_id']
-                # Seleccionar una categoría y mensaje aleatorio
-                categoria = random.choice(list(mensajes_diarios.keys()))
-                mensaje = random.choice(mensajes_diarios[categoria])
-                
-                # Crear el mensaje formateado
-                mensaje_diario = (
-                    "🧪 PRUEBA - Mensaje Diario de AntMaster\n\n"
-                    f"🔍 {categoria}:\n"
-                    f"{mensaje}\n\n"
-                    "💡 ¿Sabías este dato? ¡Comparte el tuyo usando /hormidato!\n\n"
-                    "ℹ️ Este es un mensaje de prueba del sistema de mensajes diarios."
-                )
-                
-                # Enviar el mensaje
-                await bot.send_message(chat_id=chat_id, text=mensaje_diario)
-                enviados += 1
-                logger.info(f"Mensaje de prueba enviado al chat {chat_id}")
-                
-            except Exception as e:
-                logger.error(f"Error al enviar mensaje de prueba al chat {chat_id}: {str(e)}")
-                errores += 1
+        informe = await broadcaster.enviar(mensajes)
         
         # Actualizar mensaje con el resultado
-        resumen = (
-            f"✅ Prueba completada\n\n"
-            f"📊 Resumen:\n"
-            f"• Mensajes enviados: {enviados}\n"
-            f"• Errores: {errores}\n"
-            f"• Total de grupos: {len(chats)}"
-        )
-        await wait_message.edit_text(resumen)
+        await wait_message.edit_text(f"✅ Prueba completada\n\n{formatear_informe(informe)}")
         
     except Exception as e:
         logger.error(f"Error en envío de mensaje de prueba: {str(e)}")
         await message.answer("❌ Error al enviar los mensajes de prueba")
 
 @dp.message(Command("enviar_mensaje"))
-async def enviar_mensaje_manual(message: types.Message):
+async def enviar_mensaje_manual(message: types.Message, contexto: Optional[RequestContext] = None):
     """Envía manualmente un hormidato a todos los grupos"""
     try:
         # Registrar interacción
@@ -3551,23 +3434,15 @@ async def enviar_mensaje_manual(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='enviar_mensaje',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Mensaje de espera
         wait_message = await message.answer("🔄 Enviando hormidato a todos los grupos...")
         
-        # Obtener todos los chats donde el bot está presente, filtrando solo grupos y asegurando IDs válidos
-        cursor = db.get_connection().cursor(dictionary=True)
-        cursor.execute("""
-            SELECT DISTINCT chat_id 
-            FROM user_interactions 
-            WHERE chat_id IS NOT NULL 
-            AND chat_id < 0  -- Los IDs de grupo son negativos en Telegram
-            AND chat_id != 0 -- Evitar IDs inválidos
-            ORDER BY chat_id
-        """)
-        chats = cursor.fetchall()
+        # Obtener los grupos donde el bot sigue presente (también los de otros workers)
+        chats = chat_registry.destinos(solo_grupos=True, todos=True)
         
         if not chats:
             await wait_message.edit_text("❌ No se encontraron grupos para enviar el mensaje.")
@@ -3682,63 +3557,33 @@ async def enviar_mensaje_manual(message: types.Message):
         
         mensaje = f"🐜 ¡Hora del hormidato!\n\n{categoria}:\n{dato}\n\n💡 ¿Sabías este dato? ¡Comparte el tuyo usando /hormidato!"
         
-        # Actualizar mensaje de estado inicial
-        await wait_message.edit_text(f"🔄 Enviando hormidato a {len(chats)} grupos...")
-        
-        # Contadores para el seguimiento
-        enviados = 0
-        errores = []
-        
-        for chat in chats:
-            try:
-                chat_id = chat['chat_id']
-                logger.info(f"Intentando enviar mensaje al chat {chat_id}")
-                
-                # Verificar que el chat_id sea válido
-                if not isinstance(chat_id, (int, str)) or str(chat_id).strip() == '':
-                    logger.error(f"Chat ID inválido encontrado: {chat_id}")
-                    errores.append(f"ID inválido: {chat_id}")
-                    continue
-                
-                # Convertir a entero si es string
-                if isinstance(chat_id, str):
-                    chat_id = int(chat_id)
-                
-                # Intentar enviar el mensaje
-                sent_message = await bot.send_message(
-                    chat_id=chat_id,
-                    text=mensaje,
-                    disable_notification=False  # Asegurar que se envíe con notificación
+        # Enviar en segundo plano para no bloquear el manejador
+        async def job_enviar_mensaje(job):
+            # Actualizar mensaje de estado inicial
+            await job.progreso(f"🔄 Enviando hormidato a {len(chats)} grupos...", forzar=True)
+            
+            # Actualizar mensaje de estado (el gestor de trabajos limita las ediciones)
+            async def progreso(informe):
+                await job.progreso(
+                    f"🔄 Progreso: {informe['enviados']}/{informe['total']} grupos\n"
+                    f"❌ Errores: {informe['errores'] + informe['descartados']}"
                 )
-                
-                if sent_message:
-                    enviados += 1
-                    logger.info(f"✅ Mensaje enviado exitosamente al chat {chat_id}")
-                    
-                    # Actualizar mensaje de estado cada 5 envíos exitosos
-                    if enviados % 5 == 0:
-                        await wait_message.edit_text(
-                            f"🔄 Progreso: {enviados}/{len(chats)} grupos\n"
-                            f"❌ Errores: {len(errores)}"
-                        )
-                
-            except Exception as e:
-                error_msg = f"Error en chat {chat_id}: {str(e)}"
-                logger.error(error_msg)
-                errores.append(error_msg)
-        
-        # Actualizar mensaje final con resumen
-        resumen = (
-            f"✅ Envío completado\n\n"
-            f"📊 Resumen:\n"
-            f"• Total de grupos: {len(chats)}\n"
-            f"• Mensajes enviados: {enviados}\n"
-            f"• Errores: {len(errores)}\n\n"
-            f"📝 Mensaje enviado:\n"
-            f"{mensaje[:100]}..."
-        )
+            
+            informe = await broadcaster.enviar({chat_id: mensaje for chat_id in chats}, on_progress=progreso)
+            
+            # Actualizar mensaje final con resumen
+            resumen = (
+                f"✅ Envío completado\n\n"
+                f"{formatear_informe(informe)}\n\n"
+                f"📝 Mensaje enviado:\n"
+                f"{mensaje[:100]}..."
+            )
+            
+            await job.progreso(resumen, forzar=True)
+            return resumen
         
-        await wait_message.edit_text(resumen)
+        await job_manager.lanzar('enviar_mensaje', job_enviar_mensaje, wait_message, message.from_user.id,
+                                 f"Hormidato a {len(chats)} grupos")
         
     except Exception as e:
         error_msg = f"Error general en envío de mensaje: {str(e)}"
@@ -3746,16 +3591,34 @@ async def enviar_mensaje_manual(message: types.Message):
         await message.answer(f"❌ Error al enviar los mensajes: {str(e)}")
 
 async def is_admin(chat_id, user_id):
-    """Verifica si un usuario es administrador del chat"""
+    """Verifica si un usuario es administrador del chat (lista de administradores en caché)"""
     try:
-        member = await bot.get_chat_member(chat_id, user_id)
-        return member.status in ['administrator', 'creator']
+        return await admin_cache.es_admin(chat_id, user_id)
     except Exception as e:
         logger.error(f"Error al verificar admin: {str(e)}")
         return False
 
+@dp.my_chat_member()
+async def handle_my_chat_member(event: types.ChatMemberUpdated):
+    """Actualiza el registro de chats cuando el bot entra, sale o es expulsado de un chat"""
+    try:
+        chat_registry.actualizar_estado(event.chat.id, event.new_chat_member.status, event.chat)
+        admin_cache.actualizar(event)
+        if event.new_chat_member.status in ('member', 'administrator'):
+            broadcaster.descartados.discard(event.chat.id)
+    except Exception as e:
+        logger.error(f"Error al actualizar el estado del bot en el chat {event.chat.id}: {str(e)}")
+
+@dp.chat_member()
+async def handle_chat_member(event: types.ChatMemberUpdated):
+    """Mantiene al día la lista de administradores en caché al promocionar o degradar a alguien"""
+    try:
+        admin_cache.actualizar(event)
+    except Exception as e:
+        logger.error(f"Error al actualizar los administradores del chat {event.chat.id}: {str(e)}")
+
 @dp.message_reaction()
-async def handle_reaction(message: types.MessageReactionUpdated):
+async def handle_reaction(message: types.MessageReactionUpdated, contexto: Optional[RequestContext] = None):
     """Maneja las reacciones a mensajes"""
     try:
         # Si la reacción no es de un administrador, ignorarla
@@ -3767,7 +3630,8 @@ async def handle_reaction(message: types.MessageReactionUpdated):
             user_id=message.user.id,
             username=message.user.username or message.user.first_name,
             interaction_type='reaction',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Si la reacción es de Antmaster, verificar si es aprobación de foto
@@ -3825,7 +3689,7 @@ async def delete_message_later(message: types.Message, delay: int):
         logger.error(f"Error al eliminar mensaje: {str(e)}")
 
 @dp.message(Command("nivel"))
-async def mostrar_nivel(message: types.Message):
+async def mostrar_nivel(message: types.Message, contexto: Optional[RequestContext] = None):
     """Muestra el nivel y experiencia del usuario con información detallada"""
     try:
         # Registrar interacción
@@ -3834,7 +3698,8 @@ async def mostrar_nivel(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='nivel',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Obtener datos del usuario
@@ -4005,7 +3870,7 @@ async def mostrar_nivel(message: types.Message):
             cursor.close()
 
 @dp.message(Command("aplicar_badges"))
-async def aplicar_badges(message: types.Message):
+async def aplicar_badges(message: types.Message, contexto: Optional[RequestContext] = None):
     """Aplica badges automaticamente a todos los usuarios segun su nivel actual"""
     try:
         # Verificar si el usuario es administrador
@@ -4019,15 +3884,16 @@ async def aplicar_badges(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='aplicar_badges',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         wait_message = await message.answer("🔄 Verificando permisos del bot...")
         
         # Verificar que el bot tenga permisos para promocionar administradores
         try:
-            bot_member = await bot.get_chat_member(chat_id=message.chat.id, user_id=bot.id)
-            if not hasattr(bot_member, 'can_promote_members') or not bot_member.can_promote_members:
+            bot_member = await admin_cache.miembro(message.chat.id, bot.id)
+            if not getattr(bot_member, 'can_promote_members', False):
                 await wait_message.edit_text(
                     "❌ <b>Error de Permisos</b>\n\n"
                     "El bot no tiene permisos para promocionar administradores en este grupo.\n\n"
@@ -4071,110 +3937,117 @@ async def aplicar_badges(message: types.Message):
     75: "Señor de las Castas", 
     100: "Emperador Entomólogo"
 }
-        procesados = 0
-        otorgados = 0
-        errores = 0
-        ya_tenian = 0
-        no_elegibles = 0
-        detalles = []
-        
-        for usuario in usuarios:
-            try:
-                nivel = usuario['current_level']
-                username = usuario['username'] or f"Usuario {usuario['user_id']}"
+        # Otorgar los badges en segundo plano
+        async def job_aplicar_badges(job):
+            procesados = 0
+            otorgados = 0
+            errores = 0
+            ya_tenian = 0
+            no_elegibles = 0
+            detalles = []
+        
+            for usuario in usuarios:
+                try:
+                    nivel = usuario['current_level']
+                    username = usuario['username'] or f"Usuario {usuario['user_id']}"
                 
-                # Encontrar el badge más alto que corresponde
-                badge_nivel = None
-                for nivel_req in sorted(badges.keys(), reverse=True):
-                    if nivel >= nivel_req:
-                        badge_nivel = nivel_req
-                        break
+                    # Encontrar el badge más alto que corresponde
+                    badge_nivel = None
+                    for nivel_req in sorted(badges.keys(), reverse=True):
+                        if nivel >= nivel_req:
+                            badge_nivel = nivel_req
+                            break
                 
-                if badge_nivel:
-                    resultado = await rewards_manager.otorgar_badge_automatico(
-                        user_id=usuario['user_id'],
-                        chat_id=message.chat.id,
-                        nivel=badge_nivel,
-                        badge_name=username
-                    )
+                    if badge_nivel:
+                        resultado = await rewards_manager.otorgar_badge_automatico(
+                            user_id=usuario['user_id'],
+                            chat_id=message.chat.id,
+                            nivel=badge_nivel,
+                            badge_name=username
+                        )
                     
-                    if resultado == "otorgado":
-                        otorgados += 1
-                        detalles.append(f"✅ {username}: Badge {badges[badge_nivel]} otorgado")
-                    elif resultado == "ya_tiene":
-                        ya_tenian += 1
-                        detalles.append(f"ℹ️ {username}: Ya tiene el badge correspondiente")
-                    elif resultado == "creador":
-                        no_elegibles += 1
-                        detalles.append(f"👑 {username}: Es el creador del grupo")
-                    elif resultado == "sin_permisos":
-                        errores += 1
-                        detalles.append(f"⚠️ {username}: Bot sin permisos para otorgar badges")
-                    elif resultado == "error_permisos":
-                        errores += 1
-                        detalles.append(f"❌ {username}: Error verificando permisos")
-                    elif resultado == "error_titulo":
-                        errores += 1
-                        detalles.append(f"❌ {username}: Error al establecer título")
-                    elif resultado == "error_promocion":
-                        errores += 1
-                        detalles.append(f"❌ {username}: Error al promover a administrador")
-                    elif resultado == "error_usuario":
-                        errores += 1
-                        detalles.append(f"❌ {username}: Error obteniendo información del usuario")
-                    elif resultado == "nivel_invalido":
+                        if resultado == "otorgado":
+                            otorgados += 1
+                            detalles.append(f"✅ {username}: Badge {badges[badge_nivel]} otorgado")
+                        elif resultado == "ya_tiene":
+                            ya_tenian += 1
+                            detalles.append(f"ℹ️ {username}: Ya tiene el badge correspondiente")
+                        elif resultado == "creador":
+                            no_elegibles += 1
+                            detalles.append(f"👑 {username}: Es el creador del grupo")
+                        elif resultado == "sin_permisos":
+                            errores += 1
+                            detalles.append(f"⚠️ {username}: Bot sin permisos para otorgar badges")
+                        elif resultado == "error_permisos":
+                            errores += 1
+                            detalles.append(f"❌ {username}: Error verificando permisos")
+                        elif resultado == "error_titulo":
+                            errores += 1
+                            detalles.append(f"❌ {username}: Error al establecer título")
+                        elif resultado == "error_promocion":
+                            errores += 1
+                            detalles.append(f"❌ {username}: Error al promover a administrador")
+                        elif resultado == "error_usuario":
+                            errores += 1
+                            detalles.append(f"❌ {username}: Error obteniendo información del usuario")
+                        elif resultado == "nivel_invalido":
+                            no_elegibles += 1
+                            detalles.append(f"⚪ {username}: Nivel no válido para badge")
+                        else:  # error_general u otros errores
+                            errores += 1
+                            detalles.append(f"❌ {username}: Error general al otorgar badge")
+                    else:
                         no_elegibles += 1
-                        detalles.append(f"⚪ {username}: Nivel no válido para badge")
-                    else:  # error_general u otros errores
-                        errores += 1
-                        detalles.append(f"❌ {username}: Error general al otorgar badge")
-                else:
-                    no_elegibles += 1
-                    detalles.append(f"⚪ {username}: Nivel {nivel} (sin badge disponible)")
+                        detalles.append(f"⚪ {username}: Nivel {nivel} (sin badge disponible)")
                 
-                procesados += 1
+                    procesados += 1
+                    await job.progreso(f"🔄 Procesando usuarios... ({procesados}/{len(usuarios)})")
                 
-            except Exception as e:
-                logger.error(f"Error procesando usuario {usuario.get('username', 'desconocido')}: {str(e)}")
-                errores += 1
-                detalles.append(f"❌ {usuario.get('username', 'desconocido')}: Error inesperado")
-                continue
+                except Exception as e:
+                    logger.error(f"Error procesando usuario {usuario.get('username', 'desconocido')}: {str(e)}")
+                    errores += 1
+                    detalles.append(f"❌ {usuario.get('username', 'desconocido')}: Error inesperado")
+                    continue
         
-        # Crear mensaje de resultado detallado
-        mensaje = (
-            f"✅ <b>Proceso Completado</b>\n\n"
-            f"📊 <b>Resumen:</b>\n"
-            f"• Usuarios procesados: {procesados}\n"
-            f"• Badges otorgados: {otorgados}\n"
-            f"• Ya tenían badge: {ya_tenian}\n"
-            f"• Errores: {errores}\n"
-            f"• No elegibles: {no_elegibles}\n\n"
-        )
+            # Crear mensaje de resultado detallado
+            mensaje = (
+                f"✅ <b>Proceso Completado</b>\n\n"
+                f"📊 <b>Resumen:</b>\n"
+                f"• Usuarios procesados: {procesados}\n"
+                f"• Badges otorgados: {otorgados}\n"
+                f"• Ya tenían badge: {ya_tenian}\n"
+                f"• Errores: {errores}\n"
+                f"• No elegibles: {no_elegibles}\n\n"
+            )
         
-        if detalles:
-            mensaje += "📋 <b>Detalles:</b>\n"
-            # Mostrar solo los primeros 15 para no saturar
-            for detalle in detalles[:15]:
-                mensaje += f"{detalle}\n"
+            if detalles:
+                mensaje += "📋 <b>Detalles:</b>\n"
+                # Mostrar solo los primeros 15 para no saturar
+                for detalle in detalles[:15]:
+                    mensaje += f"{detalle}\n"
             
-            if len(detalles) > 15:
-                mensaje += f"... y {len(detalles) - 15} más\n"
+                if len(detalles) > 15:
+                    mensaje += f"... y {len(detalles) - 15} más\n"
             
-            mensaje += "\n"
+                mensaje += "\n"
         
-        mensaje += (
-            f"🎖️ <b>Badges disponibles:</b>\n"
-            f"• Nivel 5: {badges[5]}\n"
-            f"• Nivel 10: {badges[10]}\n"
-            f"• Nivel 25: {badges[25]}\n"
-            f"• Nivel 50: {badges[50]}\n"
-            f"• Nivel 75: {badges[75]}\n"
-            f"• Nivel 100: {badges[100]}\n\n"
-            f"💡 <b>Nota:</b> Los badges se otorgan como títulos de administrador con permisos básicos.\n"
-            f"Si hay errores, verifica que el bot tenga permisos para gestionar administradores."
-        )
+            mensaje += (
+                f"🎖️ <b>Badges disponibles:</b>\n"
+                f"• Nivel 5: {badges[5]}\n"
+                f"• Nivel 10: {badges[10]}\n"
+                f"• Nivel 25: {badges[25]}\n"
+                f"• Nivel 50: {badges[50]}\n"
+                f"• Nivel 75: {badges[75]}\n"
+                f"• Nivel 100: {badges[100]}\n\n"
+                f"💡 <b>Nota:</b> Los badges se otorgan como títulos de administrador con permisos básicos.\n"
+                f"Si hay errores, verifica que el bot tenga permisos para gestionar administradores."
+            )
+        
+            await job.progreso(mensaje, forzar=True, parse_mode=ParseMode.HTML)
+            return f"Otorgados: {otorgados}, ya tenían: {ya_tenian}, errores: {errores}, no elegibles: {no_elegibles}"
         
-        await wait_message.edit_text(mensaje, parse_mode=ParseMode.HTML)
+        await job_manager.lanzar('aplicar_badges', job_aplicar_badges, wait_message, message.from_user.id,
+                                 f"Badges de {len(usuarios)} usuarios", {'chat_id': message.chat.id})
         
     except Exception as e:
         logger.error(f"Error en aplicar_badges: {str(e)}")
@@ -4183,8 +4056,207 @@ async def aplicar_badges(message: types.Message):
         if 'cursor' in locals():
             cursor.close()
 
+@dp.message(Command("jobs"))
+async def listar_jobs(message: types.Message):
+    """Muestra los trabajos en segundo plano activos y los más recientes"""
+    try:
+        if not await is_admin(message.chat.id, message.from_user.id):
+            await message.answer("❌ Solo los administradores pueden ejecutar este comando.")
+            return
+        
+        trabajos = job_manager.listar()
+        if not trabajos:
+            await message.answer("ℹ️ No hay trabajos registrados.")
+            return
+        
+        mensaje = "🛠 <b>Trabajos en segundo plano</b>\n\n"
+        for trabajo in trabajos:
+            icono = ICONOS_ESTADO.get(trabajo['status'], '•')
+            fecha = trabajo['created_at'].strftime('%d/%m %H:%M') if trabajo.get('created_at') else ''
+            mensaje += f"{icono} <b>#{trabajo['id']}</b> {trabajo['job_type']} - {trabajo['status']} ({fecha})\n"
+            detalle = trabajo.get('progress') if trabajo['status'] in ('pendiente', 'en_curso') else trabajo.get('result')
+            if detalle:
+                # Solo la primera línea para no saturar el mensaje
+                primera_linea = escape(detalle.strip().split('\n')[0][:120])
+                mensaje += f"   {primera_linea}\n"
+        mensaje += "\n💡 Usa /cancelar_job [id] para cancelar un trabajo en curso."
+        
+        await message.answer(mensaje, parse_mode=ParseMode.HTML)
+        
+    except Exception as e:
+        logger.error(f"Error al listar trabajos: {str(e)}")
+        await message.answer("❌ Error al obtener los trabajos.")
+
+@dp.message(Command("colas"))
+async def mostrar_colas(message: types.Message):
+    """Muestra la carga del planificador de updates y los chats con más updates en cola"""
+    try:
+        if not await is_admin(message.chat.id, message.from_user.id):
+            await message.answer("❌ Solo los administradores pueden ejecutar este comando.")
+            return
+        
+        metricas = update_scheduler.metricas()
+        mensaje = (f"📥 <b>Colas de updates</b>\n\n"
+                   f"En curso: {metricas['en_curso']}/{metricas['concurrencia']} | "
+                   f"esperando hueco: {metricas['esperando_hueco']} | en cola: {metricas['en_cola']}\n\n")
+        for chat in metricas['chats']:
+            mensaje += (f"• <code>{chat['chat_id']}</code>: {chat['profundidad']} en cola "
+                        f"(máx. {chat['profundidad_max']}), {chat['procesados']} procesados, "
+                        f"espera media {chat['espera_media']:.2f}s, máx. {chat['espera_max']:.2f}s\n")
+        
+        await message.answer(mensaje, parse_mode=ParseMode.HTML)
+        
+    except Exception as e:
+        logger.error(f"Error al mostrar las colas de updates: {str(e)}")
+        await message.answer("❌ Error al obtener el estado de las colas.")
+
+@dp.message(Command("cancelar_job"))
+async def cancelar_job(message: types.Message):
+    """Cancela un trabajo en segundo plano"""
+    try:
+        if not await is_admin(message.chat.id, message.from_user.id):
+            await message.answer("❌ Solo los administradores pueden ejecutar este comando.")
+            return
+        
+        partes = message.text.split()
+        if len(partes) < 2 or not partes[1].lstrip('#').isdigit():
+            await message.answer("Uso: /cancelar_job [id]\nConsulta los ids con /jobs")
+            return
+        
+        job_id = int(partes[1].lstrip('#'))
+        if job_manager.cancelar(job_id):
+            await message.answer(f"🚫 Cancelando el trabajo #{job_id}...")
+        else:
+            await message.answer(f"ℹ️ El trabajo #{job_id} no está en curso.")
+            
+    except Exception as e:
+        logger.error(f"Error al cancelar trabajo: {str(e)}")
+        await message.answer("❌ Error al cancelar el trabajo.")
+
+@dp.message(Command("precalentar_fotos"))
+async def precalentar_fotos(message: types.Message):
+    """Sube a Telegram las fotos de las especies más buscadas para reutilizar su file_id"""
+    try:
+        if not await is_admin(message.chat.id, message.from_user.id):
+            await message.answer("❌ Solo los administradores pueden ejecutar este comando.")
+            return
+        
+        en_curso = job_manager.en_curso('precalentar_fotos')
+        if en_curso:
+            await message.answer(f"⏳ Ya hay un precalentamiento de fotos en curso (trabajo #{en_curso.id}).")
+            return
+        
+        partes = message.text.split()
+        limite = int(partes[1]) if len(partes) > 1 and partes[1].isdigit() else 200
+        chat_destino = int(PHOTO_CACHE_CHAT_ID) if PHOTO_CACHE_CHAT_ID else message.from_user.id
+        wait_message = await message.answer(f"🔄 Subiendo las fotos de las {limite} especies más buscadas...")
+        
+        async def job_precalentar_fotos(job):
+            especies = db.get_popular_species(limite)
+            
+            async def informar(estado):
+                await job.progreso(
+                    f"🔄 Subiendo fotos: {estado['procesadas']}/{estado['total']}\n"
+                    f"📤 Subidas: {estado['subidas']} | 💾 Ya en caché: {estado['en_cache']} | "
+                    f"❌ Errores: {estado['errores']}"
+                )
+            
+            estado = await photo_cache.precalentar(bot, chat_destino, especies, on_progress=informar)
+            mensaje = (
+                f"✅ Fotos precalentadas:\n\n"
+                f"📊 Especies: {estado['total']}\n"
+                f"📤 Subidas: {estado['subidas']}\n"
+                f"💾 Ya en caché: {estado['en_cache']}\n"
+                f"❌ Errores: {estado['errores']}"
+            )
+            await job.progreso(mensaje, forzar=True)
+            return mensaje
+        
+        await job_manager.lanzar('precalentar_fotos', job_precalentar_fotos, wait_message,
+                                 message.from_user.id, f"Fotos de las {limite} especies más buscadas",
+                                 {'limite': limite})
+        
+    except Exception as e:
+        logger.error(f"Error al precalentar fotos: {str(e)}")
+        await message.answer("❌ Error al precalentar las fotos.")
+
+def formatear_cobertura_descripciones(cobertura: Dict) -> str:
+    """Resumen de la cobertura de species_descriptions"""
+    if not cobertura or not cobertura.get('total'):
+        return "📚 Cobertura de descripciones: sin datos"
+    total = cobertura['total']
+    cubiertas = cobertura['vigentes'] + cobertura['por_caducar']
+    mensaje = (
+        f"📚 Cobertura de descripciones: {cubiertas}/{total} ({cubiertas * 100 / total:.1f}%)\n"
+        f"🟢 Vigentes: {cobertura['vigentes']}\n"
+        f"🟡 Por caducar: {cobertura['por_caducar']}\n"
+        f"🔴 Sin descripción o caducadas: {cobertura['sin_descripcion']}"
+    )
+    if cobertura.get('populares'):
+        mensaje += (
+            f"\n🔥 Más buscadas: {cobertura['populares_cubiertas']}/{cobertura['populares']} "
+            f"({cobertura['populares_cubiertas'] * 100 / cobertura['populares']:.1f}%)"
+        )
+    return mensaje
+
+@dp.message(Command("pregenerar_descripciones"))
+async def pregenerar_descripciones(message: types.Message):
+    """Genera o renueva en segundo plano las descripciones, empezando por las especies más buscadas"""
+    try:
+        if not await is_admin(message.chat.id, message.from_user.id):
+            await message.answer("❌ Solo los administradores pueden ejecutar este comando.")
+            return
+        
+        if not description_service.disponible():
+            await message.answer("❌ No hay una clave de OpenAI configurada.")
+            return
+        
+        en_curso = job_manager.en_curso('pregenerar_descripciones')
+        if en_curso:
+            await message.answer(f"⏳ Ya hay una generación de descripciones en curso (trabajo #{en_curso.id}).")
+            return
+        
+        partes = message.text.split()
+        limite = int(partes[1]) if len(partes) > 1 and partes[1].isdigit() else None
+        wait_message = await message.answer("🔄 Buscando especies sin descripción o a punto de caducar...")
+        
+        async def job_pregenerar_descripciones(job):
+            especies = db.get_description_candidates(limite, DESCRIPCION_RENOVAR_DIAS)
+            
+            async def informar(estado):
+                await job.progreso(
+                    f"🔄 Generando descripciones: {estado['procesadas']}/{estado['total']}\n"
+                    f"✨ Generadas: {estado['generadas']} | ♻️ Sin cambios: {estado['sin_cambios']} | "
+                    f"📭 Sin AntWiki: {estado['sin_antwiki']} | "
+                    f"❌ Errores: {estado['errores']}"
+                )
+            
+            estado = await description_service.pregenerar(especies, on_progress=informar)
+            uso = description_service.uso_hoy()
+            mensaje = (
+                f"✅ Descripciones pregeneradas:\n\n"
+                f"📊 Especies pendientes: {estado['total']}\n"
+                f"✨ Generadas: {estado['generadas']}\n"
+                f"♻️ Sin cambios en AntWiki: {estado['sin_cambios']}\n"
+                f"📭 Sin página en AntWiki: {estado['sin_antwiki']}\n"
+                f"❌ Errores: {estado['errores']}\n"
+                f"💰 Uso de hoy: {uso['tokens_entrada'] + uso['tokens_salida']} tokens (${uso['coste']:.2f})\n"
+            )
+            if estado['sin_presupuesto']:
+                mensaje += "⚠️ Detenido para reservar el presupuesto restante a los usuarios.\n"
+            mensaje += "\n" + formatear_cobertura_descripciones(db.get_description_coverage(DESCRIPCION_RENOVAR_DIAS))
+            await job.progreso(mensaje, forzar=True)
+            return mensaje
+        
+        await job_manager.lanzar('pregenerar_descripciones', job_pregenerar_descripciones, wait_message,
+                                 message.from_user.id, "Descripciones de especies", {'limite': limite})
+        
+    except Exception as e:
+        logger.error(f"Error al pregenerar descripciones: {str(e)}")
+        await message.answer("❌ Error al pregenerar las descripciones.")
+
 @dp.message(Command("recompensas"))
-async def mostrar_recompensas(message: types.Message):
+async def mostrar_recompensas(message: types.Message, contexto: Optional[RequestContext] = None):
     """Muestra todas las recompensas disponibles por nivel"""
     try:
         # Registrar interacción
@@ -4193,7 +4265,8 @@ async def mostrar_recompensas(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='recompensas',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Obtener nivel actual del usuario
@@ -4256,7 +4329,7 @@ async def mostrar_recompensas(message: types.Message):
 
 
 @dp.message(Command("mis_codigos"))
-async def mostrar_mis_codigos(message: types.Message):
+async def mostrar_mis_codigos(message: types.Message, contexto: Optional[RequestContext] = None):
     """Muestra todos los códigos de descuento del usuario"""
     try:
         # Registrar interacción
@@ -4265,7 +4338,8 @@ async def mostrar_mis_codigos(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='mis_codigos',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Importar el discount manager
@@ -4333,7 +4407,7 @@ async def mostrar_mis_codigos(message: types.Message):
         await message.answer("❌ Lo siento, hubo un error al obtener tus códigos de descuento.")
 
 @dp.message(Command("validar_codigo"))
-async def validar_codigo_descuento(message: types.Message):
+async def validar_codigo_descuento(message: types.Message, contexto: Optional[RequestContext] = None):
     """Valida un código de descuento"""
     try:
         # Registrar interacción
@@ -4342,7 +4416,8 @@ async def validar_codigo_descuento(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='validar_codigo',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Extraer código del mensaje
@@ -4437,7 +4512,7 @@ async def validar_codigo_descuento(message: types.Message):
         await message.answer("❌ Lo siento, hubo un error al validar el código de descuento.")
 
 @dp.message(Command("crear_codigo_promo"))
-async def crear_codigo_promocional(message: types.Message):
+async def crear_codigo_promocional(message: types.Message, contexto: Optional[RequestContext] = None):
     """Permite a los administradores crear códigos promocionales"""
     try:
         # Verificar si el usuario es administrador
@@ -4451,7 +4526,8 @@ async def crear_codigo_promocional(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='crear_codigo_promo',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Extraer argumentos del comando
@@ -4575,7 +4651,7 @@ except Exception as e:
     translation_manager = None
 
 @dp.message(Command("idioma"))
-async def seleccionar_idioma(message: types.Message):
+async def seleccionar_idioma(message: types.Message, contexto: Optional[RequestContext] = None):
     """Permite al usuario seleccionar su idioma"""
     try:
         # Verificar si el sistema de traducción está disponible
@@ -4594,7 +4670,8 @@ async def seleccionar_idioma(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='idioma',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Mostrar teclado de selección de idioma
@@ -4625,7 +4702,7 @@ async def notify_daily_limit_reached(message: types.Message):
         logger.error(f"Error al notificar límite diario: {str(e)}")
 
 @dp.message()
-async def handle_message(message: types.Message):
+async def handle_message(message: types.Message, contexto: Optional[RequestContext] = None):
     """Maneja los mensajes normales"""
     try:
         # Ignorar mensajes en chats privados
@@ -4638,7 +4715,7 @@ async def handle_message(message: types.Message):
             return
             
         # Verificar si es spam antes de registrar
-        if db.is_spam(message.from_user.id, 'message', message.chat.id):
+        if db.is_spam(message.from_user.id, 'message', message.chat.id, contexto=contexto):
             logger.warning(f"Spam detectado del usuario {message.from_user.username or message.from_user.first_name} en el chat {message.chat.id}")
             # Notificar y aplicar medidas anti-spam
             await notify_spam_detected(message)
@@ -4649,13 +4726,14 @@ async def handle_message(message: types.Message):
             user_id=message.from_user.id,
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='message',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Si es detectado como spam o alcanzó límite, notificar al usuario
         if not result:
             # Verificar si el usuario alcanzó el límite diario
-            if db.reached_daily_xp_limit(message.from_user.id, message.chat.id):
+            if db.reached_daily_xp_limit(message.from_user.id, message.chat.id, contexto=contexto):
                 # Verificar si ya notificamos hoy a este usuario
                 if not hasattr(handle_message, "notified_limit_users"):
                     handle_message.notified_limit_users = {}
@@ -4668,7 +4746,7 @@ async def handle_message(message: types.Message):
                     await notify_daily_limit_reached(message)
                     handle_message.notified_limit_users[user_key] = current_date
             # Verificar si el usuario está cerca del límite diario
-            elif db.is_approaching_daily_limit(message.from_user.id, message.chat.id):
+            elif db.is_approaching_daily_limit(message.from_user.id, message.chat.id, contexto=contexto):
                 await notify_approaching_limit(message)
                 
     except Exception as e:
@@ -4867,14 +4945,14 @@ async def notify_spam_detected(message):
         logger.error(f"Error al notificar spam: {str(e)}")
 
 @dp.message(lambda message: message.video_note is not None)
-async def handle_video_note(message: types.Message):
+async def handle_video_note(message: types.Message, contexto: Optional[RequestContext] = None):
     """Maneja mensajes con notas de video (video circulares)"""
     try:
         # Log para depuración
         logger.info(f"Nota de video recibida del usuario {message.from_user.username or message.from_user.first_name}")
         
         # Verificar si es spam antes de procesar
-        if db.is_spam(message.from_user.id, 'video', message.chat.id):
+        if db.is_spam(message.from_user.id, 'video', message.chat.id, contexto=contexto):
             logger.warning(f"Spam de notas de video detectado del usuario {message.from_user.username or message.from_user.first_name} en el chat {message.chat.id}")
             # Notificar y aplicar medidas anti-spam
             await notify_spam_detected(message)
@@ -4886,7 +4964,8 @@ async def handle_video_note(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='video',
             command_name=None,
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Registrar como video pendiente de aprobación
@@ -4916,7 +4995,7 @@ async def handle_video_note(message: types.Message):
         logger.error(f"Error al registrar interacción de nota de video: {str(e)}")
         
 @dp.message(Command("configurar_dificultad"))
-async def configurar_dificultad(message: types.Message):
+async def configurar_dificultad(message: types.Message, contexto: Optional[RequestContext] = None):
     """Permite a los administradores configurar la dificultad de las especies para el juego"""
     try:
         # Verificar que el usuario sea administrador
@@ -4931,7 +5010,8 @@ async def configurar_dificultad(message: types.Message):
             username=message.from_user.username or message.from_user.first_name,
             interaction_type='command',
             command_name='configurar_dificultad',
-            chat_id=message.chat.id
+            chat_id=message.chat.id,
+            contexto=contexto
         )
         
         # Obtener argumentos del comando
@@ -5029,29 +5109,88 @@ async def handle_language_selection(callback_query: types.CallbackQuery):
     except Exception as e:
         logger.error(f"Error seleccionando idioma: {str(e)}")
         await callback_query.answer("❌ Error al configurar idioma.")
-async def init_session():
-    """Inicializa la sesión HTTP global"""
-    global global_session
-    if global_session is None:
-        global_session = aiohttp.ClientSession()
-    
-    # Establecer el tiempo de inicio del bot para evitar falsos positivos de spam
-    if hasattr(db, 'bot_start_time'):
-        db.bot_start_time = datetime.now()
+
+# Tareas de fondo del proceso; las crea iniciar_servicios y las para detener_servicios
+scheduler = AsyncIOScheduler()
+tarea_diaria = None
+
+async def iniciar_servicios(shard=None, inicial: bool = True):
+    """
+    Prepara los gestores y las tareas programadas del proceso.
+
+    shard=(indice, total, anillo) en el modo multiproceso: este proceso solo atiende (y solo
+    envía hormidatos y mensajes diarios a) los chats que el anillo le asigna, y el límite
+    global de envíos y los límites por host de las fuentes externas se reparten entre los
+    workers. El presupuesto de OpenAI se lleva en la base de datos. Los trabajos en segundo plano se ejecutan
+    todos en WORKER_TRABAJOS. inicial=False en los reinicios de un worker.
+    """
+    global tarea_diaria
+    await init_session()
     
-    # Configurar el bot en el RewardsManager
     rewards_manager.set_bot(bot)
+    job_manager.set_bot(bot)
+    broadcaster.set_bot(bot)
+    admin_cache.set_bot(bot)
+    if shard:
+        indice, total, anillo = shard
+        chat_registry.set_filtro(lambda chat_id: anillo.nodo(chat_id) == indice)
+        broadcaster.ajustar_tasa(broadcaster.global_bucket.tasa / total)
+        limitador_fuentes.repartir(total)
+    # En el modo multiproceso solo el primer worker, al arrancar el bot, reinicia el tiempo de inicio
+    if inicial and (not shard or shard[0] == 0):
+        # Tiempo de inicio para evitar falsos positivos de spam con los mensajes acumulados
+        db.reset_bot_start_time()
+    # Los trabajos solo se ejecutan en WORKER_TRABAJOS: los que siguen activos al (re)lanzarlo son de
+    # una ejecución suya que terminó sin acabarlos
+    if not shard or shard[0] == WORKER_TRABAJOS:
+        interrumpidos = job_manager.marcar_interrumpidos()
+        if interrumpidos:
+            logger.warning(f"{interrumpidos} trabajos quedaron interrumpidos en la ejecución anterior")
+    game_attempts.cargar()
+    game_attempts.iniciar()
+    chat_registry.cargar()
+    chat_registry.iniciar()
     
-    return global_session
+    # Hormidato automático cada 3 horas; el mensaje diario se programa a sí mismo
+    scheduler.add_job(enviar_hormidato_automatico, 'interval', hours=3)
+    scheduler.start()
+    tarea_diaria = asyncio.create_task(enviar_mensaje_diario())
+
+async def detener_servicios():
+    """Para las tareas de fondo y guarda lo pendiente"""
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    if tarea_diaria:
+        tarea_diaria.cancel()
+    await job_manager.detener()
+    await game_attempts.detener()
+    await chat_registry.detener()
+    await description_service.close()
+    await close_session()
+    await inat_client.close_session()
+    await antflights_fetcher.close_session()
 
 async def main():
-    """Función principal del bot"""
+    """Función principal del bot: long polling o webhook según BOT_MODE, en uno o varios procesos"""
+    if BOT_WORKERS > 1:
+        # El supervisor solo recibe y reparte updates; los workers ejecutan los manejadores
+        logger.info(f"Bot iniciado en modo multiproceso ({BOT_WORKERS} workers, modo {BOT_MODE})")
+        try:
+            await ejecutar_supervisor(bot, BOT_WORKERS, dp.resolve_used_update_types())
+        finally:
+            await bot.session.close()
+        return
     try:
-        await init_session()
-        logger.info("Bot iniciado correctamente")
-        await dp.start_polling(bot)
+        await iniciar_servicios()
+        logger.info(f"Bot iniciado correctamente (modo {BOT_MODE})")
+        if BOT_MODE == 'webhook':
+            await ejecutar_webhook(dp, bot)
+        else:
+            # Un webhook registrado impide recibir updates por polling
+            await bot.delete_webhook(drop_pending_updates=False)
+            await dp.start_polling(bot)
     finally:
-        await close_session()
+        await detener_servicios()
 
 if __name__ == '__main__':
     asyncio.run(main())
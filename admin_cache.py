@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Segundos que se reutiliza la lista de administradores de un chat
+ADMINS_TTL = float(os.getenv('ADMINS_TTL', 600))
+# Si get_chat_administrators falla, no se reintenta hasta pasado este tiempo
+ADMINS_TTL_ERROR = 60.0
+
+ESTADOS_ADMIN = ('administrator', 'creator')
+
+
+class AdminCache:
+    """
+    Administradores de cada chat, en memoria.
+
+    La lista completa se pide con get_chat_administrators y se reutiliza durante ADMINS_TTL;
+    los updates chat_member/my_chat_member la mantienen al día entre recargas. Así comprobar
+    si alguien es administrador (incluido el propio bot) es una búsqueda en un dict y las
+    reacciones de usuarios normales se descartan sin llamar a la API.
+    """
+
+    def __init__(self, bot=None, ttl: float = ADMINS_TTL):
+        self.bot = bot
+        self.ttl = ttl
+        # chat_id -> (caduca, {user_id: ChatMember})
+        self.rosters: Dict[int, Tuple[float, Dict[int, object]]] = {}
+        self._cargando: Dict[int, asyncio.Task] = {}
+        self.peticiones = 0
+
+    def set_bot(self, bot):
+        self.bot = bot
+
+    async def _cargar(self, chat_id: int) -> Dict[int, object]:
+        try:
+            self.peticiones += 1
+            admins = await self.bot.get_chat_administrators(chat_id)
+            roster = {member.user.id: member for member in admins}
+            self.rosters[chat_id] = (time.monotonic() + self.ttl, roster)
+        except Exception as e:
+            logger.error(f"Error al obtener los administradores del chat {chat_id}: {str(e)}")
+            roster = {}
+            self.rosters[chat_id] = (time.monotonic() + ADMINS_TTL_ERROR, roster)
+        finally:
+            self._cargando.pop(chat_id, None)
+        return roster
+
+    async def roster(self, chat_id: int) -> Dict[int, object]:
+        """{user_id: ChatMember} de los administradores del chat (vacío en chats privados)"""
+        if chat_id > 0:
+            return {}
+        entrada = self.rosters.get(chat_id)
+        if entrada and entrada[0] > time.monotonic():
+            return entrada[1]
+        # Varias comprobaciones a la vez en el mismo chat comparten una única petición
+        tarea = self._cargando.get(chat_id)
+        if tarea is None:
+            tarea = asyncio.create_task(self._cargar(chat_id))
+            self._cargando[chat_id] = tarea
+        return await asyncio.shield(tarea)
+
+    async def miembro(self, chat_id: int, user_id: int):
+        """ChatMember del usuario si es administrador del chat, si no None"""
+        return (await self.roster(chat_id)).get(user_id)
+
+    async def es_admin(self, chat_id: int, user_id: int) -> bool:
+        return await self.miembro(chat_id, user_id) is not None
+
+    def actualizar(self, event) -> None:
+        """Aplica un update chat_member/my_chat_member a la lista en memoria del chat"""
+        entrada = self.rosters.get(event.chat.id)
+        if not entrada:
+            return
+        miembro = event.new_chat_member
+        if miembro.status in ESTADOS_ADMIN:
+            entrada[1][miembro.user.id] = miembro
+        else:
+            entrada[1].pop(miembro.user.id, None)
+
+    def anotar_titulo(self, chat_id: int, user_id: int, titulo: str) -> None:
+        """Refleja en la caché el título personalizado que acaba de poner el bot"""
+        entrada = self.rosters.get(chat_id)
+        if entrada and user_id in entrada[1]:
+            entrada[1][user_id] = entrada[1][user_id].model_copy(update={'custom_title': titulo})
+
+    def invalidar(self, chat_id: int) -> None:
+        """Fuerza a recargar la lista en la próxima comprobación (p. ej. tras promocionar a alguien)"""
+        self.rosters.pop(chat_id, None)
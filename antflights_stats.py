@@ -0,0 +1,209 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from bs4 import BeautifulSoup, SoupStrainer
+
+from html_extractor import PARSER_HTML, extraer_en_executor
+from rate_limiter import limitador_fuentes
+
+logger = logging.getLogger(__name__)
+
+ANTFLIGHTS_API = 'https://antflights.com'
+CACHE_TTL = 6 * 3600
+
+# Tipo de estadística -> (anclas del gráfico en la página, clave del valor en cada punto)
+SERIES = {
+    'month': (('byMonth',), 'month'),
+    'hour': (('byHours', 'byHour'), 'hour'),
+    'temperature': (('byTemperatureC', 'byTemperature'), 'temperature'),
+    'moon': (('byMoon',), 'phase'),
+}
+
+# Nombres de dataset que identifican un hemisferio; cualquier otro título se guarda como 'World'
+HEMISFERIOS = {
+    'north': 'North', 'northern': 'North', 'northern hemisphere': 'North',
+    'south': 'South', 'southern': 'South', 'southern hemisphere': 'South',
+    'world': 'World', 'all': 'World',
+}
+
+FILTRO_SCRIPTS = SoupStrainer('script')
+RE_DATA = re.compile(r'\bdata\s*:\s*\[')
+RE_LABELS = re.compile(r'\blabels\s*:\s*\[')
+RE_LABEL = re.compile(r'\blabel\s*:\s*["\']([^"\']+)["\']')
+RE_NUMERO = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+def _extraer_array(texto: str, inicio: int) -> Tuple[Optional[list], int]:
+    """Extrae el array JavaScript que empieza en texto[inicio] respetando anidamiento y cadenas"""
+    nivel = 0
+    comilla = None
+    for i in range(inicio, len(texto)):
+        c = texto[i]
+        if comilla:
+            if c == comilla and texto[i - 1] != '\\':
+                comilla = None
+        elif c in '"\'':
+            comilla = c
+        elif c == '[':
+            nivel += 1
+        elif c == ']':
+            nivel -= 1
+            if nivel == 0:
+                bruto = texto[inicio:i + 1]
+                for candidato in (bruto, re.sub(r',\s*([\]}])', r'\1', bruto.replace("'", '"'))):
+                    try:
+                        return json.loads(candidato), i + 1
+                    except json.JSONDecodeError:
+                        continue
+                return None, i + 1
+    return None, len(texto)
+
+
+def _numero(valor) -> Optional[float]:
+    if isinstance(valor, (int, float)):
+        return valor
+    encontrado = RE_NUMERO.search(str(valor))
+    return float(encontrado.group()) if encontrado else None
+
+
+def _normalizar_serie(tipo: str, labels: Optional[list], datos: list, hemisferio: str) -> List[Dict]:
+    """Convierte los datos de un gráfico en la lista de puntos que guarda la base de datos"""
+    clave = SERIES[tipo][1]
+    # Si la página ya trae objetos con sus claves se usan tal cual
+    if datos and all(isinstance(d, dict) for d in datos):
+        return datos
+
+    puntos = []
+    for i, valor in enumerate(datos):
+        count = valor.get('y', 0) if isinstance(valor, dict) else valor
+        label = labels[i] if labels and i < len(labels) else None
+        if tipo == 'month':
+            x = i + 1
+        elif tipo == 'hour':
+            x = int(_numero(label)) if label is not None and _numero(label) is not None else i
+        elif tipo == 'temperature':
+            x = _numero(label) if label is not None else None
+        else:
+            x = label if label is not None else i
+        if x is None:
+            continue
+        punto = {clave: x, 'count': int(count or 0)}
+        if tipo == 'month':
+            punto['hemisphere'] = hemisferio
+        puntos.append(punto)
+    return puntos
+
+
+def _hemisferio(label: str) -> str:
+    return HEMISFERIOS.get(' '.join(label.split()).lower(), 'World')
+
+
+def _series_en_bloque(tipo: str, bloque: str) -> List[Dict]:
+    """Extrae todos los datasets de un bloque de script correspondiente a un gráfico"""
+    labels = None
+    m = RE_LABELS.search(bloque)
+    if m:
+        labels, _ = _extraer_array(bloque, m.end() - 1)
+
+    puntos = []
+    for m in RE_DATA.finditer(bloque):
+        datos, _ = _extraer_array(bloque, m.end() - 1)
+        if not isinstance(datos, list):
+            continue
+        # El nombre del dataset (p. ej. hemisferio) suele ir justo antes de sus datos
+        previo = RE_LABEL.findall(bloque[max(0, m.start() - 200):m.start()])
+        hemisferio = _hemisferio(previo[-1]) if previo and tipo == 'month' else 'World'
+        puntos.extend(_normalizar_serie(tipo, labels, datos, hemisferio))
+    return puntos
+
+
+def extraer_estadisticas(html: str) -> Dict[str, List[Dict]]:
+    """
+    Extrae de una sola pasada los gráficos de mes, hora, temperatura y fase lunar
+    de la página de estadísticas de un género.
+    """
+    soup = BeautifulSoup(html, PARSER_HTML, parse_only=FILTRO_SCRIPTS)
+    texto = '\n'.join(script.string or '' for script in soup.find_all('script'))
+
+    # Localizar el inicio de cada gráfico por su ancla
+    posiciones = []
+    for tipo, (anclas, _) in SERIES.items():
+        for ancla in anclas:
+            pos = texto.find(ancla)
+            if pos != -1:
+                posiciones.append((pos, tipo))
+                break
+    posiciones.sort()
+
+    stats = {}
+    if posiciones:
+        for n, (pos, tipo) in enumerate(posiciones):
+            fin = posiciones[n + 1][0] if n + 1 < len(posiciones) else len(texto)
+            puntos = _series_en_bloque(tipo, texto[pos:fin])
+            if puntos:
+                stats[tipo] = puntos
+    else:
+        # Sin anclas: los gráficos aparecen en el orden de las pestañas de la página
+        bloques = [m.start() for m in RE_DATA.finditer(texto)]
+        for tipo, inicio in zip(SERIES, bloques):
+            datos, _ = _extraer_array(texto, texto.index('[', inicio))
+            if isinstance(datos, list):
+                stats[tipo] = _normalizar_serie(tipo, None, datos, 'World')
+    return stats
+
+
+class AntFlightsStatsFetcher:
+    """Descarga la página de estadísticas de cada género una vez y cachea el resultado con TTL"""
+
+    def __init__(self, ttl: int = CACHE_TTL, timeout: int = 30):
+        self.ttl = ttl
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session = None
+        self.cache: Dict[str, Tuple[float, Dict]] = {}
+        self._en_curso: Dict[str, asyncio.Task] = {}
+
+    async def init_session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=self.timeout)
+        return self.session
+
+    async def close_session(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    async def _descargar(self, genus: str) -> Optional[Dict]:
+        session = await self.init_session()
+        url = f"{ANTFLIGHTS_API}/stats/flights/{genus}"
+        async with limitador_fuentes.get(session, url) as response:
+            if response.status != 200:
+                logger.warning(f"AntFlights respondió {response.status} para {genus}")
+                return None
+            html = await response.text()
+        stats = await extraer_en_executor(extraer_estadisticas, html)
+        self.cache[genus.lower()] = (time.monotonic(), stats)
+        return stats
+
+    async def obtener(self, genus: str) -> Optional[Dict]:
+        """Estadísticas del género; peticiones simultáneas del mismo género comparten descarga"""
+        clave = genus.lower()
+        en_cache = self.cache.get(clave)
+        if en_cache and time.monotonic() - en_cache[0] < self.ttl:
+            return en_cache[1]
+
+        tarea = self._en_curso.get(clave)
+        if tarea is None:
+            tarea = asyncio.ensure_future(self._descargar(genus))
+            self._en_curso[clave] = tarea
+            tarea.add_done_callback(lambda _: self._en_curso.pop(clave, None))
+        return await asyncio.shield(tarea)
+
+    def invalidar(self, genus: Optional[str] = None):
+        if genus:
+            self.cache.pop(genus.lower(), None)
+        else:
+            self.cache.clear()
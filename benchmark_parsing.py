@@ -0,0 +1,198 @@
+"""
+Benchmark del parseo de páginas de AntWiki y AntOnTop.
+
+Compara el método anterior (árbol completo con html.parser y recorrido de hermanos por
+cada encabezado) con la capa de extracción de html_extractor (SoupStrainer + lxml).
+
+Uso:
+    python benchmark_parsing.py                          # usa las páginas de benchmark_pages/
+    python benchmark_parsing.py --descargar Messor_barbarus Lasius_niger
+    python benchmark_parsing.py --repeticiones 20
+
+Si no hay páginas guardadas se generan páginas sintéticas con una estructura similar.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import requests
+from bs4 import BeautifulSoup
+
+from html_extractor import PARSER_HTML, extraer_antwiki, extraer_antontop
+
+DIRECTORIO_PAGINAS = 'benchmark_pages'
+
+
+def parseo_antwiki_anterior(html):
+    """Reproduce la extracción que hacía generar_descripcion_especie antes del cambio"""
+    soup = BeautifulSoup(html, 'html.parser')
+    content = soup.find('div', id='mw-content-text')
+    info = {'infobox': [], 'secciones': {}}
+    if not content:
+        return info
+    infobox = soup.find('table', class_='infobox')
+    if infobox:
+        for row in infobox.find_all('tr'):
+            header = row.find('th')
+            value = row.find('td')
+            if header and value:
+                info['infobox'].append((header.get_text().strip().lower(), value.get_text().strip()))
+    for section in content.find_all(['h2', 'h3']):
+        section_title = section.get_text().strip().lower()
+        next_elem = section.find_next_sibling()
+        while next_elem and next_elem.name not in ['h2', 'h3']:
+            if next_elem.name == 'p':
+                text = next_elem.get_text().strip()
+                if text:
+                    info['secciones'].setdefault(section_title, []).append(text)
+            next_elem = next_elem.find_next_sibling()
+    gallery = soup.find('div', class_='gallery')
+    if gallery and gallery.find('img'):
+        info['galeria'] = gallery.find('img').get('src')
+    return info
+
+
+def parseo_antontop_anterior(html):
+    """Reproduce la extracción que hacía buscar_info_antontop antes del cambio"""
+    soup = BeautifulSoup(html, 'html.parser')
+    info = {}
+    main_image = soup.find('img', {'class': 'wp-post-image'})
+    if main_image:
+        info['photo_url'] = main_image.get('src')
+    short_desc_div = soup.find('div', {'class': 'woocommerce-product-details__short-description'})
+    if short_desc_div and short_desc_div.find('p'):
+        info['short_description'] = short_desc_div.find('p').get_text().strip()
+    description_section = soup.find('div', {'class': 'woocommerce-Tabs-panel--description'})
+    if description_section:
+        info['description'] = description_section.get_text().strip()
+    product_details = soup.find('h4', string='Detalles de producto') or soup.find('h4', string='Product details')
+    if product_details and product_details.find_next('table'):
+        info['detalles'] = [
+            [td.get_text().strip() for td in row.find_all('td')]
+            for row in product_details.find_next('table').find_all('tr')
+        ]
+    return info
+
+
+def _relleno(n):
+    """Navegación, menús y scripts que ocupan la mayor parte de una página real"""
+    bloques = []
+    for i in range(n):
+        bloques.append(
+            f'<div class="nav-item"><a href="/wiki/Page_{i}">Enlace {i}</a>'
+            f'<ul>' + ''.join(f'<li><a href="/x/{i}/{j}">item {j}</a></li>' for j in range(10)) + '</ul></div>'
+        )
+    return ''.join(bloques)
+
+
+def pagina_antwiki_sintetica(secciones=40):
+    cuerpo = []
+    for i in range(secciones):
+        titulo = ['Description', 'Distribution', 'Habitat', 'Behavior', 'Biology'][i % 5]
+        cuerpo.append(f'<h2><span class="mw-headline">{titulo} {i}</span></h2>')
+        cuerpo.extend('<p>' + f'Texto de ejemplo de la sección {i}, párrafo {j}. ' * 5 + '</p>' for j in range(6))
+        cuerpo.append('<ul>' + ''.join(f'<li>referencia {j}</li>' for j in range(15)) + '</ul>')
+    infobox = '<table class="infobox">' + ''.join(
+        f'<tr><th>Campo {i}</th><td>Valor {i}</td></tr>' for i in range(25)
+    ) + '</table>'
+    galeria = '<div class="gallery"><img src="/images/foto.jpg"/></div>'
+    return (
+        '<html><head>' + '<script>var x = 1;</script>' * 50 + '</head><body>'
+        + f'<div id="mw-navigation">{_relleno(300)}</div>'
+        + f'<div id="mw-content-text"><div class="mw-parser-output">{infobox}{galeria}{"".join(cuerpo)}</div></div>'
+        + f'<div id="footer">{_relleno(100)}</div></body></html>'
+    )
+
+
+def pagina_antontop_sintetica():
+    productos = ''.join(
+        f'<div class="product"><img src="/p{i}.jpg"/><h2>Producto {i}</h2><span class="price">{i} €</span></div>'
+        for i in range(200)
+    )
+    detalles = '<h4>Detalles de producto</h4><table>' + ''.join(
+        f'<tr><td>Campo {i}</td><td>Valor {i}</td></tr>' for i in range(10)
+    ) + '</table>'
+    return (
+        f'<html><body><header>{_relleno(200)}</header>'
+        '<img class="attachment wp-post-image" src="https://antontop.com/foto.jpg"/>'
+        '<div class="woocommerce-product-details__short-description"><p>Descripción corta.</p></div>'
+        '<div class="woocommerce-Tabs-panel woocommerce-Tabs-panel--description">'
+        + '<p>Descripción larga del producto. </p>' * 60 + detalles + '</div>'
+        + f'<section class="related">{productos}</section><footer>{_relleno(100)}</footer></body></html>'
+    )
+
+
+def descargar_paginas(nombres):
+    os.makedirs(DIRECTORIO_PAGINAS, exist_ok=True)
+    for nombre in nombres:
+        url = f"https://www.antwiki.org/wiki/{nombre}"
+        response = requests.get(url, timeout=30)
+        if response.status_code == 200:
+            ruta = os.path.join(DIRECTORIO_PAGINAS, f"antwiki_{nombre}.html")
+            with open(ruta, 'w', encoding='utf-8') as f:
+                f.write(response.text)
+            print(f"✅ Guardada {ruta} ({len(response.text) // 1024} KB)")
+        else:
+            print(f"❌ {url}: {response.status_code}")
+
+
+def cargar_paginas():
+    paginas = []
+    if os.path.isdir(DIRECTORIO_PAGINAS):
+        for fichero in sorted(os.listdir(DIRECTORIO_PAGINAS)):
+            if not fichero.endswith('.html'):
+                continue
+            with open(os.path.join(DIRECTORIO_PAGINAS, fichero), encoding='utf-8') as f:
+                tipo = 'antontop' if fichero.startswith('antontop') else 'antwiki'
+                paginas.append((fichero, tipo, f.read()))
+    if not paginas:
+        print("ℹ️ No hay páginas guardadas, se usan páginas sintéticas")
+        paginas = [
+            ('antwiki_sintetica.html', 'antwiki', pagina_antwiki_sintetica()),
+            ('antontop_sintetica.html', 'antontop', pagina_antontop_sintetica()),
+        ]
+    return paginas
+
+
+def medir(funcion, html, repeticiones):
+    """Devuelve el tiempo medio en ms y el pico de memoria en KB de una función de parseo"""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion(html)
+    tiempo_ms = (time.perf_counter() - inicio) * 1000 / repeticiones
+
+    tracemalloc.start()
+    funcion(html)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tiempo_ms, pico / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de parseo de AntWiki/AntOnTop")
+    parser.add_argument('--descargar', nargs='*', help="Páginas de AntWiki a guardar (p. ej. Messor_barbarus)")
+    parser.add_argument('--repeticiones', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.descargar:
+        descargar_paginas(args.descargar)
+
+    funciones = {
+        'antwiki': (parseo_antwiki_anterior, extraer_antwiki),
+        'antontop': (parseo_antontop_anterior, extraer_antontop),
+    }
+
+    print(f"\nParser nuevo: {PARSER_HTML} + SoupStrainer | repeticiones: {args.repeticiones}\n")
+    print(f"{'Página':<32} {'KB':>6} {'antes ms':>10} {'ahora ms':>10} {'antes KB':>10} {'ahora KB':>10} {'x':>6}")
+    for nombre, tipo, html in cargar_paginas():
+        anterior, nueva = funciones[tipo]
+        t_antes, m_antes = medir(anterior, html, args.repeticiones)
+        t_ahora, m_ahora = medir(nueva, html, args.repeticiones)
+        print(f"{nombre[:32]:<32} {len(html) // 1024:>6} {t_antes:>10.1f} {t_ahora:>10.1f} "
+              f"{m_antes:>10.0f} {m_ahora:>10.0f} {t_antes / t_ahora:>6.1f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
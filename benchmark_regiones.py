@@ -0,0 +1,238 @@
+"""
+Benchmark de la actualización de regiones.
+
+Compara el método anterior (descargas de AntWiki una a una con requests, diccionario de
+regiones recorrido para cada especie y un UPDATE + commit por especie) con RegionUpdater
+(descargas concurrentes, expresión regular precompilada y UPDATE por lotes).
+
+Para que el resultado sea reproducible no se usa la red ni MySQL: un servidor local simula
+AntWiki e iNaturalist con una latencia fija y una base de datos en memoria simula el coste
+de cada viaje a MySQL.
+
+Uso:
+    python benchmark_regiones.py
+    python benchmark_regiones.py --especies 500 --latencia-http 80 --latencia-db 2
+"""
+import argparse
+import asyncio
+import random
+import sys
+import threading
+import time
+
+import requests
+from aiohttp import web
+
+from inaturalist_client import INaturalistClient, MAX_IDS_POR_PETICION
+from rate_limiter import SourceRateLimiter
+from region_updater import REGION_A_CONTINENTE, RegionUpdater, extraer_region_antwiki, matcher_regiones
+
+LUGARES = [
+    'Spain', 'France', 'Morocco', 'southern Italy', 'Greece', 'Portugal', 'Kenya', 'South Africa',
+    'Japan', 'China', 'India', 'Southeast Asia', 'Brazil', 'Argentina', 'Peru', 'Mexico',
+    'United States', 'Canada', 'Australia', 'New Zealand', 'Madagascar', 'Borneo',
+]
+
+
+def generar_fixture(n, semilla=42):
+    """Especies de prueba: el 60% tiene distribución en AntWiki y el resto solo en iNaturalist"""
+    rnd = random.Random(semilla)
+    especies, paginas, taxones = [], {}, {}
+    for i in range(n):
+        nombre = f"Genus{i % 40} species{i}"
+        lugares = rnd.sample(LUGARES, rnd.randint(1, 4))
+        en_antwiki = rnd.random() < 0.6
+        slug = nombre.replace(' ', '_')
+        relleno = '<p>Lorem ipsum dolor sit amet.</p>' * 50
+        if en_antwiki:
+            paginas[slug] = f"<html><body>{relleno}<p>Distribution: {', '.join(lugares)}. More text</p></body></html>"
+        else:
+            paginas[slug] = f"<html><body>{relleno}</body></html>"
+        taxones[str(1000 + i)] = {
+            'id': 1000 + i, 'name': nombre, 'establishment_means': 'native',
+            'native_places': [{'name': lugar} for lugar in lugares],
+        }
+        especies.append({'id': i + 1, 'scientific_name': nombre, 'slug': slug, 'inaturalist_id': str(1000 + i)})
+    return especies, paginas, taxones
+
+
+class ServidorFalso:
+    """AntWiki e iNaturalist simulados en un hilo aparte con latencia fija"""
+
+    def __init__(self, paginas, taxones, latencia):
+        self.paginas = paginas
+        self.taxones = taxones
+        self.latencia = latencia
+        self.peticiones = 0
+        self.url = None
+        self._listo = threading.Event()
+
+    async def _wiki(self, request):
+        self.peticiones += 1
+        await asyncio.sleep(self.latencia)
+        pagina = self.paginas.get(request.match_info['slug'])
+        if pagina is None:
+            return web.Response(status=404)
+        return web.Response(text=pagina, content_type='text/html')
+
+    async def _taxa(self, request):
+        self.peticiones += 1
+        await asyncio.sleep(self.latencia)
+        ids = request.match_info['ids'].split(',')
+        return web.json_response({'results': [self.taxones[i] for i in ids if i in self.taxones]})
+
+    def _ejecutar(self):
+        loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_get('/wiki/{slug}', self._wiki)
+        app.router.add_get('/v1/taxa/{ids}', self._taxa)
+        runner = web.AppRunner(app)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        loop.run_until_complete(site.start())
+        puerto = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{puerto}"
+        self._listo.set()
+        loop.run_forever()
+
+    def iniciar(self):
+        threading.Thread(target=self._ejecutar, daemon=True).start()
+        self._listo.wait()
+        return self
+
+
+class BaseDatosFalsa:
+    """Guarda las regiones en memoria y simula la latencia de cada viaje a MySQL"""
+
+    def __init__(self, latencia):
+        self.latencia = latencia
+        self.regiones = {}
+        self.viajes = 0
+
+    def _viaje(self):
+        self.viajes += 1
+        time.sleep(self.latencia)
+
+    def actualizar_una(self, species_id, region):
+        self._viaje()  # UPDATE
+        self._viaje()  # COMMIT
+        self.regiones[species_id] = region
+
+    def update_regions_batch(self, regiones):
+        self._viaje()  # UPDATE ... CASE
+        self._viaje()  # COMMIT
+        self.regiones.update(regiones)
+        return len(regiones)
+
+
+def actualizar_anterior(especies, db, base_url):
+    """Reproduce update_all_regions antes del cambio"""
+    raw_regions = {}
+    for especie in especies:
+        response = requests.get(especie['antwiki_url'], timeout=10)
+        if response.status_code == 200:
+            html_content = response.text
+            for marker in ["Distribution:", "Geographic Range:", "Native range:"]:
+                if marker in html_content:
+                    start_idx = html_content.find(marker) + len(marker)
+                    end_idx = html_content.find(".", start_idx)
+                    if end_idx > start_idx:
+                        raw_regions[especie['id']] = html_content[start_idx:end_idx].strip()
+                        break
+
+    ids = [e['inaturalist_id'] for e in especies if not raw_regions.get(e['id'])]
+    taxones = {}
+    for i in range(0, len(ids), MAX_IDS_POR_PETICION):
+        response = requests.get(f"{base_url}/v1/taxa/{','.join(ids[i:i + MAX_IDS_POR_PETICION])}", timeout=10)
+        for result in response.json().get('results', []):
+            taxones[str(result['id'])] = result
+
+    for especie in especies:
+        raw_region = raw_regions.get(especie['id'])
+        if not raw_region:
+            inat_data = taxones.get(especie['inaturalist_id'])
+            if inat_data and inat_data.get('establishment_means') == 'native':
+                raw_region = ", ".join(p['name'] for p in inat_data.get('native_places') or [])
+        continents = set()
+        if raw_region:
+            raw_region = raw_region.lower()
+            for region, continent in REGION_A_CONTINENTE.items():
+                if region in raw_region:
+                    continents.add(continent)
+        db.actualizar_una(especie['id'], ", ".join(sorted(continents)) if continents else "Desconocido")
+
+
+async def actualizar_nuevo(especies, db, base_url, concurrencia, batch_size):
+    # Sin límite de ritmo para el host local: se mide el pipeline, no el limitador
+    limitador = SourceRateLimiter(limites={'127.0.0.1': (100000.0, 100000)})
+    inat = INaturalistClient(base_url=f"{base_url}/v1", limitador=limitador)
+    updater = RegionUpdater(db, inat, concurrencia=concurrencia, batch_size=batch_size, limitador=limitador)
+    try:
+        return await updater.actualizar(especies)
+    finally:
+        await inat.close_session()
+
+
+def medir_matcher(textos, repeticiones=20):
+    """Tiempo en ms de normalizar todos los textos con el diccionario y con el patrón compilado"""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for texto in textos:
+            texto = texto.lower()
+            {c for r, c in REGION_A_CONTINENTE.items() if r in texto}
+    antes = (time.perf_counter() - inicio) * 1000 / repeticiones
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for texto in textos:
+            matcher_regiones.continentes(texto)
+    ahora = (time.perf_counter() - inicio) * 1000 / repeticiones
+    return antes, ahora
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la actualización de regiones")
+    parser.add_argument('--especies', type=int, default=300)
+    parser.add_argument('--latencia-http', type=float, default=50, help="ms por petición HTTP")
+    parser.add_argument('--latencia-db', type=float, default=1, help="ms por viaje a la base de datos")
+    parser.add_argument('--concurrencia', type=int, default=8)
+    parser.add_argument('--lote', type=int, default=200)
+    args = parser.parse_args()
+
+    especies, paginas, taxones = generar_fixture(args.especies)
+    servidor = ServidorFalso(paginas, taxones, args.latencia_http / 1000).iniciar()
+    for especie in especies:
+        especie['antwiki_url'] = f"{servidor.url}/wiki/{especie.pop('slug')}"
+
+    print(f"\n{args.especies} especies | HTTP {args.latencia_http:.0f} ms | DB {args.latencia_db:.1f} ms/viaje\n")
+
+    db_antes = BaseDatosFalsa(args.latencia_db / 1000)
+    servidor.peticiones = 0
+    inicio = time.perf_counter()
+    actualizar_anterior(especies, db_antes, servidor.url)
+    t_antes = time.perf_counter() - inicio
+    peticiones_antes = servidor.peticiones
+
+    db_ahora = BaseDatosFalsa(args.latencia_db / 1000)
+    servidor.peticiones = 0
+    inicio = time.perf_counter()
+    asyncio.run(actualizar_nuevo(especies, db_ahora, servidor.url, args.concurrencia, args.lote))
+    t_ahora = time.perf_counter() - inicio
+    peticiones_ahora = servidor.peticiones
+
+    print(f"{'':<12} {'segundos':>10} {'peticiones':>12} {'viajes DB':>10}")
+    print(f"{'antes':<12} {t_antes:>10.2f} {peticiones_antes:>12} {db_antes.viajes:>10}")
+    print(f"{'ahora':<12} {t_ahora:>10.2f} {peticiones_ahora:>12} {db_ahora.viajes:>10}")
+    print(f"\nMejora: x{t_antes / t_ahora:.1f}")
+
+    distintas = [i for i in db_antes.regiones if db_antes.regiones[i] != db_ahora.regiones.get(i)]
+    print(f"Regiones idénticas: {'sí' if not distintas else f'no ({len(distintas)} distintas)'}")
+
+    textos = [extraer_region_antwiki(p) or '' for p in paginas.values()] * 10
+    antes, ahora = medir_matcher(textos)
+    print(f"\nNormalización de {len(textos)} textos: {antes:.1f} ms -> {ahora:.1f} ms")
+    return 0 if not distintas else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Prueba de carga de la recepción de updates: long polling frente a webhook.
+
+Un servidor local imita la Bot API de Telegram (getUpdates, sendMessage, setWebhook...)
+con una latencia fija por llamada. Se procesan N updates de mensaje con un manejador que
+simula trabajo y responde con sendMessage, y se mide el tiempo hasta la última respuesta:
+
+- polling: el Dispatcher pide los updates al servidor falso con getUpdates.
+- webhook: los updates se envían por POST a la aplicación de webhook_server.crear_app,
+  como haría Telegram, con el secret token en la cabecera (se comprueba también que una
+  petición sin el secreto se rechaza) y al final se drenan los updates en curso.
+
+No se usa la red ni el token real del bot.
+
+Uso:
+    python benchmark_webhook.py
+    python benchmark_webhook.py --updates 5000 --trabajo 50 --latencia-api 20 --concurrencia 100
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot, Dispatcher, types
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from webhook_server import crear_app
+
+TOKEN = '123456:PRUEBA-carga-local'
+SECRETO = 'secreto-de-prueba'
+CHATS = 50
+
+
+def generar_update(i: int) -> dict:
+    chat_id = -1000 - (i % CHATS)
+    return {
+        'update_id': i + 1,
+        'message': {
+            'message_id': i + 1,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'supergroup', 'title': f"Grupo {i % CHATS}"},
+            'from': {'id': 1 + i % 200, 'is_bot': False, 'first_name': 'Usuario'},
+            'text': f"mensaje {i}",
+        },
+    }
+
+
+class TelegramFalso:
+    """Bot API mínima: sirve los updates por getUpdates y cuenta los sendMessage"""
+
+    def __init__(self, updates, latencia: float):
+        self.updates = updates
+        self.latencia = latencia
+        self.enviados = 0
+        self.webhook = None
+
+    @staticmethod
+    def _ok(resultado):
+        return web.json_response({'ok': True, 'result': resultado})
+
+    async def metodo(self, request):
+        metodo = request.match_info['metodo']
+        datos = await request.post()
+        await asyncio.sleep(self.latencia)
+        if metodo == 'getMe':
+            return self._ok({'id': 123456, 'is_bot': True, 'first_name': 'Prueba', 'username': 'prueba_bot'})
+        if metodo == 'getUpdates':
+            offset = int(datos.get('offset') or 0)
+            limite = int(datos.get('limit') or 100)
+            pendientes = [u for u in self.updates if u['update_id'] >= offset][:limite]
+            if not pendientes:
+                # Long polling: se espera un poco antes de responder vacío
+                await asyncio.sleep(0.2)
+            return self._ok(pendientes)
+        if metodo == 'sendMessage':
+            self.enviados += 1
+            return self._ok({
+                'message_id': self.enviados,
+                'date': int(time.time()),
+                'chat': {'id': int(datos['chat_id']), 'type': 'supergroup'},
+                'text': datos.get('text', ''),
+            })
+        if metodo == 'setWebhook':
+            self.webhook = datos.get('url')
+            return self._ok(True)
+        if metodo in ('deleteWebhook', 'close', 'logOut'):
+            return self._ok(True)
+        return web.json_response({'ok': False, 'error_code': 404, 'description': 'Not Found'}, status=404)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{metodo}', self.metodo)
+        return app
+
+
+def crear_dispatcher(trabajo: float, total: int):
+    """Dispatcher con un manejador que simula trabajo y contesta; `listo` se activa al terminar"""
+    dp = Dispatcher()
+    estado = {'procesados': 0, 'listo': asyncio.Event()}
+
+    @dp.message()
+    async def responder(message: types.Message):
+        await asyncio.sleep(trabajo)
+        await message.answer("ok")
+        estado['procesados'] += 1
+        if estado['procesados'] >= total:
+            estado['listo'].set()
+
+    return dp, estado
+
+
+def crear_bot(puerto_api: int) -> Bot:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{puerto_api}"))
+    return Bot(token=TOKEN, session=session)
+
+
+async def probar_polling(puerto_api: int, total: int, trabajo: float) -> float:
+    dp, estado = crear_dispatcher(trabajo, total)
+    bot = crear_bot(puerto_api)
+    inicio = time.perf_counter()
+    tarea = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+    await estado['listo'].wait()
+    transcurrido = time.perf_counter() - inicio
+    await dp.stop_polling()
+    await asyncio.gather(tarea, return_exceptions=True)
+    await bot.session.close()
+    return transcurrido
+
+
+async def probar_webhook(puerto_api: int, puerto_webhook: int, updates, trabajo: float, concurrencia: int):
+    dp, estado = crear_dispatcher(trabajo, len(updates))
+    bot = crear_bot(puerto_api)
+    app, handler = crear_app(dp, bot, '/webhook', SECRETO)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', puerto_webhook).start()
+    url = f"http://127.0.0.1:{puerto_webhook}/webhook"
+
+    async with aiohttp.ClientSession() as session:
+        # Sin la cabecera del secreto la petición debe rechazarse
+        async with session.post(url, json=updates[0]) as response:
+            rechazada = response.status == 401
+
+        cola = list(updates)
+        semaforo = asyncio.Semaphore(concurrencia)
+        cabeceras = {'X-Telegram-Bot-Api-Secret-Token': SECRETO}
+
+        async def enviar(update):
+            async with semaforo:
+                async with session.post(url, json=update, headers=cabeceras) as response:
+                    response.raise_for_status()
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*[enviar(u) for u in cola])
+        aceptados = time.perf_counter() - inicio
+        sin_terminar = await handler.drenar(timeout=60)
+        await estado['listo'].wait()
+        transcurrido = time.perf_counter() - inicio
+
+    await runner.cleanup()
+    return transcurrido, aceptados, rechazada, sin_terminar
+
+
+async def ejecutar(args):
+    updates = [generar_update(i) for i in range(args.updates)]
+    telegram = TelegramFalso(updates, args.latencia_api / 1000)
+    runner = web.AppRunner(telegram.app())
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', args.puerto_api).start()
+
+    trabajo = args.trabajo / 1000
+    t_polling = await probar_polling(args.puerto_api, args.updates, trabajo)
+    enviados_polling = telegram.enviados
+    t_webhook, t_aceptados, rechazada, sin_terminar = await probar_webhook(
+        args.puerto_api, args.puerto_webhook, updates, trabajo, args.concurrencia
+    )
+    await runner.cleanup()
+
+    print(f"Updates: {args.updates} | trabajo por update: {args.trabajo:.0f}ms | "
+          f"latencia Bot API: {args.latencia_api:.0f}ms | concurrencia webhook: {args.concurrencia}")
+    print(f"{'modo':<10}{'tiempo':>10}{'updates/s':>12}")
+    print(f"{'polling':<10}{t_polling:>9.2f}s{args.updates / t_polling:>12.0f}")
+    print(f"{'webhook':<10}{t_webhook:>9.2f}s{args.updates / t_webhook:>12.0f}")
+    print(f"Webhook: updates aceptados en {t_aceptados:.2f}s, {sin_terminar} sin terminar tras el drenaje")
+    print(f"Respuestas enviadas: {enviados_polling} (polling) + {telegram.enviados - enviados_polling} (webhook)")
+    print(f"Petición sin secret token rechazada: {'sí' if rechazada else 'NO'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga polling frente a webhook")
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--trabajo', type=float, default=20, help="ms de trabajo por update")
+    parser.add_argument('--latencia-api', type=float, default=5, help="ms por llamada a la Bot API falsa")
+    parser.add_argument('--concurrencia', type=int, default=50, help="peticiones simultáneas al webhook")
+    parser.add_argument('--puerto-api', type=int, default=8091)
+    parser.add_argument('--puerto-webhook', type=int, default=8092)
+    asyncio.run(ejecutar(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
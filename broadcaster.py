@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from aiogram.exceptions import (TelegramBadRequest, TelegramForbiddenError, TelegramMigrateToChat,
+                                TelegramNetworkError, TelegramRetryAfter, TelegramServerError)
+
+from rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Telegram admite unos 30 mensajes por segundo en total y 20 por minuto en un mismo grupo
+MENSAJES_POR_SEGUNDO = float(os.getenv('BROADCAST_MENSAJES_POR_SEGUNDO', 25))
+MENSAJES_POR_MINUTO_GRUPO = 20
+BROADCAST_CONCURRENCIA = int(os.getenv('BROADCAST_CONCURRENCIA', 8))
+# Intentos por chat ante errores de flood control o de red
+MAX_INTENTOS = 3
+
+# Errores de "chat no disponible" tras los que no se vuelve a intentar ese chat
+ERRORES_CHAT_PERDIDO = ('chat not found', 'bot was kicked', 'group chat was deactivated', 'have no rights to send')
+
+
+def formatear_informe(informe: Dict) -> str:
+    """Resumen del envío para los administradores"""
+    texto = (
+        f"📊 Resumen:\n"
+        f"• Total de grupos: {informe['total']}\n"
+        f"• Mensajes enviados: {informe['enviados']}\n"
+        f"• Errores: {informe['errores']}\n"
+    )
+    if informe['descartados']:
+        texto += f"• Chats descartados (bot expulsado o bloqueado): {informe['descartados']}\n"
+    if informe['reintentos']:
+        texto += f"• Reintentos por límite de Telegram: {informe['reintentos']}\n"
+    texto += f"• Duración: {informe['duracion']:.1f}s (máx. {informe['latencia_max']:.1f}s por chat)"
+    return texto
+
+
+class Broadcaster:
+    """
+    Envío de un mismo aviso (o uno distinto por chat) a muchos chats a la vez.
+
+    Varios envíos van en paralelo con un límite global de mensajes por segundo y otro por
+    chat. Si Telegram responde con retry_after se pausa todo el envío ese tiempo y se
+    reintenta. Los chats que han expulsado o bloqueado al bot se descartan para los envíos
+    siguientes y se notifican con on_descartado.
+    """
+
+    def __init__(self, bot=None, mensajes_por_segundo: float = MENSAJES_POR_SEGUNDO,
+                 concurrencia: int = BROADCAST_CONCURRENCIA,
+                 on_descartado: Optional[Callable[[int, str], Awaitable[None]]] = None):
+        self.bot = bot
+        self.concurrencia = max(1, concurrencia)
+        self.on_descartado = on_descartado
+        self.global_bucket = TokenBucket(mensajes_por_segundo, max(1, int(mensajes_por_segundo)))
+        self.buckets: Dict[int, TokenBucket] = {}
+        self.descartados: Set[int] = set()
+        self._pausa_hasta = 0.0
+
+    def set_bot(self, bot):
+        self.bot = bot
+
+    def ajustar_tasa(self, mensajes_por_segundo: float):
+        """Cambia el límite global (p. ej. al repartirlo entre varios procesos del bot)"""
+        self.global_bucket = TokenBucket(mensajes_por_segundo, max(1, int(mensajes_por_segundo)))
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.buckets.get(chat_id)
+        if bucket is None:
+            if chat_id < 0:
+                bucket = TokenBucket(MENSAJES_POR_MINUTO_GRUPO / 60, 3)
+            else:
+                bucket = TokenBucket(1.0, 1)
+            self.buckets[chat_id] = bucket
+        return bucket
+
+    async def _esperar_turno(self, chat_id: int):
+        pausa = self._pausa_hasta - time.monotonic()
+        if pausa > 0:
+            await asyncio.sleep(pausa)
+        espera = max(self._bucket(chat_id).reservar(), self.global_bucket.reservar())
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+    async def _descartar(self, chat_id: int, motivo: str):
+        self.descartados.add(chat_id)
+        logger.warning(f"Chat {chat_id} descartado para los envíos: {motivo}")
+        if self.on_descartado:
+            try:
+                await self.on_descartado(chat_id, motivo)
+            except Exception as e:
+                logger.error(f"Error al descartar el chat {chat_id}: {str(e)}")
+
+    async def enviar_uno(self, chat_id: int, texto: str, informe: Optional[Dict] = None, **kwargs):
+        """
+        Envía un mensaje respetando los límites. Devuelve el mensaje enviado o None si no se
+        pudo; los errores se anotan en el informe si se indica.
+        """
+        if chat_id in self.descartados:
+            return None
+        for intento in range(MAX_INTENTOS):
+            await self._esperar_turno(chat_id)
+            try:
+                return await self.bot.send_message(chat_id=chat_id, text=texto, **kwargs)
+            except TelegramRetryAfter as e:
+                logger.warning(f"Límite de Telegram al enviar al chat {chat_id}: esperando {e.retry_after}s")
+                self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + e.retry_after)
+                if informe is not None:
+                    informe['reintentos'] += 1
+            except TelegramMigrateToChat as e:
+                # El grupo pasó a supergrupo: se envía al nuevo id y el antiguo se descarta
+                logger.info(f"Chat {chat_id} migrado a {e.migrate_to_chat_id}")
+                await self._descartar(chat_id, f"migrado a {e.migrate_to_chat_id}")
+                chat_id = e.migrate_to_chat_id
+            except TelegramForbiddenError as e:
+                await self._descartar(chat_id, str(e))
+                if informe is not None:
+                    informe['descartados'] += 1
+                return None
+            except TelegramBadRequest as e:
+                if any(error in str(e).lower() for error in ERRORES_CHAT_PERDIDO):
+                    await self._descartar(chat_id, str(e))
+                    if informe is not None:
+                        informe['descartados'] += 1
+                else:
+                    logger.error(f"Error al enviar mensaje al chat {chat_id}: {str(e)}")
+                    if informe is not None:
+                        informe['errores'] += 1
+                return None
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.warning(f"Error de red al enviar al chat {chat_id} (intento {intento + 1}): {str(e)}")
+                await asyncio.sleep(2 ** intento)
+            except Exception as e:
+                logger.error(f"Error al enviar mensaje al chat {chat_id}: {str(e)}")
+                if informe is not None:
+                    informe['errores'] += 1
+                return None
+        logger.error(f"No se pudo enviar el mensaje al chat {chat_id} tras {MAX_INTENTOS} intentos")
+        if informe is not None:
+            informe['errores'] += 1
+        return None
+
+    async def enviar(self, mensajes: Dict[int, str],
+                     on_progress: Optional[Callable[[Dict], Awaitable[None]]] = None, **kwargs) -> Dict:
+        """
+        Envía a cada chat su texto ({chat_id: texto}) y devuelve el informe de entrega:
+        total, enviados, errores, descartados, reintentos, duracion, latencia_media,
+        latencia_max y la lista de chats entregados.
+        """
+        informe = {
+            'total': len(mensajes), 'enviados': 0, 'errores': 0, 'descartados': 0, 'reintentos': 0,
+            'duracion': 0.0, 'latencia_media': 0.0, 'latencia_max': 0.0, 'entregados': [],
+        }
+        if not self.bot or not mensajes:
+            return informe
+        cola: asyncio.Queue = asyncio.Queue()
+        for chat_id, texto in mensajes.items():
+            if chat_id in self.descartados:
+                informe['descartados'] += 1
+            else:
+                cola.put_nowait((chat_id, texto))
+        latencias = []
+        inicio = time.monotonic()
+
+        async def trabajador():
+            while not cola.empty():
+                chat_id, texto = cola.get_nowait()
+                comienzo = time.monotonic()
+                if await self.enviar_uno(chat_id, texto, informe, **kwargs):
+                    informe['enviados'] += 1
+                    informe['entregados'].append(chat_id)
+                latencias.append(time.monotonic() - comienzo)
+                if on_progress:
+                    await on_progress(dict(informe))
+
+        await asyncio.gather(*[trabajador() for _ in range(min(self.concurrencia, cola.qsize()))])
+        informe['duracion'] = time.monotonic() - inicio
+        if latencias:
+            informe['latencia_media'] = sum(latencias) / len(latencias)
+            informe['latencia_max'] = max(latencias)
+        logger.info(
+            f"Envío masivo: {informe['enviados']}/{informe['total']} entregados, {informe['errores']} errores, "
+            f"{informe['descartados']} descartados en {informe['duracion']:.1f}s"
+        )
+        return informe
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+logger = logging.getLogger(__name__)
+
+# Segundos entre instantáneas de la actividad en la tabla chats
+INTERVALO_ESCRITURA = 60.0
+
+# Estados del bot en el chat (ChatMember.status) con los que se le pueden enviar mensajes
+ESTADOS_PRESENTE = ('member', 'administrator', 'restricted')
+
+
+class ChatRegistry:
+    """
+    Registro de los chats donde está el bot (tabla chats) y de su última actividad.
+
+    Cada update actualiza en memoria la última actividad del chat, así que saber si un chat
+    está activo es una consulta O(1) sin tocar la base de datos. Cada INTERVALO_ESCRITURA
+    se escribe en lote una instantánea de los chats que han cambiado (actividad, título o
+    estado del bot), que se recarga al arrancar. Los envíos masivos leen sus destinos de la
+    tabla con una sola consulta indexada.
+    """
+
+    def __init__(self, db, intervalo_escritura: float = INTERVALO_ESCRITURA):
+        self.db = db
+        self.intervalo_escritura = intervalo_escritura
+        # chat_id -> time.time() de la última actividad / de la última guardada
+        self.actividad: Dict[int, float] = {}
+        self._persistida: Dict[int, float] = {}
+        # chat_id -> (type, title) conocido y chats cuyo tipo o título han cambiado
+        self.datos: Dict[int, tuple] = {}
+        self._datos_cambiados: Set[int] = set()
+        # Cambios de estado del bot pendientes de guardar y chats donde ya no está
+        self.estados: Dict[int, str] = {}
+        self.ausentes: Set[int] = set()
+        self._tarea: Optional[asyncio.Task] = None
+        # Solo los chats que cumplan el filtro son de este proceso (modo multiproceso)
+        self.filtro: Optional[Callable[[int], bool]] = None
+
+    def set_filtro(self, filtro: Optional[Callable[[int], bool]]):
+        self.filtro = filtro
+
+    def _propio(self, chat_id: int) -> bool:
+        return self.filtro is None or self.filtro(chat_id)
+
+    def cargar(self) -> int:
+        """Recupera la última actividad guardada de los chats donde sigue el bot"""
+        for chat in self.db.get_broadcast_chats(ESTADOS_PRESENTE):
+            if not self._propio(chat['id']):
+                continue
+            self.datos.setdefault(chat['id'], (chat['type'], chat['title']))
+            if chat['last_activity']:
+                marca = chat['last_activity'].timestamp()
+                self.actividad.setdefault(chat['id'], marca)
+                self._persistida.setdefault(chat['id'], marca)
+        logger.info(f"Registro de chats: {len(self.datos)} chats cargados")
+        return len(self.datos)
+
+    def registrar(self, chat, actividad: bool = True) -> None:
+        """Anota un update de un chat; con actividad=False solo se guardan su tipo y título"""
+        if chat is None:
+            return
+        if actividad:
+            self.actividad[chat.id] = time.time()
+        titulo = getattr(chat, 'title', None) or getattr(chat, 'username', None) or getattr(chat, 'first_name', None)
+        datos = (chat.type, titulo)
+        if self.datos.get(chat.id) != datos:
+            self.datos[chat.id] = datos
+            self._datos_cambiados.add(chat.id)
+
+    def actualizar_estado(self, chat_id: int, estado: str, chat=None) -> None:
+        """Guarda el estado del bot en el chat (member, administrator, left, kicked...)"""
+        if chat is not None:
+            self.registrar(chat, actividad=False)
+        self.estados[chat_id] = estado
+        if estado in ESTADOS_PRESENTE:
+            self.ausentes.discard(chat_id)
+        else:
+            self.ausentes.add(chat_id)
+        logger.info(f"Estado del bot en el chat {chat_id}: {estado}")
+
+    async def descartar(self, chat_id: int, motivo: str) -> None:
+        """Para Broadcaster.on_descartado: el bot ya no puede escribir en el chat"""
+        self.actualizar_estado(chat_id, 'kicked')
+
+    def ultima_actividad(self, chat_id: int) -> Optional[float]:
+        return self.actividad.get(chat_id)
+
+    def activo(self, chat_id: int, segundos: float) -> bool:
+        """Ha habido actividad en el chat en los últimos `segundos`"""
+        marca = self.actividad.get(chat_id)
+        return marca is not None and time.time() - marca < segundos and chat_id not in self.ausentes
+
+    def activos(self, segundos: float, solo_grupos: bool = False) -> List[int]:
+        """Chats con actividad en los últimos `segundos` donde sigue el bot, sin consultar la base de datos"""
+        limite = time.time() - segundos
+        return [
+            chat_id for chat_id, marca in self.actividad.items()
+            if marca > limite and chat_id not in self.ausentes and (not solo_grupos or chat_id < 0)
+            and self._propio(chat_id)
+        ]
+
+    def destinos(self, solo_grupos: bool = False, todos: bool = False) -> List[int]:
+        """Chats en los que sigue el bot, para los envíos masivos (todos=True ignora el filtro)"""
+        self.vaciar()
+        chats = self.db.get_broadcast_chats(ESTADOS_PRESENTE, solo_grupos)
+        return [c['id'] for c in chats if todos or self._propio(c['id'])]
+
+    def vaciar(self) -> int:
+        """Escribe en un único lote los chats con actividad, datos o estado nuevos"""
+        cambiados = {c for c, marca in self.actividad.items() if marca != self._persistida.get(c)}
+        cambiados |= self._datos_cambiados | set(self.estados)
+        if not cambiados:
+            return 0
+        estados, self.estados = self.estados, {}
+        datos_cambiados, self._datos_cambiados = self._datos_cambiados, set()
+        filas, marcas = [], {}
+        for chat_id in cambiados:
+            tipo, titulo = self.datos.get(chat_id, (None, None))
+            marca = self.actividad.get(chat_id)
+            if marca == self._persistida.get(chat_id):
+                marca = None
+            marcas[chat_id] = marca
+            actividad = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(marca)) if marca else None
+            filas.append((chat_id, tipo, titulo, actividad, estados.get(chat_id)))
+        if not self.db.save_chats(filas):
+            # Se reintentan en la próxima escritura sin pisar cambios más recientes
+            for chat_id, estado in estados.items():
+                self.estados.setdefault(chat_id, estado)
+            self._datos_cambiados |= datos_cambiados
+            return 0
+        for chat_id, marca in marcas.items():
+            if marca:
+                self._persistida[chat_id] = marca
+        return len(filas)
+
+    async def _escritor(self):
+        while True:
+            await asyncio.sleep(self.intervalo_escritura)
+            try:
+                self.vaciar()
+            except Exception as e:
+                logger.error(f"Error al guardar el registro de chats: {str(e)}")
+
+    def iniciar(self):
+        """Arranca las instantáneas en segundo plano (necesita el bucle de eventos en marcha)"""
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._escritor())
+
+    async def detener(self):
+        """Detiene el escritor y guarda la última instantánea"""
+        if self._tarea:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+        self.vaciar()
+
+
+class ChatRegistryMiddleware(BaseMiddleware):
+    """Anota en el registro el chat de cada update antes de pasarlo a los manejadores"""
+
+    def __init__(self, registro: ChatRegistry):
+        self.registro = registro
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        try:
+            # Los cambios de miembros (p. ej. añadir el bot) no cuentan como actividad del chat
+            actividad = not (isinstance(event, Update) and (event.my_chat_member or event.chat_member))
+            self.registro.registrar(data.get('event_chat'), actividad)
+            # Un grupo convertido en supergrupo cambia de id: el antiguo deja de ser destino
+            if isinstance(event, Update) and event.message and event.message.migrate_to_chat_id:
+                self.registro.actualizar_estado(event.message.chat.id, 'left')
+        except Exception as e:
+            logger.error(f"Error al registrar el chat del update: {str(e)}")
+        return await handler(event, data)
@@ -1,15 +1,72 @@
 import mysql.connector
 import logging
 from typing import Optional, Dict, List, Union
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from mysql.connector import Error
 import requests
 import json
 import math
 import asyncio
+from region_updater import RegionUpdater
+import flight_profiles
 
 logger = logging.getLogger(__name__)
 
+# Límites de frecuencia por tipo de interacción (por minuto)
+LIMITES_SPAM = {
+    'message': 15,    # 15 mensajes por minuto
+    'photo': 8,       # 8 fotos por minuto
+    'video': 6,       # 6 videos por minuto
+    'command': 8,     # 8 comandos por minuto
+    'reaction': 20    # 20 reacciones por minuto
+}
+
+def evaluar_spam(user_id, interaction_type, chat_id, times):
+    """Decide si hay spam a partir de las fechas (created_at, de más reciente a más antigua) de la ventana"""
+    if not times:
+        return False
+    
+    limite = LIMITES_SPAM.get(interaction_type, 15)
+    
+    # Analizar la distribución temporal de las interacciones
+    now = datetime.now()
+    count_recent = 0
+    
+    # Contar solo interacciones que están distribuidas temporalmente de forma natural
+    for created_at in times:
+        time_diff = (now - created_at).total_seconds()
+        if time_diff <= 60:  # Último minuto
+            count_recent += 1
+    
+    # Si hay muchas interacciones, verificar si están distribuidas naturalmente
+    if count_recent >= limite:
+        # Verificar si las interacciones están muy agrupadas en tiempo
+        if len(times) >= 5:
+            # Calcular la distribución temporal
+            ultimas = times[:10]  # Últimas 10
+            time_diffs = []
+            
+            for i in range(1, len(ultimas)):
+                diff = (ultimas[i-1] - ultimas[i]).total_seconds()
+                time_diffs.append(abs(diff))
+            
+            # Si la mayoría de las interacciones están muy juntas (menos de 2 segundos de diferencia)
+            # es probable que sean del procesamiento inicial del bot
+            if time_diffs:
+                avg_diff = sum(time_diffs) / len(time_diffs)
+                very_close_count = sum(1 for diff in time_diffs if diff < 2.0)
+                
+                # Si más del 70% de las interacciones están muy juntas temporalmente,
+                # probablemente sea procesamiento inicial del bot
+                if very_close_count / len(time_diffs) > 0.7 and avg_diff < 3.0:
+                    logger.info(f"Interacciones agrupadas detectadas para usuario {user_id} - posible procesamiento inicial del bot")
+                    return False
+        
+        logger.warning(f"Posible spam detectado: Usuario {user_id} en chat {chat_id}, tipo {interaction_type}, {count_recent} interacciones en el último minuto (límite: {limite})")
+        return True
+    
+    return False
+
 class AntDatabase:
     def __init__(self, host, user, password, database):
         self.host = host
@@ -272,13 +329,124 @@ class AntDatabase:
                 )
             """)
             
+            # Perfil de vuelos nupciales por género y hemisferio (las especies lo heredan).
+            # Cada histograma es un blob de enteros de 32 bits de tamaño fijo (ver flight_profiles.py)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS flight_profiles (
+                    genus VARCHAR(100) NOT NULL,
+                    hemisphere VARCHAR(20) NOT NULL DEFAULT 'World',
+                    months VARBINARY(64),
+                    hours VARBINARY(128),
+                    temperatures VARBINARY(512),
+                    moon_phases VARBINARY(64),
+                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                    PRIMARY KEY (genus, hemisphere)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """)
+            
+            # Trabajos de administración en segundo plano (ver job_manager.py)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    job_type VARCHAR(50) NOT NULL,
+                    status VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+                    chat_id BIGINT,
+                    user_id BIGINT,
+                    params TEXT,
+                    progress TEXT,
+                    result TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    started_at TIMESTAMP NULL,
+                    finished_at TIMESTAMP NULL,
+                    INDEX idx_status (status),
+                    INDEX idx_created (created_at)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """)
+            
+            # file_id de Telegram de las fotos ya subidas (ver photo_cache.py)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS telegram_photo_cache (
+                    scientific_name VARCHAR(255) NOT NULL,
+                    source VARCHAR(20) NOT NULL,
+                    photo_url TEXT NOT NULL,
+                    file_id VARCHAR(255) NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                    PRIMARY KEY (scientific_name, source)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """)
+            
+            # Chats donde está el bot (ver chat_registry.py)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chats (
+                    id BIGINT PRIMARY KEY,
+                    type VARCHAR(20) NULL,
+                    title VARCHAR(255) NULL,
+                    last_activity TIMESTAMP NULL,
+                    bot_status VARCHAR(20) NOT NULL DEFAULT 'member',
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                    INDEX idx_status_activity (bot_status, last_activity)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """)
+            
+            # Primera vez: rellenar el registro con los chats del historial de interacciones
+            cursor.execute("SELECT COUNT(*) FROM chats")
+            if cursor.fetchone()[0] == 0:
+                cursor.execute("""
+                    INSERT IGNORE INTO chats (id, type, last_activity)
+                    SELECT chat_id, IF(chat_id < 0, 'group', 'private'), MAX(created_at)
+                    FROM user_interactions
+                    WHERE chat_id IS NOT NULL AND chat_id != 0
+                    GROUP BY chat_id
+                """)
+                cursor.execute("""
+                    INSERT IGNORE INTO chats (id, type)
+                    SELECT DISTINCT chat_id, IF(chat_id < 0, 'group', 'private')
+                    FROM user_experience
+                    WHERE chat_id IS NOT NULL AND chat_id != 0
+                """)
+                logger.info("Registro de chats inicializado desde el historial")
+            
             # Crear tabla de descripciones si no existe
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS species_descriptions (
                     scientific_name VARCHAR(255) PRIMARY KEY,
                     description TEXT,
                     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    source VARCHAR(50) DEFAULT 'chatgpt'
+                    source VARCHAR(50) DEFAULT 'chatgpt',
+                    source_hash CHAR(64) NULL,
+                    etag VARCHAR(255) NULL,
+                    last_modified VARCHAR(64) NULL,
+                    checked_at TIMESTAMP NULL
+                )
+            """)
+            
+            # Columnas para revalidar las descripciones contra AntWiki (ver description_service.py)
+            columnas_descripcion = {
+                'source_hash': "CHAR(64) NULL",
+                'etag': "VARCHAR(255) NULL",
+                'last_modified': "VARCHAR(64) NULL",
+                'checked_at': "TIMESTAMP NULL",
+            }
+            for columna, definicion in columnas_descripcion.items():
+                cursor.execute("""
+                    SELECT COUNT(*)
+                    FROM information_schema.columns
+                    WHERE table_name = 'species_descriptions'
+                    AND column_name = %s
+                """, (columna,))
+                if cursor.fetchone()[0] == 0:
+                    cursor.execute(f"ALTER TABLE species_descriptions ADD COLUMN {columna} {definicion}")
+                    logger.info(f"Columna '{columna}' añadida a la tabla species_descriptions")
+            
+            # Uso diario de OpenAI, compartido por todos los procesos del bot (ver description_service.py)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS openai_usage (
+                    day DATE PRIMARY KEY,
+                    prompt_tokens INT NOT NULL DEFAULT 0,
+                    completion_tokens INT NOT NULL DEFAULT 0,
+                    cost DECIMAL(12, 6) NOT NULL DEFAULT 0,
+                    requests INT NOT NULL DEFAULT 0,
+                    fallbacks INT NOT NULL DEFAULT 0
                 )
             """)
             
@@ -405,6 +573,127 @@ class AntDatabase:
         finally:
             cursor.close()
 
+    def upsert_species_batch(self, especies: List[Dict]) -> int:
+        """
+        Inserta o actualiza un lote de especies en una sola transacción.
+
+        Args:
+            especies: Lista de diccionarios con scientific_name y opcionalmente antwiki_url,
+                photo_url, inaturalist_id, region y los campos de AntOnTop (description,
+                short_description, behavior, difficulty, temperature, humidity, queen_size,
+                worker_size, colony_size)
+
+        Returns:
+            int: Número de especies escritas
+        """
+        if not especies:
+            return 0
+
+        campos_antontop = ['description', 'short_description', 'photo_url', 'region', 'behavior',
+                           'difficulty', 'temperature', 'humidity', 'queen_size', 'worker_size', 'colony_size']
+        cursor = None
+        try:
+            self.ensure_connection()
+            self.connection.start_transaction()
+            cursor = self.connection.cursor()
+
+            # Los valores NULL no sobrescriben datos ya existentes
+            cursor.executemany("""
+                INSERT INTO species (scientific_name, antwiki_url, photo_url, inaturalist_id, region)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    antwiki_url = COALESCE(VALUES(antwiki_url), antwiki_url),
+                    photo_url = COALESCE(VALUES(photo_url), photo_url),
+                    inaturalist_id = COALESCE(VALUES(inaturalist_id), inaturalist_id),
+                    region = COALESCE(VALUES(region), region)
+            """, [
+                (e['scientific_name'], e.get('antwiki_url'), e.get('photo_url'),
+                 str(e['inaturalist_id']) if e.get('inaturalist_id') else None, e.get('region'))
+                for e in especies
+            ])
+
+            # Recuperar los ids de todo el lote con una sola consulta
+            nombres = [e['scientific_name'] for e in especies]
+            placeholders = ', '.join(['%s'] * len(nombres))
+            cursor.execute(f"SELECT id, scientific_name FROM species WHERE scientific_name IN ({placeholders})",
+                           nombres)
+            ids = {nombre.lower(): species_id for species_id, nombre in cursor.fetchall()}
+
+            # Estadísticas de búsqueda solo para las especies que aún no las tienen
+            cursor.execute(f"""
+                INSERT INTO search_stats (species_id, search_count)
+                SELECT s.id, 0 FROM species s
+                LEFT JOIN search_stats ss ON ss.species_id = s.id
+                WHERE ss.species_id IS NULL AND s.scientific_name IN ({placeholders})
+            """, nombres)
+
+            filas_antontop = []
+            for e in especies:
+                species_id = ids.get(e['scientific_name'].lower())
+                if species_id and e.get('antontop') and any(e['antontop'].get(c) for c in campos_antontop):
+                    filas_antontop.append(
+                        (species_id, e['scientific_name']) + tuple(e['antontop'].get(c) for c in campos_antontop)
+                    )
+            if filas_antontop:
+                columnas = ', '.join(campos_antontop)
+                valores = ', '.join(['%s'] * (len(campos_antontop) + 2))
+                actualizacion = ', '.join(f"{c} = COALESCE(VALUES({c}), {c})" for c in campos_antontop)
+                cursor.executemany(f"""
+                    INSERT INTO antontop_info (species_id, scientific_name, {columnas})
+                    VALUES ({valores})
+                    ON DUPLICATE KEY UPDATE {actualizacion}
+                """, filas_antontop)
+
+            self.connection.commit()
+            return len(especies)
+        except Exception as e:
+            logger.error(f"Error al guardar lote de especies: {str(e)}")
+            if self.connection:
+                self.connection.rollback()
+            return 0
+        finally:
+            if cursor:
+                cursor.close()
+
+    def get_inaturalist_ids(self, nombres: Optional[List[str]] = None) -> Dict[str, Optional[str]]:
+        """Devuelve nombre científico -> inaturalist_id (None si aún no se conoce)"""
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor()
+            if nombres:
+                placeholders = ', '.join(['%s'] * len(nombres))
+                cursor.execute(f"SELECT scientific_name, inaturalist_id FROM species WHERE scientific_name IN ({placeholders})",
+                               list(nombres))
+            else:
+                cursor.execute("SELECT scientific_name, inaturalist_id FROM species")
+            return {nombre: inat_id for nombre, inat_id in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"Error al obtener ids de iNaturalist: {str(e)}")
+            return {}
+        finally:
+            if cursor:
+                cursor.close()
+
+    def set_inaturalist_ids(self, ids: Dict[str, str]) -> int:
+        """Guarda en bloque los inaturalist_id resueltos (nombre científico -> id)"""
+        if not ids:
+            return 0
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor()
+            cursor.executemany(
+                "UPDATE species SET inaturalist_id = %s WHERE scientific_name = %s",
+                [(str(inat_id), nombre) for nombre, inat_id in ids.items()]
+            )
+            self.connection.commit()
+            return len(ids)
+        except Exception as e:
+            logger.error(f"Error al guardar ids de iNaturalist: {str(e)}")
+            return 0
+        finally:
+            if cursor:
+                cursor.close()
+
     def init_db(self):
         """Inicializa la base de datos con las tablas necesarias"""
         cursor = None
@@ -964,136 +1253,60 @@ class AntDatabase:
             logger.error(f"Error al obtener especies por dificultad {difficulty_level}: {str(e)}")
             return []
 
+    def get_species_region_sources(self) -> List[Dict]:
+        """Especies con las fuentes necesarias para calcular su región"""
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor(dictionary=True)
+            cursor.execute('SELECT id, scientific_name, antwiki_url, inaturalist_id FROM species')
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error al obtener especies para actualizar regiones: {str(e)}")
+            return []
+        finally:
+            if cursor:
+                cursor.close()
+
+    def update_regions_batch(self, regiones: Dict[int, str]) -> int:
+        """
+        Actualiza la región de varias especies con un solo UPDATE.
+
+        Args:
+            regiones: species_id -> región normalizada
+
+        Returns:
+            int: Número de especies actualizadas
+        """
+        if not regiones:
+            return 0
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor()
+            casos = ' '.join(['WHEN %s THEN %s'] * len(regiones))
+            placeholders = ', '.join(['%s'] * len(regiones))
+            valores = [v for species_id, region in regiones.items() for v in (species_id, region)]
+            cursor.execute(
+                f"UPDATE species SET region = CASE id {casos} END WHERE id IN ({placeholders})",
+                valores + list(regiones)
+            )
+            self.connection.commit()
+            return len(regiones)
+        except Exception as e:
+            logger.error(f"Error al actualizar regiones por lotes: {str(e)}")
+            if self.connection:
+                self.connection.rollback()
+            return 0
+        finally:
+            if cursor:
+                cursor.close()
+
     def update_all_regions(self):
-        """Actualiza las regiones de todas las especies usando datos de AntWiki e iNaturalist y normaliza a continentes"""
-        
-        # Diccionario de mapeo de países y regiones a continentes
-        region_to_continent = {
-            # América del Norte
-            'mexico': 'América del Norte',
-            'united states': 'América del Norte',
-            'canada': 'América del Norte',
-            'north america': 'América del Norte',
-            
-            # América del Sur
-            'brazil': 'América del Sur',
-            'argentina': 'América del Sur',
-            'chile': 'América del Sur',
-            'peru': 'América del Sur',
-            'colombia': 'América del Sur',
-            'venezuela': 'América del Sur',
-            'ecuador': 'América del Sur',
-            'bolivia': 'América del Sur',
-            'paraguay': 'América del Sur',
-            'uruguay': 'América del Sur',
-            'south america': 'América del Sur',
-            
-            # Europa
-            'spain': 'Europa',
-            'france': 'Europa',
-            'germany': 'Europa',
-            'italy': 'Europa',
-            'united kingdom': 'Europa',
-            'portugal': 'Europa',
-            'greece': 'Europa',
-            'europe': 'Europa',
-            
-            # Asia
-            'china': 'Asia',
-            'japan': 'Asia',
-            'india': 'Asia',
-            'russia': 'Asia',
-            'southeast asia': 'Asia',
-            'asia': 'Asia',
-            
-            # África
-            'south africa': 'África',
-            'egypt': 'África',
-            'morocco': 'África',
-            'kenya': 'África',
-            'africa': 'África',
-            
-            # Oceanía
-            'australia': 'Oceanía',
-            'new zealand': 'Oceanía',
-            'oceania': 'Oceanía'
-        }
+        """Actualiza las regiones de todas las especies usando datos de AntWiki e iNaturalist y normaliza a continentes.
         
+        Versión síncrona para scripts; dentro del bot se usa RegionUpdater directamente.
+        """
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            
-            # Obtener todas las especies
-            cursor.execute('SELECT id, scientific_name, antwiki_url FROM species')
-            species = cursor.fetchall()
-            
-            updated_count = 0
-            error_count = 0
-            
-            for specie in species:
-                try:
-                    raw_region = None
-                    
-                    # 1. Primero intentar con AntWiki
-                    if specie['antwiki_url']:
-                        try:
-                            response = requests.get(specie['antwiki_url'], timeout=10)
-                            if response.status_code == 200:
-                                html_content = response.text
-                                distribution_markers = ["Distribution:", "Geographic Range:", "Native range:"]
-                                for marker in distribution_markers:
-                                    if marker in html_content:
-                                        start_idx = html_content.find(marker) + len(marker)
-                                        end_idx = html_content.find(".", start_idx)
-                                        if end_idx > start_idx:
-                                            raw_region = html_content[start_idx:end_idx].strip()
-                                            break
-                        except Exception as e:
-                            logger.error(f"Error al obtener datos de AntWiki para {specie['scientific_name']}: {str(e)}")
-                    
-                    # 2. Si no se encontró en AntWiki, intentar con iNaturalist
-                    if not raw_region:
-                        cursor.execute('SELECT inaturalist_id FROM species WHERE id = %s', (specie['id'],))
-                        inat_result = cursor.fetchone()
-                        if inat_result and inat_result['inaturalist_id']:
-                            response = requests.get(f"https://api.inaturalist.org/v1/taxa/{inat_result['inaturalist_id']}")
-                            if response.status_code == 200:
-                                inat_data = response.json()['results'][0]
-                                
-                                if 'establishment_means' in inat_data and inat_data['establishment_means'] == 'native':
-                                    native_places = [place['name'] for place in inat_data.get('native_places', [])]
-                                    if native_places:
-                                        raw_region = ", ".join(native_places)
-                    
-                    # 3. Normalizar la región a continentes
-                    continents = set()
-                    if raw_region:
-                        raw_region = raw_region.lower()
-                        for region, continent in region_to_continent.items():
-                            if region in raw_region:
-                                continents.add(continent)
-                    
-                    final_region = ", ".join(sorted(continents)) if continents else "Desconocido"
-                    
-                    # Actualizar región en la base de datos
-                    update_cursor = self.connection.cursor()
-                    update_cursor.execute(
-                        'UPDATE species SET region = %s WHERE id = %s',
-                        (final_region, specie['id'])
-                    )
-                    self.connection.commit()
-                    updated_count += 1
-                    logger.info(f"Región actualizada para {specie['scientific_name']}: {final_region}")
-                            
-                except Exception as e:
-                    error_count += 1
-                    logger.error(f"Error al actualizar región para {specie['scientific_name']}: {str(e)}")
-            
-            return {
-                'total': len(species),
-                'updated': updated_count,
-                'errors': error_count
-            }
-            
+            return asyncio.run(RegionUpdater(self).actualizar())
         except Exception as e:
             logger.error(f"Error al actualizar regiones: {str(e)}")
             return {
@@ -1101,9 +1314,6 @@ class AntDatabase:
                 'updated': 0,
                 'errors': 1
             }
-        finally:
-            if cursor:
-                cursor.close()
 
     def reset_tables(self):
         """Reinicia todas las tablas de la base de datos"""
@@ -1119,6 +1329,8 @@ class AntDatabase:
                 "searches",
                 "species_synonyms",
                 "flight_stats",
+                "flight_profiles",
+                "telegram_photo_cache",
                 "species_info",
                 "species_images",
                 "antontop_info",
@@ -1179,11 +1391,111 @@ class AntDatabase:
             self.connection.rollback()
             return False
 
+    def save_genus_flight_stats(self, genus: str, stats: Dict[str, List[Dict]]) -> bool:
+        """
+        Guarda las estadísticas de vuelos de un género como histogramas empaquetados.
+
+        Args:
+            genus: Nombre del género
+            stats: Diccionario tipo -> lista de puntos tal como los devuelve AntFlights
+                ({'month': 5, 'count': 12, 'hemisphere': 'North'}, {'hour': 18, 'count': 3}, ...)
+
+        Returns:
+            bool: True si se guardaron correctamente
+        """
+        perfiles = flight_profiles.perfiles_desde_stats(stats)
+        if not perfiles:
+            return False
+        filas = [
+            (genus.lower(), hemisferio) + tuple(
+                flight_profiles.codificar(perfil[columna]) for columna, _ in flight_profiles.HISTOGRAMAS.values()
+            )
+            for hemisferio, perfil in perfiles.items()
+        ]
+
+        cursor = None
+        try:
+            self.ensure_connection()
+            self.connection.start_transaction()
+            cursor = self.connection.cursor()
+            # Los hemisferios que ya no aparecen en AntFlights se eliminan; el resto se reescribe de una vez
+            cursor.execute("DELETE FROM flight_profiles WHERE genus = %s", (genus.lower(),))
+            cursor.executemany("""
+                INSERT INTO flight_profiles (genus, hemisphere, months, hours, temperatures, moon_phases)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    months = VALUES(months),
+                    hours = VALUES(hours),
+                    temperatures = VALUES(temperatures),
+                    moon_phases = VALUES(moon_phases)
+            """, filas)
+            self.connection.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error al guardar estadísticas de vuelo de {genus}: {str(e)}")
+            if self.connection:
+                self.connection.rollback()
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+
+    def get_flight_profiles(self, generos: List[str]) -> Dict[str, Dict[str, Dict]]:
+        """
+        Carga los perfiles de vuelo de varios géneros con una sola consulta por clave primaria.
+
+        Returns:
+            género -> {hemisferio -> {'months', 'hours', 'temperatures', 'moon_phases'}},
+            con cada histograma decodificado como ndarray (o array.array si no hay NumPy)
+        """
+        generos = list(dict.fromkeys(g.lower() for g in generos if g))
+        if not generos:
+            return {}
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor(dictionary=True)
+            placeholders = ', '.join(['%s'] * len(generos))
+            cursor.execute(f"""
+                SELECT genus, hemisphere, months, hours, temperatures, moon_phases
+                FROM flight_profiles
+                WHERE genus IN ({placeholders})
+            """, generos)
+
+            perfiles = {}
+            for fila in cursor.fetchall():
+                perfiles.setdefault(fila['genus'], {})[fila['hemisphere']] = {
+                    columna: flight_profiles.decodificar(fila[columna], tamano)
+                    for columna, tamano in flight_profiles.HISTOGRAMAS.values()
+                }
+            return perfiles
+        except Exception as e:
+            logger.error(f"Error al obtener perfiles de vuelo: {str(e)}")
+            return {}
+        finally:
+            if cursor:
+                cursor.close()
+
+    def get_genus_flight_stats(self, genus: str, stats_type: Optional[str] = None) -> List[Dict]:
+        """Obtiene las estadísticas de vuelos de un género con el formato de get_flight_stats"""
+        perfiles = self.get_flight_profiles([genus]).get(genus.lower())
+        return flight_profiles.a_filas(perfiles, stats_type) if perfiles else []
+
     def get_flight_stats(self, species_id, stats_type=None):
-        """Obtiene las estadísticas de vuelos nupciales para una especie"""
+        """Obtiene las estadísticas de vuelos nupciales para una especie (heredadas de su género)"""
+        cursor = None
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            
+            cursor = self.get_connection().cursor(dictionary=True)
+            cursor.execute("SELECT scientific_name FROM species WHERE id = %s", (species_id,))
+            especie = cursor.fetchone()
+            if not especie or not especie['scientific_name']:
+                return []
+
+            genus = especie['scientific_name'].split()[0]
+            stats = self.get_genus_flight_stats(genus, stats_type)
+            if stats:
+                return stats
+
+            # Datos antiguos guardados por especie en flight_stats
             if stats_type == 'month':
                 cursor.execute("""
                     SELECT month, flight_count, hemisphere
@@ -1258,8 +1570,9 @@ class AntDatabase:
             self.connection.rollback()
             return False
             
-    async def log_user_interaction(self, user_id, username, interaction_type, command_name=None, points=None, chat_id=None):
-        """Registra una interacción de usuario y actualiza la experiencia"""
+    async def log_user_interaction(self, user_id, username, interaction_type, command_name=None, points=None, chat_id=None,
+                                   contexto=None):
+        """Registra una interacción de usuario y actualiza la experiencia (con el contexto del update si se pasa)"""
         cursor = None
         try:
             logger.info(f"log_user_interaction llamado: user_id={user_id}, username={username}, interaction_type={interaction_type}, command_name={command_name}, points={points}, chat_id={chat_id}")
@@ -1271,10 +1584,12 @@ class AntDatabase:
                 return False
 
             cursor = self.connection.cursor()
+            ctx = self._contexto(contexto, user_id, chat_id)
+            experiencia = None
             
             # Verificar si el usuario está haciendo spam (excepto para el juego)
             if interaction_type != 'game_guess':
-                is_spam_detected = self.is_spam(user_id, interaction_type, chat_id)
+                is_spam_detected = self.is_spam(user_id, interaction_type, chat_id, contexto=ctx)
                 if is_spam_detected:
                     logger.warning(f"Posible spam detectado del usuario {username} ({user_id}) en el chat {chat_id}")
                     await self.notify_spam_detected(user_id, username, chat_id, interaction_type)
@@ -1296,7 +1611,7 @@ class AntDatabase:
             logger.info(f"Puntos determinados: {points} para interaction_type: {interaction_type}")
             
             # Verificar si el usuario ya alcanzó el límite diario
-            if self.reached_daily_xp_limit(user_id, chat_id):
+            if self.reached_daily_xp_limit(user_id, chat_id, contexto=ctx):
                 logger.info(f"Usuario {username} alcanzó el límite diario de XP (100 XP)")
                 return False
             
@@ -1314,13 +1629,16 @@ class AntDatabase:
                 logger.info(f"Actualizando experiencia para usuario {user_id} con {points} puntos")
                 
                 # Obtener experiencia actual
-                cursor.execute("""
-                    SELECT total_xp, current_level 
-                    FROM user_experience 
-                    WHERE user_id = %s AND chat_id = %s
-                """, (user_id, chat_id))
-                
-                result = cursor.fetchone()
+                if ctx:
+                    result = (ctx.experiencia['total_xp'], ctx.experiencia['current_level']) if ctx.experiencia else None
+                else:
+                    cursor.execute("""
+                        SELECT total_xp, current_level 
+                        FROM user_experience 
+                        WHERE user_id = %s AND chat_id = %s
+                    """, (user_id, chat_id))
+                    
+                    result = cursor.fetchone()
                 if result:
                     current_xp = result[0]
                     current_level = result[1]
@@ -1333,6 +1651,7 @@ class AntDatabase:
                 # Calcular nuevo XP y nivel
                 new_xp = current_xp + points
                 new_level = self.calcular_nivel(new_xp)
+                experiencia = {'total_xp': new_xp, 'current_level': new_level}
                 
                 logger.info(f"Nuevo XP: {new_xp}, nuevo nivel: {new_level}")
                 
@@ -1361,6 +1680,8 @@ class AntDatabase:
             
             # Commit the transaction
             self.connection.commit()
+            if ctx:
+                ctx.anotar(interaction_type, points, experiencia)
             logger.info(f"Interacción registrada exitosamente: {interaction_type} para usuario {username} con {points} puntos")
             return True
             
@@ -1373,21 +1694,80 @@ class AntDatabase:
             if cursor:
                 cursor.close()
 
-    def is_spam(self, user_id, interaction_type, chat_id):
+    def _inicio_ventana_spam(self):
+        """Inicio de la ventana de análisis de spam (último minuto desde inicio del bot)"""
+        # Obtener el tiempo de inicio del bot (cuando se creó la instancia de la base de datos)
+        if not hasattr(self, 'bot_start_time'):
+            self.bot_start_time = datetime.now()
+        return max(
+            datetime.now() - timedelta(minutes=1),  # Último minuto
+            self.bot_start_time + timedelta(seconds=30)  # Mínimo 30 segundos después del inicio
+        )
+
+    @staticmethod
+    def _contexto(contexto, user_id, chat_id):
+        """Contexto del update ya cargado si corresponde a este usuario y chat, si no None"""
+        if contexto is None or not contexto.corresponde(user_id, chat_id):
+            return None
+        return contexto if contexto.cargar() else None
+
+    def load_request_context(self, user_id, chat_id):
+        """
+        Datos del usuario en el chat que usan los manejadores de un update, en una sola consulta:
+        experiencia, XP ganado hoy, idioma e interacciones de la ventana de spam
+        """
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor(dictionary=True)
+            cursor.execute("""
+                SELECT 'experiencia' AS fila, total_xp, current_level, NULL AS language_code,
+                       NULL AS is_spanish_native, NULL AS interaction_type, NULL AS created_at
+                FROM user_experience
+                WHERE user_id = %s AND chat_id = %s
+                UNION ALL
+                SELECT 'hoy', COALESCE(SUM(points), 0), NULL, NULL, NULL, NULL, NULL
+                FROM user_interactions
+                WHERE user_id = %s AND chat_id = %s AND created_at >= CURDATE()
+                UNION ALL
+                SELECT 'idioma', NULL, NULL, language_code, is_spanish_native, NULL, NULL
+                FROM user_languages
+                WHERE user_id = %s AND chat_id = %s
+                UNION ALL
+                SELECT 'interaccion', NULL, NULL, NULL, NULL, interaction_type, created_at
+                FROM user_interactions
+                WHERE user_id = %s AND chat_id = %s AND created_at >= %s
+                ORDER BY created_at DESC
+            """, (user_id, chat_id) * 4 + (self._inicio_ventana_spam(),))
+            
+            datos = {'experiencia': None, 'xp_hoy': 0, 'idioma': None, 'interacciones': {}}
+            for fila in cursor.fetchall():
+                if fila['fila'] == 'experiencia':
+                    datos['experiencia'] = {'total_xp': fila['total_xp'], 'current_level': fila['current_level']}
+                elif fila['fila'] == 'hoy':
+                    datos['xp_hoy'] = int(fila['total_xp'])
+                elif fila['fila'] == 'idioma':
+                    datos['idioma'] = {'language_code': fila['language_code'],
+                                       'is_spanish_native': bool(fila['is_spanish_native'])}
+                else:
+                    datos['interacciones'].setdefault(fila['interaction_type'], []).append(fila['created_at'])
+            return datos
+            
+        except Exception as e:
+            logger.error(f"Error al cargar el contexto del usuario: {str(e)}")
+            return None
+        finally:
+            if cursor:
+                cursor.close()
+
+    def is_spam(self, user_id, interaction_type, chat_id, contexto=None):
         """Verifica si una interacción es spam basado en la frecuencia"""
+        ctx = self._contexto(contexto, user_id, chat_id)
+        if ctx:
+            return ctx.es_spam(interaction_type)
+        cursor = None
         try:
             cursor = self.connection.cursor(dictionary=True)
             
-            # Obtener el tiempo de inicio del bot (cuando se creó la instancia de la base de datos)
-            if not hasattr(self, 'bot_start_time'):
-                self.bot_start_time = datetime.now()
-            
-            # Definir ventana de tiempo para análisis de spam (último minuto desde inicio del bot)
-            time_window_start = max(
-                datetime.now() - timedelta(minutes=1),  # Último minuto
-                self.bot_start_time + timedelta(seconds=30)  # Mínimo 30 segundos después del inicio
-            )
-            
             # Solo considerar interacciones recientes y posteriores al inicio del bot
             cursor.execute("""
                 SELECT created_at
@@ -1397,62 +1777,10 @@ class AntDatabase:
                 AND chat_id = %s
                 AND created_at >= %s
                 ORDER BY created_at DESC
-            """, (user_id, interaction_type, chat_id, time_window_start))
+            """, (user_id, interaction_type, chat_id, self._inicio_ventana_spam()))
             
             interactions = cursor.fetchall()
-            
-            if not interactions:
-                return False
-            
-            # Límites de frecuencia por tipo de interacción
-            limites = {
-                'message': 15,    # 15 mensajes por minuto
-                'photo': 8,       # 8 fotos por minuto
-                'video': 6,       # 6 videos por minuto
-                'command': 8,     # 8 comandos por minuto
-                'reaction': 20    # 20 reacciones por minuto
-            }
-            
-            limite = limites.get(interaction_type, 15)
-            
-            # Analizar la distribución temporal de las interacciones
-            now = datetime.now()
-            count_recent = 0
-            
-            # Contar solo interacciones que están distribuidas temporalmente de forma natural
-            for interaction in interactions:
-                time_diff = (now - interaction['created_at']).total_seconds()
-                if time_diff <= 60:  # Último minuto
-                    count_recent += 1
-            
-            # Si hay muchas interacciones, verificar si están distribuidas naturalmente
-            if count_recent >= limite:
-                # Verificar si las interacciones están muy agrupadas en tiempo
-                if len(interactions) >= 5:
-                    # Calcular la distribución temporal
-                    times = [interaction['created_at'] for interaction in interactions[:10]]  # Últimas 10
-                    time_diffs = []
-                    
-                    for i in range(1, len(times)):
-                        diff = (times[i-1] - times[i]).total_seconds()
-                        time_diffs.append(abs(diff))
-                    
-                    # Si la mayoría de las interacciones están muy juntas (menos de 2 segundos de diferencia)
-                    # es probable que sean del procesamiento inicial del bot
-                    if time_diffs:
-                        avg_diff = sum(time_diffs) / len(time_diffs)
-                        very_close_count = sum(1 for diff in time_diffs if diff < 2.0)
-                        
-                        # Si más del 70% de las interacciones están muy juntas temporalmente,
-                        # probablemente sea procesamiento inicial del bot
-                        if very_close_count / len(time_diffs) > 0.7 and avg_diff < 3.0:
-                            logger.info(f"Interacciones agrupadas detectadas para usuario {user_id} - posible procesamiento inicial del bot")
-                            return False
-                
-                logger.warning(f"Posible spam detectado: Usuario {user_id} en chat {chat_id}, tipo {interaction_type}, {count_recent} interacciones en el último minuto (límite: {limite})")
-                return True
-            
-            return False
+            return evaluar_spam(user_id, interaction_type, chat_id, [i['created_at'] for i in interactions])
             
         except Exception as e:
             logger.error(f"Error al verificar spam: {str(e)}")
@@ -1499,10 +1827,14 @@ class AntDatabase:
             if cursor:
                 cursor.close()
 
-    def reached_daily_xp_limit(self, user_id, chat_id, limit=100):
+    def reached_daily_xp_limit(self, user_id, chat_id, limit=100, contexto=None):
         """
         Verifica si un usuario ha alcanzado el límite diario de XP
         """
+        ctx = self._contexto(contexto, user_id, chat_id)
+        if ctx:
+            return ctx.xp_hoy >= limit
+        cursor = None
         try:
             cursor = self.connection.cursor(dictionary=True)
             
@@ -1531,11 +1863,15 @@ class AntDatabase:
             if cursor:
                 cursor.close()
 
-    def is_approaching_daily_limit(self, user_id, chat_id, limit=100, threshold=0.8):
+    def is_approaching_daily_limit(self, user_id, chat_id, limit=100, threshold=0.8, contexto=None):
         """
         Verifica si un usuario está cerca de alcanzar el límite diario de XP
         El threshold define qué tan cerca (por defecto 80% del límite)
         """
+        ctx = self._contexto(contexto, user_id, chat_id)
+        if ctx:
+            return limit * threshold <= ctx.xp_hoy < limit
+        cursor = None
         try:
             cursor = self.connection.cursor(dictionary=True)
             
@@ -2079,6 +2415,238 @@ class AntDatabase:
             if cursor:
                 cursor.close()
 
+    def create_job(self, job_type: str, chat_id: Optional[int], user_id: Optional[int], params: str = None) -> Optional[int]:
+        """Registra un trabajo en segundo plano y devuelve su id"""
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor()
+            cursor.execute("""
+                INSERT INTO jobs (job_type, status, chat_id, user_id, params)
+                VALUES (%s, 'pendiente', %s, %s, %s)
+            """, (job_type, chat_id, user_id, params))
+            self.connection.commit()
+            return cursor.lastrowid
+        except Exception as e:
+            logger.error(f"Error al registrar trabajo {job_type}: {str(e)}")
+            return None
+        finally:
+            if cursor:
+                cursor.close()
+
+    def update_job(self, job_id: int, status: Optional[str] = None, progress: Optional[str] = None,
+                   result: Optional[str] = None, started: bool = False, finished: bool = False) -> bool:
+        """Actualiza el estado, progreso o resultado de un trabajo"""
+        campos = []
+        valores = []
+        if status is not None:
+            campos.append("status = %s")
+            valores.append(status)
+        if progress is not None:
+            campos.append("progress = %s")
+            valores.append(progress)
+        if result is not None:
+            campos.append("result = %s")
+            valores.append(result)
+        if started:
+            campos.append("started_at = NOW()")
+        if finished:
+            campos.append("finished_at = NOW()")
+        if not campos:
+            return False
+
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor()
+            cursor.execute(f"UPDATE jobs SET {', '.join(campos)} WHERE id = %s", valores + [job_id])
+            self.connection.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error al actualizar trabajo {job_id}: {str(e)}")
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+
+    def get_jobs(self, limit: int = 10) -> List[Dict]:
+        """Trabajos activos primero y después los más recientes"""
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor(dictionary=True)
+            cursor.execute("""
+                SELECT id, job_type, status, chat_id, user_id, progress, result,
+                       created_at, started_at, finished_at
+                FROM jobs
+                ORDER BY status IN ('pendiente', 'en_curso') DESC, id DESC
+                LIMIT %s
+            """, (limit,))
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error al obtener trabajos: {str(e)}")
+            return []
+        finally:
+            if cursor:
+                cursor.close()
+
+    def mark_interrupted_jobs(self) -> int:
+        """Marca como interrumpidos los trabajos que no terminaron en la ejecución anterior"""
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor()
+            cursor.execute("""
+                UPDATE jobs SET status = 'interrumpido', finished_at = NOW()
+                WHERE status IN ('pendiente', 'en_curso')
+            """)
+            self.connection.commit()
+            return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error al marcar trabajos interrumpidos: {str(e)}")
+            return 0
+        finally:
+            if cursor:
+                cursor.close()
+
+    def get_photo_file_ids(self) -> List[Dict]:
+        """Todos los file_id de fotos guardados"""
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor(dictionary=True)
+            cursor.execute("SELECT scientific_name, source, photo_url, file_id FROM telegram_photo_cache")
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error al obtener file_id de fotos: {str(e)}")
+            return []
+        finally:
+            if cursor:
+                cursor.close()
+
+    def save_photo_file_id(self, scientific_name: str, source: str, photo_url: str, file_id: str) -> bool:
+        """Guarda el file_id de Telegram de la foto de una especie para una fuente"""
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor()
+            cursor.execute("""
+                INSERT INTO telegram_photo_cache (scientific_name, source, photo_url, file_id)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE photo_url = VALUES(photo_url), file_id = VALUES(file_id)
+            """, (scientific_name, source, photo_url, file_id))
+            self.connection.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error al guardar file_id de {scientific_name}: {str(e)}")
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+
+    def delete_photo_file_ids(self, scientific_name: str, source: Optional[str] = None) -> bool:
+        """Elimina el file_id de una fuente o, sin fuente, todos los de la especie"""
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor()
+            if source:
+                cursor.execute(
+                    "DELETE FROM telegram_photo_cache WHERE scientific_name = %s AND source = %s",
+                    (scientific_name, source)
+                )
+            else:
+                cursor.execute("DELETE FROM telegram_photo_cache WHERE scientific_name = %s", (scientific_name,))
+            self.connection.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error al eliminar file_id de {scientific_name}: {str(e)}")
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+
+    def save_chats(self, rows: List[tuple]) -> bool:
+        """
+        Guarda un lote del registro de chats en una transacción.
+
+        Args:
+            rows: (id, type, title, last_activity, bot_status); last_activity o bot_status
+                  a None no modifican el valor guardado
+        """
+        actividad = [(r[0], r[1], r[2], r[3]) for r in rows if r[3] is not None]
+        estados = [(r[0], r[1], r[2], r[4]) for r in rows if r[4] is not None]
+        cursor = None
+        try:
+            self.ensure_connection()
+            self.connection.start_transaction()
+            cursor = self.connection.cursor()
+            if actividad:
+                cursor.executemany("""
+                    INSERT INTO chats (id, type, title, last_activity)
+                    VALUES (%s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        type = COALESCE(VALUES(type), type),
+                        title = COALESCE(VALUES(title), title),
+                        last_activity = VALUES(last_activity)
+                """, actividad)
+            if estados:
+                cursor.executemany("""
+                    INSERT INTO chats (id, type, title, bot_status)
+                    VALUES (%s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        type = COALESCE(VALUES(type), type),
+                        title = COALESCE(VALUES(title), title),
+                        bot_status = VALUES(bot_status)
+                """, estados)
+            self.connection.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error al guardar el registro de chats: {str(e)}")
+            if self.connection:
+                self.connection.rollback()
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+
+    def get_broadcast_chats(self, statuses, only_groups: bool = False) -> List[Dict]:
+        """Chats en los que el bot tiene alguno de los estados indicados, por actividad reciente"""
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor(dictionary=True)
+            marcadores = ', '.join(['%s'] * len(statuses))
+            consulta = f"""
+                SELECT id, type, title, last_activity
+                FROM chats
+                WHERE bot_status IN ({marcadores})
+            """
+            if only_groups:
+                consulta += " AND id < 0"
+            cursor.execute(consulta + " ORDER BY last_activity DESC", tuple(statuses))
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error al obtener los chats de destino: {str(e)}")
+            return []
+        finally:
+            if cursor:
+                cursor.close()
+
+    def get_popular_species(self, limit: int = 100) -> List[Dict]:
+        """Especies con foto ordenadas por número de búsquedas"""
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor(dictionary=True)
+            cursor.execute("""
+                SELECT s.id, s.scientific_name, s.photo_url, COALESCE(SUM(ss.search_count), 0) AS searches
+                FROM species s
+                LEFT JOIN search_stats ss ON ss.species_id = s.id
+                WHERE s.photo_url IS NOT NULL AND s.photo_url != ''
+                GROUP BY s.id, s.scientific_name, s.photo_url
+                ORDER BY searches DESC, s.scientific_name
+                LIMIT %s
+            """, (limit,))
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error al obtener especies populares: {str(e)}")
+            return []
+        finally:
+            if cursor:
+                cursor.close()
+
     def reset_daily_xp_limits(self):
         """Restablece los límites diarios de XP para todos los usuarios"""
         try:
@@ -2137,6 +2705,24 @@ class AntDatabase:
             if cursor:
                 cursor.close()
 
+    def get_game_species(self) -> List[Dict]:
+        """Especies con foto para el juego de adivinar, con su región"""
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor(dictionary=True)
+            cursor.execute("""
+                SELECT id, scientific_name, photo_url, region
+                FROM species
+                WHERE photo_url LIKE 'http%'
+            """)
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error al obtener especies para el juego: {str(e)}")
+            return []
+        finally:
+            if cursor:
+                cursor.close()
+
     def can_play_guessing_game(self, user_id, chat_id):
         """Verifica si el usuario puede jugar al juego de adivinar la especie"""
         try:
@@ -2242,6 +2828,60 @@ class AntDatabase:
             if cursor:
                 cursor.close()
 
+    def get_open_game_windows(self, window_seconds: int = 86400) -> List[Dict]:
+        """Ventanas de intentos del juego cuyo último intento está dentro del periodo, de la más antigua a la más reciente"""
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor(dictionary=True)
+            cursor.execute("""
+                SELECT user_id, chat_id, species_id, attempts, last_attempt
+                FROM species_guessing_game
+                WHERE last_attempt >= DATE_SUB(NOW(), INTERVAL %s SECOND)
+                ORDER BY last_attempt
+            """, (window_seconds,))
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error al cargar intentos del juego: {str(e)}")
+            return []
+        finally:
+            if cursor:
+                cursor.close()
+
+    def save_game_attempts(self, new_windows: List[tuple], updated_windows: List[tuple]) -> bool:
+        """
+        Guarda un lote de intentos del juego en una transacción.
+
+        Args:
+            new_windows: (user_id, chat_id, species_id, attempts, last_attempt) de ventanas nuevas
+            updated_windows: (attempts, last_attempt, species_id, user_id, chat_id, last_attempt_guardado)
+        """
+        cursor = None
+        try:
+            self.ensure_connection()
+            self.connection.start_transaction()
+            cursor = self.connection.cursor()
+            if new_windows:
+                cursor.executemany("""
+                    INSERT INTO species_guessing_game (user_id, chat_id, species_id, attempts, last_attempt)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, new_windows)
+            if updated_windows:
+                cursor.executemany("""
+                    UPDATE species_guessing_game
+                    SET attempts = %s, last_attempt = %s, species_id = %s
+                    WHERE user_id = %s AND chat_id = %s AND last_attempt = %s
+                """, updated_windows)
+            self.connection.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error al guardar intentos del juego: {str(e)}")
+            if self.connection:
+                self.connection.rollback()
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+
     def get_species_by_id(self, species_id):
         """Obtiene una especie por su ID"""
         try:
@@ -2300,7 +2940,7 @@ class AntDatabase:
         try:
             cursor = self.connection.cursor(dictionary=True)
             cursor.execute("""
-                SELECT description, last_updated 
+                SELECT description, COALESCE(checked_at, last_updated) AS last_checked
                 FROM species_descriptions 
                 WHERE scientific_name = %s
             """, (scientific_name,))
@@ -2309,10 +2949,10 @@ class AntDatabase:
             cursor.close()
             
             if result:
-                # Verificar si la descripción tiene más de 30 días
-                last_updated = result['last_updated']
-                if last_updated:
-                    days_old = (datetime.now() - last_updated).days
+                # Verificar si la descripción lleva más de 30 días sin comprobarse contra AntWiki
+                last_checked = result['last_checked']
+                if last_checked:
+                    days_old = (datetime.now() - last_checked).days
                     if days_old > 30:
                         return None  # Forzar regeneración si es muy antigua
                 return result['description']
@@ -2322,23 +2962,144 @@ class AntDatabase:
             logger.error(f"Error obteniendo descripción de especie: {str(e)}")
             return None
 
-    def save_species_description(self, scientific_name: str, description: str) -> bool:
+    def get_description_entry(self, scientific_name: str) -> Optional[Dict]:
+        """Descripción guardada con los datos para revalidarla (hash de las fuentes, ETag, Last-Modified)"""
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor(dictionary=True)
+            cursor.execute("""
+                SELECT scientific_name, description, source_hash, etag, last_modified, last_updated,
+                       COALESCE(checked_at, last_updated) AS last_checked
+                FROM species_descriptions
+                WHERE scientific_name = %s
+            """, (scientific_name,))
+            return cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Error obteniendo descripción de {scientific_name}: {str(e)}")
+            return None
+        finally:
+            if cursor:
+                cursor.close()
+
+    def mark_description_checked(self, scientific_name: str, etag: Optional[str] = None,
+                                 last_modified: Optional[str] = None, source_hash: Optional[str] = None) -> bool:
+        """Marca la descripción como comprobada sin cambiar el texto"""
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor()
+            cursor.execute("""
+                UPDATE species_descriptions
+                SET checked_at = NOW(),
+                    etag = COALESCE(%s, etag),
+                    last_modified = COALESCE(%s, last_modified),
+                    source_hash = COALESCE(%s, source_hash)
+                WHERE scientific_name = %s
+            """, (etag, last_modified, source_hash, scientific_name))
+            self.connection.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error al marcar descripción comprobada de {scientific_name}: {str(e)}")
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+
+    def get_description_candidates(self, limit: Optional[int] = None, refresh_days: int = 25) -> List[Dict]:
+        """
+        Especies sin descripción o con una descripción a punto de caducar, las más buscadas primero
+        """
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor(dictionary=True)
+            query = """
+                SELECT s.id, s.scientific_name, COALESCE(SUM(ss.search_count), 0) AS searches,
+                       COALESCE(sd.checked_at, sd.last_updated) AS last_checked
+                FROM species s
+                LEFT JOIN search_stats ss ON ss.species_id = s.id
+                LEFT JOIN species_descriptions sd ON sd.scientific_name = s.scientific_name
+                WHERE sd.scientific_name IS NULL
+                   OR COALESCE(sd.checked_at, sd.last_updated) IS NULL
+                   OR COALESCE(sd.checked_at, sd.last_updated) < DATE_SUB(NOW(), INTERVAL %s DAY)
+                GROUP BY s.id, s.scientific_name, last_checked
+                ORDER BY searches DESC, last_checked IS NOT NULL, last_checked, s.scientific_name
+            """
+            params = [refresh_days]
+            if limit:
+                query += " LIMIT %s"
+                params.append(limit)
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error al obtener especies sin descripción: {str(e)}")
+            return []
+        finally:
+            if cursor:
+                cursor.close()
+
+    def get_description_coverage(self, refresh_days: int = 25, expire_days: int = 30, popular: int = 100) -> Dict:
+        """Cobertura de species_descriptions en todo el catálogo y entre las especies más buscadas"""
+        cursor = None
+        try:
+            cursor = self.get_connection().cursor(dictionary=True)
+            cursor.execute("""
+                SELECT COUNT(*) AS total,
+                       SUM(sd.last_checked >= DATE_SUB(NOW(), INTERVAL %s DAY)) AS vigentes,
+                       SUM(sd.last_checked < DATE_SUB(NOW(), INTERVAL %s DAY)
+                           AND sd.last_checked >= DATE_SUB(NOW(), INTERVAL %s DAY)) AS por_caducar,
+                       SUM(sd.scientific_name IS NULL OR sd.last_checked < DATE_SUB(NOW(), INTERVAL %s DAY)) AS sin_descripcion
+                FROM species s
+                LEFT JOIN (
+                    SELECT scientific_name, COALESCE(checked_at, last_updated) AS last_checked
+                    FROM species_descriptions
+                ) sd ON sd.scientific_name = s.scientific_name
+            """, (refresh_days, refresh_days, expire_days, expire_days))
+            cobertura = {k: int(v or 0) for k, v in cursor.fetchone().items()}
+
+            cursor.execute("""
+                SELECT COUNT(*) AS populares,
+                       SUM(COALESCE(sd.checked_at, sd.last_updated) >= DATE_SUB(NOW(), INTERVAL %s DAY)) AS populares_cubiertas
+                FROM (
+                    SELECT s.scientific_name
+                    FROM species s
+                    JOIN search_stats ss ON ss.species_id = s.id
+                    GROUP BY s.id, s.scientific_name
+                    ORDER BY SUM(ss.search_count) DESC
+                    LIMIT %s
+                ) p
+                LEFT JOIN species_descriptions sd ON sd.scientific_name = p.scientific_name
+            """, (expire_days, popular))
+            cobertura.update({k: int(v or 0) for k, v in cursor.fetchone().items()})
+            return cobertura
+        except Exception as e:
+            logger.error(f"Error al calcular la cobertura de descripciones: {str(e)}")
+            return {}
+        finally:
+            if cursor:
+                cursor.close()
+
+    def save_species_description(self, scientific_name: str, description: str, source_hash: Optional[str] = None,
+                                 etag: Optional[str] = None, last_modified: Optional[str] = None) -> bool:
         """
-        Guarda la descripción de una especie en caché
+        Guarda la descripción de una especie en caché junto con el hash de las fuentes de las que salió
         """
         try:
             cursor = self.get_connection().cursor()
             
             # Insertar o actualizar la descripción usando las columnas correctas
             query = """
-                INSERT INTO species_descriptions (scientific_name, description, last_updated) 
-                VALUES (%s, %s, NOW()) 
+                INSERT INTO species_descriptions
+                (scientific_name, description, last_updated, source_hash, etag, last_modified, checked_at)
+                VALUES (%s, %s, NOW(), %s, %s, %s, NOW())
                 ON DUPLICATE KEY UPDATE 
                 description = VALUES(description), 
-                last_updated = NOW()
+                last_updated = NOW(),
+                source_hash = VALUES(source_hash),
+                etag = VALUES(etag),
+                last_modified = VALUES(last_modified),
+                checked_at = NOW()
             """
             
-            cursor.execute(query, (scientific_name, description))
+            cursor.execute(query, (scientific_name, description, source_hash, etag, last_modified))
             self.connection.commit()
             logger.info(f"Descripción guardada para {scientific_name}")
             return True
@@ -2350,6 +3111,53 @@ class AntDatabase:
             if cursor:
                 cursor.close()
 
+    def add_openai_usage(self, day: date, prompt_tokens: int = 0, completion_tokens: int = 0,
+                         cost: float = 0.0, request_count: int = 0, fallback_count: int = 0) -> Optional[Dict]:
+        """
+        Suma el uso de OpenAI al total del día con un único UPSERT, de modo que varios
+        procesos pueden registrar a la vez sin pisarse, y devuelve los totales resultantes
+        """
+        cursor = None
+        try:
+            self.ensure_connection()
+            cursor = self.connection.cursor(dictionary=True)
+            cursor.execute("""
+                INSERT INTO openai_usage (day, prompt_tokens, completion_tokens, cost, requests, fallbacks)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    prompt_tokens = prompt_tokens + VALUES(prompt_tokens),
+                    completion_tokens = completion_tokens + VALUES(completion_tokens),
+                    cost = cost + VALUES(cost),
+                    requests = requests + VALUES(requests),
+                    fallbacks = fallbacks + VALUES(fallbacks)
+            """, (day, prompt_tokens, completion_tokens, cost, request_count, fallback_count))
+            self.connection.commit()
+            cursor.execute("SELECT * FROM openai_usage WHERE day = %s", (day,))
+            return cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Error al registrar el uso de OpenAI: {str(e)}")
+            if self.connection:
+                self.connection.rollback()
+            return None
+        finally:
+            if cursor:
+                cursor.close()
+
+    def get_openai_usage(self, day: date) -> Optional[Dict]:
+        """Uso de OpenAI acumulado en el día por todos los procesos ({} si aún no hay)"""
+        cursor = None
+        try:
+            self.ensure_connection()
+            cursor = self.connection.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM openai_usage WHERE day = %s", (day,))
+            return cursor.fetchone() or {}
+        except Exception as e:
+            logger.error(f"Error al obtener el uso de OpenAI: {str(e)}")
+            return None
+        finally:
+            if cursor:
+                cursor.close()
+
     def create_translation_tables(self):
         """Crea las tablas necesarias para el sistema de traducción"""
         try:
@@ -2442,8 +3250,12 @@ class AntDatabase:
             if cursor:
                 cursor.close()
 
-    def get_user_language(self, user_id: int, chat_id: int):
+    def get_user_language(self, user_id: int, chat_id: int, contexto=None):
         """Obtiene el idioma preferido de un usuario"""
+        ctx = self._contexto(contexto, user_id, chat_id)
+        if ctx:
+            return ctx.idioma
+        cursor = None
         try:
             cursor = self.get_connection().cursor(dictionary=True)
             
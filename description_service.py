@@ -0,0 +1,475 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import date, datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+from openai import AsyncOpenAI
+
+from html_extractor import extraer_antwiki, agrupar_secciones, extraer_en_executor
+from rate_limiter import CircuitOpenError, limitador_fuentes
+
+logger = logging.getLogger(__name__)
+
+OPENAI_MODELO = os.getenv('OPENAI_MODELO', 'gpt-3.5-turbo')
+# Completions simultáneas y segundos máximos por descripción (incluida la espera en cola)
+OPENAI_MAX_CONCURRENTES = int(os.getenv('OPENAI_MAX_CONCURRENTES', 4))
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 20))
+# Presupuesto diario; al superarlo se usa el resumen básico
+OPENAI_TOKENS_DIARIOS = int(os.getenv('OPENAI_TOKENS_DIARIOS', 200000))
+OPENAI_COSTE_DIARIO = float(os.getenv('OPENAI_COSTE_DIARIO', 1.0))
+# Precio en dólares por cada 1000 tokens de entrada y de salida
+OPENAI_PRECIO_ENTRADA = float(os.getenv('OPENAI_PRECIO_ENTRADA', 0.0005))
+OPENAI_PRECIO_SALIDA = float(os.getenv('OPENAI_PRECIO_SALIDA', 0.0015))
+
+# Segundos durante los que se reutiliza el uso del día leído de la base de datos; entre
+# lecturas solo se ven al momento las peticiones de este proceso
+INTERVALO_LECTURA_USO = 30
+
+# Las descripciones caducan a los 30 días sin comprobarse contra AntWiki; el lote renueva antes
+DESCRIPCION_CADUCIDAD_DIAS = 30
+DESCRIPCION_RENOVAR_DIAS = int(os.getenv('DESCRIPCION_RENOVAR_DIAS', 25))
+# Fracción del presupuesto diario que el lote deja libre para las peticiones de los usuarios
+DESCRIPCION_RESERVA_USUARIOS = float(os.getenv('DESCRIPCION_RESERVA_USUARIOS', 0.3))
+# Servir la descripción caducada al momento y revalidarla en segundo plano
+DESCRIPCION_SWR = os.getenv('DESCRIPCION_SWR', '1') != '0'
+
+ANTWIKI_WIKI = 'https://www.antwiki.org/wiki/'
+MAX_TOKENS_RESPUESTA = 200
+TEMAS_ANTWIKI = {
+    'description': ['description', 'descripción'],
+    'distribution': ['distribution', 'distribución'],
+    'habitat': ['habitat', 'hábitat'],
+    'behavior': ['behavior', 'behaviour', 'comportamiento']
+}
+MENSAJE_SISTEMA = (
+    "Eres un experto en mirmecología especializado en generar resúmenes BREVES y precisos sobre "
+    "especies de hormigas. Debes ser conciso y mantener el texto dentro del límite de caracteres."
+)
+
+
+def construir_prompt(nombre_cientifico: str, info: Dict[str, List[str]]) -> str:
+    """Prompt con la información de AntWiki agrupada por temas"""
+    return f"""Genera un resumen BREVE Y CONCISO (máximo 800 caracteres en total) sobre la hormiga {nombre_cientifico} basado en la siguiente información de AntWiki.
+                        El resumen debe ser en español y destacar solo los aspectos más interesantes y únicos de la especie.
+
+                        Información disponible:
+
+                        Descripción: {' '.join(info.get('description', [])[:1])}
+
+                        Distribución: {' '.join(info.get('distribution', []))}
+
+                        Hábitat: {' '.join(info.get('habitat', []))}
+
+                        Comportamiento: {' '.join(info.get('behavior', []))}
+
+                        Medidas: {' '.join(info.get('measurements', []))}
+
+                        IMPORTANTE:
+                        1. El resumen DEBE ser menor a 800 caracteres en total
+                        2. Usa máximo 2-3 emojis en todo el texto
+                        3. Estructura el texto en 2-3 líneas máximo
+                        4. Prioriza la información más interesante y única
+                        5. Si no hay información en alguna sección, omítela
+                        """
+
+
+def info_desde_pagina(pagina: Dict) -> Dict[str, List[str]]:
+    """Agrupa las secciones y la tabla de una página de AntWiki por temas"""
+    info = agrupar_secciones(pagina['secciones'], TEMAS_ANTWIKI)
+    info['measurements'] = []
+
+    # La información de la tabla (infobox) va antes que la de las secciones
+    infobox = {'distribution': [], 'habitat': []}
+    for key, val in pagina['infobox']:
+        if any(word in key for word in ['size', 'length', 'measurements']):
+            info['measurements'].append(f"{key}: {val}")
+        elif 'distribution' in key:
+            infobox['distribution'].append(val)
+        elif 'habitat' in key:
+            infobox['habitat'].append(val)
+    for key, valores in infobox.items():
+        info[key] = valores + info[key]
+    return info
+
+
+def hash_fuentes(info: Dict[str, List[str]]) -> str:
+    """Hash de las secciones extraídas de AntWiki; si no cambia, la descripción sigue valiendo"""
+    return hashlib.sha256(json.dumps(info, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class DescriptionService:
+    """
+    Generación de descripciones de especies con OpenAI.
+
+    Usa un único cliente para todo el bot, limita las completions simultáneas con un
+    semáforo (el resto espera en cola) y lleva la cuenta diaria de tokens y coste en la
+    tabla openai_usage, que comparten todos los procesos del bot. Si no hay presupuesto, la petición no cabe en el plazo o la API falla,
+    generar() devuelve None y quien llama usa el resumen básico.
+
+    Las descripciones guardadas llevan el hash de las secciones de AntWiki de las que salieron.
+    Al caducar se revalidan con una petición condicional (ETag/Last-Modified) y solo se vuelve
+    a llamar a OpenAI si la página ha cambiado.
+    """
+
+    def __init__(self, db, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 modelo: str = OPENAI_MODELO, max_concurrentes: int = OPENAI_MAX_CONCURRENTES,
+                 timeout: float = OPENAI_TIMEOUT, tokens_diarios: int = OPENAI_TOKENS_DIARIOS,
+                 coste_diario: float = OPENAI_COSTE_DIARIO):
+        self.db = db
+        self.modelo = modelo
+        self.timeout = timeout
+        self.tokens_diarios = tokens_diarios
+        self.coste_diario = coste_diario
+        api_key = api_key or os.getenv('OPENAI_API_KEY')
+        # OPENAI_BASE_URL permite apuntar a un servidor local (ver stub_openai.py)
+        base_url = base_url or os.getenv('OPENAI_BASE_URL') or None
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=1) if api_key else None
+        self.semaforo = asyncio.Semaphore(max(1, max_concurrentes))
+        self.uso: Optional[Dict] = None
+        self._uso_leido = 0.0
+        # Tokens y coste estimados de las peticiones en curso, para no pasarse con varias a la vez
+        self._reservado = [0, 0.0]
+        self._revalidando: Dict[str, asyncio.Task] = {}
+
+    # --- Contabilidad diaria ---
+
+    def _actualizar_uso(self, dia: str, fila: Dict) -> Dict:
+        self.uso = {
+            'dia': dia,
+            'tokens_entrada': int(fila.get('prompt_tokens') or 0),
+            'tokens_salida': int(fila.get('completion_tokens') or 0),
+            'coste': float(fila.get('cost') or 0),
+            'peticiones': int(fila.get('requests') or 0),
+            'respaldos': int(fila.get('fallbacks') or 0),
+        }
+        self._uso_leido = time.monotonic()
+        return self.uso
+
+    def uso_hoy(self) -> Dict:
+        """Tokens, coste y peticiones del día de todos los procesos (releídos cada INTERVALO_LECTURA_USO s)"""
+        hoy = date.today()
+        nuevo_dia = self.uso is None or self.uso['dia'] != hoy.isoformat()
+        if nuevo_dia or time.monotonic() - self._uso_leido >= INTERVALO_LECTURA_USO:
+            fila = self.db.get_openai_usage(hoy)
+            if fila is not None:
+                self._actualizar_uso(hoy.isoformat(), fila)
+            elif nuevo_dia:
+                # Sin base de datos se cuenta solo lo de este proceso
+                self._actualizar_uso(hoy.isoformat(), {})
+        return self.uso
+
+    def _sumar_uso(self, tokens_entrada: int = 0, tokens_salida: int = 0, peticiones: int = 0, respaldos: int = 0):
+        """Suma el uso en la base de datos (de forma atómica) y se queda con los totales resultantes"""
+        coste = (tokens_entrada * OPENAI_PRECIO_ENTRADA + tokens_salida * OPENAI_PRECIO_SALIDA) / 1000
+        hoy = date.today()
+        fila = self.db.add_openai_usage(hoy, tokens_entrada, tokens_salida, coste, peticiones, respaldos)
+        if fila:
+            self._actualizar_uso(hoy.isoformat(), fila)
+            return
+        uso = self.uso_hoy()
+        uso['tokens_entrada'] += tokens_entrada
+        uso['tokens_salida'] += tokens_salida
+        uso['coste'] += coste
+        uso['peticiones'] += peticiones
+        uso['respaldos'] += respaldos
+
+    def _registrar_uso(self, tokens_entrada: int, tokens_salida: int):
+        self._sumar_uso(tokens_entrada, tokens_salida, peticiones=1)
+
+    def registrar_respaldo(self):
+        """Cuenta una descripción servida con el resumen básico"""
+        self._sumar_uso(respaldos=1)
+
+    def _estimar(self, prompt: str):
+        """Tokens y coste máximos de una petición (unos 4 caracteres por token)"""
+        entrada = len(prompt) // 4
+        return entrada + MAX_TOKENS_RESPUESTA, (entrada * OPENAI_PRECIO_ENTRADA + MAX_TOKENS_RESPUESTA * OPENAI_PRECIO_SALIDA) / 1000
+
+    def fraccion_restante(self) -> float:
+        """Parte del presupuesto diario (tokens o coste, la menor) que queda sin usar"""
+        uso = self.uso_hoy()
+        tokens = 1 - (uso['tokens_entrada'] + uso['tokens_salida'] + self._reservado[0]) / self.tokens_diarios
+        coste = 1 - (uso['coste'] + self._reservado[1]) / self.coste_diario
+        return max(0.0, min(tokens, coste))
+
+    def hay_presupuesto(self, prompt: str = '') -> bool:
+        """Comprueba si la petición cabe en el presupuesto contando las que están en curso"""
+        uso = self.uso_hoy()
+        tokens, coste = self._estimar(prompt)
+        return (uso['tokens_entrada'] + uso['tokens_salida'] + self._reservado[0] + tokens <= self.tokens_diarios
+                and uso['coste'] + self._reservado[1] + coste <= self.coste_diario)
+
+    # --- Generación ---
+
+    def disponible(self) -> bool:
+        return self.client is not None
+
+    async def _completar(self, prompt: str) -> Optional[str]:
+        async with self.semaforo:
+            completion = await self.client.chat.completions.create(
+                model=self.modelo,
+                messages=[
+                    {"role": "system", "content": MENSAJE_SISTEMA},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=MAX_TOKENS_RESPUESTA
+            )
+        if completion.usage:
+            self._registrar_uso(completion.usage.prompt_tokens, completion.usage.completion_tokens)
+        return completion.choices[0].message.content
+
+    async def _completar_stream(self, nombre_cientifico: str, prompt: str,
+                                on_parcial: Callable[[str], Awaitable[None]]) -> Optional[str]:
+        """Completion en streaming: llama a on_parcial con el texto acumulado tras cada fragmento"""
+        partes: List[str] = []
+        uso = None
+        async with self.semaforo:
+            inicio = time.monotonic()
+            primer_fragmento = None
+            stream = await self.client.chat.completions.create(
+                model=self.modelo,
+                messages=[
+                    {"role": "system", "content": MENSAJE_SISTEMA},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=MAX_TOKENS_RESPUESTA,
+                stream=True
+            )
+            async for chunk in stream:
+                if getattr(chunk, 'usage', None):
+                    uso = chunk.usage
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                if primer_fragmento is None:
+                    primer_fragmento = time.monotonic() - inicio
+                partes.append(chunk.choices[0].delta.content)
+                await on_parcial(''.join(partes))
+
+        texto = ''.join(partes)
+        logger.info(
+            f"Descripción de {nombre_cientifico} en streaming: primer fragmento en "
+            f"{primer_fragmento if primer_fragmento is not None else 0:.2f}s, completa en {time.monotonic() - inicio:.2f}s"
+        )
+        # Sin stream_options la API no devuelve el uso en streaming (el cliente lo deja como dict
+        # si algún servidor lo envía); si no llega, se estima por caracteres
+        if isinstance(uso, dict):
+            self._registrar_uso(uso.get('prompt_tokens', 0), uso.get('completion_tokens', 0))
+        elif uso:
+            self._registrar_uso(uso.prompt_tokens, uso.completion_tokens)
+        else:
+            self._registrar_uso(len(prompt) // 4, len(texto) // 4)
+        return texto or None
+
+    async def generar(self, nombre_cientifico: str, info: Dict[str, List[str]],
+                      on_parcial: Optional[Callable[[str], Awaitable[None]]] = None) -> Optional[str]:
+        """
+        Descripción generada o None si hay que usar el resumen básico.
+
+        Con on_parcial la completion se pide en streaming y se va notificando el texto parcial.
+        """
+        if not self.client:
+            return None
+        prompt = construir_prompt(nombre_cientifico, info)
+        if not self.hay_presupuesto(prompt):
+            logger.warning(f"Presupuesto diario de OpenAI agotado, resumen básico para: {nombre_cientifico}")
+            return None
+        tokens, coste = self._estimar(prompt)
+        self._reservado[0] += tokens
+        self._reservado[1] += coste
+        try:
+            if on_parcial:
+                return await asyncio.wait_for(self._completar_stream(nombre_cientifico, prompt, on_parcial),
+                                              timeout=self.timeout)
+            return await asyncio.wait_for(self._completar(prompt), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Tiempo de espera agotado al generar la descripción de {nombre_cientifico}")
+        except Exception as e:
+            logger.error(f"Error al generar descripción con OpenAI para {nombre_cientifico}: {str(e)}")
+        finally:
+            self._reservado[0] -= tokens
+            self._reservado[1] -= coste
+        return None
+
+    async def descargar_antwiki(self, nombre_cientifico: str, session: aiohttp.ClientSession,
+                                etag: Optional[str] = None, last_modified: Optional[str] = None) -> Dict:
+        """
+        Descarga la página de AntWiki de la especie, condicionada a ETag/Last-Modified si se indican.
+
+        Devuelve {'status', 'info', 'etag', 'last_modified'}; info es None si la página no ha
+        cambiado (304) o no existe.
+        """
+        genus, species = nombre_cientifico.split()[:2]
+        url = f"{ANTWIKI_WIKI}{genus}_{species}"
+        cabeceras = {}
+        if etag:
+            cabeceras['If-None-Match'] = etag
+        if last_modified:
+            cabeceras['If-Modified-Since'] = last_modified
+        async with limitador_fuentes.get(session, url, headers=cabeceras) as response:
+            resultado = {
+                'status': response.status,
+                'info': None,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+            if response.status != 200:
+                return resultado
+            html = await response.text()
+        # Extraer información relevante fuera del event loop
+        pagina = await extraer_en_executor(extraer_antwiki, html)
+        resultado['info'] = info_desde_pagina(pagina) if pagina else None
+        return resultado
+
+    async def revalidar(self, nombre_cientifico: str, session: Optional[aiohttp.ClientSession] = None,
+                        entrada: Optional[Dict] = None,
+                        on_parcial: Optional[Callable[[str], Awaitable[None]]] = None) -> Dict:
+        """
+        Comprueba la descripción guardada contra AntWiki y la regenera solo si las fuentes cambian.
+
+        Devuelve {'descripcion', 'info', 'resultado'} donde resultado es 'sin_cambios',
+        'generada', 'sin_antwiki' o 'error'. Con 'error', info permite construir el resumen básico;
+        si el circuito de AntWiki está abierto se devuelve la descripción guardada tal cual.
+        """
+        if session is None:
+            async with aiohttp.ClientSession() as session:
+                return await self.revalidar(nombre_cientifico, session, entrada, on_parcial)
+
+        if entrada is None:
+            entrada = self.db.get_description_entry(nombre_cientifico)
+        anterior = entrada.get('description') if entrada else None
+
+        try:
+            pagina = await self.descargar_antwiki(
+                nombre_cientifico, session,
+                entrada.get('etag') if anterior else None,
+                entrada.get('last_modified') if anterior else None
+            )
+        except CircuitOpenError as e:
+            # AntWiki está fallando: se sirve lo guardado sin marcarlo como comprobado
+            logger.warning(f"No se revalida {nombre_cientifico}: {str(e)}")
+            return {'descripcion': anterior, 'info': None, 'resultado': 'error'}
+        if pagina['status'] == 304 and anterior:
+            self.db.mark_description_checked(nombre_cientifico, pagina['etag'], pagina['last_modified'])
+            logger.info(f"AntWiki sin cambios (304) para: {nombre_cientifico}")
+            return {'descripcion': anterior, 'info': None, 'resultado': 'sin_cambios'}
+
+        info = pagina['info']
+        if not info:
+            if anterior:
+                # Se conserva la descripción y no se vuelve a comprobar hasta que caduque de nuevo
+                self.db.mark_description_checked(nombre_cientifico)
+            return {'descripcion': anterior, 'info': None, 'resultado': 'sin_antwiki'}
+
+        huella = hash_fuentes(info)
+        if anterior and entrada.get('source_hash') == huella:
+            self.db.mark_description_checked(nombre_cientifico, pagina['etag'], pagina['last_modified'])
+            logger.info(f"Fuentes sin cambios para: {nombre_cientifico}")
+            return {'descripcion': anterior, 'info': info, 'resultado': 'sin_cambios'}
+
+        descripcion = await self.generar(nombre_cientifico, info, on_parcial)
+        if not descripcion:
+            return {'descripcion': anterior, 'info': info, 'resultado': 'error'}
+        if self.db.save_species_description(nombre_cientifico, descripcion, huella,
+                                            pagina['etag'], pagina['last_modified']):
+            logger.info(f"Descripción guardada en caché para: {nombre_cientifico}")
+        else:
+            logger.warning(f"No se pudo guardar la descripción en caché para: {nombre_cientifico}")
+        return {'descripcion': descripcion, 'info': info, 'resultado': 'generada'}
+
+    def revalidar_en_segundo_plano(self, nombre_cientifico: str, entrada: Optional[Dict] = None):
+        """Lanza la revalidación si no hay otra en curso para la misma especie"""
+        if nombre_cientifico in self._revalidando:
+            return
+
+        async def tarea():
+            try:
+                await self.revalidar(nombre_cientifico, entrada=entrada)
+            except Exception as e:
+                logger.error(f"Error al revalidar la descripción de {nombre_cientifico}: {str(e)}")
+            finally:
+                self._revalidando.pop(nombre_cientifico, None)
+
+        self._revalidando[nombre_cientifico] = asyncio.create_task(tarea())
+
+    def desde_cache(self, nombre_cientifico: str) -> Optional[Dict]:
+        """
+        Descripción guardada que se puede mostrar ya, sin peticiones externas, o None.
+
+        Una descripción vigente se devuelve como 'cache'. Si ha caducado y está activo
+        DESCRIPCION_SWR, se devuelve igualmente ('caducada') y se revalida en segundo plano.
+        """
+        entrada = self.db.get_description_entry(nombre_cientifico)
+        if entrada and entrada.get('description'):
+            comprobada = entrada.get('last_checked')
+            if comprobada and (datetime.now() - comprobada).days <= DESCRIPCION_CADUCIDAD_DIAS:
+                return {'descripcion': entrada['description'], 'info': None, 'resultado': 'cache'}
+            if DESCRIPCION_SWR:
+                self.revalidar_en_segundo_plano(nombre_cientifico, entrada)
+                return {'descripcion': entrada['description'], 'info': None, 'resultado': 'caducada'}
+        return None
+
+    async def describir(self, nombre_cientifico: str,
+                        on_parcial: Optional[Callable[[str], Awaitable[None]]] = None) -> Dict:
+        """
+        Descripción para mostrar al usuario: {'descripcion', 'info', 'resultado'}.
+
+        Usa la caché si se puede (ver desde_cache); si no, revalida antes de responder.
+        """
+        resultado = self.desde_cache(nombre_cientifico)
+        if resultado:
+            return resultado
+        return await self.revalidar(nombre_cientifico, on_parcial=on_parcial)
+
+    async def pregenerar(self, especies: Iterable[Dict], workers: int = OPENAI_MAX_CONCURRENTES,
+                         reserva: float = DESCRIPCION_RESERVA_USUARIOS,
+                         on_progress: Optional[Callable[[Dict], Awaitable[None]]] = None) -> Dict:
+        """
+        Genera o renueva en lote las descripciones de las especies indicadas, en su orden.
+        Las que no han cambiado en AntWiki solo se marcan como comprobadas.
+
+        Se detiene antes de gastar la fracción `reserva` del presupuesto diario, que queda
+        para las búsquedas de los usuarios.
+        """
+        especies = list(especies)
+        estado = {'total': len(especies), 'procesadas': 0, 'generadas': 0, 'sin_cambios': 0, 'sin_antwiki': 0,
+                  'errores': 0, 'sin_presupuesto': False, 'inicio': time.monotonic()}
+        cola: asyncio.Queue = asyncio.Queue()
+        for especie in especies:
+            cola.put_nowait(especie)
+
+        async def trabajador(session: aiohttp.ClientSession):
+            while True:
+                try:
+                    especie = cola.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                if not self.client or self.fraccion_restante() <= reserva:
+                    estado['sin_presupuesto'] = True
+                    return
+                try:
+                    resultado = await self.revalidar(especie['scientific_name'], session)
+                    clave = {'generada': 'generadas', 'sin_cambios': 'sin_cambios',
+                             'sin_antwiki': 'sin_antwiki'}.get(resultado['resultado'], 'errores')
+                    estado[clave] += 1
+                except Exception as e:
+                    estado['errores'] += 1
+                    logger.error(f"Error al pregenerar la descripción de {especie['scientific_name']}: {str(e)}")
+                estado['procesadas'] += 1
+                if on_progress:
+                    await on_progress(dict(estado))
+
+        async with aiohttp.ClientSession() as session:
+            await asyncio.gather(*[trabajador(session) for _ in range(max(1, workers))])
+        estado['transcurrido'] = time.monotonic() - estado.pop('inicio')
+        return estado
+
+    async def close(self):
+        if self.client:
+            await self.client.close()
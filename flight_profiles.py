@@ -0,0 +1,217 @@
+import logging
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Los histogramas se decodifican como ndarray para puntuar muchos géneros a la vez; si NumPy
+# no estuviera instalado (está en requirements.txt) se usa array.array con el mismo resultado
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MESES = 12
+HORAS = 24
+TEMP_MIN = -5
+TEMP_MAX = 45
+TEMPERATURAS = TEMP_MAX - TEMP_MIN + 1
+FASES_LUNARES = [
+    'new moon', 'waxing crescent', 'first quarter', 'waxing gibbous',
+    'full moon', 'waning gibbous', 'last quarter', 'waning crescent',
+]
+SINONIMOS_FASE = {'third quarter': 'last quarter', 'new': 'new moon', 'full': 'full moon'}
+
+# Tipo de estadística -> (columna del histograma, número de posiciones)
+HISTOGRAMAS = {
+    'month': ('months', MESES),
+    'hour': ('hours', HORAS),
+    'temperature': ('temperatures', TEMPERATURAS),
+    'moon': ('moon_phases', len(FASES_LUNARES)),
+}
+
+
+def _indice_fase(valor) -> Optional[int]:
+    texto = str(valor).strip().lower()
+    texto = SINONIMOS_FASE.get(texto, texto)
+    if texto in FASES_LUNARES:
+        return FASES_LUNARES.index(texto)
+    try:
+        indice = int(float(texto))
+    except ValueError:
+        return None
+    return indice if 0 <= indice < len(FASES_LUNARES) else None
+
+
+def indice(stats_type: str, valor) -> Optional[int]:
+    """Posición del valor dentro del histograma del tipo indicado"""
+    try:
+        if stats_type == 'month':
+            i = int(float(valor)) - 1
+            return i if 0 <= i < MESES else None
+        if stats_type == 'hour':
+            i = int(float(valor))
+            return i if 0 <= i < HORAS else None
+        if stats_type == 'temperature':
+            # Los extremos se acumulan en la primera y la última posición
+            return min(max(int(round(float(valor))), TEMP_MIN), TEMP_MAX) - TEMP_MIN
+        if stats_type == 'moon':
+            return _indice_fase(valor)
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def valor_de_indice(stats_type: str, i: int):
+    """Valor original correspondiente a una posición del histograma"""
+    if stats_type == 'month':
+        return i + 1
+    if stats_type == 'temperature':
+        return float(i + TEMP_MIN)
+    if stats_type == 'moon':
+        return FASES_LUNARES[i].title()
+    return i
+
+
+def codificar(valores: Iterable[int]) -> bytes:
+    """Empaqueta un histograma como enteros sin signo de 32 bits en little-endian"""
+    datos = array('I', valores)
+    if sys.byteorder == 'big':
+        datos.byteswap()
+    return datos.tobytes()
+
+
+def decodificar(blob: Optional[bytes], tamano: int):
+    """Convierte un blob en ndarray (o array.array sin NumPy) del tamaño indicado"""
+    if np is not None:
+        datos = np.frombuffer(blob, dtype='<u4') if blob else np.zeros(0, dtype='<u4')
+        # Igual que con array.array: se rellena con ceros o se recorta, nunca se repiten datos
+        histograma = np.zeros(tamano, dtype=np.uint32)
+        n = min(len(datos), tamano)
+        histograma[:n] = datos[:n]
+        return histograma
+
+    datos = array('I')
+    if blob:
+        datos.frombytes(bytes(blob))
+        if sys.byteorder == 'big':
+            datos.byteswap()
+    if len(datos) < tamano:
+        datos.extend([0] * (tamano - len(datos)))
+    return datos[:tamano]
+
+
+def perfiles_desde_stats(stats: Dict[str, List[Dict]]) -> Dict[str, Dict[str, List[int]]]:
+    """
+    Agrupa los puntos de AntFlights en histogramas de tamaño fijo por hemisferio.
+
+    Los meses vienen separados por hemisferio; hora, temperatura y fase lunar se
+    guardan en el perfil 'World'.
+    """
+    perfiles: Dict[str, Dict[str, List[int]]] = {}
+
+    def perfil(hemisferio: str) -> Dict[str, List[int]]:
+        if hemisferio not in perfiles:
+            perfiles[hemisferio] = {columna: [0] * tamano for columna, tamano in HISTOGRAMAS.values()}
+        return perfiles[hemisferio]
+
+    claves = {'month': 'month', 'hour': 'hour', 'temperature': 'temperature', 'moon': 'phase'}
+    for stats_type, (columna, _) in HISTOGRAMAS.items():
+        for punto in stats.get(stats_type) or []:
+            i = indice(stats_type, punto.get(claves[stats_type]))
+            if i is None:
+                continue
+            hemisferio = (punto.get('hemisphere') or 'World') if stats_type == 'month' else 'World'
+            perfil(hemisferio)[columna][i] += int(punto.get('count') or 0)
+    return perfiles
+
+
+def a_filas(perfiles: Dict[str, Dict], stats_type: Optional[str] = None) -> List[Dict]:
+    """
+    Convierte perfiles decodificados en las filas que devolvía get_flight_stats
+    ({'month': 5, 'flight_count': 12, 'hemisphere': 'North'}, ...), omitiendo posiciones vacías.
+    """
+    columnas_legacy = {'month': 'month', 'hour': 'hour', 'temperature': 'temperature_c', 'moon': 'moon_phase'}
+    filas = []
+    for tipo, (columna, _) in HISTOGRAMAS.items():
+        if stats_type and tipo != stats_type:
+            continue
+        for hemisferio, perfil in perfiles.items():
+            for i, count in enumerate(perfil[columna]):
+                if not count:
+                    continue
+                fila = {columnas_legacy[tipo]: valor_de_indice(tipo, i), 'flight_count': int(count),
+                        'hemisphere': hemisferio}
+                if not stats_type:
+                    fila['stats_type'] = tipo
+                filas.append(fila)
+    return filas
+
+
+def _perfil_mensual(perfiles_genero: Dict[str, Dict], hemisferio: str) -> Optional[Dict]:
+    """
+    Perfil del que sacar el histograma mensual: el del hemisferio pedido y, si no tiene
+    meses, el primero que sí los tenga. 'World' casi siempre existe (guarda hora,
+    temperatura y fase lunar) aunque sus meses estén a cero, así que no basta con que exista.
+    """
+    columna = HISTOGRAMAS['month'][0]
+    candidatos = [perfiles_genero.get(hemisferio)] + list(perfiles_genero.values())
+    for perfil in candidatos:
+        if perfil is not None and sum(int(v) for v in perfil.get(columna, ())) > 0:
+            return perfil
+    return None
+
+
+def puntuar(perfiles: Dict[str, Dict], mes: Optional[int] = None, hora: Optional[int] = None,
+            temperatura: Optional[float] = None, hemisferio: str = 'World') -> Dict[str, float]:
+    """
+    Puntúa varios géneros a la vez para unas condiciones dadas.
+
+    Args:
+        perfiles: género -> {hemisferio -> perfil decodificado}, como devuelve get_flight_profiles
+        mes, hora, temperatura: condiciones actuales (las que falten no se tienen en cuenta)
+        hemisferio: hemisferio para el histograma mensual
+
+    Returns:
+        género -> probabilidad relativa (producto de la frecuencia de cada condición)
+    """
+    if not perfiles:
+        return {}
+    condiciones = [
+        ('month', mes, lambda p: _perfil_mensual(p, hemisferio)),
+        ('hour', hora, lambda p: p.get('World')),
+        ('temperature', temperatura, lambda p: p.get('World')),
+    ]
+    generos = list(perfiles)
+
+    if np is not None:
+        puntuacion = np.ones(len(generos))
+        for tipo, valor, elegir in condiciones:
+            if valor is None:
+                continue
+            columna, tamano = HISTOGRAMAS[tipo]
+            i = indice(tipo, valor)
+            if i is None:
+                continue
+            matriz = np.stack([
+                (elegir(perfiles[g]) or {}).get(columna, np.zeros(tamano, dtype=np.uint32)) for g in generos
+            ]).astype(np.float64)
+            totales = matriz.sum(axis=1)
+            frecuencia = np.divide(matriz[:, i], totales, out=np.zeros(len(generos)), where=totales > 0)
+            puntuacion *= frecuencia
+        return dict(zip(generos, puntuacion.tolist()))
+
+    puntuacion = {g: 1.0 for g in generos}
+    for tipo, valor, elegir in condiciones:
+        if valor is None:
+            continue
+        columna, _ = HISTOGRAMAS[tipo]
+        i = indice(tipo, valor)
+        if i is None:
+            continue
+        for g in generos:
+            histograma = (elegir(perfiles[g]) or {}).get(columna)
+            total = sum(histograma) if histograma else 0
+            puntuacion[g] *= histograma[i] / total if total else 0.0
+    return puntuacion
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = 3
+VENTANA = timedelta(hours=24)
+# Segundos entre escrituras en lote a species_guessing_game
+INTERVALO_ESCRITURA = 5.0
+
+
+def formatear_proxima_partida(proxima: datetime, ahora: Optional[datetime] = None) -> str:
+    """Hora a la que se podrá volver a jugar, indicando si es hoy o mañana"""
+    ahora = ahora or datetime.now()
+    if proxima.date() == ahora.date():
+        return f"{proxima.strftime('%H:%M')} (hoy)"
+    elif (proxima.date() - ahora.date()).days == 1:
+        return f"{proxima.strftime('%H:%M')} (mañana)"
+    return proxima.strftime("%H:%M del %d/%m/%Y")
+
+
+class AttemptTracker:
+    """
+    Intentos del juego de adivinar la especie por (usuario, chat), en memoria.
+
+    Se mantiene la regla de species_guessing_game: como máximo MAX_INTENTOS mientras el
+    último intento tenga menos de 24 horas. Las comprobaciones no tocan la base de datos;
+    los intentos se escriben en segundo plano en lotes y al arrancar se reconstruye el
+    estado a partir de las ventanas todavía abiertas.
+    """
+
+    def __init__(self, db, max_intentos: int = MAX_INTENTOS, ventana: timedelta = VENTANA,
+                 intervalo_escritura: float = INTERVALO_ESCRITURA):
+        self.db = db
+        self.max_intentos = max_intentos
+        self.ventana = ventana
+        self.intervalo_escritura = intervalo_escritura
+        # (user_id, chat_id) -> {'attempts', 'last_attempt', 'species_id', 'persistido'}
+        # 'persistido' es el last_attempt de la fila ya escrita, o None si la ventana es nueva
+        self.ventanas: Dict[Tuple[int, int], Dict] = {}
+        self.pendientes: Dict[Tuple[int, int], Dict] = {}
+        self._tarea: Optional[asyncio.Task] = None
+        self._hay_pendientes: Optional[asyncio.Event] = None
+
+    def cargar(self) -> int:
+        """Reconstruye las ventanas abiertas desde species_guessing_game"""
+        for fila in self.db.get_open_game_windows(int(self.ventana.total_seconds())):
+            self.ventanas[(fila['user_id'], fila['chat_id'])] = {
+                'attempts': fila['attempts'],
+                'last_attempt': fila['last_attempt'],
+                'species_id': fila['species_id'],
+                'persistido': fila['last_attempt'],
+            }
+        logger.info(f"Juego de especies: {len(self.ventanas)} ventanas de intentos cargadas")
+        return len(self.ventanas)
+
+    def _ventana(self, user_id: int, chat_id: int, ahora: datetime) -> Optional[Dict]:
+        ventana = self.ventanas.get((user_id, chat_id))
+        if ventana and ahora - ventana['last_attempt'] >= self.ventana:
+            return None
+        return ventana
+
+    def puede_jugar(self, user_id: int, chat_id: int) -> bool:
+        ventana = self._ventana(user_id, chat_id, datetime.now())
+        return not ventana or ventana['attempts'] < self.max_intentos
+
+    def proxima_partida(self, user_id: int, chat_id: int) -> Optional[str]:
+        """Hora formateada a la que podrá jugar de nuevo, o None si ya puede"""
+        ahora = datetime.now()
+        ventana = self._ventana(user_id, chat_id, ahora)
+        if not ventana or ventana['attempts'] < self.max_intentos:
+            return None
+        return formatear_proxima_partida(ventana['last_attempt'] + self.ventana, ahora)
+
+    def mensaje_limite(self, user_id: int, chat_id: int) -> str:
+        proxima = self.proxima_partida(user_id, chat_id)
+        if proxima:
+            return f"Ya has jugado {self.max_intentos} veces en las últimas 24 horas. Podrás jugar de nuevo a las {proxima}."
+        return f"Ya has jugado {self.max_intentos} veces en las últimas 24 horas. ¡Vuelve mañana!"
+
+    def registrar(self, user_id: int, chat_id: int, species_id: int, is_correct: bool) -> bool:
+        """
+        Cuenta un intento. Devuelve False si el usuario ya había agotado sus intentos, sin
+        contarlo; así una doble pulsación no puede pasar del límite.
+        """
+        # TIMESTAMP de MySQL guarda segundos: se trunca para poder localizar la fila al actualizar
+        ahora = datetime.now().replace(microsecond=0)
+        clave = (user_id, chat_id)
+        ventana = self._ventana(user_id, chat_id, ahora)
+        if ventana is None:
+            ventana = {'attempts': 0, 'persistido': None}
+            self.ventanas[clave] = ventana
+        elif ventana['attempts'] >= self.max_intentos:
+            return False
+        ventana['attempts'] += 1
+        ventana['last_attempt'] = ahora
+        ventana['species_id'] = species_id
+        self.pendientes[clave] = ventana
+        if self._hay_pendientes:
+            self._hay_pendientes.set()
+        logger.info(f"Intento de juego registrado: usuario {user_id}, correcto: {is_correct}")
+        return True
+
+    def vaciar(self) -> int:
+        """Escribe los intentos pendientes en un único lote"""
+        if not self.pendientes:
+            return 0
+        lote = self.pendientes
+        self.pendientes = {}
+        nuevas, actualizadas = [], []
+        for (user_id, chat_id), ventana in lote.items():
+            if ventana['persistido'] is None:
+                nuevas.append((user_id, chat_id, ventana['species_id'], ventana['attempts'], ventana['last_attempt']))
+            else:
+                actualizadas.append((ventana['attempts'], ventana['last_attempt'], ventana['species_id'],
+                                     user_id, chat_id, ventana['persistido']))
+        if not self.db.save_game_attempts(nuevas, actualizadas):
+            # Se reintentan en la próxima escritura sin pisar intentos más recientes
+            for clave, ventana in lote.items():
+                self.pendientes.setdefault(clave, ventana)
+            return 0
+        for ventana in lote.values():
+            ventana['persistido'] = ventana['last_attempt']
+        return len(lote)
+
+    async def _escritor(self):
+        while True:
+            await self._hay_pendientes.wait()
+            self._hay_pendientes.clear()
+            # Agrupar los intentos que lleguen durante el intervalo
+            await asyncio.sleep(self.intervalo_escritura)
+            try:
+                self.vaciar()
+            except Exception as e:
+                logger.error(f"Error al guardar intentos del juego: {str(e)}")
+            if self.pendientes:
+                self._hay_pendientes.set()
+
+    def iniciar(self):
+        """Arranca la escritura en segundo plano (necesita el bucle de eventos en marcha)"""
+        if self._tarea is None:
+            self._hay_pendientes = asyncio.Event()
+            if self.pendientes:
+                self._hay_pendientes.set()
+            self._tarea = asyncio.create_task(self._escritor())
+
+    async def detener(self):
+        """Detiene el escritor y guarda lo pendiente"""
+        if self._tarea:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+        self.vaciar()
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Set
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Rondas preparadas por chat y umbral a partir del cual se rellena la cola
+RONDAS_POR_CHAT = 5
+UMBRAL_RELLENO = 2
+OPCIONES_POR_RONDA = 4
+# Especies correctas recientes por chat que no se repiten
+HISTORIAL_POR_CHAT = 30
+# Segundos entre recargas de las especies con foto
+RECARGA_ESPECIES = 1800
+TIMEOUT_VALIDACION = 8
+
+
+def genero(especie: Dict) -> str:
+    return especie['scientific_name'].split()[0].lower()
+
+
+def continentes(especie: Dict) -> Set[str]:
+    region = especie.get('region') or ''
+    return {c.strip() for c in region.split(',') if c.strip() and c.strip() != 'Desconocido'}
+
+
+class RoundGenerator:
+    """
+    Genera por adelantado las rondas de /adivina_especie.
+
+    Cada chat tiene una cola de rondas listas (especie correcta, tres distractores y foto
+    comprobada). Empezar una partida solo saca la siguiente ronda de la cola; cuando quedan
+    pocas se rellena en segundo plano. Los distractores se eligen primero del mismo género,
+    después de la misma región y solo al final al azar, así que las opciones se parecen.
+    """
+
+    def __init__(self, db, photo_cache=None, rondas_por_chat: int = RONDAS_POR_CHAT,
+                 umbral_relleno: int = UMBRAL_RELLENO):
+        self.db = db
+        self.photo_cache = photo_cache
+        self.rondas_por_chat = max(1, rondas_por_chat)
+        self.umbral_relleno = umbral_relleno
+
+        self.especies: List[Dict] = []
+        self.por_id: Dict[int, Dict] = {}
+        self.por_genero: Dict[str, List[Dict]] = defaultdict(list)
+        self.por_continente: Dict[str, List[Dict]] = defaultdict(list)
+        self._cargadas = 0.0
+
+        self.colas: Dict[int, Deque[Dict]] = defaultdict(deque)
+        self.recientes: Dict[int, Deque[int]] = defaultdict(lambda: deque(maxlen=HISTORIAL_POR_CHAT))
+        self.rellenos: Dict[int, asyncio.Task] = {}
+        # Fotos comprobadas: id -> True (válida) / False (descartada)
+        self.fotos_validadas: Dict[int, bool] = {}
+
+    def cargar(self, forzar: bool = False) -> int:
+        """Carga (o recarga, si ha caducado) las especies con foto y sus índices"""
+        if not forzar and self.especies and time.monotonic() - self._cargadas < RECARGA_ESPECIES:
+            return len(self.especies)
+        especies = [e for e in self.db.get_game_species() if self.fotos_validadas.get(e['id']) is not False]
+        por_genero, por_continente = defaultdict(list), defaultdict(list)
+        for especie in especies:
+            por_genero[genero(especie)].append(especie)
+            for continente in continentes(especie):
+                por_continente[continente].append(especie)
+        self.especies, self.por_genero, self.por_continente = especies, por_genero, por_continente
+        self.por_id = {e['id']: e for e in especies}
+        self._cargadas = time.monotonic()
+        logger.info(f"Juego de especies: {len(especies)} especies con foto disponibles")
+        return len(especies)
+
+    def especie(self, species_id: int) -> Optional[Dict]:
+        """Especie cargada por id, sin consultar la base de datos"""
+        return self.por_id.get(species_id)
+
+    def descartar(self, species_id: int):
+        """Retira una especie cuya foto no se puede enviar y las rondas que la usan"""
+        self.fotos_validadas[species_id] = False
+        for cola in self.colas.values():
+            for ronda in [r for r in cola if r['especie']['id'] == species_id]:
+                cola.remove(ronda)
+
+    def _distractores(self, correcta: Dict) -> List[Dict]:
+        elegidos: Dict[int, Dict] = {}
+        grupos = [self.por_genero.get(genero(correcta), [])]
+        grupos += [self.por_continente.get(c, []) for c in continentes(correcta)]
+        for grupo in grupos:
+            candidatas = [e for e in grupo if e['id'] != correcta['id'] and e['id'] not in elegidos]
+            for especie in random.sample(candidatas, min(len(candidatas), OPCIONES_POR_RONDA - 1 - len(elegidos))):
+                elegidos[especie['id']] = especie
+            if len(elegidos) == OPCIONES_POR_RONDA - 1:
+                return list(elegidos.values())
+
+        # Relleno al azar; con miles de especies casi nunca hace falta repetir el sorteo
+        while len(elegidos) < OPCIONES_POR_RONDA - 1:
+            especie = random.choice(self.especies)
+            if especie['id'] != correcta['id']:
+                elegidos[especie['id']] = especie
+        return list(elegidos.values())
+
+    async def _foto_valida(self, session: aiohttp.ClientSession, especie: Dict) -> bool:
+        """La foto ya tiene file_id o la URL responde con una imagen"""
+        validada = self.fotos_validadas.get(especie['id'])
+        if validada is not None:
+            return validada
+        if self.photo_cache and self.photo_cache.obtener(especie['scientific_name'], especie['photo_url']):
+            self.fotos_validadas[especie['id']] = True
+            return True
+        try:
+            async with session.head(especie['photo_url'], allow_redirects=True) as response:
+                if response.status == 405:
+                    async with session.get(especie['photo_url']) as response_get:
+                        valida = response_get.status == 200 and response_get.content_type.startswith('image/')
+                else:
+                    valida = response.status == 200 and response.content_type.startswith('image/')
+        except Exception as e:
+            logger.warning(f"No se pudo comprobar la foto de {especie['scientific_name']}: {str(e)}")
+            # Un fallo de red no descarta la especie; se vuelve a intentar en otra ronda
+            return False
+        self.fotos_validadas[especie['id']] = valida
+        return valida
+
+    async def _generar(self, session: aiohttp.ClientSession, chat_id: int, excluir: Set[int]) -> Optional[Dict]:
+        if len(self.especies) < OPCIONES_POR_RONDA:
+            return None
+        for _ in range(10):
+            correcta = random.choice(self.especies)
+            if correcta['id'] in excluir or correcta['id'] in self.recientes[chat_id]:
+                continue
+            if not await self._foto_valida(session, correcta):
+                continue
+            opciones = [correcta] + self._distractores(correcta)
+            random.shuffle(opciones)
+            return {'especie': correcta, 'opciones': opciones}
+        return None
+
+    async def _rellenar(self, chat_id: int):
+        try:
+            self.cargar()
+            cola = self.colas[chat_id]
+            timeout = aiohttp.ClientTimeout(total=TIMEOUT_VALIDACION)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                while len(cola) < self.rondas_por_chat:
+                    ronda = await self._generar(session, chat_id, {r['especie']['id'] for r in cola})
+                    if not ronda:
+                        break
+                    cola.append(ronda)
+        except Exception as e:
+            logger.error(f"Error al preparar rondas del juego para el chat {chat_id}: {str(e)}")
+        finally:
+            self.rellenos.pop(chat_id, None)
+
+    def rellenar(self, chat_id: int) -> asyncio.Task:
+        """Lanza el relleno de la cola del chat si no hay uno en marcha"""
+        tarea = self.rellenos.get(chat_id)
+        if tarea is None:
+            tarea = asyncio.create_task(self._rellenar(chat_id))
+            self.rellenos[chat_id] = tarea
+        return tarea
+
+    async def siguiente(self, chat_id: int) -> Optional[Dict]:
+        """
+        Devuelve la siguiente ronda del chat: {'especie': dict, 'opciones': [4 dicts]}.
+
+        Solo espera si la cola está vacía (primera partida del chat); en cualquier otro caso
+        la ronda sale de la cola y el relleno continúa en segundo plano.
+        """
+        cola = self.colas[chat_id]
+        if not cola:
+            await self.rellenar(chat_id)
+        if not cola:
+            return None
+        ronda = cola.popleft()
+        self.recientes[chat_id].append(ronda['especie']['id'])
+        if len(cola) <= self.umbral_relleno:
+            self.rellenar(chat_id)
+        return ronda
@@ -0,0 +1,100 @@
+import json
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+CLAVE_ESTADO_POR_DEFECTO = 'crawl_estadisticas_vuelos'
+# El progreso guardado caduca a las 24 horas; después se empieza de cero
+EXPIRACION_ESTADO = 24 * 3600
+
+
+class GenusCrawler(WorkerPool):
+    """
+    Actualiza las estadísticas de vuelos de muchos géneros con un número limitado de trabajadores.
+
+    `actualizar(genus)` debe devolver True si el género se actualizó. El límite de peticiones
+    por host lo aplica limitador_fuentes dentro de la descarga, así que aquí solo se limita
+    el número de géneros en curso. El progreso se guarda en temp_data para que, si el bot se
+    reinicia, la siguiente ejecución continúe con los géneros pendientes.
+    """
+
+    unidad = 'géneros'
+
+    def __init__(self, db, actualizar: Callable[[str], Awaitable[bool]], workers: int = 4,
+                 clave_estado: str = CLAVE_ESTADO_POR_DEFECTO, intervalo_progreso: float = 10.0,
+                 on_progress: Optional[Callable[[Dict], Awaitable[None]]] = None):
+        super().__init__(workers, intervalo_progreso, on_progress)
+        self.db = db
+        self.actualizar = actualizar
+        self.clave_estado = clave_estado
+
+        self.completados: Set[str] = set()
+        self.estado.update({'actualizados': 0, 'errores': []})
+
+    def cargar_estado(self) -> Set[str]:
+        """Lee los géneros ya completados por una ejecución anterior interrumpida"""
+        try:
+            guardado = self.db.get_temp_data(self.clave_estado)
+            if guardado:
+                self.completados = set(json.loads(guardado).get('completados', []))
+        except Exception as e:
+            logger.error(f"Error al cargar el progreso de estadísticas: {str(e)}")
+        return self.completados
+
+    def _guardar_estado(self):
+        self.db.set_temp_data(self.clave_estado, json.dumps({
+            'completados': sorted(self.completados),
+            'actualizados': self.estado['actualizados'],
+            'errores': self.estado['errores'][-50:],
+        }), expire=EXPIRACION_ESTADO)
+
+    def al_informar(self):
+        # El progreso se persiste al mismo ritmo que se informa
+        self._guardar_estado()
+
+    async def procesar_elemento(self, genus: str):
+        try:
+            if await self.actualizar(genus):
+                self.estado['actualizados'] += 1
+                self.completados.add(genus.lower())
+            else:
+                self.estado['errores'].append(genus)
+        except Exception as e:
+            logger.error(f"Error al actualizar {genus}: {str(e)}")
+            self.estado['errores'].append(genus)
+        finally:
+            self.estado['procesados'] += 1
+
+    async def ejecutar(self, generos: List[str]) -> Dict:
+        """Procesa los géneros pendientes y devuelve el resumen final"""
+        generos = list(dict.fromkeys(g for g in generos if g))
+        self.cargar_estado()
+        self.estado['total'] = len(generos)
+
+        pendientes = []
+        for genus in generos:
+            if genus.lower() in self.completados:
+                self.estado['omitidos'] += 1
+            else:
+                pendientes.append(genus)
+
+        if self.estado['omitidos']:
+            logger.info(f"Reanudando estadísticas: {self.estado['omitidos']} géneros ya actualizados")
+
+        completado = False
+        try:
+            await self.ejecutar_cola(pendientes)
+            completado = True
+        finally:
+            if completado:
+                # La siguiente ejecución empieza de cero
+                self.db.delete_temp_data(self.clave_estado)
+            else:
+                self._guardar_estado()
+
+        # Sin al_informar: el estado ya se ha borrado o guardado
+        await self.notificar()
+        return self.resumen()
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+logger = logging.getLogger(__name__)
+
+# lxml es bastante más rápido que html.parser; si no está instalado se usa el parser estándar
+try:
+    import lxml  # noqa: F401
+    PARSER_HTML = 'lxml'
+except ImportError:
+    PARSER_HTML = 'html.parser'
+
+ANTWIKI_BASE = 'https://www.antwiki.org'
+
+# En AntWiki el infobox, las secciones y la galería están dentro de mw-content-text,
+# así que no hace falta construir el árbol de la cabecera, menús ni pie de página
+FILTRO_ANTWIKI = SoupStrainer(id='mw-content-text')
+
+CLASES_ANTONTOP = {
+    'wp-post-image',
+    'woocommerce-product-details__short-description',
+    'woocommerce-Tabs-panel--description',
+}
+
+
+def _clases(attrs) -> List[str]:
+    valor = attrs.get('class') if attrs else None
+    if not valor:
+        return []
+    return valor.split() if isinstance(valor, str) else list(valor)
+
+
+def _filtro_antontop(nombre, attrs) -> bool:
+    """Conserva solo la imagen principal, las descripciones y la tabla de detalles"""
+    if nombre in ('h4', 'table'):
+        return True
+    return any(clase in CLASES_ANTONTOP for clase in _clases(attrs))
+
+
+FILTRO_ANTONTOP = SoupStrainer(_filtro_antontop)
+
+
+def _url_absoluta(src: str) -> str:
+    if src.startswith('//'):
+        return f"https:{src}"
+    if src.startswith('/'):
+        return f"{ANTWIKI_BASE}{src}"
+    return src
+
+
+def _es_foto_valida(src: str) -> bool:
+    return bool(src) and not src.endswith(('.svg', '.png')) and 'icon' not in src.lower()
+
+
+def _titulo_seccion(encabezado) -> str:
+    titular = encabezado.find(class_='mw-headline')
+    return (titular or encabezado).get_text().strip()
+
+
+def extraer_antwiki(html: str) -> Optional[Dict]:
+    """
+    Extrae de una página de especie de AntWiki el infobox, las secciones de contenido,
+    la galería y el primer párrafo relevante, parseando solo el bloque de contenido.
+
+    Returns:
+        Diccionario con 'infobox' (lista de (clave, valor)), 'infobox_foto', 'galeria_foto',
+        'primera_foto', 'primer_parrafo' y 'secciones' (lista de (título, párrafos)),
+        o None si la página no tiene bloque de contenido
+    """
+    soup = BeautifulSoup(html, PARSER_HTML, parse_only=FILTRO_ANTWIKI)
+    content = soup.find(id='mw-content-text')
+    if not content:
+        return None
+
+    info = {
+        'infobox': [],
+        'infobox_foto': None,
+        'galeria_foto': None,
+        'primera_foto': None,
+        'primer_parrafo': None,
+        'secciones': []
+    }
+
+    infobox = content.find('table', class_='infobox')
+    if infobox:
+        for row in infobox.find_all('tr'):
+            header = row.find('th')
+            value = row.find('td')
+            if header and value:
+                info['infobox'].append((header.get_text().strip().lower(), value.get_text().strip()))
+        for img in infobox.find_all('img'):
+            if _es_foto_valida(img.get('src', '')):
+                info['infobox_foto'] = _url_absoluta(img['src'])
+                break
+
+    gallery = content.find('div', class_='gallery')
+    if gallery:
+        img = gallery.find('img')
+        if img and img.get('src'):
+            info['galeria_foto'] = _url_absoluta(img['src'])
+
+    for img in content.find_all('img'):
+        if _es_foto_valida(img.get('src', '')):
+            info['primera_foto'] = _url_absoluta(img['src'])
+            break
+
+    # Recorrido único de los hijos del contenido en lugar de una cadena de hermanos por encabezado
+    contenedor = content.find(class_='mw-parser-output') or content
+    titulo_actual = None
+    parrafos: List[str] = []
+    for elem in contenedor.find_all(True, recursive=False):
+        encabezado = None
+        if elem.name in ('h2', 'h3'):
+            encabezado = elem
+        elif elem.name == 'div' and 'mw-heading' in (elem.get('class') or []):
+            encabezado = elem.find(['h2', 'h3'])
+
+        if encabezado is not None:
+            if titulo_actual is not None:
+                info['secciones'].append((titulo_actual, parrafos))
+            titulo_actual = _titulo_seccion(encabezado)
+            parrafos = []
+        elif elem.name == 'p':
+            text = elem.get_text().strip()
+            if not text:
+                continue
+            if info['primer_parrafo'] is None and len(text) > 50:
+                info['primer_parrafo'] = text
+            if titulo_actual is not None:
+                parrafos.append(text)
+
+    if titulo_actual is not None:
+        info['secciones'].append((titulo_actual, parrafos))
+
+    return info
+
+
+def agrupar_secciones(secciones: List[Tuple[str, List[str]]], temas: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """
+    Agrupa los párrafos de las secciones según palabras clave en el título.
+
+    Args:
+        secciones: Lista de (título, párrafos) devuelta por extraer_antwiki
+        temas: Diccionario tema -> palabras clave; se asigna el primer tema que coincide
+    """
+    agrupado = {tema: [] for tema in temas}
+    for titulo, parrafos in secciones:
+        titulo = titulo.lower()
+        for tema, palabras in temas.items():
+            if any(palabra in titulo for palabra in palabras):
+                agrupado[tema].extend(parrafos)
+                break
+    return agrupado
+
+
+def extraer_antontop(html: str) -> Dict:
+    """
+    Extrae la imagen principal, las descripciones y la tabla de detalles de una ficha de AntOnTop.
+
+    Returns:
+        Diccionario con 'photo_url', 'short_description', 'short_description_parrafo'
+        (solo el primer párrafo), 'description' y 'detalles' (lista de (clave, valor) de la tabla de producto)
+    """
+    soup = BeautifulSoup(html, PARSER_HTML, parse_only=FILTRO_ANTONTOP)
+
+    info = {
+        'photo_url': None,
+        'short_description': None,
+        'short_description_parrafo': None,
+        'description': None,
+        'detalles': []
+    }
+
+    main_image = soup.find('img', class_='wp-post-image')
+    if main_image and main_image.get('src'):
+        info['photo_url'] = main_image.get('src')
+
+    short_desc_div = soup.find('div', class_='woocommerce-product-details__short-description')
+    if short_desc_div:
+        info['short_description'] = ' '.join(short_desc_div.stripped_strings)
+        p_tag = short_desc_div.find('p')
+        if p_tag:
+            info['short_description_parrafo'] = p_tag.get_text().strip()
+
+    description_section = soup.find('div', class_='woocommerce-Tabs-panel--description')
+    if description_section:
+        info['description'] = description_section.get_text().strip()
+
+    product_details = soup.find('h4', string='Detalles de producto') or soup.find('h4', string='Product details')
+    if product_details:
+        details_table = product_details.find_next('table')
+        if details_table:
+            for row in details_table.find_all('tr'):
+                cells = row.find_all('td')
+                if len(cells) == 2:
+                    info['detalles'].append((
+                        ' '.join(cells[0].stripped_strings).lower(),
+                        ' '.join(cells[1].stripped_strings)
+                    ))
+
+    return info
+
+
+async def extraer_en_executor(funcion: Callable[[str], Dict], html: str):
+    """Ejecuta una función de extracción en el pool de hilos para no bloquear el event loop"""
+    return await asyncio.get_event_loop().run_in_executor(None, funcion, html)
@@ -0,0 +1,250 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import aiohttp
+
+from rate_limiter import limitador_fuentes
+
+logger = logging.getLogger(__name__)
+
+INATURALIST_BASE = 'https://api.inaturalist.org/v1'
+# El endpoint /v1/taxa/{ids} acepta hasta 30 ids separados por comas
+MAX_IDS_POR_PETICION = 30
+MAX_ENTRADAS_CACHE = 5000
+
+
+def formatear_taxon(result: Dict) -> Dict:
+    """Convierte un resultado de la API en el diccionario que usa el bot"""
+    info = {
+        "id": result.get("id"),
+        "name": result.get("name"),
+        "rank": result.get("rank"),
+        "preferred_common_name": result.get("preferred_common_name"),
+        "wikipedia_url": result.get("wikipedia_url"),
+        "wikipedia_summary": result.get("wikipedia_summary"),
+        "observations_count": result.get("observations_count", 0),
+        "establishment_means": result.get("establishment_means"),
+        "native_places": result.get("native_places", []),
+        "photo_url": None
+    }
+
+    # Buscar la mejor foto disponible
+    if result.get("taxon_photos"):
+        photo = result["taxon_photos"][0].get("photo", {})
+        info["photo_url"] = photo.get("medium_url") or photo.get("url")
+    if not info["photo_url"] and result.get("default_photo"):
+        info["photo_url"] = result["default_photo"].get("medium_url")
+    return info
+
+
+def obtener_taxones_por_ids_sync(ids: Iterable, timeout: int = 10) -> Dict[str, Dict]:
+    """Versión síncrona de la consulta multi-id, para el código de base de datos que usa requests"""
+    ids = [str(i) for i in dict.fromkeys(ids) if i]
+    taxones = {}
+    for i in range(0, len(ids), MAX_IDS_POR_PETICION):
+        lote = ids[i:i + MAX_IDS_POR_PETICION]
+        try:
+            response = limitador_fuentes.get_sync(f"{INATURALIST_BASE}/taxa/{','.join(lote)}", timeout=timeout)
+            if response.status_code == 200:
+                for result in response.json().get('results', []):
+                    taxones[str(result['id'])] = formatear_taxon(result)
+        except Exception as e:
+            logger.error(f"Error al obtener taxones de iNaturalist por id: {str(e)}")
+    return taxones
+
+
+class _CacheLRU(OrderedDict):
+    def __init__(self, max_entradas: int):
+        super().__init__()
+        self.max_entradas = max_entradas
+
+    def guardar(self, clave, valor):
+        self[clave] = valor
+        self.move_to_end(clave)
+        while len(self) > self.max_entradas:
+            self.popitem(last=False)
+
+
+class INaturalistClient:
+    """
+    Cliente de iNaturalist que resuelve muchos nombres con pocas peticiones.
+
+    - Con ids conocidos usa el endpoint multi-id /v1/taxa/{id1,id2,...}.
+    - Sin ids agrupa los nombres por género y lista las especies del género de una vez;
+      solo los nombres que no aparecen ahí se buscan individualmente.
+    Los resultados se guardan en caché por nombre y por id.
+    """
+
+    def __init__(self, concurrencia: int = 4, timeout: int = 30, base_url: str = INATURALIST_BASE,
+                 limitador=limitador_fuentes):
+        self.base_url = base_url.rstrip('/')
+        self.limitador = limitador
+        self.session = None
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.semaforo = asyncio.Semaphore(concurrencia)
+        self.por_nombre = _CacheLRU(MAX_ENTRADAS_CACHE)
+        self.por_id = _CacheLRU(MAX_ENTRADAS_CACHE)
+        self._en_curso: Dict[str, asyncio.Task] = {}
+
+    async def init_session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=self.timeout)
+        return self.session
+
+    async def close_session(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    async def _get_json(self, url: str, params: Optional[Dict] = None) -> Optional[Dict]:
+        session = await self.init_session()
+        async with self.semaforo:
+            async with self.limitador.get(session, url, params=params) as response:
+                if response.status != 200:
+                    logger.warning(f"iNaturalist respondió {response.status} para {url}")
+                    return None
+                return await response.json()
+
+    def _guardar(self, taxon: Dict, nombre: Optional[str] = None):
+        self.por_id.guardar(str(taxon['id']), taxon)
+        self.por_nombre.guardar((nombre or taxon['name']).lower(), taxon)
+        if taxon.get('name'):
+            self.por_nombre.guardar(taxon['name'].lower(), taxon)
+
+    async def obtener_por_ids(self, ids: Iterable) -> Dict[str, Dict]:
+        """Obtiene el detalle de varios taxones por id, en peticiones de hasta 30 ids"""
+        ids = [str(i) for i in dict.fromkeys(ids) if i]
+        faltan = [i for i in ids if i not in self.por_id or self.por_id[i].get('_parcial')]
+
+        async def lote(ids_lote: List[str]):
+            try:
+                data = await self._get_json(f"{self.base_url}/taxa/{','.join(ids_lote)}")
+                for result in (data or {}).get('results', []):
+                    self._guardar(formatear_taxon(result))
+            except Exception as e:
+                logger.error(f"Error al obtener taxones de iNaturalist por id: {str(e)}")
+
+        await asyncio.gather(*[
+            lote(faltan[i:i + MAX_IDS_POR_PETICION])
+            for i in range(0, len(faltan), MAX_IDS_POR_PETICION)
+        ])
+        return {i: self.por_id[i] for i in ids if i in self.por_id}
+
+    async def _listar_genero(self, genero: str) -> Dict[str, Dict]:
+        """Lista de una vez todas las especies de un género"""
+        data = await self._get_json(f"{self.base_url}/taxa", {'q': genero, 'rank': 'genus', 'per_page': 5})
+        genero_id = None
+        for result in (data or {}).get('results', []):
+            if result.get('name', '').lower() == genero.lower():
+                genero_id = result['id']
+                break
+        if not genero_id:
+            return {}
+
+        especies = {}
+        pagina = 1
+        while True:
+            data = await self._get_json(f"{self.base_url}/taxa", {
+                'parent_id': genero_id, 'rank': 'species', 'per_page': 200, 'page': pagina
+            })
+            results = (data or {}).get('results', [])
+            for result in results:
+                taxon = formatear_taxon(result)
+                # Los listados no traen taxon_photos ni wikipedia_summary
+                taxon['_parcial'] = True
+                especies[taxon['name'].lower()] = taxon
+            if len(results) < 200:
+                break
+            pagina += 1
+        return especies
+
+    async def _buscar_nombre(self, nombre: str) -> Optional[Dict]:
+        """
+        Búsqueda individual de un nombre (respaldo para sinónimos y subespecies).
+
+        Solo se acepta un resultado cuyo nombre o término coincidente (matched_term, que
+        recoge los sinónimos) sea exactamente el buscado: la búsqueda de iNaturalist es
+        aproximada y el primer resultado puede ser otra especie.
+        """
+        buscado = ' '.join(nombre.split()).lower()
+        data = await self._get_json(f"{self.base_url}/taxa", {'q': nombre, 'per_page': 10})
+        for result in (data or {}).get('results', []):
+            nombres = {' '.join((result.get(campo) or '').split()).lower() for campo in ('name', 'matched_term')}
+            if buscado in nombres:
+                return formatear_taxon(result)
+        return None
+
+    async def _resolver_y_guardar(self, nombre: str) -> Optional[Dict]:
+        try:
+            taxon = await self._buscar_nombre(nombre)
+        except Exception as e:
+            logger.error(f"Error al buscar {nombre} en iNaturalist: {str(e)}")
+            return None
+        if taxon:
+            self._guardar(taxon, nombre)
+        return taxon
+
+    async def resolver_nombre(self, nombre: str) -> Optional[Dict]:
+        """
+        Resuelve un nombre usando la caché; peticiones simultáneas del mismo nombre comparten
+        resultado. La búsqueda va en su propia tarea, así que cancelar a quien la lanzó no
+        deja esperando al resto.
+        """
+        clave = nombre.strip().lower()
+        if clave in self.por_nombre:
+            return self.por_nombre[clave]
+
+        tarea = self._en_curso.get(clave)
+        if tarea is None:
+            tarea = asyncio.ensure_future(self._resolver_y_guardar(nombre))
+            self._en_curso[clave] = tarea
+            tarea.add_done_callback(lambda _: self._en_curso.pop(clave, None))
+        return await asyncio.shield(tarea)
+
+    async def resolver_nombres(self, nombres: Iterable[str], ids_conocidos: Optional[Dict[str, str]] = None) -> Dict[str, Optional[Dict]]:
+        """
+        Resuelve una lista de nombres científicos con el menor número de peticiones.
+
+        Args:
+            nombres: Nombres científicos a resolver
+            ids_conocidos: nombre -> inaturalist_id ya guardado en la base de datos
+
+        Returns:
+            Diccionario nombre -> taxón (o None si no se encontró)
+        """
+        nombres = list(dict.fromkeys(n.strip() for n in nombres if n and n.strip()))
+        ids_conocidos = {k.lower(): v for k, v in (ids_conocidos or {}).items() if v}
+
+        # 1. Nombres con id conocido: una petición cada 30 ids
+        con_id = [n for n in nombres if n.lower() not in self.por_nombre and n.lower() in ids_conocidos]
+        if con_id:
+            encontrados = await self.obtener_por_ids(ids_conocidos[n.lower()] for n in con_id)
+            for n in con_id:
+                taxon = encontrados.get(str(ids_conocidos[n.lower()]))
+                if taxon:
+                    self.por_nombre.guardar(n.lower(), taxon)
+
+        # 2. Resto: un listado por género
+        por_genero: Dict[str, List[str]] = {}
+        for n in nombres:
+            if n.lower() not in self.por_nombre and len(n.split()) >= 2:
+                por_genero.setdefault(n.split()[0].capitalize(), []).append(n)
+
+        async def resolver_genero(genero: str, del_genero: List[str]):
+            listado = {}
+            # Para un solo nombre no compensa listar el género entero
+            if len(del_genero) > 1:
+                try:
+                    listado = await self._listar_genero(genero)
+                except Exception as e:
+                    logger.error(f"Error al listar el género {genero} en iNaturalist: {str(e)}")
+            for n in del_genero:
+                taxon = listado.get(' '.join(n.split()[:2]).lower()) if len(n.split()) == 2 else None
+                if taxon:
+                    self._guardar(taxon, n)
+                else:
+                    await self.resolver_nombre(n)
+
+        await asyncio.gather(*[resolver_genero(g, ns) for g, ns in por_genero.items()])
+        return {n: self.por_nombre.get(n.lower()) for n in nombres}
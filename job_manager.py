@@ -0,0 +1,203 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiogram.exceptions import TelegramBadRequest
+
+logger = logging.getLogger(__name__)
+
+# Trabajos de administración simultáneos en total y por tipo
+JOBS_MAX_CONCURRENTES = int(os.getenv('JOBS_MAX_CONCURRENTES', 2))
+LIMITES_POR_TIPO = {
+    'cargar_especies': 1,
+    'actualizar_regiones': 1,
+    'actualizar_estadisticas': 1,
+    'actualizar_todo': 1,
+    'aplicar_badges': 2,
+    'enviar_mensaje': 1,
+    'precalentar_fotos': 1,
+    'pregenerar_descripciones': 1,
+}
+# Trabajos que guardan su propio progreso: al relanzarlos se omite lo ya hecho
+# (checkpoint de SpeciesLoader para /cargar_especies y temp_data de GenusCrawler)
+TIPOS_REANUDABLES = {'cargar_especies', 'actualizar_estadisticas'}
+# Segundos mínimos entre ediciones del mensaje de progreso
+INTERVALO_PROGRESO = float(os.getenv('JOBS_INTERVALO_PROGRESO', 5))
+
+ESTADOS_ACTIVOS = ('pendiente', 'en_curso')
+ICONOS_ESTADO = {
+    'pendiente': '⏳',
+    'en_curso': '🔄',
+    'completado': '✅',
+    'error': '❌',
+    'cancelado': '🚫',
+    'interrumpido': '⚠️',
+}
+
+
+class Job:
+    """Trabajo en segundo plano con su mensaje de progreso"""
+
+    def __init__(self, manager: 'JobManager', job_id: int, tipo: str, chat_id: int, user_id: int,
+                 mensaje=None, descripcion: str = ''):
+        self.manager = manager
+        self.id = job_id
+        self.tipo = tipo
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.mensaje = mensaje
+        self.descripcion = descripcion
+        self.estado = 'pendiente'
+        self.progreso_texto = ''
+        self.creado = time.time()
+        self.tarea: Optional[asyncio.Task] = None
+        # True si lo para el apagado del bot y no un administrador
+        self.interrumpido = False
+        self._ultima_edicion = 0.0
+        self._ultimo_guardado = 0.0
+
+    async def editar(self, texto: str, **kwargs):
+        """Edita el mensaje del trabajo ignorando los errores de 'mensaje sin cambios'"""
+        if not self.mensaje:
+            return
+        try:
+            await self.mensaje.edit_text(texto, **kwargs)
+        except TelegramBadRequest as e:
+            if 'not modified' not in str(e):
+                logger.warning(f"No se pudo editar el mensaje del trabajo {self.id}: {str(e)}")
+
+    async def progreso(self, texto: str, forzar: bool = False, **kwargs):
+        """
+        Actualiza el progreso del trabajo. La edición del mensaje y el guardado en la base de
+        datos se limitan a una vez cada INTERVALO_PROGRESO segundos salvo que se fuerce.
+        """
+        self.progreso_texto = texto
+        ahora = time.monotonic()
+        if forzar or ahora - self._ultima_edicion >= INTERVALO_PROGRESO:
+            self._ultima_edicion = ahora
+            await self.editar(texto, **kwargs)
+        if forzar or ahora - self._ultimo_guardado >= INTERVALO_PROGRESO * 6:
+            self._ultimo_guardado = ahora
+            self.manager.db.update_job(self.id, progress=texto[:1000])
+
+    def como_relanzar(self) -> str:
+        if self.tipo in TIPOS_REANUDABLES:
+            return "Vuelve a lanzarlo con los mismos datos y continuará donde se quedó."
+        return "Vuelve a lanzarlo para empezar de nuevo."
+
+    def cancelar(self, interrumpir: bool = False) -> bool:
+        """Cancela la tarea; interrumpir=True si es por apagar el bot (queda como interrumpido)"""
+        if self.tarea and not self.tarea.done():
+            self.interrumpido = interrumpir
+            self.tarea.cancel()
+            return True
+        return False
+
+
+class JobManager:
+    """
+    Ejecuta en segundo plano los comandos largos de administración.
+
+    Cada trabajo se registra en la tabla jobs, espera a que haya hueco según el límite
+    global y el de su tipo, y puede cancelarse con /cancelar_job. Al arrancar, los trabajos
+    que quedaron a medias en la ejecución anterior se marcan como interrumpidos.
+    """
+
+    def __init__(self, db, max_concurrentes: int = JOBS_MAX_CONCURRENTES,
+                 limites_por_tipo: Optional[Dict[str, int]] = None):
+        self.db = db
+        self.bot = None
+        self.limite_global = asyncio.Semaphore(max(1, max_concurrentes))
+        self.limites_por_tipo = dict(limites_por_tipo or LIMITES_POR_TIPO)
+        self.semaforos: Dict[str, asyncio.Semaphore] = {}
+        self.activos: Dict[int, Job] = {}
+
+    def set_bot(self, bot):
+        """Establece la referencia al bot para enviar mensajes"""
+        self.bot = bot
+
+    def _semaforo(self, tipo: str) -> asyncio.Semaphore:
+        if tipo not in self.semaforos:
+            self.semaforos[tipo] = asyncio.Semaphore(self.limites_por_tipo.get(tipo, 1))
+        return self.semaforos[tipo]
+
+    def marcar_interrumpidos(self) -> int:
+        """Marca como interrumpidos los trabajos que seguían activos al reiniciar el bot"""
+        return self.db.mark_interrupted_jobs()
+
+    def en_curso(self, *tipos: str) -> Optional[Job]:
+        """Devuelve un trabajo activo de alguno de los tipos indicados, si lo hay"""
+        for job in self.activos.values():
+            if job.tipo in tipos:
+                return job
+        return None
+
+    async def lanzar(self, tipo: str, funcion: Callable[[Job], Awaitable[Optional[str]]], mensaje,
+                     user_id: int, descripcion: str = '', params: Optional[Dict] = None) -> Optional[Job]:
+        """
+        Registra y lanza un trabajo. `funcion(job)` hace el trabajo, informa con job.progreso()
+        y puede devolver un texto de resultado que se guarda en la tabla jobs.
+        """
+        chat_id = mensaje.chat.id if mensaje else None
+        job_id = self.db.create_job(tipo, chat_id, user_id, json.dumps(params or {}, ensure_ascii=False))
+        if job_id is None:
+            return None
+        job = Job(self, job_id, tipo, chat_id, user_id, mensaje, descripcion)
+        self.activos[job_id] = job
+        job.tarea = asyncio.create_task(self._ejecutar(job, funcion), name=f"job-{job_id}-{tipo}")
+        return job
+
+    async def _ejecutar(self, job: Job, funcion: Callable[[Job], Awaitable[Optional[str]]]):
+        try:
+            semaforo = self._semaforo(job.tipo)
+            if semaforo.locked() or self.limite_global.locked():
+                await job.editar(f"⏳ Trabajo #{job.id} en cola, esperando a que terminen otros trabajos...")
+            # Primero el hueco del tipo, para que un trabajo en cola no ocupe plaza global
+            async with semaforo, self.limite_global:
+                job.estado = 'en_curso'
+                self.db.update_job(job.id, status='en_curso', started=True)
+                resultado = await funcion(job)
+            job.estado = 'completado'
+            self.db.update_job(job.id, status='completado', result=(resultado or job.progreso_texto)[:1000],
+                               finished=True)
+        except asyncio.CancelledError:
+            if job.interrumpido:
+                job.estado = 'interrumpido'
+                self.db.update_job(job.id, status='interrumpido', result=job.progreso_texto[:1000], finished=True)
+                await job.editar(f"⚠️ Trabajo #{job.id} interrumpido al reiniciar el bot. "
+                                 f"{job.como_relanzar()}\n\n{job.progreso_texto}"[:4000])
+                return
+            job.estado = 'cancelado'
+            self.db.update_job(job.id, status='cancelado', result=job.progreso_texto[:1000], finished=True)
+            await job.editar(f"🚫 Trabajo #{job.id} cancelado. {job.como_relanzar()}\n\n{job.progreso_texto}"[:4000])
+        except Exception as e:
+            job.estado = 'error'
+            logger.error(f"Error en el trabajo {job.id} ({job.tipo}): {str(e)}")
+            self.db.update_job(job.id, status='error', result=str(e)[:1000], finished=True)
+            await job.editar(f"❌ Error en el trabajo #{job.id}. Por favor, intenta más tarde.")
+        finally:
+            self.activos.pop(job.id, None)
+
+    def cancelar(self, job_id: int) -> bool:
+        job = self.activos.get(job_id)
+        return job.cancelar() if job else False
+
+    def listar(self, limite: int = 10) -> List[Dict]:
+        """Trabajos activos y recientes, con el progreso en memoria de los que están en curso"""
+        trabajos = self.db.get_jobs(limite)
+        for trabajo in trabajos:
+            job = self.activos.get(trabajo['id'])
+            if job:
+                trabajo['status'] = job.estado
+                trabajo['progress'] = job.progreso_texto or trabajo.get('progress')
+        return trabajos
+
+    async def detener(self):
+        """Interrumpe los trabajos en curso (al apagar el bot)"""
+        jobs = list(self.activos.values())
+        for job in jobs:
+            job.cancelar(interrumpir=True)
+        await asyncio.gather(*[job.tarea for job in jobs if job.tarea], return_exceptions=True)
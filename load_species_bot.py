@@ -11,6 +11,10 @@ from bs4 import BeautifulSoup
 import backoff
 from urllib.parse import quote
 from deep_translator import GoogleTranslator
+from rate_limiter import limitador_fuentes, CircuitOpenError
+from html_extractor import extraer_antwiki, extraer_antontop, extraer_en_executor
+from species_loader import SpeciesLoader
+from inaturalist_client import INaturalistClient
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,6 +25,7 @@ TIMEOUT = 30
 MAX_CONCURRENT_REQUESTS = 5
 RETRY_DELAY = 5
 BATCH_SIZE = 10
+LOADER_WORKERS = int(os.getenv('LOADER_WORKERS', 4))
 INATURALIST_API = 'https://api.inaturalist.org/v1/taxa?q='
 ANTWIKI_API = 'https://www.antwiki.org/wiki/'
 ANTMAPS_API = 'https://antmaps.org/api/v01'
@@ -32,6 +37,9 @@ semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
 # Inicializar la base de datos
 db = AntDatabase('localhost', 'root', 'BFXNH2Ncj1kh@23', 'antmaster')
 
+# Cliente de iNaturalist con resolución por lotes
+inat_client = INaturalistClient()
+
 @backoff.on_exception(backoff.expo, (aiohttp.ClientError, asyncio.TimeoutError), max_tries=3)
 async def make_request(session: aiohttp.ClientSession, url: str, params: Optional[Dict] = None, is_json: bool = True) -> Optional[Dict]:
     """Realiza una solicitud HTTP con reintentos automáticos
@@ -44,7 +52,7 @@ async def make_request(session: aiohttp.ClientSession, url: str, params: Optiona
     """
     async with semaphore:  # Limitar solicitudes concurrentes
         try:
-            async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=30)) as response:
+            async with limitador_fuentes.get(session, url, params=params, timeout=aiohttp.ClientTimeout(total=30)) as response:
                 if response.status == 200:
                     if is_json:
                         return await response.json()
@@ -61,6 +69,9 @@ async def make_request(session: aiohttp.ClientSession, url: str, params: Optiona
                 else:
                     print(f"Error en la solicitud: {response.status} - {url}")
                     return None
+        except CircuitOpenError as e:
+            print(f"Petición descartada: {str(e)}")
+            return None
         except asyncio.TimeoutError:
             print(f"Timeout en la solicitud a {url}")
             return None
@@ -72,74 +83,51 @@ async def make_request(session: aiohttp.ClientSession, url: str, params: Optiona
             return None
 
 async def buscar_en_inaturalist(query):
-    """Busca información de la especie en iNaturalist."""
+    """Busca información de la especie en iNaturalist (usa la caché llenada por prefetch_inaturalist)."""
     try:
         logger.info(f"Buscando en iNaturalist: {query}")
-        url = f"{INATURALIST_API}{quote(query)}&rank=species"
+        result = await inat_client.resolver_nombre(query)
+        if not result:
+            return None
         
-        async with aiohttp.ClientSession() as session:
-            data = await make_request(session, url)
+        # Detalle por id (wikipedia_summary); tras el prefetch ya está en caché
+        details = (await inat_client.obtener_por_ids([result['id']])).get(str(result['id'])) or result
+        
+        # Traducir la descripción si está en inglés y limpiar etiquetas HTML
+        description = None
+        if details.get('wikipedia_summary'):
+            soup = BeautifulSoup(details['wikipedia_summary'], 'html.parser')
+            description = ' '.join(soup.stripped_strings)
             
-            if data and data.get('total_results', 0) > 0 and data.get('results'):
-                result = data['results'][0]
-                
-                # Obtener más detalles usando el ID de la especie
-                details_url = f"https://api.inaturalist.org/v1/taxa/{result['id']}"
-                details_data = await make_request(session, details_url)
-                
-                # Traducir la descripción si está en inglés y limpiar etiquetas HTML
-                description = None
-                if details_data and details_data.get('results', [{}])[0].get('wikipedia_summary'):
-                    description = details_data['results'][0]['wikipedia_summary']
-                    # Limpiar etiquetas HTML
-                    soup = BeautifulSoup(description, 'html.parser')
-                    description = ' '.join(soup.stripped_strings)
-                    
-                    if any(char in description for char in 'abcdefghijklmnopqrstuvwxyz'):
-                        try:
-                            translator = GoogleTranslator(source='en', target='es')
-                            description = translator.translate(description)
-                        except Exception as e:
-                            logger.error(f"Error al traducir descripción: {str(e)}")
+            if any(char in description for char in 'abcdefghijklmnopqrstuvwxyz'):
+                try:
+                    translator = GoogleTranslator(source='en', target='es')
+                    description = await asyncio.get_event_loop().run_in_executor(None, translator.translate, description)
+                except Exception as e:
+                    logger.error(f"Error al traducir descripción: {str(e)}")
 
-                # Obtener la foto principal
-                photo_url = None
-                if result.get('default_photo'):
-                    photo_url = result['default_photo'].get('medium_url')
-                elif result.get('photos'):
-                    photo_url = result['photos'][0].get('medium_url')
-
-                # Limpiar cualquier texto HTML en otros campos
-                def clean_html(text):
-                    if text:
-                        soup = BeautifulSoup(text, 'html.parser')
-                        return ' '.join(soup.stripped_strings)
-                    return text
-
-                # Limpiar características si existen
-                characteristics = []
-                if result.get('characteristics'):
-                    characteristics = [clean_html(char) for char in result.get('characteristics', [])]
-
-                return {
-                    'id': str(result.get('id')),
-                    'photo_url': photo_url,
-                    'observations': result.get('observations_count', 0),
-                    'description': description,
-                    'measurements': {
-                        'queen_size': clean_html(result.get('measurements', {}).get('queen_size')),
-                        'worker_size': clean_html(result.get('measurements', {}).get('worker_size')),
-                        'colony_size': clean_html(result.get('measurements', {}).get('colony_size'))
-                    },
-                    'characteristics': characteristics,
-                    'habitat': clean_html(result.get('habitat')),
-                    'behavior': clean_html(result.get('behavior'))
-                }
-        return None
+        return {
+            'id': str(result['id']),
+            'photo_url': details.get('photo_url') or result.get('photo_url'),
+            'observations': details.get('observations_count', 0),
+            'description': description,
+            'measurements': {},
+            'characteristics': [],
+            'habitat': None,
+            'behavior': None
+        }
     except Exception as e:
         logger.error(f"Error en búsqueda de iNaturalist: {str(e)}")
         return None
 
+async def prefetch_inaturalist(nombres: List[str]):
+    """Resuelve todos los nombres y sus detalles en iNaturalist con peticiones por lotes"""
+    nombres = [' '.join(n.split(' ')[:2]) for n in nombres if len(n.split(' ')) >= 2]
+    resueltos = await inat_client.resolver_nombres(nombres, db.get_inaturalist_ids(nombres))
+    ids = [taxon['id'] for taxon in resueltos.values() if taxon]
+    await inat_client.obtener_por_ids(ids)
+    logger.info(f"iNaturalist: {len(ids)}/{len(nombres)} nombres resueltos por lotes")
+
 def construir_url_antwiki(genus: str, species: str) -> str:
     """Construye la URL para buscar en AntWiki"""
     return f"https://www.antwiki.org/wiki/{genus}_{species}"
@@ -150,15 +138,16 @@ async def buscar_foto_antwiki(genus, species):
         url = construir_url_antwiki(genus, species)
         logger.info(f"Buscando información en AntWiki: {url}")
         
-        # Aumentar el timeout a 30 segundos
-        response = requests.get(url, timeout=30)
+        # Aumentar el timeout a 30 segundos; la petición síncrona va al executor para no bloquear a los demás trabajadores
+        loop = asyncio.get_event_loop()
+        response = await loop.run_in_executor(None, lambda: limitador_fuentes.get_sync(url, timeout=30))
         
         if response.status_code == 404:
             # Intentar con variante del nombre
             url_alt = url.replace("_nigrocinta", "_nigrocincta")
             if url != url_alt:
                 logger.info(f"URL original no encontrada, intentando con: {url_alt}")
-                response = requests.get(url_alt, timeout=30)
+                response = await loop.run_in_executor(None, lambda: limitador_fuentes.get_sync(url_alt, timeout=30))
         
         info = {
             'photo_url': None,
@@ -177,91 +166,41 @@ async def buscar_foto_antwiki(genus, species):
             return text
         
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Buscar foto en la tabla de información (infobox)
-            infobox = soup.find('table', {'class': 'infobox'})
-            if infobox:
-                # Buscar foto
-                for img in infobox.find_all('img'):
-                    src = img.get('src', '')
-                    if src and not src.endswith(('.svg', '.png')) and 'icon' not in src.lower():
-                        if src.startswith('//'):
-                            info['photo_url'] = f"https:{src}"
-                        elif src.startswith('/'):
-                            info['photo_url'] = f"https://www.antwiki.org{src}"
-                        else:
-                            info['photo_url'] = src
-                        break
+            pagina = await extraer_en_executor(extraer_antwiki, response.text)
+            if pagina:
+                # Foto: infobox, después galería y por último cualquier imagen del contenido
+                info['photo_url'] = pagina['infobox_foto'] or pagina['galeria_foto'] or pagina['primera_foto']
                 
                 # Buscar información en la tabla
-                for row in infobox.find_all('tr'):
-                    header = row.find('th')
-                    value = row.find('td')
-                    if header and value:
-                        header_text = clean_html(header.get_text()).lower()
-                        value_text = clean_html(value.get_text())
-                        
-                        if 'queen' in header_text and ('size' in header_text or 'length' in header_text):
-                            info['queen_size'] = value_text
-                        elif 'worker' in header_text and ('size' in header_text or 'length' in header_text):
-                            info['worker_size'] = value_text
-                        elif 'colony' in header_text and 'size' in header_text:
-                            info['colony_size'] = value_text
-                        elif 'habitat' in header_text:
-                            info['habitat'] = value_text
-            
-            # Buscar características en el contenido principal
-            content = soup.find('div', {'id': 'mw-content-text'})
-            if content:
-                # Buscar secciones relevantes
+                for header_text, value_text in pagina['infobox']:
+                    header_text = clean_html(header_text)
+                    value_text = clean_html(value_text)
+                    
+                    if 'queen' in header_text and ('size' in header_text or 'length' in header_text):
+                        info['queen_size'] = value_text
+                    elif 'worker' in header_text and ('size' in header_text or 'length' in header_text):
+                        info['worker_size'] = value_text
+                    elif 'colony' in header_text and 'size' in header_text:
+                        info['colony_size'] = value_text
+                    elif 'habitat' in header_text:
+                        info['habitat'] = value_text
+                
+                # Buscar características en las secciones relevantes
                 sections = ['Description', 'Descripción', 'Biology', 'Biología', 'Behavior', 'Comportamiento']
-                for section in sections:
-                    section_header = content.find(['h2', 'h3'], string=section)
-                    if section_header:
-                        next_elem = section_header.find_next_sibling()
-                        while next_elem and next_elem.name not in ['h2', 'h3']:
-                            if next_elem.name == 'p':
-                                text = clean_html(next_elem.get_text())
-                                if text:
-                                    # Traducir si está en inglés
-                                    if any(char in text.lower() for char in 'abcdefghijklmnopqrstuvwxyz'):
-                                        try:
-                                            translator = GoogleTranslator(source='en', target='es')
-                                            text = translator.translate(text)
-                                        except Exception as e:
-                                            logger.error(f"Error al traducir texto: {str(e)}")
-                                    info['characteristics'].append(text)
-                            next_elem = next_elem.find_next_sibling()
-            
-            # Si no se encontró foto en infobox, buscar en otros lugares
-            if not info['photo_url']:
-                # Buscar en la galería
-                gallery = soup.find('div', {'class': 'gallery'})
-                if gallery:
-                    for img in gallery.find_all('img'):
-                        src = img.get('src', '')
-                        if src and not src.endswith(('.svg', '.png')) and 'icon' not in src.lower():
-                            if src.startswith('//'):
-                                info['photo_url'] = f"https:{src}"
-                            elif src.startswith('/'):
-                                info['photo_url'] = f"https://www.antwiki.org{src}"
-                            else:
-                                info['photo_url'] = src
-                            break
-            
-            # Buscar en cualquier parte de la página
-            if not info['photo_url']:
-                for img in soup.find_all('img'):
-                    src = img.get('src', '')
-                    if src and not src.endswith(('.svg', '.png')) and 'icon' not in src.lower():
-                        if src.startswith('//'):
-                            info['photo_url'] = f"https:{src}"
-                        elif src.startswith('/'):
-                            info['photo_url'] = f"https://www.antwiki.org{src}"
-                        else:
-                            info['photo_url'] = src
-                            break
+                for section_title, parrafos in pagina['secciones']:
+                    if section_title not in sections:
+                        continue
+                    for text in parrafos:
+                        text = clean_html(text)
+                        if text:
+                            # Traducir si está en inglés
+                            if any(char in text.lower() for char in 'abcdefghijklmnopqrstuvwxyz'):
+                                try:
+                                    translator = GoogleTranslator(source='en', target='es')
+                                    text = translator.translate(text)
+                                except Exception as e:
+                                    logger.error(f"Error al traducir texto: {str(e)}")
+                            info['characteristics'].append(text)
                 
         return info
                     
@@ -281,7 +220,7 @@ async def obtener_distribucion_antmaps(scientific_name):
         
         response = await asyncio.get_event_loop().run_in_executor(
             None, 
-            lambda: requests.get(url, timeout=TIMEOUT)
+            lambda: limitador_fuentes.get_sync(url, timeout=TIMEOUT)
         )
         
         if response.status_code == 200:
@@ -325,14 +264,14 @@ async def buscar_info_antontop(species_name):
         
         # Realizar la solicitud con un timeout adecuado
         async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=TIMEOUT) as response:
+            async with limitador_fuentes.get(session, url, timeout=TIMEOUT) as response:
                 if response.status != 200:
                     logger.warning(f"Error al buscar en AntOnTop: {response.status}")
                     # Intentar con URL sin el prefijo "es" como respaldo
                     url_alt = f"https://antontop.com/{species_url_name}/"
                     logger.info(f"Intentando URL alternativa: {url_alt}")
                     
-                    async with session.get(url_alt, timeout=TIMEOUT) as alt_response:
+                    async with limitador_fuentes.get(session, url_alt, timeout=TIMEOUT) as alt_response:
                         if alt_response.status != 200:
                             logger.warning(f"Error al buscar en URL alternativa: {alt_response.status}")
                             return None
@@ -341,13 +280,12 @@ async def buscar_info_antontop(species_name):
                 else:
                     html = await response.text()
                 
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                # Extraer datos relevantes
+                # Extraer datos relevantes fuera del event loop
+                pagina = await extraer_en_executor(extraer_antontop, html)
                 info = {
-                    'photo_url': None,
-                    'short_description': None, 
-                    'description': None,
+                    'photo_url': pagina['photo_url'],
+                    'short_description': pagina['short_description'],
+                    'description': clean_html(pagina['description']),
                     'region': None,
                     'behavior': None,
                     'difficulty': None,
@@ -358,51 +296,24 @@ async def buscar_info_antontop(species_name):
                     'colony_size': None
                 }
                 
-                # Extraer la imagen principal
-                main_image = soup.find('img', {'class': 'wp-post-image'})
-                if main_image and main_image.get('src'):
-                    info['photo_url'] = main_image.get('src')
-                
-                # Buscar la descripción corta
-                short_desc_div = soup.find('div', {'class': 'woocommerce-product-details__short-description'})
-                if short_desc_div:
-                    info['short_description'] = clean_html(short_desc_div.get_text())
-                
-                # Buscar la descripción completa
-                description_section = soup.find('div', {'class': 'woocommerce-Tabs-panel--description'})
-                if description_section:
-                    info['description'] = clean_html(description_section.get_text())
-                
                 # Extraer detalles de la tabla de características
-                product_details = soup.find('h4', string='Detalles de producto')
-                if not product_details:
-                    product_details = soup.find('h4', string='Product details')
-                
-                if product_details:
-                    details_table = product_details.find_next('table')
-                    if details_table:
-                        for row in details_table.find_all('tr'):
-                            cells = row.find_all('td')
-                            if len(cells) == 2:
-                                key = clean_html(cells[0].get_text()).lower()
-                                value = clean_html(cells[1].get_text())
-                                
-                                if 'dificultad' in key or 'difficulty' in key:
-                                    info['difficulty'] = value
-                                elif 'comportamiento' in key or 'behavior' in key:
-                                    info['behavior'] = value
-                                elif 'origen' in key or 'origin' in key:
-                                    info['region'] = value
-                                elif 'temperatura' in key or 'temperature' in key:
-                                    info['temperature'] = value
-                                elif 'humedad' in key or 'humidity' in key:
-                                    info['humidity'] = value
-                                elif 'reina' in key or 'queen' in key:
-                                    info['queen_size'] = value
-                                elif 'obrera' in key or 'worker' in key:
-                                    info['worker_size'] = value
-                                elif 'colonia' in key or 'colony' in key:
-                                    info['colony_size'] = value
+                for key, value in pagina['detalles']:
+                    if 'dificultad' in key or 'difficulty' in key:
+                        info['difficulty'] = value
+                    elif 'comportamiento' in key or 'behavior' in key:
+                        info['behavior'] = value
+                    elif 'origen' in key or 'origin' in key:
+                        info['region'] = value
+                    elif 'temperatura' in key or 'temperature' in key:
+                        info['temperature'] = value
+                    elif 'humedad' in key or 'humidity' in key:
+                        info['humidity'] = value
+                    elif 'reina' in key or 'queen' in key:
+                        info['queen_size'] = value
+                    elif 'obrera' in key or 'worker' in key:
+                        info['worker_size'] = value
+                    elif 'colonia' in key or 'colony' in key:
+                        info['colony_size'] = value
                 
                 # Si no se encuentra información suficiente, retornar None
                 if not info['short_description'] and not info['description']:
@@ -416,80 +327,75 @@ async def buscar_info_antontop(species_name):
         logger.error(f"Error al buscar en AntOnTop: {str(e)}")
         return None
 
-async def procesar_especie(db: AntDatabase, especie: str, region: Optional[str] = None) -> tuple:
-    """Procesa una especie y la agrega a la base de datos."""
-    try:
-        # Separar nombre científico y subespecie
-        partes = especie.split(' ')
-        if len(partes) < 2:
-            logger.error(f"Nombre de especie inválido: {especie}")
-            return False, {}
-            
-        nombre_cientifico = ' '.join(partes[:2])
-        subespecie = ' '.join(partes[2:]) if len(partes) > 2 else None
-        
-        # Verificar si la especie ya existe
-        if db.get_species(nombre_cientifico):
-            logger.info(f"La especie {nombre_cientifico} ya existe en la base de datos")
-            return True, {}
-            
-        # Recopilar información de todas las fuentes
-        info = {}
-        
-        # Buscar en iNaturalist
-        inaturalist_info = await buscar_en_inaturalist(nombre_cientifico)
-        if inaturalist_info:
-            info.update(inaturalist_info)
-            if inaturalist_info.get('photo_url'):
-                info['inaturalist_photo'] = inaturalist_info['photo_url']
-        
-        # Buscar en AntWiki
-        genus, species = nombre_cientifico.split(' ')
-        antwiki_info = await buscar_foto_antwiki(genus, species)
-        if antwiki_info and antwiki_info.get('photo_url'):
-            info['antwiki_photo'] = antwiki_info['photo_url']
-            
-        # Buscar en AntMaps
-        antmaps_info = await obtener_distribucion_antmaps(nombre_cientifico)
-        if antmaps_info:
-            info['distribution'] = antmaps_info
-            
-        # Buscar en AntOnTop
-        antontop_info = await buscar_info_antontop(nombre_cientifico)
-        if antontop_info:
-            info.update(antontop_info)
-            if antontop_info.get('photo_url'):
-                info['antontop_photo'] = antontop_info['photo_url']
+async def procesar_especie(db: AntDatabase, especie: str, region: Optional[str] = None,
+                           loader: Optional[SpeciesLoader] = None) -> Optional[Dict]:
+    """Consulta todas las fuentes de una especie y devuelve sus datos para guardarlos por lotes."""
+    partes = especie.split(' ')
+    if len(partes) < 2:
+        logger.error(f"Nombre de especie inválido: {especie}")
+        return None
         
-        # Preparar datos para la base de datos
-        species_data = {
-            'scientific_name': nombre_cientifico,
-            'subspecies': subespecie,
-            'description': info.get('description'),
-            'habitat': info.get('habitat'),
-            'behavior': info.get('behavior'),
-            'distribution': info.get('distribution'),
-            'photo_url': info.get('inaturalist_photo') or info.get('antwiki_photo') or info.get('antontop_photo'),
-            'queen_size': info.get('measurements', {}).get('queen_size'),
-            'worker_size': info.get('measurements', {}).get('worker_size'),
-            'colony_size': info.get('measurements', {}).get('colony_size'),
-            'region': region
+    nombre_cientifico = ' '.join(partes[:2])
+    
+    # Si la especie ya existe solo se actualiza la región
+    if db.get_species(nombre_cientifico):
+        logger.info(f"La especie {nombre_cientifico} ya existe en la base de datos")
+        return {'scientific_name': nombre_cientifico, 'region': region}
+    
+    async def con_limite(fuente, coro):
+        if loader is None:
+            return await coro
+        async with loader.fuente(fuente):
+            return await coro
+    
+    # Consultar iNaturalist, AntWiki, AntMaps y AntOnTop a la vez
+    genus, species = nombre_cientifico.split(' ')
+    inaturalist_info, antwiki_info, antmaps_info, antontop_info = await asyncio.gather(
+        con_limite('inaturalist', buscar_en_inaturalist(nombre_cientifico)),
+        con_limite('antwiki', buscar_foto_antwiki(genus, species)),
+        con_limite('antmaps', obtener_distribucion_antmaps(nombre_cientifico)),
+        con_limite('antontop', buscar_info_antontop(nombre_cientifico))
+    )
+    
+    if not any([inaturalist_info, antwiki_info, antontop_info]):
+        logger.warning(f"No se encontró información para {nombre_cientifico}")
+        return None
+    
+    inaturalist_info = inaturalist_info or {}
+    antwiki_info = antwiki_info or {}
+    antontop_info = antontop_info or {}
+    if antmaps_info:
+        logger.info(f"Distribución en AntMaps para {nombre_cientifico}: {', '.join(antmaps_info)}")
+    
+    measurements = inaturalist_info.get('measurements') or {}
+    return {
+        'scientific_name': nombre_cientifico,
+        'region': region,
+        'inaturalist_id': inaturalist_info.get('id'),
+        'antwiki_url': construir_url_antwiki(genus, species) if antwiki_info else None,
+        'photo_url': inaturalist_info.get('photo_url') or antwiki_info.get('photo_url') or antontop_info.get('photo_url'),
+        'antontop': {
+            'description': antontop_info.get('description') or inaturalist_info.get('description'),
+            'short_description': antontop_info.get('short_description'),
+            'photo_url': antontop_info.get('photo_url'),
+            'region': antontop_info.get('region'),
+            'behavior': antontop_info.get('behavior'),
+            'difficulty': antontop_info.get('difficulty'),
+            'temperature': antontop_info.get('temperature'),
+            'humidity': antontop_info.get('humidity'),
+            'queen_size': antontop_info.get('queen_size') or antwiki_info.get('queen_size') or measurements.get('queen_size'),
+            'worker_size': antontop_info.get('worker_size') or antwiki_info.get('worker_size') or measurements.get('worker_size'),
+            'colony_size': antontop_info.get('colony_size') or antwiki_info.get('colony_size') or measurements.get('colony_size')
         }
-        
-        # Agregar la especie a la base de datos
-        if db.add_species(species_data):
-            logger.info(f"Especie {nombre_cientifico} agregada exitosamente")
-            return True, info
-        else:
-            logger.error(f"Error al agregar la especie {nombre_cientifico}")
-            return False, info
-            
-    except Exception as e:
-        logger.error(f"Error procesando especie {especie}: {str(e)}")
-        return False, {}
+    }
 
-async def cargar_especies_desde_archivo(filename: str, start_line: int = 1, region: Optional[str] = None):
-    """Carga y procesa especies desde un archivo línea por línea."""
+async def cargar_especies_desde_archivo(filename: str, start_line: int = 1, region: Optional[str] = None,
+                                       workers: int = LOADER_WORKERS):
+    """Carga y procesa especies desde un archivo con varios trabajadores en paralelo.
+    
+    Los nombres completados se guardan en `<filename>.checkpoint`; si la carga se interrumpe,
+    volver a lanzarla continúa desde donde se quedó.
+    """
     try:
         if not os.path.exists(filename):
             logger.error(f"El archivo {filename} no existe")
@@ -500,48 +406,30 @@ async def cargar_especies_desde_archivo(filename: str, start_line: int = 1, regi
 
         # Filtrar especies desde la línea inicial
         especies = [esp.strip() for esp in especies[start_line-1:] if esp.strip()]
-        total_especies = len(especies)
-        procesadas = 0
-        exitosas = 0
-        fallidas = 0
 
-        logger.info(f"Cargando {total_especies} especies desde el archivo {filename}, comenzando desde la línea {start_line}")
+        logger.info(f"Cargando {len(especies)} especies desde el archivo {filename}, comenzando desde la línea {start_line}")
 
-        for especie in especies:
-            procesadas += 1
-            logger.info(f"\nProcesando especie {procesadas}/{total_especies}: {especie}")
-            
-            try:
-                success, info = await procesar_especie(db, especie, region)
-                
-                if success:
-                    exitosas += 1
-                    # Mostrar enlaces de imágenes si están disponibles
-                    if info.get('inaturalist_photo'):
-                        print(f"Foto iNaturalist: {info['inaturalist_photo']}")
-                    if info.get('antwiki_photo'):
-                        print(f"Foto AntWiki: {info['antwiki_photo']}")
-                    if info.get('antontop_photo'):
-                        print(f"Foto AntOnTop: {info['antontop_photo']}")
-                else:
-                    fallidas += 1
-                    logger.warning(f"No se pudo procesar la especie: {especie}")
-                
-                # Pequeña pausa para evitar sobrecargar las APIs
-                await asyncio.sleep(1)
-                
-            except Exception as e:
-                fallidas += 1
-                logger.error(f"Error procesando {especie}: {str(e)}")
-                continue
-
-            # Mostrar progreso
-            if procesadas % 10 == 0:
-                logger.info(f"Progreso: {procesadas}/{total_especies} especies procesadas. Exitosas: {exitosas}, Fallidas: {fallidas}")
+        loader = SpeciesLoader(
+            db,
+            lambda especie, loader: procesar_especie(db, especie, region, loader),
+            workers=workers,
+            checkpoint_path=f"{filename}.checkpoint",
+            batch_size=BATCH_SIZE
+        )
+        
+        # Resolver en iNaturalist por lotes solo lo que queda pendiente
+        completadas = loader.cargar_checkpoint()
+        await prefetch_inaturalist([e for e in especies if e.lower() not in completadas])
+        try:
+            resumen = await loader.cargar(especies)
+        finally:
+            await inat_client.close_session()
 
-        logger.info(f"\nProceso completado. Total procesadas: {procesadas}")
-        logger.info(f"Exitosas: {exitosas}")
-        logger.info(f"Fallidas: {fallidas}")
+        logger.info(f"\nProceso completado. Total procesadas: {resumen['procesados']} (omitidas por checkpoint: {resumen['omitidos']})")
+        logger.info(f"Guardadas: {resumen['guardadas']}")
+        logger.info(f"No encontradas: {resumen['no_encontradas']}")
+        logger.info(f"Fallidas: {resumen['errores']}")
+        logger.info(f"Ritmo medio: {resumen['por_minuto']:.1f} especies/min")
 
     except Exception as e:
         logger.error(f"Error al cargar especies desde archivo: {str(e)}")
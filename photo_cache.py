@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Origen de la URL de la foto: 'species' es species.photo_url; el resto, fotos de cada fuente externa
+FUENTES = ('species', 'inaturalist', 'antwiki', 'antontop')
+
+
+class PhotoCache:
+    """
+    Caché de file_id de Telegram para las fotos de especies.
+
+    La primera vez que se envía una URL, Telegram descarga la imagen y devuelve un file_id;
+    a partir de ahí se reutiliza ese file_id. Se guarda uno por (especie, fuente) junto con
+    la URL de la que salió: si la URL de esa fuente cambia, el file_id anterior se descarta.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.cache: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        self._cargado = False
+
+    def cargar(self) -> int:
+        """Carga en memoria todos los file_id guardados"""
+        for fila in self.db.get_photo_file_ids():
+            self.cache[(fila['scientific_name'].lower(), fila['source'])] = (fila['photo_url'], fila['file_id'])
+        self._cargado = True
+        return len(self.cache)
+
+    def obtener(self, scientific_name: str, photo_url: str, fuente: str = 'species') -> Optional[str]:
+        """file_id de la foto o None si no está en caché o la URL de esa fuente ha cambiado"""
+        if not self._cargado:
+            self.cargar()
+        clave = (scientific_name.lower(), fuente)
+        entrada = self.cache.get(clave)
+        if not entrada:
+            return None
+        if entrada[0] != photo_url:
+            self.invalidar(scientific_name, fuente)
+            return None
+        return entrada[1]
+
+    def media(self, scientific_name: str, photo_url: str, fuente: str = 'species') -> str:
+        """Valor para el parámetro photo/media: el file_id si se conoce, si no la URL"""
+        return self.obtener(scientific_name, photo_url, fuente) or photo_url
+
+    def guardar(self, scientific_name: str, photo_url: str, file_id: str, fuente: str = 'species'):
+        self.cache[(scientific_name.lower(), fuente)] = (photo_url, file_id)
+        self.db.save_photo_file_id(scientific_name, fuente, photo_url, file_id)
+
+    def invalidar(self, scientific_name: str, fuente: Optional[str] = None):
+        """Descarta el file_id de una fuente o, sin fuente, todos los de la especie"""
+        nombre = scientific_name.lower()
+        for clave in [c for c in self.cache if c[0] == nombre and (fuente is None or c[1] == fuente)]:
+            del self.cache[clave]
+        self.db.delete_photo_file_ids(scientific_name, fuente)
+
+    def registrar(self, scientific_name: str, photo_url: str, mensaje, fuente: str = 'species'):
+        """Guarda el file_id de un mensaje enviado con la URL"""
+        if mensaje is not None and getattr(mensaje, 'photo', None):
+            file_id = mensaje.photo[-1].file_id
+            if self.cache.get((scientific_name.lower(), fuente)) != (photo_url, file_id):
+                self.guardar(scientific_name, photo_url, file_id, fuente)
+
+    def registrar_grupo(self, fotos: List[Tuple[str, str, str]], mensajes):
+        """Guarda los file_id de un media group; fotos es [(nombre, url, fuente)] en el mismo orden"""
+        for (nombre, url, fuente), mensaje in zip(fotos, mensajes or []):
+            self.registrar(nombre, url, mensaje, fuente)
+
+    async def enviar(self, enviar_foto: Callable[[str], Awaitable], scientific_name: str, photo_url: str,
+                     fuente: str = 'species'):
+        """
+        Envía la foto con `enviar_foto(photo)` usando el file_id si se conoce.
+
+        Si Telegram rechaza el file_id se descarta y se reenvía con la URL; el file_id del
+        envío por URL se guarda para la próxima vez.
+        """
+        file_id = self.obtener(scientific_name, photo_url, fuente)
+        if file_id:
+            try:
+                return await enviar_foto(file_id)
+            except TelegramBadRequest as e:
+                logger.warning(f"file_id no válido para {scientific_name} ({fuente}): {str(e)}")
+                self.invalidar(scientific_name, fuente)
+
+        mensaje = await enviar_foto(photo_url)
+        self.registrar(scientific_name, photo_url, mensaje, fuente)
+        return mensaje
+
+    async def enviar_grupo(self, enviar_grupo: Callable[[List[str]], Awaitable], fotos: List[Tuple[str, str, str]]):
+        """
+        Envía un media group con `enviar_grupo(medias)`; fotos es [(nombre, url, fuente)].
+
+        Si Telegram rechaza el grupo y llevaba algún file_id (basta uno caducado), se descartan
+        todos los file_id usados y se reintenta una vez con las URL.
+        """
+        medias = [self.media(nombre, url, fuente) for nombre, url, fuente in fotos]
+        try:
+            mensajes = await enviar_grupo(medias)
+        except TelegramBadRequest as e:
+            usados = [foto for foto, media in zip(fotos, medias) if media != foto[1]]
+            if not usados:
+                raise
+            logger.warning(f"Media group rechazado con file_id en caché, se reenvía con las URL: {str(e)}")
+            for nombre, url, fuente in usados:
+                self.invalidar(nombre, fuente)
+            mensajes = await enviar_grupo([url for _, url, _ in fotos])
+        self.registrar_grupo(fotos, mensajes)
+        return mensajes
+
+    async def precalentar(self, bot, chat_id: int, especies: Iterable[Dict], pausa: float = 1.0,
+                          on_progress: Optional[Callable[[Dict], Awaitable[None]]] = None) -> Dict:
+        """
+        Sube las fotos de las especies indicadas que aún no tienen file_id.
+
+        Cada foto se envía sin notificación al chat indicado y el mensaje se borra en cuanto
+        se obtiene el file_id.
+        """
+        especies = [e for e in especies if e.get('photo_url', '').startswith('http')]
+        estado = {'total': len(especies), 'procesadas': 0, 'subidas': 0, 'en_cache': 0, 'errores': 0}
+        for especie in especies:
+            nombre, url = especie['scientific_name'], especie['photo_url']
+            if self.obtener(nombre, url):
+                estado['en_cache'] += 1
+            else:
+                for intento in range(2):
+                    try:
+                        mensaje = await bot.send_photo(chat_id=chat_id, photo=url, disable_notification=True)
+                        self.registrar(nombre, url, mensaje)
+                        estado['subidas'] += 1
+                        try:
+                            await mensaje.delete()
+                        except Exception:
+                            pass
+                        await asyncio.sleep(pausa)
+                        break
+                    except TelegramRetryAfter as e:
+                        await asyncio.sleep(e.retry_after)
+                    except Exception as e:
+                        logger.warning(f"No se pudo subir la foto de {nombre}: {str(e)}")
+                        estado['errores'] += 1
+                        break
+                else:
+                    estado['errores'] += 1
+            estado['procesadas'] += 1
+            if on_progress:
+                await on_progress(dict(estado))
+        return estado
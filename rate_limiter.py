@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Límites por host: (peticiones por segundo, ráfaga máxima)
+LIMITES_POR_HOST = {
+    'api.inaturalist.org': (1.0, 5),
+    'www.antwiki.org': (1.0, 3),
+    'antwiki.org': (1.0, 3),
+    'antmaps.org': (2.0, 5),
+    'antflights.com': (0.5, 2),
+    'antontop.com': (1.0, 3),
+    'www.googleapis.com': (1.0, 3),
+    'translate.googleapis.com': (5.0, 10),
+}
+LIMITE_POR_DEFECTO = (2.0, 5)
+
+# Configuración del circuit breaker
+UMBRAL_FALLOS = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))
+TIEMPO_REAPERTURA = float(os.getenv('CIRCUIT_RESET_TIMEOUT', 60))
+
+# Estados del circuito
+CERRADO = 'cerrado'
+ABIERTO = 'abierto'
+SEMIABIERTO = 'semiabierto'
+
+
+class CircuitOpenError(Exception):
+    """Se lanza cuando el circuito de un host está abierto y la petición se descarta sin esperar"""
+
+    def __init__(self, host: str, reintentar_en: float):
+        self.host = host
+        self.reintentar_en = reintentar_en
+        super().__init__(f"Circuito abierto para {host}, reintentar en {reintentar_en:.0f}s")
+
+
+class TokenBucket:
+    """Cubo de tokens para limitar la frecuencia de peticiones a un host"""
+
+    def __init__(self, tasa: float, capacidad: int):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.tokens = float(capacidad)
+        self.ultima_recarga = time.monotonic()
+
+    def reservar(self) -> float:
+        """Reserva un token y devuelve los segundos que hay que esperar para usarlo"""
+        ahora = time.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultima_recarga) * self.tasa)
+        self.ultima_recarga = ahora
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.tasa
+
+
+class CircuitBreaker:
+    """Circuit breaker con estados cerrado, abierto y semiabierto"""
+
+    def __init__(self, umbral_fallos: int = UMBRAL_FALLOS, tiempo_reapertura: float = TIEMPO_REAPERTURA):
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_reapertura = tiempo_reapertura
+        self.estado = CERRADO
+        self.fallos = 0
+        self.abierto_desde = 0.0
+        self.sonda_en_curso = False
+
+    def permitir(self) -> Tuple[bool, float]:
+        """Indica si se permite una petición y, si no, cuántos segundos faltan para reintentar"""
+        if self.estado == CERRADO:
+            return True, 0.0
+
+        restante = self.abierto_desde + self.tiempo_reapertura - time.monotonic()
+        if self.estado == ABIERTO:
+            if restante > 0:
+                return False, restante
+            self.estado = SEMIABIERTO
+            self.sonda_en_curso = False
+
+        # Semiabierto: solo se deja pasar una petición de prueba a la vez
+        if self.sonda_en_curso:
+            return False, max(restante, 1.0)
+        self.sonda_en_curso = True
+        return True, 0.0
+
+    def registrar_exito(self):
+        self.estado = CERRADO
+        self.fallos = 0
+        self.sonda_en_curso = False
+
+    def liberar_sonda(self):
+        """La petición de prueba no llegó a completarse (p. ej. se canceló): otra puede intentarlo"""
+        self.sonda_en_curso = False
+
+    def registrar_fallo(self) -> bool:
+        """Registra un fallo y devuelve True si el circuito acaba de abrirse"""
+        self.fallos += 1
+        self.sonda_en_curso = False
+        if self.estado == SEMIABIERTO or self.fallos >= self.umbral_fallos:
+            ya_abierto = self.estado == ABIERTO
+            self.estado = ABIERTO
+            self.abierto_desde = time.monotonic()
+            return not ya_abierto
+        return False
+
+
+class SourceRateLimiter:
+    """Limitador compartido por todos los scrapers: un token bucket y un circuit breaker por host"""
+
+    def __init__(self, limites: Optional[Dict[str, Tuple[float, int]]] = None,
+                 umbral_fallos: int = UMBRAL_FALLOS, tiempo_reapertura: float = TIEMPO_REAPERTURA):
+        self.limites = dict(LIMITES_POR_HOST if limites is None else limites)
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_reapertura = tiempo_reapertura
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.circuitos: Dict[str, CircuitBreaker] = {}
+        # Procesos que consultan las mismas fuentes con su propio limitador (ver repartir())
+        self.procesos = 1
+        # Lock de hilos porque también se usa desde executors con requests síncrono
+        self._lock = threading.Lock()
+
+    def repartir(self, procesos: int):
+        """
+        Reparte los límites entre varios procesos del bot (modo multiproceso): cada uno usa
+        1/procesos de la tasa y la ráfaga de cada host, y abre el circuito con la parte
+        proporcional de los fallos, para que entre todos no superen lo configurado.
+        """
+        with self._lock:
+            self.procesos = max(1, procesos)
+            # Se vuelven a crear con los nuevos límites en la siguiente petición
+            self.buckets.clear()
+            for circuito in self.circuitos.values():
+                circuito.umbral_fallos = self._umbral()
+
+    def _umbral(self) -> int:
+        return max(1, -(-self.umbral_fallos // self.procesos))
+
+    def limite(self, host: str) -> Tuple[float, int]:
+        """Tasa y ráfaga de este proceso para el host"""
+        tasa, capacidad = self.limites.get(host, LIMITE_POR_DEFECTO)
+        return tasa / self.procesos, max(1, capacidad // self.procesos)
+
+    @staticmethod
+    def obtener_host(url: str) -> str:
+        return (urlparse(url).hostname or url).lower()
+
+    def _reservar(self, url: str) -> Tuple[str, float]:
+        """Comprueba el circuito y reserva un token. Devuelve el host y la espera necesaria"""
+        host = self.obtener_host(url)
+        with self._lock:
+            circuito = self.circuitos.get(host)
+            if circuito is None:
+                circuito = self.circuitos[host] = CircuitBreaker(self._umbral(), self.tiempo_reapertura)
+            permitido, restante = circuito.permitir()
+            if not permitido:
+                raise CircuitOpenError(host, restante)
+
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(*self.limite(host))
+            return host, bucket.reservar()
+
+    async def adquirir(self, url: str):
+        """Espera turno para hacer una petición a la URL (versión asíncrona)"""
+        host, espera = self._reservar(url)
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+    def adquirir_sync(self, url: str):
+        """
+        Espera turno para hacer una petición a la URL (versión síncrona). Bloquea el hilo: desde
+        código asíncrono hay que llamarla en un executor (o usar get()), nunca en el bucle de eventos.
+        """
+        host, espera = self._reservar(url)
+        if espera > 0:
+            time.sleep(espera)
+
+    def registrar_exito(self, url: str):
+        host = self.obtener_host(url)
+        with self._lock:
+            circuito = self.circuitos.get(host)
+            if circuito:
+                circuito.registrar_exito()
+
+    def registrar_fallo(self, url: str):
+        host = self.obtener_host(url)
+        with self._lock:
+            circuito = self.circuitos.get(host)
+            if circuito and circuito.registrar_fallo():
+                logger.warning(f"Circuito abierto para {host} tras {circuito.fallos} fallos, "
+                               f"se descartarán peticiones durante {circuito.tiempo_reapertura:.0f}s")
+
+    def liberar_sonda(self, url: str):
+        host = self.obtener_host(url)
+        with self._lock:
+            circuito = self.circuitos.get(host)
+            if circuito:
+                circuito.liberar_sonda()
+
+    def registrar_estado(self, url: str, status: int):
+        """Registra el resultado de una respuesta HTTP según su código de estado"""
+        if status >= 500 or status == 429:
+            self.registrar_fallo(url)
+        else:
+            self.registrar_exito(url)
+
+    def get(self, session: aiohttp.ClientSession, url: str, **kwargs) -> '_PeticionProtegida':
+        """
+        Equivalente a session.get(url, **kwargs) pasando por el limitador.
+
+        Uso:
+            async with limitador_fuentes.get(session, url) as response:
+                ...
+        """
+        return _PeticionProtegida(self, session, 'GET', url, kwargs)
+
+    def head(self, session: aiohttp.ClientSession, url: str, **kwargs) -> '_PeticionProtegida':
+        return _PeticionProtegida(self, session, 'HEAD', url, kwargs)
+
+    def get_sync(self, url: str, session=None, **kwargs) -> requests.Response:
+        """Equivalente a requests.get(url, **kwargs) pasando por el limitador"""
+        return self.peticion_sync('GET', url, session=session, **kwargs)
+
+    def peticion_sync(self, metodo: str, url: str, session=None, **kwargs) -> requests.Response:
+        self.adquirir_sync(url)
+        try:
+            response = (session or requests).request(metodo, url, **kwargs)
+        except requests.exceptions.RequestException:
+            self.registrar_fallo(url)
+            raise
+        self.registrar_estado(url, response.status_code)
+        return response
+
+    def estado(self) -> Dict[str, Dict]:
+        """Resumen del estado de cada host conocido"""
+        with self._lock:
+            return {
+                host: {
+                    'estado': circuito.estado,
+                    'fallos': circuito.fallos,
+                    'tokens': round(self.buckets[host].tokens, 2) if host in self.buckets else None
+                }
+                for host, circuito in self.circuitos.items()
+            }
+
+
+class _PeticionProtegida:
+    """Context manager asíncrono que envuelve una petición aiohttp con el limitador"""
+
+    def __init__(self, limitador: SourceRateLimiter, session: aiohttp.ClientSession,
+                 metodo: str, url: str, kwargs: Dict):
+        self.limitador = limitador
+        self.session = session
+        self.metodo = metodo
+        self.url = url
+        self.kwargs = kwargs
+        self.response = None
+
+    async def __aenter__(self) -> aiohttp.ClientResponse:
+        try:
+            await self.limitador.adquirir(self.url)
+            self.response = await self.session.request(self.metodo, self.url, **self.kwargs)
+        except asyncio.CancelledError:
+            # Cancelar (p. ej. un trabajo) no dice nada del host: solo se libera la sonda del estado semiabierto
+            self.limitador.liberar_sonda(self.url)
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.limitador.registrar_fallo(self.url)
+            raise
+        self.limitador.registrar_estado(self.url, self.response.status)
+        return self.response
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.response is not None:
+            self.response.release()
+        if exc_type is not None and issubclass(exc_type, (aiohttp.ClientPayloadError, asyncio.TimeoutError)):
+            # Cortes al leer el cuerpo también cuentan como fallo del host
+            self.limitador.registrar_fallo(self.url)
+        return False
+
+
+# Instancia compartida por el bot, los cargadores y los gestores
+limitador_fuentes = SourceRateLimiter()
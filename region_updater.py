@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import re
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+import aiohttp
+
+from inaturalist_client import INaturalistClient, MAX_IDS_POR_PETICION
+from rate_limiter import limitador_fuentes
+from worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+# Países y regiones (texto libre de AntWiki/iNaturalist) -> continente
+REGION_A_CONTINENTE = {
+    # América del Norte
+    'mexico': 'América del Norte',
+    'united states': 'América del Norte',
+    'canada': 'América del Norte',
+    'north america': 'América del Norte',
+
+    # América del Sur
+    'brazil': 'América del Sur',
+    'argentina': 'América del Sur',
+    'chile': 'América del Sur',
+    'peru': 'América del Sur',
+    'colombia': 'América del Sur',
+    'venezuela': 'América del Sur',
+    'ecuador': 'América del Sur',
+    'bolivia': 'América del Sur',
+    'paraguay': 'América del Sur',
+    'uruguay': 'América del Sur',
+    'south america': 'América del Sur',
+
+    # Europa
+    'spain': 'Europa',
+    'france': 'Europa',
+    'germany': 'Europa',
+    'italy': 'Europa',
+    'united kingdom': 'Europa',
+    'portugal': 'Europa',
+    'greece': 'Europa',
+    'europe': 'Europa',
+
+    # Asia
+    'china': 'Asia',
+    'japan': 'Asia',
+    'india': 'Asia',
+    'russia': 'Asia',
+    'southeast asia': 'Asia',
+    'asia': 'Asia',
+
+    # África
+    'south africa': 'África',
+    'egypt': 'África',
+    'morocco': 'África',
+    'kenya': 'África',
+    'africa': 'África',
+
+    # Oceanía
+    'australia': 'Oceanía',
+    'new zealand': 'Oceanía',
+    'oceania': 'Oceanía'
+}
+
+REGION_DESCONOCIDA = "Desconocido"
+MARCADORES_DISTRIBUCION = ["Distribution:", "Geographic Range:", "Native range:"]
+
+
+class RegionMatcher:
+    """
+    Traduce texto libre de localidades a continentes con una única expresión regular.
+
+    Todas las regiones se combinan en una alternancia compilada una sola vez, con las más
+    largas primero para que 'south africa' o 'southeast asia' ganen a sus subcadenas.
+    """
+
+    def __init__(self, regiones: Dict[str, str] = REGION_A_CONTINENTE):
+        self.regiones = {clave.lower(): continente for clave, continente in regiones.items()}
+        alternativas = sorted(self.regiones, key=len, reverse=True)
+        self.patron = re.compile(r'(?:' + '|'.join(re.escape(a) for a in alternativas) + r')')
+
+    def continentes(self, texto: Optional[str]) -> List[str]:
+        if not texto:
+            return []
+        return sorted({self.regiones[m.group(0)] for m in self.patron.finditer(texto.lower())})
+
+    def normalizar(self, texto: Optional[str]) -> str:
+        """Continentes separados por comas, o 'Desconocido' si no se reconoce ninguno"""
+        continentes = self.continentes(texto)
+        return ", ".join(continentes) if continentes else REGION_DESCONOCIDA
+
+
+# Se construye una vez al importar el módulo
+matcher_regiones = RegionMatcher()
+
+
+def extraer_region_antwiki(html: str) -> Optional[str]:
+    """Texto de distribución de una página de AntWiki (hasta el primer punto tras el marcador)"""
+    for marcador in MARCADORES_DISTRIBUCION:
+        inicio = html.find(marcador)
+        if inicio != -1:
+            inicio += len(marcador)
+            fin = html.find(".", inicio)
+            if fin > inicio:
+                return html[inicio:fin].strip()
+    return None
+
+
+def region_desde_taxon(taxon: Optional[Dict]) -> Optional[str]:
+    """Lugares nativos de un taxón de iNaturalist como texto libre"""
+    if not taxon or taxon.get('establishment_means') != 'native':
+        return None
+    lugares = [lugar['name'] for lugar in taxon.get('native_places') or [] if lugar.get('name')]
+    return ", ".join(lugares) if lugares else None
+
+
+class RegionUpdater(WorkerPool):
+    """
+    Actualiza la región de todas las especies como un flujo continuo:
+
+    - Las páginas de AntWiki se descargan con varios trabajadores a la vez (respetando el
+      límite por host de limitador_fuentes).
+    - Las especies sin distribución en AntWiki se acumulan y se consultan en iNaturalist
+      por lotes de 30 ids en cuanto el lote se llena.
+    - Las regiones normalizadas se escriben con un UPDATE por lote.
+    """
+
+    unidad = 'especies'
+
+    def __init__(self, db, inat_client: Optional[INaturalistClient] = None, concurrencia: int = 8,
+                 batch_size: int = 200, limitador=limitador_fuentes, timeout: int = 10,
+                 intervalo_progreso: float = 10.0,
+                 on_progress: Optional[Callable[[Dict], Awaitable[None]]] = None):
+        super().__init__(concurrencia, intervalo_progreso, on_progress)
+        self.db = db
+        self.inat_client = inat_client or INaturalistClient()
+        self._cerrar_inat = inat_client is None
+        self.batch_size = max(1, batch_size)
+        self.limitador = limitador
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+        self.pendientes_escritura: Dict[int, str] = {}
+        self.pendientes_inat: List[Dict] = []
+        self._tareas_inat: List[asyncio.Task] = []
+        self.estado.update({'updated': 0, 'errors': 0})
+
+    def _vaciar(self):
+        if not self.pendientes_escritura:
+            return
+        lote = self.pendientes_escritura
+        self.pendientes_escritura = {}
+        escritas = self.db.update_regions_batch(lote)
+        self.estado['updated'] += escritas
+        self.estado['errors'] += len(lote) - escritas
+
+    async def _guardar(self, especie: Dict, region_bruta: Optional[str]):
+        self.pendientes_escritura[especie['id']] = matcher_regiones.normalizar(region_bruta)
+        self.estado['procesados'] += 1
+        if len(self.pendientes_escritura) >= self.batch_size:
+            self._vaciar()
+        await self.informar()
+
+    async def _resolver_inat(self, lote: List[Dict]):
+        try:
+            taxones = await self.inat_client.obtener_por_ids(e['inaturalist_id'] for e in lote)
+        except Exception as e:
+            logger.error(f"Error al consultar regiones en iNaturalist: {str(e)}")
+            taxones = {}
+        for especie in lote:
+            await self._guardar(especie, region_desde_taxon(taxones.get(str(especie['inaturalist_id']))))
+
+    def _encolar_inat(self, especie: Dict):
+        self.pendientes_inat.append(especie)
+        if len(self.pendientes_inat) >= MAX_IDS_POR_PETICION:
+            lote = self.pendientes_inat
+            self.pendientes_inat = []
+            self._tareas_inat.append(asyncio.create_task(self._resolver_inat(lote)))
+
+    async def _region_antwiki(self, especie: Dict) -> Optional[str]:
+        try:
+            async with self.limitador.get(self.session, especie['antwiki_url']) as response:
+                if response.status != 200:
+                    return None
+                return extraer_region_antwiki(await response.text())
+        except Exception as e:
+            logger.error(f"Error al obtener datos de AntWiki para {especie['scientific_name']}: {str(e)}")
+            return None
+
+    async def procesar_elemento(self, especie: Dict):
+        try:
+            region_bruta = await self._region_antwiki(especie) if especie['antwiki_url'] else None
+            if region_bruta or not especie['inaturalist_id']:
+                await self._guardar(especie, region_bruta)
+            else:
+                self._encolar_inat(especie)
+        except Exception as e:
+            self.estado['procesados'] += 1
+            self.estado['errors'] += 1
+            logger.error(f"Error al actualizar región para {especie['scientific_name']}: {str(e)}")
+
+    async def actualizar(self, especies: Optional[Iterable[Dict]] = None) -> Dict:
+        """
+        Actualiza las regiones y devuelve {'total', 'updated', 'errors', ...}.
+
+        Args:
+            especies: filas con id, scientific_name, antwiki_url e inaturalist_id;
+                por defecto todas las especies de la base de datos
+        """
+        especies = list(especies if especies is not None else self.db.get_species_region_sources())
+        self.estado['total'] = len(especies)
+
+        try:
+            async with aiohttp.ClientSession(timeout=self.timeout) as self.session:
+                await self.ejecutar_cola(especies)
+
+            # Último lote incompleto de iNaturalist
+            if self.pendientes_inat:
+                self._tareas_inat.append(asyncio.create_task(self._resolver_inat(self.pendientes_inat)))
+                self.pendientes_inat = []
+            await asyncio.gather(*self._tareas_inat)
+        finally:
+            self._vaciar()
+            if self._cerrar_inat:
+                await self.inat_client.close_session()
+
+        await self.informar(forzar=True)
+        resumen = self.resumen()
+        logger.info(
+            f"Regiones actualizadas: {resumen['updated']}/{resumen['total']} "
+            f"({resumen['errors']} errores) en {resumen['transcurrido']:.1f}s"
+        )
+        return resumen
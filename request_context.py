@@ -0,0 +1,94 @@
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from database import evaluar_spam
+
+logger = logging.getLogger(__name__)
+
+
+class RequestContext:
+    """
+    Estado del usuario que envía un update en su chat: experiencia, XP ganado hoy, idioma,
+    interacciones recientes (ventana de spam) y si es administrador.
+
+    Se carga como mucho una vez por update, con una sola consulta, la primera vez que un
+    manejador o gestor lo necesita (p. ej. db.is_spam(..., contexto=contexto)). Las
+    interacciones que se registran durante el update se anotan en memoria, así que las
+    comprobaciones posteriores del mismo update ven el estado actualizado sin releerlo.
+    """
+
+    def __init__(self, db, user_id: int, chat_id: int, admin_cache=None):
+        self.db = db
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.admin_cache = admin_cache
+        self.cargado = False
+        self.experiencia: Optional[Dict] = None
+        self.xp_hoy = 0
+        self.idioma: Optional[Dict] = None
+        # interaction_type -> created_at de la ventana de spam, de más reciente a más antigua
+        self.interacciones: Dict[str, List[datetime]] = {}
+        self._spam: Dict[str, bool] = {}
+        self._admin: Optional[bool] = None
+
+    def corresponde(self, user_id: int, chat_id: int) -> bool:
+        return self.user_id == user_id and self.chat_id == chat_id
+
+    def cargar(self) -> bool:
+        """Carga los datos si aún no se ha hecho; False si la consulta ha fallado"""
+        if not self.cargado:
+            datos = self.db.load_request_context(self.user_id, self.chat_id)
+            if datos is None:
+                return False
+            self.experiencia = datos['experiencia']
+            self.xp_hoy = datos['xp_hoy']
+            self.idioma = datos['idioma']
+            self.interacciones = datos['interacciones']
+            self.cargado = True
+        return True
+
+    def es_spam(self, interaction_type: str) -> bool:
+        # Se evalúa una vez por tipo: el manejador y log_user_interaction comparten el resultado
+        if interaction_type not in self._spam:
+            self._spam[interaction_type] = evaluar_spam(
+                self.user_id, interaction_type, self.chat_id, self.interacciones.get(interaction_type, [])
+            )
+        return self._spam[interaction_type]
+
+    def anotar(self, interaction_type: str, points: int, experiencia: Optional[Dict] = None) -> None:
+        """Refleja una interacción recién registrada en la base de datos"""
+        self.interacciones.setdefault(interaction_type, []).insert(0, datetime.now())
+        self._spam.pop(interaction_type, None)
+        self.xp_hoy += points or 0
+        if experiencia:
+            self.experiencia = experiencia
+
+    async def es_admin(self) -> bool:
+        """Si el usuario es administrador del chat (lista de administradores en caché)"""
+        if self._admin is None:
+            try:
+                self._admin = bool(self.admin_cache) and await self.admin_cache.es_admin(self.chat_id, self.user_id)
+            except Exception as e:
+                logger.error(f"Error al verificar admin: {str(e)}")
+                return False
+        return self._admin
+
+
+class RequestContextMiddleware(BaseMiddleware):
+    """Añade a cada update con usuario y chat su RequestContext (parámetro `contexto` de los manejadores)"""
+
+    def __init__(self, db, admin_cache=None):
+        self.db = db
+        self.admin_cache = admin_cache
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        usuario = data.get('event_from_user')
+        chat = data.get('event_chat')
+        if usuario and chat:
+            data['contexto'] = RequestContext(self.db, usuario.id, chat.id, self.admin_cache)
+        return await handler(event, data)
@@ -13,6 +13,9 @@ from aiogram import Bot
 # Removed aiogram.client import for aiogram 2.x compatibility
 import aiohttp
 from discount_code_manager import DiscountCodeManager, DiscountType
+from broadcaster import Broadcaster
+from chat_registry import ESTADOS_PRESENTE
+from admin_cache import AdminCache
 
 # Cargar variables de entorno
 load_dotenv()
@@ -70,10 +73,38 @@ class RewardsManager:
         
         # Bot se configurará después con set_bot()
         self.bot = None
+        self.broadcaster = None
+        self.admin_cache = None
     
     def set_bot(self, bot):
         """Establece la referencia al bot para enviar mensajes"""
         self.bot = bot
+        if self.broadcaster:
+            self.broadcaster.set_bot(bot)
+        if self.admin_cache:
+            self.admin_cache.set_bot(bot)
+    
+    def set_broadcaster(self, broadcaster):
+        """Usa el broadcaster compartido del bot para los rankings (mismos límites de envío)"""
+        self.broadcaster = broadcaster
+    
+    def set_admin_cache(self, admin_cache):
+        """Usa la lista de administradores en caché del bot para los badges"""
+        self.admin_cache = admin_cache
+    
+    def _get_admin_cache(self) -> AdminCache:
+        if self.admin_cache is None:
+            self.admin_cache = AdminCache(self.bot)
+        elif self.admin_cache.bot is None:
+            self.admin_cache.set_bot(self.bot)
+        return self.admin_cache
+    
+    def _get_broadcaster(self) -> Broadcaster:
+        if self.broadcaster is None:
+            self.broadcaster = Broadcaster(self.bot)
+        elif self.broadcaster.bot is None:
+            self.broadcaster.set_bot(self.bot)
+        return self.broadcaster
     
     def detener_sistema(self):
         """Detiene el sistema de recompensas"""
@@ -472,16 +503,13 @@ class RewardsManager:
         try:
             cursor = self.db.get_connection().cursor(dictionary=True)
             
-            # Obtener lista de grupos activos
-            cursor.execute("""
-                SELECT DISTINCT chat_id FROM user_experience
-                WHERE chat_id < 0  -- Solo grupos, no chats privados
-            """)
-            
-            grupos = cursor.fetchall()
+            # Grupos donde el bot sigue presente (registro de chats)
+            grupos = self.db.get_broadcast_chats(ESTADOS_PRESENTE, only_groups=True)
             
+            # Rankings de cada grupo; se envían todos juntos al final
+            mensajes = {}
             for grupo in grupos:
-                chat_id = grupo['chat_id']
+                chat_id = grupo['id']
                 
                 # Calcular fecha de hace una semana
                 una_semana_atras = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
@@ -507,11 +535,10 @@ class RewardsManager:
                         mensaje += f"{medal} @{user['username']} - {user['puntos_semana']} XP (Nivel {user['current_level']})\n"
                     
                     mensaje += "\n¡Felicidades a los más activos! Sigue participando para subir en el ranking. 🌟"
-                    
-                    # Enviar el mensaje al grupo
-                    await self.bot.send_message(chat_id=chat_id, text=mensaje)
-                    
-                    logger.info(f"Ranking semanal enviado al grupo {chat_id}")
+                    mensajes[chat_id] = mensaje
+            
+            informe = await self._get_broadcaster().enviar(mensajes)
+            logger.info(f"Ranking semanal enviado a {informe['enviados']} de {informe['total']} grupos")
                 
         except Exception as e:
             logger.error(f"Error al mostrar ranking semanal: {str(e)}")
@@ -524,16 +551,13 @@ class RewardsManager:
         try:
             cursor = self.db.get_connection().cursor(dictionary=True)
             
-            # Obtener lista de grupos activos
-            cursor.execute("""
-                SELECT DISTINCT chat_id FROM user_experience
-                WHERE chat_id < 0  -- Solo grupos, no chats privados
-            """)
-            
-            grupos = cursor.fetchall()
+            # Grupos donde el bot sigue presente (registro de chats)
+            grupos = self.db.get_broadcast_chats(ESTADOS_PRESENTE, only_groups=True)
             
+            # Rankings de cada grupo y su usuario top; se envían todos juntos al final
+            mensajes, tops = {}, {}
             for grupo in grupos:
-                chat_id = grupo['chat_id']
+                chat_id = grupo['id']
                 
                 # Calcular fecha de hace un mes
                 un_mes_atras = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
@@ -559,16 +583,16 @@ class RewardsManager:
                         mensaje += f"{medal} @{user['username']} - {user['puntos_mes']} XP (Nivel {user['current_level']})\n"
                     
                     mensaje += "\n¡Felicidades a los más activos del mes! El usuario #1 recibirá una mención especial. 🌟"
-                    
-                    # Enviar el mensaje al grupo
-                    await self.bot.send_message(chat_id=chat_id, text=mensaje)
-                    
-                    logger.info(f"Ranking mensual enviado al grupo {chat_id}")
-                    
-                    # Premiar al usuario top 1 del mes
-                    if ranking and len(ranking) > 0:
-                        top_user = ranking[0]
-                        await self.premiar_usuario_top(top_user['user_id'], top_user['username'], chat_id)
+                    mensajes[chat_id] = mensaje
+                    tops[chat_id] = ranking[0]
+            
+            informe = await self._get_broadcaster().enviar(mensajes)
+            logger.info(f"Ranking mensual enviado a {informe['enviados']} de {informe['total']} grupos")
+            
+            # Premiar al usuario top 1 del mes en los grupos que han recibido el ranking
+            for chat_id in informe['entregados']:
+                top_user = tops[chat_id]
+                await self.premiar_usuario_top(top_user['user_id'], top_user['username'], chat_id)
                 
         except Exception as e:
             logger.error(f"Error al mostrar ranking mensual: {str(e)}")
@@ -586,7 +610,7 @@ class RewardsManager:
                 f"Como reconocimiento, recibirá un premio especial. ¡Gracias por tu contribución a la comunidad!"
             )
             
-            await self.bot.send_message(chat_id=chat_id, text=mensaje)
+            await self._get_broadcaster().enviar_uno(chat_id, mensaje)
             
             # Intentar enviar mensaje privado
             try:
@@ -676,9 +700,10 @@ class RewardsManager:
             logger.info(f"Intentando otorgar badge '{badge_titulo}' al usuario {user_id} en chat {chat_id}")
             
             # Verificar que el bot tenga permisos para promocionar administradores
+            admin_cache = self._get_admin_cache()
             try:
-                bot_member = await self.bot.get_chat_member(chat_id=chat_id, user_id=self.bot.id)
-                if not hasattr(bot_member, 'can_promote_members') or not bot_member.can_promote_members:
+                bot_member = await admin_cache.miembro(chat_id, self.bot.id)
+                if not getattr(bot_member, 'can_promote_members', False):
                     logger.warning(f"El bot no tiene permisos para promocionar miembros en el chat {chat_id}")
                     return False
             except Exception as e:
@@ -687,7 +712,8 @@ class RewardsManager:
             
             # Verificar el estado actual del usuario
             try:
-                user_member = await self.bot.get_chat_member(chat_id=chat_id, user_id=user_id)
+                # None si no es administrador
+                user_member = await admin_cache.miembro(chat_id, user_id)
                 
                 # Si ya es administrador, solo actualizar el título
                 if hasattr(user_member, 'status') and user_member.status in ['administrator', 'creator']:
@@ -705,6 +731,7 @@ class RewardsManager:
                         )
                         
                         if success:
+                            admin_cache.anotar_titulo(chat_id, user_id, badge_titulo)
                             logger.info(f"Título actualizado a '{badge_titulo}' para usuario {user_id}")
                             return True
                         else:
@@ -733,6 +760,8 @@ class RewardsManager:
                     )
                     
                     if success:
+                        # El nuevo administrador aparecerá en la próxima carga de la lista
+                        admin_cache.invalidar(chat_id)
                         logger.info(f"Usuario {user_id} promovido a administrador con permisos básicos")
                         
                         # Establecer título personalizado
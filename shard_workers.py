@@ -0,0 +1,423 @@
+"""
+Modo multiproceso: un supervisor recibe los updates y los reparte entre N procesos worker.
+
+Cada update va al worker que le corresponde por hashing consistente sobre su chat_id, así
+que todos los updates de un chat los procesa siempre el mismo proceso, en orden, y las
+cachés en memoria de cada proceso (rondas del juego, intentos, administradores, actividad
+de los chats, estado FSM) siguen siendo válidas. Un chat pesado solo retrasa a los chats
+de su mismo worker.
+
+El supervisor guarda los updates enviados a cada worker hasta que este confirma que los
+ha procesado. Si un worker muere se relanza y recibe de nuevo, en el mismo orden, los
+updates sin confirmar (entrega "al menos una vez"). Con SIGUSR1 se reinician todos los
+workers uno detrás de otro sin perder updates; cada worker espera a que acaben sus trabajos
+en segundo plano antes de reiniciarse.
+
+Los trabajos de administración (job_manager) se ejecutan siempre en el worker
+WORKER_TRABAJOS: los comandos que los lanzan, /jobs y /cancelar_job se le envían a él sea
+cual sea el chat, así que un solo proceso ve y puede cancelar todos los trabajos. Esos
+comandos no guardan el orden con el resto de updates de su chat.
+
+Se activa con BOT_WORKERS > 1 al arrancar AntmasterBot.py; cada worker se lanza como
+    python shard_workers.py --worker I --total N --puerto P
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import hmac
+import json
+import logging
+import os
+import signal
+import sys
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', 1))
+# Puerto local por el que se conectan los workers (0 = uno libre cualquiera)
+SHARD_PUERTO = int(os.getenv('SHARD_PUERTO', 0))
+# Puntos de cada worker en el anillo
+REPLICAS_ANILLO = 100
+# Segundos que se espera a que un worker termine lo que tiene en curso al pararlo
+TIMEOUT_PARADA = 30.0
+
+# Worker que ejecuta los trabajos en segundo plano y comandos que se le envían siempre
+WORKER_TRABAJOS = 0
+COMANDOS_TRABAJOS = frozenset({
+    'cargar_especies', 'actualizar_regiones', 'actualizar_estadisticas', 'actualizar_todo',
+    'enviar_mensaje', 'aplicar_badges', 'precalentar_fotos', 'pregenerar_descripciones',
+    'jobs', 'cancelar_job',
+})
+# Segundos entre comprobaciones de si un worker que va a reiniciarse tiene trabajos activos
+INTERVALO_ESPERA_TRABAJOS = 5.0
+
+# Campos de un update que contienen el chat (directamente o dentro de un mensaje)
+CAMPOS_CON_CHAT = ('message', 'edited_message', 'channel_post', 'edited_channel_post', 'my_chat_member',
+                   'chat_member', 'chat_join_request', 'message_reaction', 'message_reaction_count',
+                   'chat_boost', 'removed_chat_boost')
+
+
+class HashRing:
+    """Anillo de hashing consistente: cambiar el número de workers solo mueve una parte de los chats"""
+
+    def __init__(self, nodos: int, replicas: int = REPLICAS_ANILLO):
+        puntos = []
+        for nodo in range(nodos):
+            for replica in range(replicas):
+                puntos.append((self._hash(f"worker-{nodo}-{replica}"), nodo))
+        puntos.sort()
+        self.claves = [p[0] for p in puntos]
+        self.nodos = [p[1] for p in puntos]
+
+    @staticmethod
+    def _hash(valor: str) -> int:
+        return int.from_bytes(hashlib.md5(valor.encode()).digest()[:8], 'big')
+
+    def nodo(self, chat_id: int) -> int:
+        posicion = bisect.bisect(self.claves, self._hash(str(chat_id))) % len(self.claves)
+        return self.nodos[posicion]
+
+
+def chat_id_de_update(update: Dict) -> int:
+    """chat_id del update en bruto; para updates sin chat (p. ej. inline) el id del usuario"""
+    for campo in CAMPOS_CON_CHAT:
+        evento = update.get(campo)
+        if evento and 'chat' in evento:
+            return evento['chat']['id']
+    callback = update.get('callback_query')
+    if callback:
+        if callback.get('message'):
+            return callback['message']['chat']['id']
+        return callback['from']['id']
+    for evento in update.values():
+        if isinstance(evento, dict) and 'from' in evento:
+            return evento['from']['id']
+    return 0
+
+
+def es_comando_de_trabajos(update: Dict) -> bool:
+    """El update es un comando que lanza, lista o cancela trabajos en segundo plano"""
+    texto = (update.get('message') or {}).get('text') or ''
+    if not texto.startswith('/'):
+        return False
+    comando = texto[1:].split(maxsplit=1)[0].split('@', 1)[0].lower() if len(texto) > 1 else ''
+    return comando in COMANDOS_TRABAJOS
+
+
+class WorkerHandle:
+    """Estado de un worker en el supervisor"""
+
+    def __init__(self, indice: int):
+        self.indice = indice
+        self.proceso: Optional[asyncio.subprocess.Process] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        # update_id -> update enviado o por enviar y todavía sin confirmar, en orden de llegada
+        self.pendientes: "OrderedDict[int, Dict]" = OrderedDict()
+        self.lock = asyncio.Lock()
+        self.reinicios = 0
+        self.fallos_seguidos = 0
+        self.procesados = 0
+        # Se activa cuando el worker avisa de que no tiene trabajos activos y puede reiniciarse
+        self.listo = asyncio.Event()
+
+
+class Supervisor:
+    """Recibe los updates (polling o webhook) y los reparte entre los workers"""
+
+    def __init__(self, bot, workers: int, allowed_updates: Optional[List[str]] = None, puerto: int = SHARD_PUERTO):
+        self.bot = bot
+        self.total = workers
+        self.allowed_updates = allowed_updates
+        self.puerto = puerto
+        self.anillo = HashRing(workers)
+        self.workers = {i: WorkerHandle(i) for i in range(workers)}
+        self._servidor: Optional[asyncio.AbstractServer] = None
+        self._monitores: List[asyncio.Task] = []
+        self._reiniciando: set = set()
+        self._parando = False
+        self.parada = asyncio.Event()
+
+    async def iniciar(self):
+        self._servidor = await asyncio.start_server(self._conexion, '127.0.0.1', self.puerto)
+        self.puerto = self._servidor.sockets[0].getsockname()[1]
+        for indice in self.workers:
+            self._monitores.append(asyncio.create_task(self._vigilar(indice)))
+        logger.info(f"Supervisor: {self.total} workers, conexión local en el puerto {self.puerto}")
+
+    async def _lanzar(self, indice: int, inicial: bool):
+        argumentos = [sys.executable, os.path.abspath(__file__), '--worker', str(indice),
+                      '--total', str(self.total), '--puerto', str(self.puerto)]
+        if inicial:
+            argumentos.append('--inicial')
+        self.workers[indice].proceso = await asyncio.create_subprocess_exec(*argumentos)
+
+    async def _vigilar(self, indice: int):
+        """Lanza el worker y lo relanza cada vez que termina, salvo al apagar el supervisor"""
+        handle = self.workers[indice]
+        inicial = True
+        while not self._parando:
+            await self._lanzar(indice, inicial)
+            inicial = False
+            codigo = await handle.proceso.wait()
+            handle.writer = None
+            if self._parando:
+                break
+            if indice in self._reiniciando:
+                self._reiniciando.discard(indice)
+                logger.info(f"Worker {indice} reiniciado ({len(handle.pendientes)} updates pendientes)")
+                continue
+            handle.reinicios += 1
+            handle.fallos_seguidos += 1
+            espera = min(2 ** handle.fallos_seguidos, 30)
+            logger.error(f"Worker {indice} terminó con código {codigo}; se relanza en {espera}s "
+                         f"con {len(handle.pendientes)} updates sin confirmar")
+            await asyncio.sleep(espera)
+
+    async def _conexion(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Conexión de un worker: reenvía lo pendiente y después recibe las confirmaciones"""
+        handle = None
+        try:
+            indice = int((await reader.readline()).decode().strip())
+            handle = self.workers[indice]
+            async with handle.lock:
+                for update in handle.pendientes.values():
+                    writer.write(json.dumps(update).encode() + b'\n')
+                await writer.drain()
+                handle.writer = writer
+            logger.info(f"Worker {indice} conectado; reenviados {len(handle.pendientes)} updates pendientes")
+            while True:
+                linea = await reader.readline()
+                if not linea:
+                    break
+                if linea.strip() == b'listo':
+                    handle.listo.set()
+                    continue
+                handle.pendientes.pop(int(linea), None)
+                handle.procesados += 1
+                handle.fallos_seguidos = 0
+        except Exception as e:
+            logger.error(f"Error en la conexión con un worker: {str(e)}")
+        finally:
+            if handle and handle.writer is writer:
+                handle.writer = None
+            writer.close()
+
+    async def despachar(self, update: Dict):
+        """Envía el update al worker de su chat; si no está conectado queda pendiente"""
+        if es_comando_de_trabajos(update):
+            handle = self.workers[WORKER_TRABAJOS]
+        else:
+            handle = self.workers[self.anillo.nodo(chat_id_de_update(update))]
+        async with handle.lock:
+            handle.pendientes[update['update_id']] = update
+            if handle.writer:
+                try:
+                    handle.writer.write(json.dumps(update).encode() + b'\n')
+                    await handle.writer.drain()
+                except (ConnectionError, RuntimeError):
+                    # Se reenviará cuando el worker vuelva a conectarse
+                    handle.writer = None
+
+    async def _parar_worker(self, handle: WorkerHandle):
+        async with handle.lock:
+            if handle.writer:
+                handle.writer.write(b'{"cmd": "stop"}\n')
+                await handle.writer.drain()
+                handle.writer = None
+        if handle.proceso and handle.proceso.returncode is None:
+            try:
+                await asyncio.wait_for(handle.proceso.wait(), TIMEOUT_PARADA)
+            except asyncio.TimeoutError:
+                logger.warning(f"Worker {handle.indice} no terminó a tiempo; se fuerza la salida")
+                handle.proceso.kill()
+
+    async def reiniciar(self, indice: int):
+        """Reinicia un worker cuando no tiene trabajos activos, dejando que termine lo que está procesando"""
+        handle = self.workers[indice]
+        handle.listo.clear()
+        async with handle.lock:
+            if handle.writer:
+                handle.writer.write(b'{"cmd": "preparar_reinicio"}\n')
+                await handle.writer.drain()
+            else:
+                handle.listo.set()
+        # El worker sigue atendiendo updates hasta que acaban sus trabajos
+        espera = asyncio.create_task(handle.listo.wait())
+        salida = asyncio.create_task(handle.proceso.wait())
+        await asyncio.wait({espera, salida}, return_when=asyncio.FIRST_COMPLETED)
+        espera.cancel()
+        salida.cancel()
+        if self._parando or handle.proceso.returncode is not None:
+            return
+        self._reiniciando.add(indice)
+        await self._parar_worker(handle)
+
+    async def reiniciar_todos(self):
+        """Reinicio escalonado: un worker cada vez"""
+        for indice in self.workers:
+            await self.reiniciar(indice)
+            while self.workers[indice].writer is None and not self._parando:
+                await asyncio.sleep(0.5)
+
+    async def detener(self):
+        self._parando = True
+        await asyncio.gather(*[self._parar_worker(h) for h in self.workers.values()])
+        for monitor in self._monitores:
+            monitor.cancel()
+        await asyncio.gather(*self._monitores, return_exceptions=True)
+        if self._servidor:
+            self._servidor.close()
+        sin_confirmar = sum(len(h.pendientes) for h in self.workers.values())
+        if sin_confirmar:
+            logger.warning(f"Supervisor detenido con {sin_confirmar} updates sin confirmar")
+
+    def estado(self) -> Dict[int, Dict]:
+        return {
+            i: {'pendientes': len(h.pendientes), 'procesados': h.procesados, 'reinicios': h.reinicios,
+                'conectado': h.writer is not None}
+            for i, h in self.workers.items()
+        }
+
+    async def recibir_polling(self, timeout: int = 30):
+        """Long polling en el supervisor; el offset avanza en cuanto el update queda registrado"""
+        await self.bot.delete_webhook(drop_pending_updates=False)
+        offset = None
+        while not self.parada.is_set():
+            try:
+                updates = await self.bot.get_updates(offset=offset, timeout=timeout,
+                                                     allowed_updates=self.allowed_updates)
+            except Exception as e:
+                logger.error(f"Error al recibir updates: {str(e)}")
+                await asyncio.sleep(5)
+                continue
+            for update in updates:
+                await self.despachar(update.model_dump(mode='json', by_alias=True, exclude_none=True))
+                offset = update.update_id + 1
+
+    async def recibir_webhook(self, url: str, path: str, host: str, port: int, secret: str):
+        """Servidor webhook del supervisor: comprueba el secret token y reparte el update"""
+        async def recibir(request: web.Request) -> web.Response:
+            recibido = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+            if not hmac.compare_digest(recibido, secret):
+                return web.Response(body="Unauthorized", status=401)
+            await self.despachar(await request.json())
+            return web.json_response({})
+
+        app = web.Application()
+        app.router.add_post(path, recibir)
+        runner = web.AppRunner(app, handle_signals=False)
+        await runner.setup()
+        site = web.TCPSite(runner, host=host, port=port)
+        await site.start()
+        try:
+            await self.bot.set_webhook(url=f"{url}{path}", secret_token=secret, allowed_updates=self.allowed_updates)
+            logger.info(f"Supervisor: webhook en {host}:{port}{path}")
+            await self.parada.wait()
+        finally:
+            await site.stop()
+            await runner.cleanup()
+
+
+async def ejecutar_supervisor(bot, workers: int, allowed_updates: Optional[List[str]] = None):
+    """Arranca el supervisor y los workers y recibe updates según BOT_MODE hasta SIGINT/SIGTERM"""
+    import secrets
+    from webhook_server import BOT_MODE, WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL
+
+    supervisor = Supervisor(bot, workers, allowed_updates)
+    await supervisor.iniciar()
+    loop = asyncio.get_running_loop()
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(senal, supervisor.parada.set)
+    loop.add_signal_handler(signal.SIGUSR1, lambda: asyncio.ensure_future(supervisor.reiniciar_todos()))
+
+    try:
+        if BOT_MODE == 'webhook':
+            if not WEBHOOK_URL:
+                raise ValueError("BOT_MODE=webhook necesita WEBHOOK_URL")
+            secreto = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+            await supervisor.recibir_webhook(WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, secreto)
+        else:
+            recepcion = asyncio.create_task(supervisor.recibir_polling())
+            await supervisor.parada.wait()
+            recepcion.cancel()
+            await asyncio.gather(recepcion, return_exceptions=True)
+    finally:
+        await supervisor.detener()
+
+
+async def ejecutar_worker(indice: int, total: int, puerto: int, inicial: bool):
+    """Procesa los updates que le envía el supervisor (el UpdateScheduler del Dispatcher mantiene el orden por chat)"""
+    import AntmasterBot as app
+
+    await app.iniciar_servicios(shard=(indice, total, HashRing(total)), inicial=inicial)
+    reader, writer = await asyncio.open_connection('127.0.0.1', puerto)
+    writer.write(f"{indice}\n".encode())
+    await writer.drain()
+    logger.info(f"Worker {indice}/{total} conectado al supervisor")
+
+    tareas = set()
+    preparacion: Optional[asyncio.Task] = None
+
+    async def esperar_trabajos():
+        """Avisa al supervisor de que puede reiniciar el worker cuando no quedan trabajos activos"""
+        if app.job_manager.activos:
+            logger.info(f"Worker {indice}: reinicio pendiente de {len(app.job_manager.activos)} trabajos en curso")
+        while app.job_manager.activos:
+            await asyncio.sleep(INTERVALO_ESPERA_TRABAJOS)
+        writer.write(b"listo\n")
+
+    async def procesar(update: Dict):
+        try:
+            await app.dp.feed_raw_update(app.bot, update)
+        except Exception as e:
+            logger.error(f"Error al procesar el update {update.get('update_id')}: {str(e)}")
+        finally:
+            # Se confirma también si el manejador falla: reintentarlo no lo arreglaría
+            writer.write(f"{update['update_id']}\n".encode())
+
+    try:
+        while True:
+            linea = await reader.readline()
+            if not linea:
+                break
+            mensaje = json.loads(linea)
+            if mensaje.get('cmd') == 'stop':
+                break
+            if mensaje.get('cmd') == 'preparar_reinicio':
+                if preparacion is None or preparacion.done():
+                    preparacion = asyncio.create_task(esperar_trabajos())
+                continue
+            tarea = asyncio.create_task(procesar(mensaje))
+            tareas.add(tarea)
+            tarea.add_done_callback(tareas.discard)
+        if preparacion:
+            preparacion.cancel()
+        # Terminar lo que está en curso antes de salir
+        if tareas:
+            await asyncio.wait(set(tareas), timeout=TIMEOUT_PARADA)
+        await writer.drain()
+    finally:
+        writer.close()
+        await app.detener_servicios()
+        await app.bot.session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker del modo multiproceso de AntmasterBot")
+    parser.add_argument('--worker', type=int, required=True)
+    parser.add_argument('--total', type=int, required=True)
+    parser.add_argument('--puerto', type=int, required=True)
+    parser.add_argument('--inicial', action='store_true', help="primer arranque (no un reinicio)")
+    args = parser.parse_args()
+    # El supervisor decide cuándo parar: Ctrl+C en la terminal no debe matar a los workers a medias
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(ejecutar_worker(args.worker, args.total, args.puerto, args.inicial))
+
+
+if __name__ == '__main__':
+    main()
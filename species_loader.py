@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+# Peticiones simultáneas por fuente durante una carga masiva
+LIMITES_FUENTE_POR_DEFECTO = {
+    'inaturalist': 4,
+    'antwiki': 2,
+    'antmaps': 2,
+    'antontop': 2,
+}
+
+
+class SpeciesLoader(WorkerPool):
+    """
+    Cargador masivo de especies: varios trabajadores en paralelo con límite por fuente,
+    checkpoint de nombres completados para poder reanudar y escritura por lotes en la base de datos.
+
+    La función `procesar(especie, loader)` debe devolver el diccionario de la especie para
+    `AntDatabase.upsert_species_batch`, o None si no se encontró. Dentro de ella cada
+    consulta externa se envuelve con `async with loader.fuente('antwiki'):`.
+    """
+
+    unidad = 'especies'
+
+    def __init__(self, db, procesar: Callable[[str, 'SpeciesLoader'], Awaitable[Optional[Dict]]],
+                 workers: int = 4, limites_fuente: Optional[Dict[str, int]] = None,
+                 checkpoint_path: Optional[str] = None, batch_size: int = 25,
+                 intervalo_progreso: float = 10.0,
+                 on_progress: Optional[Callable[[Dict], Awaitable[None]]] = None):
+        super().__init__(workers, intervalo_progreso, on_progress)
+        self.db = db
+        self.procesar = procesar
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = max(1, batch_size)
+        self.semaforos = {
+            fuente: asyncio.Semaphore(limite)
+            for fuente, limite in (limites_fuente or LIMITES_FUENTE_POR_DEFECTO).items()
+        }
+
+        self.completadas: Set[str] = set()
+        self.pendientes_escritura: List[Dict] = []
+        self.nombres_pendientes: List[str] = []
+        self.estado.update({'guardadas': 0, 'no_encontradas': 0, 'errores': 0, 'ultimas': []})
+
+    def fuente(self, nombre: str) -> asyncio.Semaphore:
+        """Semáforo de la fuente indicada (se crea con límite 1 si no estaba configurada)"""
+        if nombre not in self.semaforos:
+            self.semaforos[nombre] = asyncio.Semaphore(1)
+        return self.semaforos[nombre]
+
+    def cargar_checkpoint(self) -> Set[str]:
+        """Lee los nombres ya completados en ejecuciones anteriores"""
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                self.completadas = {line.strip().lower() for line in f if line.strip()}
+        return self.completadas
+
+    def _guardar_checkpoint(self, nombres: List[str]):
+        self.completadas.update(n.lower() for n in nombres)
+        if not self.checkpoint_path or not nombres:
+            return
+        with open(self.checkpoint_path, 'a', encoding='utf-8') as f:
+            f.write(''.join(f"{n}\n" for n in nombres))
+
+    def _vaciar_lote(self):
+        """Escribe el lote pendiente y marca sus nombres como completados"""
+        if not self.pendientes_escritura and not self.nombres_pendientes:
+            return
+        lote = self.pendientes_escritura
+        nombres = self.nombres_pendientes
+        self.pendientes_escritura = []
+        self.nombres_pendientes = []
+
+        if lote:
+            escritas = self.db.upsert_species_batch(lote)
+            if escritas != len(lote):
+                # Si el lote falla no se marca en el checkpoint para reintentarlo en la siguiente ejecución
+                self.estado['errores'] += len(lote)
+                self.estado['guardadas'] -= len(lote)
+                guardadas = {e['_nombre'] for e in lote}
+                nombres = [n for n in nombres if n not in guardadas]
+        self._guardar_checkpoint(nombres)
+
+    def _anotar(self, texto: str):
+        self.estado['ultimas'] = (self.estado['ultimas'] + [texto])[-10:]
+
+    async def procesar_elemento(self, especie: str):
+        try:
+            resultado = await self.procesar(especie, self)
+            if resultado:
+                resultado['_nombre'] = especie
+                self.pendientes_escritura.append(resultado)
+                self.estado['guardadas'] += 1
+                self._anotar(f"✅ {resultado['scientific_name']}")
+            else:
+                self.estado['no_encontradas'] += 1
+                self._anotar(f"❌ No encontrada: {especie}")
+            self.nombres_pendientes.append(especie)
+        except Exception as e:
+            # Los errores no se guardan en el checkpoint para reintentarlos al reanudar
+            self.estado['errores'] += 1
+            self._anotar(f"❌ Error: {especie}")
+            logger.error(f"Error procesando {especie}: {str(e)}")
+        finally:
+            self.estado['procesados'] += 1
+            if len(self.pendientes_escritura) >= self.batch_size or len(self.nombres_pendientes) >= self.batch_size:
+                self._vaciar_lote()
+
+    async def cargar(self, especies: List[str]) -> Dict:
+        """
+        Procesa la lista de especies y devuelve el resumen final.
+
+        Los nombres presentes en el checkpoint se omiten, así que volver a lanzar la misma
+        carga tras un fallo continúa donde se quedó.
+        """
+        self.cargar_checkpoint()
+        self.estado['total'] = len(especies)
+
+        pendientes = []
+        vistas = set()
+        for especie in especies:
+            clave = especie.lower()
+            if clave in self.completadas or clave in vistas:
+                self.estado['omitidos'] += 1
+                continue
+            vistas.add(clave)
+            pendientes.append(especie)
+
+        if self.estado['omitidos']:
+            logger.info(f"Reanudando carga: {self.estado['omitidos']} especies ya completadas")
+
+        try:
+            await self.ejecutar_cola(pendientes)
+        finally:
+            # Lo ya procesado se escribe aunque la carga se interrumpa
+            self._vaciar_lote()
+
+        await self.informar(forzar=True)
+        return self.resumen()
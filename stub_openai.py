@@ -0,0 +1,159 @@
+"""
+Servidor local que imita el endpoint /v1/chat/completions de OpenAI.
+
+Sirve para probar DescriptionService sin gastar tokens: el bot usa este servidor si se
+define OPENAI_BASE_URL=http://127.0.0.1:8089/v1 (con cualquier OPENAI_API_KEY).
+
+Uso:
+    python stub_openai.py                      # servidor en el puerto 8089
+    python stub_openai.py --latencia 3000      # respuestas lentas para probar el plazo
+    python stub_openai.py --probar 20          # lanza 20 descripciones contra el propio servidor
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from aiohttp import web
+
+TEXTO = ("🐜 Especie de prueba generada por el servidor local. Forma colonias en suelos secos y "
+         "recolecta semillas durante los meses cálidos.")
+
+
+class StubOpenAI:
+    def __init__(self, latencia: float, tokens_entrada: int = 350, chunks: int = 8):
+        self.latencia = latencia
+        self.tokens_entrada = tokens_entrada
+        self.chunks = chunks
+        self.peticiones = 0
+        self.simultaneas = 0
+        self.max_simultaneas = 0
+
+    def _respuesta(self, modelo: str) -> dict:
+        return {
+            'id': f"chatcmpl-stub-{self.peticiones}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': modelo,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': TEXTO},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': self.tokens_entrada,
+                'completion_tokens': len(TEXTO) // 4,
+                'total_tokens': self.tokens_entrada + len(TEXTO) // 4,
+            },
+        }
+
+    async def _stream(self, request, modelo: str):
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        tamano = len(TEXTO) // self.chunks + 1
+        for i in range(0, len(TEXTO), tamano):
+            await asyncio.sleep(self.latencia / self.chunks)
+            chunk = {
+                'id': f"chatcmpl-stub-{self.peticiones}",
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': modelo,
+                'choices': [{'index': 0, 'delta': {'content': TEXTO[i:i + tamano]}, 'finish_reason': None}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        final = {
+            'id': f"chatcmpl-stub-{self.peticiones}",
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': modelo,
+            'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+            'usage': self._respuesta(modelo)['usage'],
+        }
+        await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        await response.write_eof()
+        return response
+
+    async def completions(self, request):
+        cuerpo = await request.json()
+        modelo = cuerpo.get('model', 'stub')
+        self.peticiones += 1
+        self.simultaneas += 1
+        self.max_simultaneas = max(self.max_simultaneas, self.simultaneas)
+        try:
+            if cuerpo.get('stream'):
+                return await self._stream(request, modelo)
+            await asyncio.sleep(self.latencia)
+            return web.json_response(self._respuesta(modelo))
+        finally:
+            self.simultaneas -= 1
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', self.completions)
+        return app
+
+
+class BaseDatosMemoria:
+    """Tabla openai_usage en memoria para la prueba"""
+
+    def __init__(self):
+        self.uso = {}
+
+    def get_openai_usage(self, day):
+        return dict(self.uso.get(day, {}))
+
+    def add_openai_usage(self, day, prompt_tokens=0, completion_tokens=0, cost=0.0, request_count=0,
+                         fallback_count=0):
+        fila = self.uso.setdefault(day, {'prompt_tokens': 0, 'completion_tokens': 0, 'cost': 0.0,
+                                         'requests': 0, 'fallbacks': 0})
+        fila['prompt_tokens'] += prompt_tokens
+        fila['completion_tokens'] += completion_tokens
+        fila['cost'] += cost
+        fila['requests'] += request_count
+        fila['fallbacks'] += fallback_count
+        return dict(fila)
+
+
+async def probar(stub: StubOpenAI, puerto: int, n: int, concurrencia: int, timeout: float, tokens: int):
+    from description_service import DescriptionService
+
+    runner = web.AppRunner(stub.app())
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', puerto).start()
+
+    servicio = DescriptionService(BaseDatosMemoria(), api_key='stub', base_url=f"http://127.0.0.1:{puerto}/v1",
+                                  max_concurrentes=concurrencia, timeout=timeout, tokens_diarios=tokens)
+    info = {'description': ['Texto de prueba.'], 'distribution': ['Spain'], 'habitat': [], 'behavior': []}
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*[servicio.generar(f"Messor prueba{i}", info) for i in range(n)])
+    transcurrido = time.perf_counter() - inicio
+    await servicio.close()
+    await runner.cleanup()
+
+    uso = servicio.uso_hoy()
+    print(f"Descripciones: {n} en {transcurrido:.2f}s")
+    print(f"Generadas: {sum(1 for r in resultados if r)} | Resumen básico: {sum(1 for r in resultados if not r)}")
+    print(f"Peticiones al servidor: {stub.peticiones} | Máximo simultáneas: {stub.max_simultaneas} (límite {concurrencia})")
+    print(f"Tokens: {uso['tokens_entrada']} + {uso['tokens_salida']} | Coste: ${uso['coste']:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local compatible con OpenAI")
+    parser.add_argument('--puerto', type=int, default=8089)
+    parser.add_argument('--latencia', type=float, default=500, help="ms por respuesta")
+    parser.add_argument('--probar', type=int, default=0, help="número de descripciones de prueba")
+    parser.add_argument('--concurrencia', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=20)
+    parser.add_argument('--tokens-diarios', type=int, default=200000)
+    args = parser.parse_args()
+
+    stub = StubOpenAI(args.latencia / 1000)
+    if args.probar:
+        asyncio.run(probar(stub, args.puerto, args.probar, args.concurrencia, args.timeout, args.tokens_diarios))
+    else:
+        print(f"Servidor OpenAI local en http://127.0.0.1:{args.puerto}/v1")
+        web.run_app(stub.app(), host='127.0.0.1', port=args.puerto)
+
+
+if __name__ == '__main__':
+    main()
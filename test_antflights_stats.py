@@ -0,0 +1,21 @@
+from antflights_stats import _series_en_bloque
+
+BLOQUE_MESES = """
+byMonth = new Chart(ctx, {data: {labels: ['Jan', 'Feb'], datasets: [
+    {label: "North", data: [3, 4]},
+    {label: 'Flights per month of Lasius niger (all records in the database)', data: [1, 1]},
+    {label: "Southern Hemisphere", data: [0, 2]}
+]}});
+"""
+
+
+def test_solo_los_hemisferios_conocidos_son_claves():
+    puntos = _series_en_bloque('month', BLOQUE_MESES)
+    assert {p['hemisphere'] for p in puntos} == {'North', 'South', 'World'}
+    assert {(p['month'], p['count']) for p in puntos if p['hemisphere'] == 'North'} == {(1, 3), (2, 4)}
+    assert {(p['month'], p['count']) for p in puntos if p['hemisphere'] == 'World'} == {(1, 1), (2, 1)}
+
+
+def test_hemisferio_solo_en_meses():
+    bloque = 'byHours = new Chart(ctx, {data: {labels: [20], datasets: [{label: "North", data: [7]}]}});'
+    assert _series_en_bloque('hour', bloque) == [{'hour': 20, 'count': 7}]
@@ -0,0 +1,95 @@
+import asyncio
+
+from aiogram.exceptions import (TelegramBadRequest, TelegramForbiddenError, TelegramMigrateToChat,
+                                TelegramRetryAfter)
+
+from broadcaster import Broadcaster, formatear_informe
+
+
+class BotFalso:
+    """send_message que lanza el error configurado para cada chat (una vez) y anota los envíos"""
+
+    def __init__(self, errores=None):
+        self.errores = dict(errores or {})
+        self.enviados = []
+        self.activos = 0
+        self.max_activos = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.activos += 1
+        self.max_activos = max(self.max_activos, self.activos)
+        try:
+            await asyncio.sleep(0.001)
+            error = self.errores.pop(chat_id, None)
+            if error:
+                raise error
+            self.enviados.append(chat_id)
+            return {'chat_id': chat_id, 'text': text}
+        finally:
+            self.activos -= 1
+
+
+def test_envia_a_todos_con_concurrencia_limitada():
+    bot = BotFalso()
+    broadcaster = Broadcaster(bot, mensajes_por_segundo=1000, concurrencia=4)
+    chats = {chat_id: 'Aviso' for chat_id in range(1, 41)}
+
+    informe = asyncio.run(broadcaster.enviar(chats))
+
+    assert informe['enviados'] == 40
+    assert sorted(informe['entregados']) == list(range(1, 41))
+    assert informe['errores'] == informe['descartados'] == 0
+    assert bot.max_activos == 4
+
+
+def test_respeta_la_tasa_global():
+    broadcaster = Broadcaster(BotFalso(), mensajes_por_segundo=20, concurrencia=8)
+    informe = asyncio.run(broadcaster.enviar({chat_id: 'Aviso' for chat_id in range(1, 31)}))
+    # Ráfaga de 20 y los 10 restantes a 20 por segundo
+    assert informe['enviados'] == 30
+    assert informe['duracion'] >= 0.45
+
+
+def test_errores_de_telegram():
+    bot = BotFalso({
+        -1: TelegramRetryAfter(method=None, message='flood', retry_after=0.01),
+        -2: TelegramForbiddenError(method=None, message='Forbidden: bot was kicked from the group chat'),
+        -3: TelegramBadRequest(method=None, message='Bad Request: chat not found'),
+        -4: TelegramBadRequest(method=None, message='Bad Request: message is too long'),
+        -5: TelegramMigrateToChat(method=None, message='migrated', migrate_to_chat_id=-1005),
+    })
+    descartados = []
+
+    async def on_descartado(chat_id, motivo):
+        descartados.append(chat_id)
+
+    broadcaster = Broadcaster(bot, mensajes_por_segundo=1000, on_descartado=on_descartado)
+    informe = asyncio.run(broadcaster.enviar({chat_id: 'Aviso' for chat_id in (-1, -2, -3, -4, -5)}))
+
+    assert sorted(bot.enviados) == [-1005, -1]
+    assert informe['enviados'] == 2
+    assert informe['reintentos'] == 1
+    assert informe['descartados'] == 2
+    assert informe['errores'] == 1
+    assert sorted(descartados) == [-5, -3, -2]
+
+    # Los chats descartados no se vuelven a intentar
+    segundo = asyncio.run(broadcaster.enviar({-2: 'Otro aviso', -1: 'Otro aviso'}))
+    assert segundo['descartados'] == 1
+    assert segundo['enviados'] == 1
+
+
+def test_limites_por_chat():
+    broadcaster = Broadcaster(BotFalso())
+    grupo, privado = broadcaster._bucket(-100), broadcaster._bucket(100)
+    assert (grupo.tasa, grupo.capacidad) == (20 / 60, 3)
+    assert (privado.tasa, privado.capacidad) == (1.0, 1)
+
+
+def test_formatear_informe():
+    texto = formatear_informe({'total': 10, 'enviados': 8, 'errores': 1, 'descartados': 1, 'reintentos': 0,
+                               'duracion': 2.5, 'latencia_max': 0.75})
+    assert '• Mensajes enviados: 8' in texto
+    assert 'Chats descartados' in texto
+    assert 'Reintentos' not in texto
+    assert texto.endswith('2.5s (máx. 0.8s por chat)')
@@ -0,0 +1,70 @@
+import flight_profiles
+from flight_profiles import HISTOGRAMAS, codificar, decodificar, perfiles_desde_stats, puntuar
+
+
+def _decodificados(perfiles):
+    """Simula el paso por la base de datos: codificar y decodificar cada histograma"""
+    return {
+        hemisferio: {columna: decodificar(codificar(perfil[columna]), tamano)
+                     for columna, tamano in HISTOGRAMAS.values()}
+        for hemisferio, perfil in perfiles.items()
+    }
+
+
+def test_codificar_decodificar_ida_y_vuelta():
+    valores = [0, 1, 7, 2 ** 32 - 1]
+    assert list(decodificar(codificar(valores), 4)) == valores
+
+
+def test_decodificar_rellena_con_ceros_y_recorta():
+    assert list(decodificar(codificar([3, 4]), 5)) == [3, 4, 0, 0, 0]
+    assert list(decodificar(codificar([1, 2, 3]), 2)) == [1, 2]
+    assert list(decodificar(None, 3)) == [0, 0, 0]
+
+
+def test_indices_fuera_de_rango():
+    assert flight_profiles.indice('month', 13) is None
+    assert flight_profiles.indice('hour', 'x') is None
+    # Las temperaturas extremas caen en la primera y la última posición
+    assert flight_profiles.indice('temperature', -40) == 0
+    assert flight_profiles.indice('temperature', 80) == flight_profiles.TEMPERATURAS - 1
+    assert flight_profiles.indice('moon', 'Third quarter') == flight_profiles.FASES_LUNARES.index('last quarter')
+
+
+def test_perfiles_desde_stats_separa_hemisferios():
+    perfiles = perfiles_desde_stats({
+        'month': [{'month': 6, 'count': 3, 'hemisphere': 'North'}, {'month': 12, 'count': 2, 'hemisphere': 'South'}],
+        'hour': [{'hour': 18, 'count': 5}],
+    })
+    assert perfiles['North']['months'][5] == 3
+    assert perfiles['South']['months'][11] == 2
+    assert perfiles['World']['hours'][18] == 5
+    assert sum(perfiles['World']['months']) == 0
+
+
+def test_puntuar_genero_con_meses_por_hemisferio():
+    # 'World' existe (horas) pero sus meses están a cero: hay que usar los de 'North'
+    perfiles = _decodificados(perfiles_desde_stats({
+        'month': [{'month': 6, 'count': 3, 'hemisphere': 'North'}, {'month': 7, 'count': 1, 'hemisphere': 'North'}],
+        'hour': [{'hour': 18, 'count': 4}],
+    }))
+    assert puntuar({'lasius': perfiles}, mes=6) == {'lasius': 0.75}
+    assert puntuar({'lasius': perfiles}, mes=6, hemisferio='North') == {'lasius': 0.75}
+    assert puntuar({'lasius': perfiles}, mes=6, hora=18) == {'lasius': 0.75}
+
+
+def test_puntuar_prefiere_el_hemisferio_pedido():
+    perfiles = _decodificados(perfiles_desde_stats({
+        'month': [{'month': 6, 'count': 1, 'hemisphere': 'North'},
+                  {'month': 6, 'count': 1, 'hemisphere': 'South'}, {'month': 12, 'count': 3, 'hemisphere': 'South'}],
+    }))
+    assert puntuar({'messor': perfiles}, mes=6, hemisferio='North') == {'messor': 1.0}
+    assert puntuar({'messor': perfiles}, mes=6, hemisferio='South') == {'messor': 0.25}
+
+
+def test_puntuar_sin_datos():
+    assert puntuar({}) == {}
+    perfiles = _decodificados(perfiles_desde_stats({'hour': [{'hour': 3, 'count': 1}]}))
+    assert puntuar({'pheidole': perfiles}, mes=6) == {'pheidole': 0.0}
+    # Sin condiciones no se descarta a nadie
+    assert puntuar({'pheidole': perfiles}) == {'pheidole': 1.0}
@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from game_attempts import AttemptTracker, formatear_proxima_partida
+
+
+class BaseDatosIntentos:
+    def __init__(self, ventanas=()):
+        self.ventanas = list(ventanas)
+        self.escrituras = []
+        self.fallar = False
+
+    def get_open_game_windows(self, segundos):
+        return self.ventanas
+
+    def save_game_attempts(self, nuevas, actualizadas):
+        if self.fallar:
+            return False
+        self.escrituras.append((nuevas, actualizadas))
+        return True
+
+
+def test_limite_de_intentos_en_la_ventana():
+    tracker = AttemptTracker(BaseDatosIntentos(), max_intentos=3)
+    assert all(tracker.registrar(1, -100, 7, False) for _ in range(3))
+    assert not tracker.puede_jugar(1, -100)
+    # El cuarto intento no se cuenta
+    assert not tracker.registrar(1, -100, 7, True)
+    assert tracker.ventanas[(1, -100)]['attempts'] == 3
+    assert 'Podrás jugar de nuevo a las' in tracker.mensaje_limite(1, -100)
+    # Otro chat y otro usuario tienen su propia ventana
+    assert tracker.puede_jugar(1, -200)
+    assert tracker.puede_jugar(2, -100)
+
+
+def test_la_ventana_caduca_a_las_24_horas():
+    tracker = AttemptTracker(BaseDatosIntentos(), max_intentos=1)
+    tracker.registrar(1, -100, 7, False)
+    assert tracker.proxima_partida(1, -100) is not None
+    tracker.ventanas[(1, -100)]['last_attempt'] -= timedelta(hours=24)
+    assert tracker.puede_jugar(1, -100)
+    assert tracker.proxima_partida(1, -100) is None
+    assert tracker.registrar(1, -100, 8, True)
+    assert tracker.ventanas[(1, -100)]['attempts'] == 1
+
+
+def test_cargar_reconstruye_las_ventanas_abiertas():
+    hace_una_hora = datetime.now().replace(microsecond=0) - timedelta(hours=1)
+    db = BaseDatosIntentos([{'user_id': 1, 'chat_id': -100, 'attempts': 3,
+                             'last_attempt': hace_una_hora, 'species_id': 5}])
+    tracker = AttemptTracker(db)
+    assert tracker.cargar() == 1
+    assert not tracker.puede_jugar(1, -100)
+
+
+def test_vaciar_separa_ventanas_nuevas_y_actualizadas():
+    hace_una_hora = datetime.now().replace(microsecond=0) - timedelta(hours=1)
+    db = BaseDatosIntentos([{'user_id': 1, 'chat_id': -100, 'attempts': 1,
+                             'last_attempt': hace_una_hora, 'species_id': 5}])
+    tracker = AttemptTracker(db)
+    tracker.cargar()
+    tracker.registrar(1, -100, 6, True)
+    tracker.registrar(2, -100, 7, False)
+
+    assert tracker.vaciar() == 2
+    nuevas, actualizadas = db.escrituras[0]
+    assert [fila[:4] for fila in nuevas] == [(2, -100, 7, 1)]
+    # La fila existente se localiza por su last_attempt anterior
+    assert [(fila[0], fila[2], fila[3], fila[4], fila[5]) for fila in actualizadas] == [(2, 6, 1, -100, hace_una_hora)]
+    assert tracker.vaciar() == 0
+
+
+def test_los_intentos_se_reintentan_si_falla_la_escritura():
+    db = BaseDatosIntentos()
+    tracker = AttemptTracker(db)
+    tracker.registrar(1, -100, 7, False)
+    db.fallar = True
+    assert tracker.vaciar() == 0
+    assert (1, -100) in tracker.pendientes
+
+    db.fallar = False
+    tracker.registrar(1, -100, 8, False)
+    assert tracker.vaciar() == 1
+    nuevas, actualizadas = db.escrituras[0]
+    # Sigue siendo una ventana nueva y lleva los dos intentos
+    assert [fila[:4] for fila in nuevas] == [(1, -100, 8, 2)]
+    assert actualizadas == []
+
+
+def test_el_escritor_agrupa_y_detener_guarda_lo_pendiente():
+    db = BaseDatosIntentos()
+    tracker = AttemptTracker(db, intervalo_escritura=0.01)
+
+    async def probar():
+        tracker.iniciar()
+        tracker.registrar(1, -100, 7, False)
+        tracker.registrar(2, -100, 7, False)
+        await asyncio.sleep(0.05)
+        tracker.registrar(3, -100, 7, False)
+        await tracker.detener()
+
+    asyncio.run(probar())
+    assert [len(nuevas) for nuevas, _ in db.escrituras] == [2, 1]
+
+
+def test_formatear_proxima_partida():
+    ahora = datetime(2024, 5, 10, 12, 0)
+    assert formatear_proxima_partida(datetime(2024, 5, 10, 18, 30), ahora) == '18:30 (hoy)'
+    assert formatear_proxima_partida(datetime(2024, 5, 11, 9, 5), ahora) == '09:05 (mañana)'
+    assert formatear_proxima_partida(datetime(2024, 5, 13, 9, 5), ahora) == '09:05 del 13/05/2024'
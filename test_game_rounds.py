@@ -0,0 +1,98 @@
+import asyncio
+
+from game_rounds import OPCIONES_POR_RONDA, RoundGenerator, genero
+
+
+def _especie(species_id, nombre, region='Europa'):
+    return {'id': species_id, 'scientific_name': nombre, 'region': region,
+            'photo_url': f'https://fotos.example/{species_id}.jpg'}
+
+
+ESPECIES = [
+    _especie(1, 'Lasius niger'), _especie(2, 'Lasius flavus'), _especie(3, 'Lasius fuliginosus'),
+    _especie(4, 'Lasius emarginatus'), _especie(5, 'Messor barbarus'), _especie(6, 'Messor structor'),
+    _especie(7, 'Atta cephalotes', 'América del Sur'), _especie(8, 'Atta sexdens', 'América del Sur'),
+    _especie(9, 'Camponotus cruentatus'), _especie(10, 'Pheidole pallidula'),
+]
+
+
+class BaseDatosJuego:
+    def __init__(self, especies):
+        self.especies = especies
+        self.consultas = 0
+
+    def get_game_species(self):
+        self.consultas += 1
+        return list(self.especies)
+
+
+class CacheFotos:
+    """Todas las fotos tienen file_id: no hace falta comprobarlas por HTTP"""
+
+    def obtener(self, nombre, url):
+        return 'file-id'
+
+
+def _generador(**kwargs):
+    return RoundGenerator(BaseDatosJuego(ESPECIES), CacheFotos(), **kwargs)
+
+
+def test_distractores_del_mismo_genero():
+    generador = _generador()
+    generador.cargar()
+    for _ in range(20):
+        distractores = generador._distractores(generador.especie(1))
+        assert len(distractores) == OPCIONES_POR_RONDA - 1
+        assert {genero(e) for e in distractores} == {'lasius'}
+        assert 1 not in {e['id'] for e in distractores}
+
+
+def test_distractores_completan_con_la_region():
+    generador = _generador()
+    generador.cargar()
+    for _ in range(20):
+        distractores = generador._distractores(generador.especie(7))
+        ids = {e['id'] for e in distractores}
+        assert len(ids) == OPCIONES_POR_RONDA - 1
+        assert 8 in ids and 7 not in ids
+
+
+def test_siguiente_saca_de_la_cola_y_la_rellena():
+    generador = _generador(rondas_por_chat=3, umbral_relleno=1)
+
+    async def probar():
+        primera = await generador.siguiente(-100)
+        # La primera partida espera al relleno; las siguientes salen directamente de la cola
+        assert len(generador.colas[-100]) == 2
+        segunda = await generador.siguiente(-100)
+        await asyncio.gather(*generador.rellenos.values())
+        return primera, segunda
+
+    primera, segunda = asyncio.run(probar())
+    assert len(primera['opciones']) == OPCIONES_POR_RONDA
+    assert primera['especie'] in primera['opciones']
+    assert len(generador.colas[-100]) == 3
+    assert list(generador.recientes[-100]) == [primera['especie']['id'], segunda['especie']['id']]
+    # Las especies solo se leen de la base de datos una vez
+    assert generador.db.consultas == 1
+
+
+def test_descartar_retira_las_rondas_de_la_especie():
+    generador = _generador(rondas_por_chat=5)
+
+    async def rellenar():
+        await generador.rellenar(-100)
+
+    asyncio.run(rellenar())
+    especie_id = generador.colas[-100][0]['especie']['id']
+
+    generador.descartar(especie_id)
+
+    assert all(r['especie']['id'] != especie_id for r in generador.colas[-100])
+    generador.cargar(forzar=True)
+    assert generador.especie(especie_id) is None
+
+
+def test_sin_especies_suficientes():
+    generador = RoundGenerator(BaseDatosJuego(ESPECIES[:2]), CacheFotos())
+    assert asyncio.run(generador.siguiente(-100)) is None
@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+from genus_crawler import GenusCrawler
+
+
+class BaseDatosTemporal:
+    """Solo la parte de temp_data que usa GenusCrawler"""
+
+    def __init__(self, datos=None):
+        self.datos = dict(datos or {})
+
+    def get_temp_data(self, clave):
+        return self.datos.get(clave)
+
+    def set_temp_data(self, clave, valor, expire=None):
+        self.datos[clave] = valor
+
+    def delete_temp_data(self, clave):
+        self.datos.pop(clave, None)
+
+
+def _crawler(db, fallan=(), bloquear=None):
+    llamadas = []
+
+    async def actualizar(genus):
+        llamadas.append(genus)
+        if genus == bloquear:
+            await asyncio.sleep(3600)
+        return genus not in fallan
+
+    crawler = GenusCrawler(db, actualizar, workers=2, intervalo_progreso=0)
+    return crawler, llamadas
+
+
+def test_reanuda_y_borra_el_estado_al_terminar():
+    db = BaseDatosTemporal({'crawl_estadisticas_vuelos': json.dumps({'completados': ['lasius']})})
+    crawler, llamadas = _crawler(db, fallan={'Messor'})
+
+    resumen = asyncio.run(crawler.ejecutar(['Lasius', 'Messor', 'Pheidole', 'Pheidole']))
+
+    assert sorted(llamadas) == ['Messor', 'Pheidole']
+    assert resumen['total'] == 3
+    assert resumen['omitidos'] == 1
+    assert resumen['procesados'] == 2
+    assert resumen['actualizados'] == 1
+    assert resumen['errores'] == ['Messor']
+    assert 'crawl_estadisticas_vuelos' not in db.datos
+
+
+def test_guarda_el_estado_si_se_cancela():
+    db = BaseDatosTemporal()
+    crawler, _ = _crawler(db, bloquear='Pheidole')
+    crawler.workers = 1
+
+    async def probar():
+        tarea = asyncio.create_task(crawler.ejecutar(['Lasius', 'Pheidole', 'Messor']))
+        await asyncio.sleep(0.01)
+        tarea.cancel()
+        try:
+            await tarea
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(probar())
+    guardado = json.loads(db.datos['crawl_estadisticas_vuelos'])
+    assert guardado['completados'] == ['lasius']
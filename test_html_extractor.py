@@ -0,0 +1,23 @@
+from html_extractor import extraer_antontop
+
+FICHA = """
+<html><body>
+<img class="wp-post-image" src="https://antontop.example/messor.jpg">
+<div class="woocommerce-product-details__short-description">
+  <p>Hormiga granívora.</p><p>Colonia monogínica.</p>
+</div>
+<div class="woocommerce-Tabs-panel--description">Descripción larga</div>
+<h4>Detalles de producto</h4>
+<table><tr><td>Tamaño</td><td>3-12 mm</td></tr></table>
+</body></html>
+"""
+
+
+def test_extraer_antontop():
+    info = extraer_antontop(FICHA)
+    assert set(info) == {'photo_url', 'short_description', 'short_description_parrafo', 'description', 'detalles'}
+    assert info['photo_url'] == 'https://antontop.example/messor.jpg'
+    assert info['short_description'] == 'Hormiga granívora. Colonia monogínica.'
+    assert info['short_description_parrafo'] == 'Hormiga granívora.'
+    assert info['description'] == 'Descripción larga'
+    assert info['detalles'] == [('tamaño', '3-12 mm')]
@@ -0,0 +1,73 @@
+import asyncio
+
+from inaturalist_client import INaturalistClient, _CacheLRU
+
+MESSOR = {'id': 1, 'name': 'Messor barbarus', 'rank': 'species', 'matched_term': 'Messor barbarus'}
+
+
+def _cliente(respuestas, espera: float = 0.0):
+    """Cliente cuya API devuelve los resultados de `respuestas[q]` y cuenta las peticiones"""
+    cliente = INaturalistClient()
+    cliente.peticiones = []
+
+    async def get_json(url, params=None):
+        cliente.peticiones.append(params['q'])
+        await asyncio.sleep(espera)
+        return {'results': respuestas.get(params['q'], [])}
+
+    cliente._get_json = get_json
+    return cliente
+
+
+def test_cache_lru_descarta_la_entrada_mas_antigua():
+    cache = _CacheLRU(2)
+    cache.guardar('a', 1)
+    cache.guardar('b', 2)
+    cache.guardar('a', 1)
+    cache.guardar('c', 3)
+    assert list(cache) == ['a', 'c']
+
+
+def test_solo_acepta_el_nombre_exacto_o_un_sinonimo():
+    cliente = _cliente({
+        'Messor barbara': [MESSOR],
+        'Camponotus ligniperda': [
+            {'id': 3, 'name': 'Camponotus herculeanus', 'matched_term': 'Camponotus herculeanus'},
+            {'id': 2, 'name': 'Camponotus ligniperdus', 'matched_term': 'Camponotus ligniperda'},
+        ],
+    })
+
+    async def probar():
+        assert await cliente.resolver_nombre('Messor barbara') is None
+        assert (await cliente.resolver_nombre('Camponotus ligniperda'))['id'] == 2
+
+    asyncio.run(probar())
+    # Un resultado aproximado no se guarda en caché
+    assert 'messor barbara' not in cliente.por_nombre
+    assert 'camponotus ligniperda' in cliente.por_nombre
+
+
+def test_peticiones_simultaneas_comparten_busqueda():
+    cliente = _cliente({'Messor barbarus': [MESSOR]}, espera=0.05)
+
+    async def probar():
+        return await asyncio.gather(*[cliente.resolver_nombre('Messor barbarus') for _ in range(3)])
+
+    assert [t['id'] for t in asyncio.run(probar())] == [1, 1, 1]
+    assert cliente.peticiones == ['Messor barbarus']
+
+
+def test_cancelar_al_primero_no_bloquea_al_resto():
+    cliente = _cliente({'Messor barbarus': [MESSOR]}, espera=0.05)
+
+    async def probar():
+        primero = asyncio.create_task(cliente.resolver_nombre('Messor barbarus'))
+        await asyncio.sleep(0)
+        segundo = asyncio.create_task(cliente.resolver_nombre('Messor barbarus'))
+        await asyncio.sleep(0.01)
+        primero.cancel()
+        return await asyncio.wait_for(segundo, 1)
+
+    assert asyncio.run(probar())['id'] == 1
+    assert cliente.peticiones == ['Messor barbarus']
+    assert not cliente._en_curso
@@ -0,0 +1,127 @@
+import pytest
+import requests
+
+import rate_limiter
+from rate_limiter import (ABIERTO, CERRADO, SEMIABIERTO, CircuitBreaker, CircuitOpenError,
+                          SourceRateLimiter, TokenBucket)
+
+
+class Reloj:
+    """Sustituye al módulo time de rate_limiter con un reloj que solo avanza a mano"""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def monotonic(self):
+        return self.ahora
+
+    def sleep(self, segundos):
+        self.ahora += segundos
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(rate_limiter, 'time', reloj)
+    return reloj
+
+
+class SesionFalsa:
+    def __init__(self, *respuestas):
+        self.respuestas = list(respuestas)
+        self.peticiones = 0
+
+    def request(self, metodo, url, **kwargs):
+        self.peticiones += 1
+        respuesta = self.respuestas.pop(0)
+        if isinstance(respuesta, Exception):
+            raise respuesta
+        resultado = requests.Response()
+        resultado.status_code = respuesta
+        return resultado
+
+
+def test_token_bucket_rafaga_y_espera(reloj):
+    bucket = TokenBucket(tasa=2.0, capacidad=3)
+    assert [bucket.reservar() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Sin tokens: cada reserva espera medio segundo más que la anterior
+    assert bucket.reservar() == pytest.approx(0.5)
+    assert bucket.reservar() == pytest.approx(1.0)
+    reloj.ahora += 10
+    # La recarga no supera la capacidad
+    assert bucket.reservar() == 0.0
+    assert bucket.tokens == pytest.approx(2.0)
+
+
+def test_circuito_se_abre_tras_el_umbral(reloj):
+    circuito = CircuitBreaker(umbral_fallos=3, tiempo_reapertura=60)
+    assert not circuito.registrar_fallo()
+    assert not circuito.registrar_fallo()
+    assert circuito.registrar_fallo()
+    assert circuito.estado == ABIERTO
+    permitido, restante = circuito.permitir()
+    assert not permitido and restante == pytest.approx(60)
+    # Un fallo más con el circuito ya abierto no cuenta como apertura nueva
+    assert not circuito.registrar_fallo()
+
+
+def test_semiabierto_deja_pasar_una_sola_sonda(reloj):
+    circuito = CircuitBreaker(umbral_fallos=1, tiempo_reapertura=30)
+    circuito.registrar_fallo()
+    reloj.ahora += 31
+    assert circuito.permitir() == (True, 0.0)
+    assert circuito.estado == SEMIABIERTO
+    assert not circuito.permitir()[0]
+
+    # Si la sonda se cancela, otra petición puede intentarlo
+    circuito.liberar_sonda()
+    assert circuito.permitir()[0]
+
+    # Un fallo en semiabierto vuelve a abrir; un éxito cierra
+    assert circuito.registrar_fallo()
+    assert circuito.estado == ABIERTO
+    reloj.ahora += 31
+    assert circuito.permitir()[0]
+    circuito.registrar_exito()
+    assert circuito.estado == CERRADO
+    assert circuito.fallos == 0
+
+
+def test_limitador_descarta_peticiones_con_el_circuito_abierto(reloj):
+    limitador = SourceRateLimiter({'antflights.com': (100.0, 10)}, umbral_fallos=2, tiempo_reapertura=60)
+    sesion = SesionFalsa(503, requests.exceptions.ConnectionError(), 200)
+    url = 'https://antflights.com/es/stats/lasius'
+
+    assert limitador.get_sync(url, session=sesion).status_code == 503
+    with pytest.raises(requests.exceptions.ConnectionError):
+        limitador.get_sync(url, session=sesion)
+    with pytest.raises(CircuitOpenError) as error:
+        limitador.get_sync(url, session=sesion)
+    assert error.value.host == 'antflights.com'
+    assert sesion.peticiones == 2
+
+    reloj.ahora += 61
+    assert limitador.get_sync(url, session=sesion).status_code == 200
+    assert limitador.estado()['antflights.com']['estado'] == CERRADO
+
+
+def test_limitador_espera_su_turno(reloj):
+    limitador = SourceRateLimiter({'antwiki.org': (1.0, 1)})
+    inicio = reloj.ahora
+    for _ in range(3):
+        limitador.adquirir_sync('https://antwiki.org/wiki/Lasius_niger')
+    assert reloj.ahora - inicio == pytest.approx(2.0)
+
+
+def test_repartir_divide_tasa_rafaga_y_umbral(reloj):
+    limitador = SourceRateLimiter({'antmaps.org': (2.0, 5)}, umbral_fallos=5)
+    limitador.adquirir_sync('https://antmaps.org/api')
+    limitador.repartir(4)
+
+    assert limitador.limite('antmaps.org') == (0.5, 1)
+    assert limitador.limite('desconocido.org') == (rate_limiter.LIMITE_POR_DEFECTO[0] / 4, 1)
+    # El circuito existente se ajusta a ceil(5 / 4) fallos
+    assert limitador.circuitos['antmaps.org'].umbral_fallos == 2
+    # El bucket se vuelve a crear con el límite repartido
+    limitador.adquirir_sync('https://antmaps.org/api')
+    assert limitador.buckets['antmaps.org'].tasa == 0.5
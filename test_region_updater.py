@@ -0,0 +1,70 @@
+import asyncio
+
+from region_updater import RegionMatcher, RegionUpdater, extraer_region_antwiki
+
+
+class BaseDatosRegiones:
+    def __init__(self):
+        self.regiones = {}
+        self.lotes = 0
+
+    def update_regions_batch(self, regiones):
+        self.lotes += 1
+        self.regiones.update(regiones)
+        return len(regiones)
+
+
+class ClienteINat:
+    def __init__(self, taxones):
+        self.taxones = taxones
+        self.peticiones = []
+
+    async def obtener_por_ids(self, ids):
+        ids = [str(i) for i in ids]
+        self.peticiones.append(ids)
+        return {i: self.taxones[i] for i in ids if i in self.taxones}
+
+
+def test_matcher_prefiere_la_region_mas_larga():
+    matcher = RegionMatcher()
+    assert matcher.normalizar('South Africa') == 'África'
+    assert matcher.normalizar('Spain, Southeast Asia') == 'Asia, Europa'
+    assert matcher.normalizar('Atlantis') == 'Desconocido'
+    assert matcher.normalizar(None) == 'Desconocido'
+
+
+def test_extraer_region_antwiki():
+    assert extraer_region_antwiki('<p>Distribution: Spain and Portugal. More text.</p>') == 'Spain and Portugal'
+    assert extraer_region_antwiki('<p>Sin datos</p>') is None
+
+
+def test_actualizar_combina_antwiki_e_inaturalist():
+    especies = [
+        {'id': i, 'scientific_name': f'Especie {i}', 'antwiki_url': f'https://antwiki/{i}' if i % 2 else None,
+         'inaturalist_id': 100 + i}
+        for i in range(40)
+    ]
+    nativo = {'establishment_means': 'native', 'native_places': [{'name': 'Australia'}]}
+    inat = ClienteINat({str(100 + i): nativo for i in range(0, 40, 2)})
+    db = BaseDatosRegiones()
+    updater = RegionUpdater(db, inat_client=inat, concurrencia=4, batch_size=15)
+
+    async def region_antwiki(especie):
+        await asyncio.sleep(0)
+        return 'Spain' if especie['id'] % 3 else None
+
+    updater._region_antwiki = region_antwiki
+    resumen = asyncio.run(updater.actualizar(especies))
+
+    assert resumen['procesados'] == 40
+    assert resumen['updated'] == 40
+    assert resumen['errors'] == 0
+    assert db.lotes == 3
+    assert db.regiones[1] == 'Europa'
+    assert db.regiones[2] == 'Oceanía'
+    # Impares múltiplos de 3: sin distribución en AntWiki ni taxón nativo
+    assert db.regiones[3] == 'Desconocido'
+    # Solo las especies sin región en AntWiki llegan a iNaturalist, en lotes de hasta 30
+    consultados = [i for lote in inat.peticiones for i in lote]
+    assert len(consultados) == len(set(consultados)) == 20 + 7
+    assert all(len(lote) <= 30 for lote in inat.peticiones)
@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from database import LIMITES_SPAM, evaluar_spam
+from request_context import RequestContext, RequestContextMiddleware
+
+
+class BaseDatosContexto:
+    def __init__(self, interacciones=None, fallar=False):
+        self.interacciones = interacciones or {}
+        self.fallar = fallar
+        self.consultas = 0
+
+    def load_request_context(self, user_id, chat_id):
+        self.consultas += 1
+        if self.fallar:
+            return None
+        return {'experiencia': {'level': 2}, 'xp_hoy': 10, 'idioma': {'language_code': 'es'},
+                'interacciones': {k: list(v) for k, v in self.interacciones.items()}}
+
+
+class CacheAdmins:
+    def __init__(self):
+        self.consultas = 0
+
+    async def es_admin(self, chat_id, user_id):
+        self.consultas += 1
+        return user_id == 1
+
+
+def _cada(segundos, cuantas):
+    """Fechas separadas `segundos` entre sí, de más reciente a más antigua"""
+    ahora = datetime.now()
+    return [ahora - timedelta(seconds=segundos * i) for i in range(cuantas)]
+
+
+def test_evaluar_spam():
+    limite = LIMITES_SPAM['photo']
+    assert not evaluar_spam(1, 'photo', -100, [])
+    assert not evaluar_spam(1, 'photo', -100, _cada(3, limite - 1))
+    assert evaluar_spam(1, 'photo', -100, _cada(3, limite))
+    # Las que quedan fuera del último minuto no cuentan
+    assert not evaluar_spam(1, 'photo', -100, _cada(61, limite))
+    # Una ráfaga casi simultánea se trata como procesamiento inicial del bot, no como spam
+    assert not evaluar_spam(1, 'photo', -100, _cada(0.1, limite))
+    # Tipos desconocidos usan el límite de mensajes
+    assert evaluar_spam(1, 'sticker', -100, _cada(3, LIMITES_SPAM['message']))
+
+
+def test_carga_una_sola_vez():
+    db = BaseDatosContexto()
+    contexto = RequestContext(db, 1, -100)
+    assert contexto.cargar() and contexto.cargar()
+    assert db.consultas == 1
+    assert contexto.experiencia == {'level': 2}
+    assert contexto.xp_hoy == 10
+
+
+def test_carga_fallida_se_reintenta():
+    db = BaseDatosContexto(fallar=True)
+    contexto = RequestContext(db, 1, -100)
+    assert not contexto.cargar()
+    assert not contexto.cargado
+    db.fallar = False
+    assert contexto.cargar()
+    assert db.consultas == 2
+
+
+def test_anotar_actualiza_la_ventana_de_spam():
+    limite = LIMITES_SPAM['command']
+    contexto = RequestContext(BaseDatosContexto({'command': _cada(3, limite - 1)[1:]}), 1, -100)
+    contexto.cargar()
+    assert not contexto.es_spam('command')
+
+    contexto.anotar('command', 5, {'level': 3})
+    assert not contexto.es_spam('command')
+    contexto.anotar('command', 5)
+    # La interacción anotada cuenta sin volver a consultar la base de datos
+    assert contexto.es_spam('command')
+    assert contexto.xp_hoy == 20
+    assert contexto.experiencia == {'level': 3}
+    assert contexto.db.consultas == 1
+
+
+def test_es_admin_se_consulta_una_vez():
+    cache = CacheAdmins()
+    admin = RequestContext(BaseDatosContexto(), 1, -100, cache)
+    otro = RequestContext(BaseDatosContexto(), 2, -100, cache)
+    sin_cache = RequestContext(BaseDatosContexto(), 1, -100)
+
+    async def probar():
+        return [await admin.es_admin(), await admin.es_admin(), await otro.es_admin(), await sin_cache.es_admin()]
+
+    assert asyncio.run(probar()) == [True, True, False, False]
+    assert cache.consultas == 2
+
+
+def test_middleware_crea_el_contexto():
+    middleware = RequestContextMiddleware(BaseDatosContexto())
+
+    async def handler(event, data):
+        return data.get('contexto')
+
+    async def probar():
+        con_usuario = await middleware(handler, None, {'event_from_user': SimpleNamespace(id=1),
+                                                       'event_chat': SimpleNamespace(id=-100)})
+        sin_usuario = await middleware(handler, None, {'event_chat': SimpleNamespace(id=-100)})
+        return con_usuario, sin_usuario
+
+    contexto, sin_contexto = asyncio.run(probar())
+    assert contexto.corresponde(1, -100)
+    assert not contexto.cargado
+    assert sin_contexto is None
@@ -0,0 +1,42 @@
+from shard_workers import HashRing, chat_id_de_update, es_comando_de_trabajos
+
+CHATS = list(range(-1000000, -990000, 7)) + list(range(1, 10000, 3))
+
+
+def test_anillo_reparte_todos_los_chats():
+    anillo = HashRing(4)
+    por_nodo = [0] * 4
+    for chat_id in CHATS:
+        por_nodo[anillo.nodo(chat_id)] += 1
+    # Ningún worker se queda con menos de la mitad (ni más del doble) de su parte
+    media = len(CHATS) / 4
+    assert all(media / 2 < n < media * 2 for n in por_nodo)
+
+
+def test_anillo_es_estable_al_anadir_un_worker():
+    antes, despues = HashRing(4), HashRing(5)
+    movidos = [c for c in CHATS if antes.nodo(c) != despues.nodo(c)]
+    # Solo se mueven chats al worker nuevo, y aproximadamente 1/5 de ellos
+    assert all(despues.nodo(c) == 4 for c in movidos)
+    assert len(movidos) < len(CHATS) * 0.35
+
+
+def test_un_solo_worker():
+    anillo = HashRing(1)
+    assert {anillo.nodo(c) for c in CHATS[:50]} == {0}
+
+
+def test_chat_id_de_update():
+    assert chat_id_de_update({'update_id': 1, 'message': {'chat': {'id': -5}, 'from': {'id': 9}}}) == -5
+    assert chat_id_de_update({'update_id': 2, 'callback_query': {'from': {'id': 9}, 'message': {'chat': {'id': -7}}}}) == -7
+    assert chat_id_de_update({'update_id': 3, 'callback_query': {'from': {'id': 9}}}) == 9
+    assert chat_id_de_update({'update_id': 4, 'inline_query': {'from': {'id': 11}}}) == 11
+
+
+def test_comandos_de_trabajos():
+    assert es_comando_de_trabajos({'message': {'text': '/cargar_especies\nLasius niger'}})
+    assert es_comando_de_trabajos({'message': {'text': '/jobs@AntmasterBot'}})
+    assert es_comando_de_trabajos({'message': {'text': '/cancelar_job 3'}})
+    assert not es_comando_de_trabajos({'message': {'text': '/especie Lasius niger'}})
+    assert not es_comando_de_trabajos({'message': {'text': 'jobs'}})
+    assert not es_comando_de_trabajos({'callback_query': {'data': 'x'}})
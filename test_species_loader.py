@@ -0,0 +1,100 @@
+import asyncio
+
+from species_loader import SpeciesLoader
+
+
+class BaseDatosEspecies:
+    """upsert_species_batch en memoria; con `fallar` el siguiente lote no se escribe"""
+
+    def __init__(self):
+        self.especies = {}
+        self.lotes = []
+        self.fallar = False
+
+    def upsert_species_batch(self, lote):
+        self.lotes.append(len(lote))
+        if self.fallar:
+            self.fallar = False
+            return 0
+        for especie in lote:
+            self.especies[especie['scientific_name']] = especie
+        return len(lote)
+
+
+def _procesar(no_encontradas=(), errores=()):
+    llamadas = []
+
+    async def procesar(especie, loader):
+        llamadas.append(especie)
+        async with loader.fuente('inaturalist'):
+            await asyncio.sleep(0)
+        if especie in errores:
+            raise ValueError('fallo de red')
+        if especie in no_encontradas:
+            return None
+        return {'scientific_name': especie}
+
+    return procesar, llamadas
+
+
+def _leer(ruta):
+    return ruta.read_text(encoding='utf-8').split()
+
+
+def test_reanuda_desde_el_checkpoint(tmp_path):
+    ruta = tmp_path / 'carga.txt'
+    ruta.write_text('lasius_niger\n', encoding='utf-8')
+    db = BaseDatosEspecies()
+    procesar, llamadas = _procesar(no_encontradas={'Atta_inventada'}, errores={'Messor_error'})
+    loader = SpeciesLoader(db, procesar, workers=3, checkpoint_path=str(ruta), batch_size=2)
+
+    especies = ['Lasius_niger', 'Messor_barbarus', 'messor_barbarus', 'Atta_inventada', 'Messor_error', 'Pheidole_pallidula']
+    resumen = asyncio.run(loader.cargar(especies))
+
+    assert sorted(llamadas) == ['Atta_inventada', 'Messor_barbarus', 'Messor_error', 'Pheidole_pallidula']
+    assert resumen['total'] == 6
+    assert resumen['omitidos'] == 2
+    assert resumen['procesados'] == 4
+    assert (resumen['guardadas'], resumen['no_encontradas'], resumen['errores']) == (2, 1, 1)
+    assert set(db.especies) == {'Messor_barbarus', 'Pheidole_pallidula'}
+    # Los errores no entran en el checkpoint para reintentarlos; los no encontrados sí
+    assert sorted(_leer(ruta)) == ['Atta_inventada', 'Messor_barbarus', 'Pheidole_pallidula', 'lasius_niger']
+
+
+def test_lote_fallido_no_se_marca_como_completado(tmp_path):
+    ruta = tmp_path / 'carga.txt'
+    db = BaseDatosEspecies()
+    db.fallar = True
+    procesar, _ = _procesar()
+    loader = SpeciesLoader(db, procesar, workers=1, checkpoint_path=str(ruta), batch_size=2)
+
+    resumen = asyncio.run(loader.cargar(['Lasius_niger', 'Lasius_flavus', 'Formica_rufa']))
+
+    assert db.lotes == [2, 1]
+    assert resumen['guardadas'] == 1
+    assert resumen['errores'] == 2
+    assert _leer(ruta) == ['Formica_rufa']
+
+    # Al relanzar la misma carga solo se repiten las del lote fallido
+    procesar, llamadas = _procesar()
+    resumen = asyncio.run(SpeciesLoader(db, procesar, checkpoint_path=str(ruta)).cargar(
+        ['Lasius_niger', 'Lasius_flavus', 'Formica_rufa']))
+    assert sorted(llamadas) == ['Lasius_flavus', 'Lasius_niger']
+    assert resumen['omitidos'] == 1
+    assert set(db.especies) == {'Lasius_niger', 'Lasius_flavus', 'Formica_rufa'}
+
+
+def test_limite_por_fuente():
+    activos = {'antwiki': 0, 'maximo': 0}
+
+    async def procesar(especie, loader):
+        async with loader.fuente('antwiki'):
+            activos['antwiki'] += 1
+            activos['maximo'] = max(activos['maximo'], activos['antwiki'])
+            await asyncio.sleep(0.001)
+            activos['antwiki'] -= 1
+        return {'scientific_name': especie}
+
+    loader = SpeciesLoader(BaseDatosEspecies(), procesar, workers=6, limites_fuente={'antwiki': 2})
+    asyncio.run(loader.cargar([f'Especie_{i}' for i in range(12)]))
+    assert activos['maximo'] == 2
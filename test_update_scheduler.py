@@ -0,0 +1,129 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.types import Update
+
+from update_scheduler import PrioritySemaphore, UpdateScheduler
+
+
+def _update(tipo):
+    return Update.model_construct(update_id=1, **{tipo: object()})
+
+
+def _datos(chat_id):
+    return {'event_chat': SimpleNamespace(id=chat_id), 'event_from_user': SimpleNamespace(id=1)}
+
+
+def test_semaforo_reparte_por_prioridad_y_llegada():
+    async def probar():
+        semaforo = PrioritySemaphore(1)
+        orden = []
+        await semaforo.adquirir(1)
+
+        async def esperar(nombre, prioridad):
+            await semaforo.adquirir(prioridad)
+            orden.append(nombre)
+            semaforo.liberar()
+
+        tareas = [asyncio.create_task(esperar(n, p)) for n, p in (('a', 1), ('b', 1), ('boton', 0))]
+        await asyncio.sleep(0)
+        assert semaforo.esperando() == 3
+        semaforo.liberar()
+        await asyncio.gather(*tareas)
+        return orden, semaforo.libres
+
+    orden, libres = asyncio.run(probar())
+    assert orden == ['boton', 'a', 'b']
+    assert libres == 1
+
+
+def test_semaforo_cancelar_no_pierde_huecos():
+    async def probar():
+        semaforo = PrioritySemaphore(1)
+        await semaforo.adquirir(1)
+
+        # Cancelado mientras espera: no se le concede nada
+        esperando = asyncio.create_task(semaforo.adquirir(1))
+        await asyncio.sleep(0)
+        esperando.cancel()
+        await asyncio.gather(esperando, return_exceptions=True)
+        assert semaforo.esperando() == 0
+
+        # Cancelado justo después de concedérsele el hueco: lo devuelve
+        concedido = asyncio.create_task(semaforo.adquirir(1))
+        await asyncio.sleep(0)
+        semaforo.liberar()
+        concedido.cancel()
+        await asyncio.gather(concedido, return_exceptions=True)
+        return semaforo.libres
+
+    assert asyncio.run(probar()) == 1
+
+
+def test_updates_del_mismo_chat_en_orden():
+    planificador = UpdateScheduler(concurrencia=4)
+    procesados = []
+
+    async def handler(event, data):
+        # El primero tarda más: si no hubiera cola por chat, el segundo terminaría antes
+        await asyncio.sleep(0.02 if data['n'] == 0 else 0)
+        procesados.append((data['event_chat'].id, data['n']))
+
+    async def probar():
+        await asyncio.gather(*[
+            planificador(handler, _update('message'), dict(_datos(chat_id), n=n))
+            for n in range(3) for chat_id in (-1, -2)
+        ])
+
+    asyncio.run(probar())
+    assert [n for chat_id, n in procesados if chat_id == -1] == [0, 1, 2]
+    assert [n for chat_id, n in procesados if chat_id == -2] == [0, 1, 2]
+    metricas = planificador.metricas()
+    assert metricas['en_cola'] == metricas['en_curso'] == 0
+    assert {c['chat_id']: c['procesados'] for c in metricas['chats']} == {-1: 3, -2: 3}
+    assert not planificador._colas
+
+
+def test_botones_no_esperan_al_comando_lento_del_chat():
+    planificador = UpdateScheduler(concurrencia=2)
+    orden = []
+
+    async def probar():
+        fin_comando = asyncio.Event()
+
+        async def comando(event, data):
+            await fin_comando.wait()
+            orden.append('comando')
+
+        async def boton(event, data):
+            orden.append('boton')
+            fin_comando.set()
+
+        lento = asyncio.create_task(planificador(comando, _update('message'), _datos(-1)))
+        await asyncio.sleep(0)
+        # Un segundo mensaje del chat espera al primero, el botón no
+        siguiente = asyncio.create_task(planificador(boton, _update('message'), _datos(-1)))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(planificador(boton, _update('callback_query'), _datos(-1)), 1)
+        await asyncio.gather(lento, siguiente)
+
+    asyncio.run(probar())
+    assert orden == ['boton', 'comando', 'boton']
+
+
+def test_concurrencia_global_limitada():
+    planificador = UpdateScheduler(concurrencia=3)
+    activos = {'ahora': 0, 'max': 0}
+
+    async def handler(event, data):
+        activos['ahora'] += 1
+        activos['max'] = max(activos['max'], activos['ahora'])
+        await asyncio.sleep(0.005)
+        activos['ahora'] -= 1
+
+    async def probar():
+        await asyncio.gather(*[planificador(handler, _update('message'), _datos(-c)) for c in range(10)])
+
+    asyncio.run(probar())
+    assert activos['max'] == 3
+    assert planificador.huecos.libres == 3
@@ -0,0 +1,82 @@
+import asyncio
+
+from worker_pool import WorkerPool
+
+
+class Contador(WorkerPool):
+    """Procesa números con un máximo de `workers` a la vez y falla con los negativos"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hechos = []
+        self.activos = 0
+        self.maximo = 0
+
+    async def procesar_elemento(self, elemento):
+        self.activos += 1
+        self.maximo = max(self.maximo, self.activos)
+        try:
+            await asyncio.sleep(0.001)
+            if elemento < 0:
+                raise ValueError('negativo')
+            self.hechos.append(elemento)
+            self.estado['procesados'] += 1
+        finally:
+            self.activos -= 1
+
+
+def test_procesa_todo_sin_pasar_de_los_trabajadores():
+    pool = Contador(workers=3)
+    pool.estado['total'] = 10
+    asyncio.run(pool.ejecutar_cola(range(10)))
+    assert sorted(pool.hechos) == list(range(10))
+    assert pool.maximo == 3
+    assert pool.estado['procesados'] == 10
+
+
+def test_un_error_no_detiene_a_los_trabajadores():
+    pool = Contador(workers=2)
+    asyncio.run(pool.ejecutar_cola([1, -1, 2, -2, 3]))
+    assert sorted(pool.hechos) == [1, 2, 3]
+    # Los fallidos también cuentan como procesados
+    assert pool.estado['procesados'] == 5
+
+
+def test_progreso_limitado_por_intervalo():
+    avisos = []
+
+    async def on_progress(estado):
+        avisos.append(estado)
+
+    pool = Contador(workers=2, intervalo_progreso=60, on_progress=on_progress)
+    pool.estado['total'] = 6
+
+    async def probar():
+        await pool.ejecutar_cola(range(6))
+        await pool.informar(forzar=True)
+
+    asyncio.run(probar())
+    # Uno al terminar el primer elemento y el forzado del final
+    assert len(avisos) == 2
+    assert avisos[-1]['procesados'] == 6
+    assert avisos[-1]['eta'] == 0
+
+
+def test_cancelar_detiene_los_trabajadores():
+    pool = Contador(workers=2)
+
+    async def probar():
+        tarea = asyncio.create_task(pool.ejecutar_cola(range(1000)))
+        await asyncio.sleep(0.01)
+        tarea.cancel()
+        try:
+            await tarea
+        except asyncio.CancelledError:
+            pass
+        await asyncio.sleep(0.01)
+        return len(pool.hechos)
+
+    hechos = asyncio.run(probar())
+    assert hechos < 1000
+    assert len(pool.hechos) == hechos
+    assert pool.activos == 0
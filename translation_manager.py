@@ -6,6 +6,7 @@ from urllib.parse import quote
 from typing import Dict, List, Optional, Tuple
 import re
 import hashlib
+from rate_limiter import limitador_fuentes
 
 logger = logging.getLogger(__name__)
 
@@ -79,7 +80,7 @@ class TranslationManager:
                 'q': text[:500]  # Limitar a 500 caracteres para detección
             }
             
-            async with self.session.get(url, params=params) as response:
+            async with limitador_fuentes.get(self.session, url, params=params) as response:
                 if response.status == 200:
                     result = await response.text()
                     # Parsear respuesta JSON
@@ -117,7 +118,7 @@ class TranslationManager:
                 'q': text
             }
             
-            async with self.session.get(url, params=params) as response:
+            async with limitador_fuentes.get(self.session, url, params=params) as response:
                 if response.status == 200:
                     result = await response.text()
                     # Parsear respuesta JSON
@@ -218,8 +219,8 @@ class TranslationManager:
         
         return keyboard
 
-    async def process_message_translation(self, message, bot):
-        """Procesa un mensaje para traducir automáticamente"""
+    async def process_message_translation(self, message, bot, contexto=None):
+        """Procesa un mensaje para traducir automáticamente (contexto: RequestContext del update)"""
         try:
             text = message.text
             if not text or not self.should_translate_text(text):
@@ -229,7 +230,7 @@ class TranslationManager:
             chat_id = message.chat.id
             
             # Verificar si el usuario tiene idioma configurado
-            user_lang_info = self.db.get_user_language(user_id, chat_id)
+            user_lang_info = self.db.get_user_language(user_id, chat_id, contexto=contexto)
             
             # Si el usuario no tiene idioma configurado, es español por defecto
             if not user_lang_info:
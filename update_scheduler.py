@@ -0,0 +1,147 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+logger = logging.getLogger(__name__)
+
+# Updates que se procesan a la vez en todo el bot
+UPDATES_CONCURRENCIA = int(os.getenv('UPDATES_CONCURRENCIA', 20))
+
+# Menor número = antes consigue un hueco. Las respuestas a botones (captcha, juego) no
+# deben esperar detrás de comandos pesados de otros grupos.
+PRIORIDADES = {
+    'callback_query': 0,
+}
+PRIORIDAD_NORMAL = 1
+
+
+class PrioritySemaphore:
+    """Semáforo que, al liberarse un hueco, se lo da al que espera con menor prioridad (FIFO entre iguales)"""
+
+    def __init__(self, limite: int):
+        self.limite = limite
+        self.libres = limite
+        self._esperando: List[Tuple[int, int, asyncio.Future]] = []
+        self._orden = itertools.count()
+
+    def esperando(self) -> int:
+        return sum(1 for _, _, futuro in self._esperando if not futuro.done())
+
+    async def adquirir(self, prioridad: int):
+        if self.libres > 0 and not self.esperando():
+            self.libres -= 1
+            return
+        futuro = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._esperando, (prioridad, next(self._orden), futuro))
+        try:
+            await futuro
+        except asyncio.CancelledError:
+            # Si el hueco ya se había concedido, se devuelve
+            if futuro.done() and not futuro.cancelled():
+                self.liberar()
+            raise
+
+    def liberar(self):
+        while self._esperando:
+            _, _, futuro = heapq.heappop(self._esperando)
+            if not futuro.done():
+                futuro.set_result(None)
+                return
+        self.libres += 1
+
+
+class ChatQueueStats:
+    """Métricas de la cola de updates de un chat"""
+
+    def __init__(self):
+        self.profundidad = 0
+        self.profundidad_max = 0
+        self.procesados = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.ultimo = 0.0
+
+    def como_dict(self) -> Dict[str, Any]:
+        return {
+            'profundidad': self.profundidad,
+            'profundidad_max': self.profundidad_max,
+            'procesados': self.procesados,
+            'espera_media': self.espera_total / self.procesados if self.procesados else 0.0,
+            'espera_max': self.espera_max,
+        }
+
+
+class UpdateScheduler(BaseMiddleware):
+    """
+    Capa de planificación sobre el Dispatcher.
+
+    Los updates de chats distintos se procesan en paralelo, hasta `concurrencia` a la vez; los
+    de un mismo chat, de uno en uno y en orden de llegada. Las callback queries de cada chat
+    van en su propia cola, así que un comando lento en un grupo no retiene los botones que se
+    pulsen en él, y tienen prioridad al repartir los huecos libres. Se registra como primer
+    outer middleware de dp.update: polling y webhook ya lanzan cada update en su propia tarea.
+    """
+
+    def __init__(self, concurrencia: int = UPDATES_CONCURRENCIA):
+        self.huecos = PrioritySemaphore(max(1, concurrencia))
+        # (chat_id, es_callback) -> [lock, updates en la cola]
+        self._colas: Dict[Tuple[int, bool], list] = {}
+        self.estadisticas: Dict[int, ChatQueueStats] = {}
+        self.en_curso = 0
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        chat = data.get('event_chat')
+        usuario = data.get('event_from_user')
+        chat_id = chat.id if chat else (usuario.id if usuario else 0)
+        tipo = event.event_type if isinstance(event, Update) else None
+        prioridad = PRIORIDADES.get(tipo, PRIORIDAD_NORMAL)
+        clave = (chat_id, tipo == 'callback_query')
+
+        cola = self._colas.setdefault(clave, [asyncio.Lock(), 0])
+        cola[1] += 1
+        stats = self.estadisticas.setdefault(chat_id, ChatQueueStats())
+        stats.profundidad += 1
+        stats.profundidad_max = max(stats.profundidad_max, stats.profundidad)
+        llegada = time.monotonic()
+        try:
+            async with cola[0]:
+                await self.huecos.adquirir(prioridad)
+                espera = time.monotonic() - llegada
+                stats.procesados += 1
+                stats.espera_total += espera
+                stats.espera_max = max(stats.espera_max, espera)
+                stats.ultimo = time.time()
+                self.en_curso += 1
+                try:
+                    return await handler(event, data)
+                finally:
+                    self.en_curso -= 1
+                    self.huecos.liberar()
+        finally:
+            cola[1] -= 1
+            if cola[1] == 0:
+                self._colas.pop(clave, None)
+            stats.profundidad -= 1
+
+    def metricas(self, limite: int = 10) -> Dict[str, Any]:
+        """Estado global y los chats con más updates en cola (o con más espera acumulada)"""
+        chats = sorted(
+            self.estadisticas.items(),
+            key=lambda item: (item[1].profundidad, item[1].espera_max),
+            reverse=True,
+        )
+        return {
+            'en_curso': self.en_curso,
+            'esperando_hueco': self.huecos.esperando(),
+            'concurrencia': self.huecos.limite,
+            'en_cola': sum(stats.profundidad for stats in self.estadisticas.values()),
+            'chats': [dict(stats.como_dict(), chat_id=chat_id) for chat_id, stats in chats[:limite]],
+        }
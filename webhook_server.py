@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import os
+import secrets
+import signal
+from typing import Optional, Tuple
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+logger = logging.getLogger(__name__)
+
+# polling (por defecto) o webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling').strip().lower()
+# URL pública con la que Telegram llega al servidor (p. ej. https://bot.midominio.com)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').rstrip('/')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+# Dirección en la que escucha el servidor aiohttp (normalmente detrás de un proxy con TLS)
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+# Segundos que se espera a los updates en curso al apagar
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', 30))
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """SimpleRequestHandler que permite esperar a los updates que se están procesando"""
+
+    def en_curso(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def drenar(self, timeout: float) -> int:
+        """Espera a los updates en curso; devuelve cuántos quedaban al agotarse el plazo"""
+        pendientes = set(self._background_feed_update_tasks)
+        if not pendientes:
+            return 0
+        logger.info(f"Esperando a {len(pendientes)} updates en curso...")
+        _, sin_terminar = await asyncio.wait(pendientes, timeout=timeout)
+        return len(sin_terminar)
+
+
+def crear_app(dp: Dispatcher, bot: Bot, path: str = WEBHOOK_PATH,
+              secret: Optional[str] = None) -> Tuple[web.Application, DrainingRequestHandler]:
+    """Aplicación aiohttp que recibe los updates en `path` comprobando el secret token"""
+    app = web.Application()
+    handler = DrainingRequestHandler(dispatcher=dp, bot=bot, secret_token=secret, handle_in_background=True)
+    handler.register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    return app, handler
+
+
+async def ejecutar_webhook(dp: Dispatcher, bot: Bot, url: str = WEBHOOK_URL, path: str = WEBHOOK_PATH,
+                           host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT, secret: str = WEBHOOK_SECRET,
+                           drain_timeout: float = WEBHOOK_DRAIN_TIMEOUT, parada: Optional[asyncio.Event] = None):
+    """
+    Sirve el bot por webhook hasta recibir SIGINT/SIGTERM (o hasta que se active `parada`).
+
+    Al apagar deja de aceptar conexiones, espera hasta drain_timeout a que terminen los
+    updates en curso y después cierra la aplicación. El webhook no se borra: los updates que
+    lleguen mientras el bot está parado los guarda Telegram y los reenvía al volver.
+    """
+    if not url:
+        raise ValueError("BOT_MODE=webhook necesita WEBHOOK_URL")
+    if not secret:
+        # Sin secreto configurado se genera uno por ejecución: se registra con set_webhook igualmente
+        secret = secrets.token_urlsafe(32)
+        logger.warning("WEBHOOK_SECRET no está definido; se usa un secreto aleatorio para esta ejecución")
+
+    app, handler = crear_app(dp, bot, path, secret)
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+    logger.info(f"Servidor webhook escuchando en {host}:{port}{path}")
+
+    parada = parada or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(senal, parada.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    try:
+        await bot.set_webhook(
+            url=f"{url}{path}",
+            secret_token=secret,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info(f"Webhook registrado en {url}{path}")
+        await parada.wait()
+    finally:
+        logger.info("Apagando el servidor webhook...")
+        await site.stop()
+        sin_terminar = await handler.drenar(drain_timeout)
+        if sin_terminar:
+            logger.warning(f"{sin_terminar} updates no terminaron en {drain_timeout:.0f}s")
+        await runner.cleanup()
+        for senal in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.remove_signal_handler(senal)
+            except (NotImplementedError, RuntimeError):
+                pass
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """
+    Base de los procesos masivos con un número limitado de trabajadores (SpeciesLoader,
+    GenusCrawler, RegionUpdater).
+
+    Reparte los elementos de una cola entre `workers` tareas que llaman a
+    `procesar_elemento(elemento)`, y lleva en self.estado el total, los procesados y los
+    omitidos (ya hechos en una ejecución anterior) para calcular el ritmo y el tiempo
+    restante. El progreso se notifica a on_progress como mucho cada `intervalo_progreso`
+    segundos. Las subclases añaden sus propios contadores a self.estado.
+    """
+
+    # Nombre de los elementos en los mensajes de log
+    unidad = 'elementos'
+
+    def __init__(self, workers: int = 4, intervalo_progreso: float = 10.0,
+                 on_progress: Optional[Callable[[Dict], Awaitable[None]]] = None):
+        self.workers = max(1, workers)
+        self.intervalo_progreso = intervalo_progreso
+        self.on_progress = on_progress
+        self.estado: Dict[str, Any] = {'total': 0, 'omitidos': 0, 'procesados': 0, 'inicio': None}
+        self._ultimo_progreso = 0.0
+
+    async def procesar_elemento(self, elemento):
+        raise NotImplementedError
+
+    def al_informar(self):
+        """Se llama cada vez que toca informar del progreso (p. ej. para guardarlo)"""
+
+    def resumen(self) -> Dict:
+        """Estado actual con ritmo (elementos/minuto) y tiempo restante estimado"""
+        estado = dict(self.estado)
+        transcurrido = time.monotonic() - estado['inicio'] if estado['inicio'] else 0
+        restantes = estado['total'] - estado['omitidos'] - estado['procesados']
+        ritmo = estado['procesados'] / transcurrido if transcurrido > 0 else 0
+        estado['transcurrido'] = transcurrido
+        estado['por_minuto'] = ritmo * 60
+        estado['eta'] = restantes / ritmo if ritmo > 0 else None
+        return estado
+
+    async def notificar(self):
+        """Registra el progreso en el log y se lo pasa a on_progress"""
+        estado = self.resumen()
+        eta = f"{estado['eta'] / 60:.1f} min" if estado['eta'] is not None else "-"
+        logger.info(
+            f"Progreso: {estado['procesados'] + estado['omitidos']}/{estado['total']} {self.unidad} - "
+            f"{estado['por_minuto']:.1f} {self.unidad}/min, ETA {eta}"
+        )
+        if self.on_progress:
+            try:
+                await self.on_progress(estado)
+            except Exception as e:
+                logger.error(f"Error al notificar el progreso: {str(e)}")
+
+    async def informar(self, forzar: bool = False):
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultimo_progreso < self.intervalo_progreso:
+            return
+        self._ultimo_progreso = ahora
+        self.al_informar()
+        await self.notificar()
+
+    async def _trabajador(self, cola: asyncio.Queue):
+        while True:
+            elemento = await cola.get()
+            try:
+                await self.procesar_elemento(elemento)
+            except Exception as e:
+                # procesar_elemento trata sus errores; esto solo evita perder el trabajador
+                self.estado['procesados'] += 1
+                logger.error(f"Error inesperado procesando {elemento}: {str(e)}")
+            finally:
+                await self.informar()
+                cola.task_done()
+
+    async def ejecutar_cola(self, elementos: Iterable) -> None:
+        """
+        Procesa los elementos y vuelve cuando se han terminado todos. Si se cancela (p. ej. al
+        cancelar el trabajo), cancela los trabajadores antes de propagar la cancelación.
+        """
+        if self.estado['inicio'] is None:
+            self.estado['inicio'] = time.monotonic()
+        cola: asyncio.Queue = asyncio.Queue()
+        for elemento in elementos:
+            cola.put_nowait(elemento)
+
+        trabajadores = [asyncio.create_task(self._trabajador(cola)) for _ in range(self.workers)]
+        try:
+            await cola.join()
+        finally:
+            for trabajador in trabajadores:
+                trabajador.cancel()
+            await asyncio.gather(*trabajadores, return_exceptions=True)